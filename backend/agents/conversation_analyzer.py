@@ -2,10 +2,25 @@
 Conversation Analysis Agent - Few-Shot Learning Version
 """
 
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
 import json
 import os
-from openai import OpenAI
+import re
+
+from agents.json_stream import IncrementalJSONParser, parse_fragment
+from agents.openai_client import get_openai_client
+from agents.resilience import CircuitOpenError
+from cache.analysis_cache import analysis_key, get_analysis_cache
+from cache.single_flight import SingleFlight
+from compliance.off_label_detector import OffLabelDetector
+from compliance.registry import get_rule_registry
+from observability.logs import get_logger
+from observability.metrics import ANALYSIS_REPAIRS, ANALYSES, PIPELINE_IN_FLIGHT, stage
+from scorecards.store import get_scorecard_store
+
+logger = get_logger("analyzer")
 
 FEW_SHOT_EXAMPLES = """
 EXAMPLE 1 - EXCELLENT CONVERSATION (Score: 4.8):
@@ -75,8 +90,6 @@ Look for:
 
 Return ONLY JSON:
 {{
-  "overall_score": 2.8,
-  "overall_color": "yellow",
   "scores": {{
     "compliance": {{"score": 0.0, "color": "red", "justification": "Off-label promotion detected", "examples": ["quote"], "dimension": "Compliance"}},
     "tone": {{"score": 2.5, "color": "red", "justification": "Pushy language", "examples": ["quote"], "dimension": "Tone & Professionalism"}},
@@ -85,6 +98,64 @@ Return ONLY JSON:
     "relationship": {{"score": 2.5, "color": "red", "justification": "Transactional", "examples": ["quote"], "dimension": "Relationship Building"}},
     "call_to_action": {{"score": 3.0, "color": "yellow", "justification": "Vague follow-up", "examples": ["quote"], "dimension": "Call-to-Action"}}
   }},
+  "strengths": ["One specific strength if any"],
+  "improvements": ["Specific actionable fix"],
+  "coaching": [{{"issue": "Problem", "recommendation": "Solution", "example": "What to say"}}],
+  "conversation_summary": "Brief summary",
+  "overall_score": 2.8,
+  "overall_color": "yellow"
+}}
+
+Rep: {rep_name}, Doctor: {doctor_name}, Product: CardioStatin (cholesterol med)
+"""
+
+ANALYZER_SYSTEM_PROMPT = "You are a strict pharmaceutical sales analyst. Follow the examples precisely. Off-label promotion MUST score 0.0 for compliance. Be harsh - most conversations are mediocre (2.5-3.5). Only truly excellent ones score 4.5+."
+
+# Scoring dimensions (key in "scores" -> display name)
+DIMENSIONS = {
+    "compliance": "Compliance",
+    "tone": "Tone & Professionalism",
+    "knowledge": "Product Knowledge",
+    "objection_handling": "Objection Handling",
+    "relationship": "Relationship Building",
+    "call_to_action": "Call-to-Action"
+}
+
+# Parallel mode: one small request per dimension...
+DIMENSION_PROMPT = """You are a pharmaceutical sales analyst. Use the examples above to calibrate your scoring.
+
+CRITICAL RULES:
+1. OFF-LABEL PROMOTION = Compliance score MUST be 0.0
+2. Specific data (studies, percentages, dollar amounts) = 4.5-5.0 for Knowledge
+3. Vague claims ("better", "everyone uses") = max 3.0 for Knowledge
+4. Specific date/time in CTA = 4.5-5.0, vague follow-up = max 3.0
+5. Data-driven objection handling = 4.5-5.0, dismissive = max 2.5
+
+NOW ANALYZE THIS CONVERSATION:
+---
+{conversation}
+---
+
+Score ONLY the "{dimension}" dimension (0.0-5.0).
+
+Return ONLY JSON:
+{{"score": 2.5, "color": "red", "justification": "One sentence", "examples": ["quote"], "dimension": "{dimension}"}}
+
+Rep: {rep_name}, Doctor: {doctor_name}, Product: CardioStatin (cholesterol med)
+"""
+
+# ...plus one for the qualitative feedback
+COACHING_PROMPT = """You are a pharmaceutical sales coach. Use the examples above to calibrate your feedback.
+
+NOW REVIEW THIS CONVERSATION:
+---
+{conversation}
+---
+
+Flag any OFF-LABEL mentions (migraines, pain, inflammation for a cholesterol drug) as the top improvement.
+
+Return ONLY JSON:
+{{
   "strengths": ["One specific strength if any"],
   "improvements": ["Specific actionable fix"],
   "coaching": [{{"issue": "Problem", "recommendation": "Solution", "example": "What to say"}}],
@@ -94,116 +165,796 @@ Return ONLY JSON:
 Rep: {rep_name}, Doctor: {doctor_name}, Product: CardioStatin (cholesterol med)
 """
 
-def analyze_conversation_sync(
+# Structured outputs: the model is held to these schemas (strict mode needs
+# every property listed as required and no extra properties). Scores come
+# first so each dimension closes, and can be shown, early in the stream.
+DIMENSION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "number"},
+        "color": {"type": "string", "enum": ["green", "yellow", "red"]},
+        "justification": {"type": "string"},
+        "examples": {"type": "array", "items": {"type": "string"}},
+        "dimension": {"type": "string"}
+    },
+    "required": ["score", "color", "justification", "examples", "dimension"],
+    "additionalProperties": False
+}
+COACHING_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "issue": {"type": "string"},
+        "recommendation": {"type": "string"},
+        "example": {"type": "string"}
+    },
+    "required": ["issue", "recommendation", "example"],
+    "additionalProperties": False
+}
+FEEDBACK_PROPERTIES = {
+    "strengths": {"type": "array", "items": {"type": "string"}},
+    "improvements": {"type": "array", "items": {"type": "string"}},
+    "coaching": {"type": "array", "items": COACHING_ITEM_SCHEMA},
+    "conversation_summary": {"type": "string"}
+}
+COACHING_SCHEMA = {
+    "type": "object",
+    "properties": FEEDBACK_PROPERTIES,
+    "required": list(FEEDBACK_PROPERTIES),
+    "additionalProperties": False
+}
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "scores": {
+            "type": "object",
+            "properties": {key: DIMENSION_SCHEMA for key in DIMENSIONS},
+            "required": list(DIMENSIONS),
+            "additionalProperties": False
+        },
+        **FEEDBACK_PROPERTIES,
+        "overall_score": {"type": "number"},
+        "overall_color": {"type": "string", "enum": ["green", "yellow", "red"]}
+    },
+    "required": ["scores", *FEEDBACK_PROPERTIES, "overall_score", "overall_color"],
+    "additionalProperties": False
+}
+
+# off: plain "Return ONLY JSON" prompting, for endpoints without json_schema support
+STRUCTURED_OUTPUT = os.getenv("ANALYZER_STRUCTURED_OUTPUT", "on").lower() in ("1", "on", "true")
+
+
+# Raw "conversation_summary" string value, for output whose root object did not parse
+SUMMARY_FIELD = re.compile(r'"conversation_summary"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def _response_format(name: str, schema: Dict) -> Optional[Dict]:
+    if not STRUCTURED_OUTPUT:
+        return None
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+
+
+ANALYSIS_MODES = ("single", "parallel", "windowed")
+
+# In-flight analyses by analysis key (created on first use: it opens the shared state)
+_analysis_flights: Optional[SingleFlight] = None
+
+
+def _get_analysis_flights() -> SingleFlight:
+    global _analysis_flights
+    if _analysis_flights is None:
+        _analysis_flights = SingleFlight.from_env("analysis")
+    return _analysis_flights
+
+# Windowed mode: long transcripts are scored as overlapping excerpts of whole
+# speaker turns ("Rep: ...", "Dr. Smith: ...") and the results merged
+WINDOW_CHARS = int(os.getenv("ANALYZER_WINDOW_CHARS", "12000"))
+WINDOW_OVERLAP_TURNS = int(os.getenv("ANALYZER_WINDOW_OVERLAP_TURNS", "2"))
+WINDOW_HEADER = "[Excerpt {index} of {count} from a longer call - score only what this excerpt shows]"
+SPEAKER_TURN = re.compile(r"^\s*[A-Z][\w .'-]{0,40}:")
+
+# Changes whenever any prompt text or output schema changes (part of the analysis cache key)
+_SCHEMA_VERSION = json.dumps([STRUCTURED_OUTPUT, ANALYSIS_SCHEMA, COACHING_SCHEMA], sort_keys=True)
+ANALYZER_PROMPT_VERSION = hashlib.sha256(
+    (FEW_SHOT_EXAMPLES + SCORING_PROMPT + ANALYZER_SYSTEM_PROMPT + _SCHEMA_VERSION).encode("utf-8")
+).hexdigest()[:16]
+PARALLEL_PROMPT_VERSION = hashlib.sha256(
+    (FEW_SHOT_EXAMPLES + DIMENSION_PROMPT + COACHING_PROMPT + ANALYZER_SYSTEM_PROMPT
+     + _SCHEMA_VERSION).encode("utf-8")
+).hexdigest()[:16]
+WINDOWED_PROMPT_VERSION = hashlib.sha256(
+    f"{ANALYZER_PROMPT_VERSION}:{WINDOW_HEADER}:{WINDOW_CHARS}:{WINDOW_OVERLAP_TURNS}".encode("utf-8")
+).hexdigest()[:16]
+PROMPT_VERSIONS = {
+    "single": ANALYZER_PROMPT_VERSION,
+    "parallel": PARALLEL_PROMPT_VERSION,
+    "windowed": WINDOWED_PROMPT_VERSION
+}
+
+
+async def analyze_conversation(
     conversation: str,
     rep_name: Optional[str] = "Sales Rep",
-    doctor_name: Optional[str] = "Dr. Smith"
+    doctor_name: Optional[str] = "Dr. Smith",
+    use_cache: bool = True,
+    mode: Optional[str] = None,
+    product_id: Optional[str] = None,
+    territory: Optional[str] = None
+) -> Dict:
+    """
+    Analyze a conversation, reusing the stored result for an identical transcript.
+
+    Args:
+        use_cache: False forces a fresh analysis (the result still refreshes the cache)
+        mode: "single" (one completion for everything), "parallel" (concurrent
+            per-dimension requests) or "windowed" (long transcripts scored as
+            overlapping excerpts); defaults to ANALYZER_MODE, else "windowed" for
+            transcripts over ANALYZER_WINDOW_CHARS and "single" otherwise
+        product_id: Product whose compliance rules flag the transcript
+            (default product when None)
+        territory: Sales territory the result counts toward in scorecards
+    """
+    mode = mode or os.getenv("ANALYZER_MODE") or (
+        "windowed" if len(conversation) > WINDOW_CHARS else "single")
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    # Same compiled rule set the Compliance Guardian uses for this product
+    detector = OffLabelDetector(get_rule_registry().get(product_id))
+
+    with PIPELINE_IN_FLIGHT.track(pipeline="analysis"), stage("analysis", "total"):
+        analysis, _ = await _analyze_cached(conversation, rep_name, doctor_name, use_cache, mode, detector)
+        await _record_result(analysis, conversation, rep_name, doctor_name, territory, product_id)
+        return analysis
+
+
+async def _analyze_cached(
+    conversation: str,
+    rep_name: Optional[str],
+    doctor_name: Optional[str],
+    use_cache: bool,
+    mode: str,
+    detector: OffLabelDetector
+) -> Tuple[Dict, bool]:
+    """
+    The analysis and whether it came from the cache.
+    """
+    cache = get_analysis_cache()
+    key = _cache_key(conversation, rep_name, doctor_name, mode, detector)
+
+    if cache is not None:
+        if use_cache:
+            with stage("analysis", "cache_lookup"):
+                cached = await cache.get(key)
+            if cached is not None:
+                logger.info("Cache hit", extra={"rep": rep_name, "doctor": doctor_name, "sample": True})
+                ANALYSES.inc(mode=mode, cached="true")
+                return cached, True
+        else:
+            cache.bypassed += 1
+
+    async def analyze_and_store() -> Dict:
+        analysis = await _run_analysis(conversation, rep_name, doctor_name, mode, detector)
+        if cache is not None:
+            with stage("analysis", "cache_store"):
+                await cache.set(key, analysis)
+        return analysis
+
+    # Identical transcripts submitted together (even with bypass_cache) share one analysis; other
+    # workers' results are picked up from the cache only when an existing entry would have been used
+    peek = (lambda: cache.peek(key)) if cache is not None and use_cache else None
+    return await _get_analysis_flights().do(key, analyze_and_store, peek), False
+
+
+async def analyze_conversation_stream(
+    conversation: str,
+    rep_name: Optional[str] = "Sales Rep",
+    doctor_name: Optional[str] = "Dr. Smith",
+    use_cache: bool = True,
+    mode: Optional[str] = None,
+    product_id: Optional[str] = None,
+    territory: Optional[str] = None
+) -> AsyncIterator[Dict]:
+    """
+    Analyze a conversation, yielding each part as soon as it is known.
+
+    Events (dicts with "event" and "data"):
+        dimension: {"key", "score", "color", "justification", "examples", "dimension"}
+            as each score object closes in the model output
+        feedback: {"field", "value"} for strengths, improvements, coaching
+            and conversation_summary
+        done: the complete analysis (same shape as analyze_conversation)
+            plus "cached"
+
+    Only single mode streams part by part; parallel and windowed results
+    (and cache hits) are emitted together once complete. A streamed
+    analysis is not coalesced with concurrent identical requests, but its
+    result is cached like any other.
+    """
+    mode = mode or os.getenv("ANALYZER_MODE") or (
+        "windowed" if len(conversation) > WINDOW_CHARS else "single")
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    detector = OffLabelDetector(get_rule_registry().get(product_id))
+
+    with PIPELINE_IN_FLIGHT.track(pipeline="analysis_stream"), stage("analysis_stream", "total"):
+        if mode != "single":
+            analysis, cached = await _analyze_cached(conversation, rep_name, doctor_name, use_cache, mode, detector)
+            for event in _analysis_events(analysis):
+                yield event
+            await _record_result(analysis, conversation, rep_name, doctor_name, territory, product_id)
+            yield {"event": "done", "data": {**analysis, "cached": cached}}
+            return
+
+        cache = get_analysis_cache()
+        key = _cache_key(conversation, rep_name, doctor_name, mode, detector)
+        if cache is not None:
+            if use_cache:
+                with stage("analysis", "cache_lookup"):
+                    cached = await cache.get(key)
+                if cached is not None:
+                    logger.info("Cache hit", extra={"rep": rep_name, "doctor": doctor_name, "sample": True})
+                    ANALYSES.inc(mode=mode, cached="true")
+                    for event in _analysis_events(cached):
+                        yield event
+                    await _record_result(cached, conversation, rep_name, doctor_name, territory, product_id)
+                    yield {"event": "done", "data": {**cached, "cached": True}}
+                    return
+            else:
+                cache.bypassed += 1
+
+        logger.info("Streaming analysis", extra={"rep": rep_name, "doctor": doctor_name, "sample": True})
+        has_off_label = _pre_check(conversation, detector)
+        assembler = AnalysisAssembler(off_label=has_off_label)
+        prompt_args = {"conversation": conversation, "rep_name": rep_name, "doctor_name": doctor_name}
+
+        chunks = get_openai_client().stream_response(
+            system_prompt=ANALYZER_SYSTEM_PROMPT,
+            user_message=FEW_SHOT_EXAMPLES + "\n\n" + SCORING_PROMPT.format(**prompt_args),
+            temperature=0.05,
+            max_tokens=2000,
+            response_format=_response_format("conversation_analysis", ANALYSIS_SCHEMA)
+        )
+        try:
+            async for chunk in chunks:
+                for event in assembler.feed(chunk):
+                    yield event
+        finally:
+            await chunks.aclose()
+        for event in assembler.finish():
+            yield event
+        for event in await _repair(assembler, prompt_args):
+            yield event
+
+        analysis = _finalize(assembler.result(), has_off_label, rep_name, doctor_name, mode)
+        if cache is not None:
+            with stage("analysis", "cache_store"):
+                await cache.set(key, analysis)
+        await _record_result(analysis, conversation, rep_name, doctor_name, territory, product_id)
+        yield {"event": "done", "data": {**analysis, "cached": False}}
+
+
+async def _record_result(
+    analysis: Dict,
+    conversation: str,
+    rep_name: Optional[str],
+    doctor_name: Optional[str],
+    territory: Optional[str],
+    product_id: Optional[str]
+) -> None:
+    """
+    Persist the result for scorecards. A failure is logged, never
+    raised: the caller still gets its analysis. The write runs in a
+    thread, as it may wait on the database lock (the snapshot thread,
+    other workers).
+    """
+    store = get_scorecard_store()
+    if store is None:
+        return
+    try:
+        with stage("analysis", "scorecard"):
+            await asyncio.to_thread(
+                store.record, analysis, conversation, rep_name, doctor_name, territory, product_id)
+    except Exception as e:
+        logger.error("Failed to record scorecard result", extra={"error": str(e)})
+
+
+def _analysis_events(analysis: Dict) -> Iterator[Dict]:
+    for key, score in analysis.get("scores", {}).items():
+        yield {"event": "dimension", "data": {"key": key, **score}}
+    for field in FEEDBACK_PROPERTIES:
+        yield {"event": "feedback", "data": {"field": field, "value": analysis.get(field)}}
+
+
+def _cache_key(
+    conversation: str,
+    rep_name: Optional[str],
+    doctor_name: Optional[str],
+    mode: str,
+    detector: OffLabelDetector
+) -> str:
+    return analysis_key(
+        conversation, rep_name, doctor_name,
+        PROMPT_VERSIONS[mode],
+        get_openai_client().model,
+        rules_version=detector.rules.version
+    )
+
+
+async def _run_analysis(
+    conversation: str,
+    rep_name: Optional[str] = "Sales Rep",
+    doctor_name: Optional[str] = "Dr. Smith",
+    mode: str = "single",
+    detector: Optional[OffLabelDetector] = None
 ) -> Dict:
     """Analyze with few-shot learning."""
     
     try:
-        print(f"[ANALYZER] Analyzing: {rep_name} with {doctor_name}")
-        
-        # Check for off-label keywords first
-        off_label_keywords = [
-            "migraine", "headache", "pain", "inflammation", 
-            "off-label", "other uses", "also works for",
-            "between you and me", "unofficially"
-        ]
+        logger.info("Analyzing", extra={"rep": rep_name, "doctor": doctor_name, "mode": mode, "sample": True})
         
-        conversation_lower = conversation.lower()
-        has_off_label = any(keyword in conversation_lower for keyword in off_label_keywords)
+        # Check for the product's red-flag terms first (always over the full transcript)
+        has_off_label = _pre_check(conversation, detector or OffLabelDetector())
         
-        if has_off_label:
-            print("[ANALYZER] ⚠️  OFF-LABEL KEYWORDS DETECTED!")
+        if mode == "parallel":
+            analysis = await _score_parallel(conversation, rep_name, doctor_name)
+        elif mode == "windowed":
+            analysis = await _score_windowed(conversation, rep_name, doctor_name)
+        else:
+            analysis = await _score_single(conversation, rep_name, doctor_name)
         
-        # Create client
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found")
+        return _finalize(analysis, has_off_label, rep_name, doctor_name, mode)
         
-        client = OpenAI(api_key=api_key)
+    except CircuitOpenError:
+        # Fail fast unchanged: the API answers 503 with Retry-After
+        raise
+    except Exception as e:
+        logger.error("Analysis failed", extra={"error": str(e)})
+        raise Exception(f"Analysis failed: {str(e)}")
+
+
+def _pre_check(conversation: str, detector: OffLabelDetector) -> bool:
+    with stage("analysis", "pre_check"):
+        flagged = detector.conversation_flags(conversation)
+    if flagged:
+        logger.warning("Off-label keywords detected", extra={"keywords": flagged})
+    return bool(flagged)
+
+
+def _finalize(analysis: Dict, has_off_label: bool, rep_name: str, doctor_name: str, mode: str) -> Dict:
+    # ENFORCE compliance rule if off-label detected
+    if has_off_label:
+        logger.warning("Enforcing compliance score 0.0 (off-label detected)")
+        if "scores" in analysis and "compliance" in analysis["scores"]:
+            _enforce_off_label(analysis["scores"]["compliance"])
         
-        # Combine examples + prompt
-        full_prompt = FEW_SHOT_EXAMPLES + "\n\n" + SCORING_PROMPT.format(
-            conversation=conversation,
-            rep_name=rep_name,
-            doctor_name=doctor_name
+        # Recalculate overall score
+        if "scores" in analysis:
+            scores_list = [s["score"] for s in analysis["scores"].values()]
+            analysis["overall_score"] = round(sum(scores_list) / len(scores_list), 1)
+            analysis["overall_color"] = "red" if analysis["overall_score"] < 3.0 else "yellow"
+    
+    # Add metadata
+    analysis["rep_name"] = rep_name
+    analysis["doctor_name"] = doctor_name
+    ANALYSES.inc(mode=mode, cached="false", off_label=str(has_off_label).lower())
+    
+    logger.info("Final score", extra={"overall_score": analysis.get("overall_score"), "mode": mode, "sample": True})
+    
+    return analysis
+
+
+def _enforce_off_label(compliance: Dict) -> None:
+    compliance["score"] = 0.0
+    compliance["color"] = "red"
+    if "off-label" not in compliance["justification"].lower():
+        compliance["justification"] = "CRITICAL VIOLATION: Off-label promotion detected"
+
+
+class AnalysisAssembler:
+    """
+    Builds an analysis from model output, one part at a time.
+
+    Single-completion output is fed in as it streams; each dimension score
+    and feedback list is accepted (and reported) the moment its JSON
+    closes, instead of after the whole response has been parsed. A part
+    that is malformed (or never arrives, e.g. the output was truncated) is
+    left missing, so only that part needs re-requesting - see _repair.
+    """
+
+    def __init__(self, off_label: bool = False):
+        self.parser = IncrementalJSONParser()
+        self.off_label = off_label
+        self.scores: Dict[str, Dict] = {}
+        self.feedback: Dict = {}
+        self.malformed: List[str] = []
+        self.overall_score: Optional[float] = None
+        self.repaired = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        Add model output; returns the events for parts completed by it.
+        """
+        events = []
+        for path, raw in self.parser.feed(chunk):
+            if len(path) == 2 and path[0] == "scores" and path[1] in DIMENSIONS:
+                event = self.accept_score(path[1], parse_fragment(raw))
+            elif len(path) == 1 and path[0] in FEEDBACK_PROPERTIES:
+                event = self.accept_feedback(path[0], parse_fragment(raw))
+            elif not path:
+                event = self._accept_root(parse_fragment(raw))
+            else:
+                continue
+            if event is not None:
+                events.append(event)
+        return events
+
+    def finish(self) -> List[Dict]:
+        """
+        Events for anything recoverable once the output has ended.
+        """
+        if "conversation_summary" in self.feedback:
+            return []
+        # Strings are not containers: salvage the summary if the root object was malformed
+        match = SUMMARY_FIELD.search(self.parser.text)
+        event = self.accept_feedback("conversation_summary", parse_fragment(match.group(1)) if match else None)
+        return [event] if event is not None else []
+
+    def accept_score(self, key: str, score) -> Optional[Dict]:
+        if key in self.scores:
+            return None
+        try:
+            value = min(max(float(score["score"]), 0.0), 5.0)
+        except (KeyError, TypeError, ValueError):
+            self.malformed.append(key)
+            return None
+        color = score.get("color")
+        examples = score.get("examples")
+        normalized = {
+            "score": value,
+            "color": color if color in ("green", "yellow", "red") else _score_color(value),
+            "justification": str(score.get("justification", "")),
+            "examples": [str(e) for e in examples] if isinstance(examples, list) else [],
+            "dimension": DIMENSIONS[key]
+        }
+        if key == "compliance" and self.off_label:
+            _enforce_off_label(normalized)
+        self.scores[key] = normalized
+        return {"event": "dimension", "data": {"key": key, **normalized}}
+
+    def accept_feedback(self, field: str, value) -> Optional[Dict]:
+        expected = str if field == "conversation_summary" else list
+        if field in self.feedback:
+            return None
+        if not isinstance(value, expected):
+            self.malformed.append(field)
+            return None
+        self.feedback[field] = value
+        return {"event": "feedback", "data": {"field": field, "value": value}}
+
+    def _accept_root(self, root) -> Optional[Dict]:
+        if not isinstance(root, dict):
+            return None
+        if isinstance(root.get("overall_score"), (int, float)):
+            self.overall_score = float(root["overall_score"])
+        if "conversation_summary" in root:
+            return self.accept_feedback("conversation_summary", root["conversation_summary"])
+        return None
+
+    def missing_scores(self) -> List[str]:
+        return [key for key in DIMENSIONS if key not in self.scores]
+
+    def missing_feedback(self) -> List[str]:
+        return [field for field in FEEDBACK_PROPERTIES if field not in self.feedback]
+
+    def result(self) -> Dict:
+        scores = {key: self.scores[key] for key in DIMENSIONS if key in self.scores}
+        # The model's own overall score only stands if every part came from the same output
+        overall_score = self.overall_score
+        if overall_score is None or self.repaired:
+            overall_score = round(sum(s["score"] for s in scores.values()) / len(scores), 1) if scores else 0.0
+        return {
+            "overall_score": overall_score,
+            "overall_color": _score_color(overall_score),
+            "scores": scores,
+            "strengths": self.feedback.get("strengths", []),
+            "improvements": self.feedback.get("improvements", []),
+            "coaching": self.feedback.get("coaching", []),
+            "conversation_summary": self.feedback.get("conversation_summary", "")
+        }
+
+
+async def _repair(assembler: AnalysisAssembler, prompt_args: Dict) -> List[Dict]:
+    """
+    Re-request only the parts the assembler is missing: a dimension
+    prompt per missing score, and one coaching prompt if any feedback
+    field is missing. Returns the events for the repaired parts.
+    """
+    missing = assembler.missing_scores()
+    missing_feedback = assembler.missing_feedback()
+    if not missing and not missing_feedback:
+        return []
+
+    logger.warning("Re-requesting malformed or missing parts", extra={"parts": missing + missing_feedback})
+    calls = [_score_dimension(key, prompt_args) for key in missing]
+    if missing_feedback:
+        calls.append(_score_feedback(prompt_args))
+    with stage("analysis", "repair"):
+        results = await _gather_or_cancel(calls)
+
+    events = [assembler.accept_score(key, score) for key, score in zip(missing, results)]
+    ANALYSIS_REPAIRS.inc(len(missing), part="dimension")
+    if missing_feedback:
+        events += [assembler.accept_feedback(field, results[-1][field]) for field in missing_feedback]
+        ANALYSIS_REPAIRS.inc(part="feedback")
+    assembler.repaired = True
+    return [event for event in events if event is not None]
+
+
+async def _gather_or_cancel(calls: List) -> List:
+    """
+    Run the calls concurrently and return their results in order. The first
+    failure cancels the calls still running (instead of leaving them to
+    spend tokens on an analysis that is already lost) and is re-raised as is.
+    """
+    tasks = [asyncio.ensure_future(call) for call in calls]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in tasks:
+            if task in done and task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _score_dimension(key: str, prompt_args: Dict) -> Dict:
+    """
+    One dimension on its own (retried once if the output is malformed).
+    """
+    for attempt in range(1, 3):
+        text = await get_openai_client().generate_response(
+            system_prompt=ANALYZER_SYSTEM_PROMPT,
+            user_message=FEW_SHOT_EXAMPLES + "\n\n" + DIMENSION_PROMPT.format(
+                dimension=DIMENSIONS[key], **prompt_args),
+            temperature=0.05,
+            max_tokens=250,
+            response_format=_response_format("dimension_score", DIMENSION_SCHEMA)
         )
-        
-        print("[ANALYZER] Calling OpenAI with few-shot examples...")
-        
-        # Use GPT-4 for better reasoning (or gpt-4o-mini with very low temp)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Could upgrade to "gpt-4o" for better accuracy
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a strict pharmaceutical sales analyst. Follow the examples precisely. Off-label promotion MUST score 0.0 for compliance. Be harsh - most conversations are mediocre (2.5-3.5). Only truly excellent ones score 4.5+."
-                },
-                {"role": "user", "content": full_prompt}
-            ],
+        score = _parse_object(text)
+        if score is not None and isinstance(score.get("score"), (int, float)):
+            return score
+        logger.warning("Malformed score", extra={"dimension": DIMENSIONS[key], "attempt": attempt})
+    raise ValueError(f"Malformed {DIMENSIONS[key]} score")
+
+
+async def _score_feedback(prompt_args: Dict) -> Dict:
+    """
+    Strengths, improvements, coaching and summary on their own (retried once if malformed).
+    """
+    for attempt in range(1, 3):
+        text = await get_openai_client().generate_response(
+            system_prompt=ANALYZER_SYSTEM_PROMPT,
+            user_message=FEW_SHOT_EXAMPLES + "\n\n" + COACHING_PROMPT.format(**prompt_args),
+            temperature=0.05,
+            max_tokens=800,
+            response_format=_response_format("coaching_feedback", COACHING_SCHEMA)
+        )
+        feedback = _parse_object(text)
+        if feedback is not None and all(field in feedback for field in FEEDBACK_PROPERTIES):
+            return feedback
+        logger.warning("Malformed coaching feedback", extra={"attempt": attempt})
+    raise ValueError("Malformed coaching feedback")
+
+
+async def _score_single(conversation: str, rep_name: str, doctor_name: str) -> Dict:
+    """
+    One completion returns every score, the feedback and the summary.
+    """
+    # Shared client (pooled connections, concurrency cap)
+    client = get_openai_client()
+    prompt_args = {"conversation": conversation, "rep_name": rep_name, "doctor_name": doctor_name}
+    
+    # Combine examples + prompt
+    with stage("analysis", "prompt_build"):
+        full_prompt = FEW_SHOT_EXAMPLES + "\n\n" + SCORING_PROMPT.format(**prompt_args)
+    
+    logger.debug("Calling OpenAI with few-shot examples")
+    
+    # Use GPT-4 for better reasoning (or gpt-4o-mini with very low temp)
+    with stage("analysis", "llm"):
+        result_text = await client.generate_response(
+            system_prompt=ANALYZER_SYSTEM_PROMPT,
+            user_message=full_prompt,
             temperature=0.05,  # VERY low for consistency
-            max_tokens=2000
+            max_tokens=2000,
+            response_format=_response_format("conversation_analysis", ANALYSIS_SCHEMA)
         )
-        
-        result_text = response.choices[0].message.content
-        print(f"[ANALYZER] Response length: {len(result_text)}")
-        
-        # Clean up
-        result_text = result_text.strip()
-        
-        if "```json" in result_text:
-            result_text = result_text.split("```json")[1].split("```")[0]
-        elif "```" in result_text:
-            parts = result_text.split("```")
-            if len(parts) >= 2:
-                result_text = parts[1]
-        
-        result_text = result_text.strip()
-        
-        # Extract JSON
-        start = result_text.find('{')
-        end = result_text.rfind('}')
-        
-        if start == -1 or end == -1:
-            raise ValueError("No JSON found")
-        
-        json_text = result_text[start:end+1]
-        analysis = json.loads(json_text)
-        
-        # ENFORCE compliance rule if off-label detected
-        if has_off_label:
-            print("[ANALYZER] ENFORCING: Compliance = 0.0 (off-label detected)")
-            if "scores" in analysis and "compliance" in analysis["scores"]:
-                analysis["scores"]["compliance"]["score"] = 0.0
-                analysis["scores"]["compliance"]["color"] = "red"
-                if "off-label" not in analysis["scores"]["compliance"]["justification"].lower():
-                    analysis["scores"]["compliance"]["justification"] = "CRITICAL VIOLATION: Off-label promotion detected"
-            
-            # Recalculate overall score
-            if "scores" in analysis:
-                scores_list = [s["score"] for s in analysis["scores"].values()]
-                analysis["overall_score"] = round(sum(scores_list) / len(scores_list), 1)
-                analysis["overall_color"] = "red" if analysis["overall_score"] < 3.0 else "yellow"
-        
-        # Add metadata
-        analysis["rep_name"] = rep_name
-        analysis["doctor_name"] = doctor_name
-        
-        print(f"[ANALYZER] Final score: {analysis.get('overall_score')}")
-        
-        return analysis
-        
-    except Exception as e:
-        print(f"[ANALYZER] ERROR: {str(e)}")
-        raise Exception(f"Analysis failed: {str(e)}")
+    
+    logger.debug("Response received", extra={"chars": len(result_text)})
+    
+    assembler = AnalysisAssembler()
+    with stage("analysis", "parse"):
+        assembler.feed(result_text)
+        assembler.finish()
+    await _repair(assembler, prompt_args)
+    return assembler.result()
 
-# Async wrapper
-async def analyze_conversation(
+
+async def _score_parallel(conversation: str, rep_name: str, doctor_name: str) -> Dict:
+    """
+    Concurrent small completions: one per dimension plus one for coaching
+    and summary, merged into the single-completion result shape. Latency is
+    set by the slowest of them rather than one long generation.
+    """
+    prompt_args = {"conversation": conversation, "rep_name": rep_name, "doctor_name": doctor_name}
+
+    logger.debug("Calling OpenAI with parallel requests", extra={"requests": len(DIMENSIONS) + 1})
+    with stage("analysis", "llm"):
+        *scores, feedback = await _gather_or_cancel([
+            *(_score_dimension(key, prompt_args) for key in DIMENSIONS),
+            _score_feedback(prompt_args)
+        ])
+
+    assembler = AnalysisAssembler()
+    with stage("analysis", "parse"):
+        for key, score in zip(DIMENSIONS, scores):
+            assembler.accept_score(key, score)
+        for field in FEEDBACK_PROPERTIES:
+            assembler.accept_feedback(field, feedback[field])
+    await _repair(assembler, prompt_args)
+    return assembler.result()
+
+
+async def _score_windowed(conversation: str, rep_name: str, doctor_name: str) -> Dict:
+    """
+    Score overlapping excerpts concurrently and merge them. Latency follows
+    the largest window rather than the length of the whole call.
+    """
+    windows = split_windows(conversation)
+    if len(windows) == 1:
+        return await _score_single(conversation, rep_name, doctor_name)
+
+    logger.info("Long transcript", extra={"chars": len(conversation), "windows": len(windows)})
+    analyses = await _gather_or_cancel([
+        _score_single(
+            WINDOW_HEADER.format(index=i, count=len(windows)) + "\n" + window,
+            rep_name,
+            doctor_name
+        )
+        for i, window in enumerate(windows, start=1)
+    ])
+    with stage("analysis", "merge"):
+        return _merge_windows(analyses, [len(window) for window in windows])
+
+
+def split_windows(
+    conversation: str,
+    max_chars: int = WINDOW_CHARS,
+    overlap_turns: int = WINDOW_OVERLAP_TURNS
+) -> List[str]:
+    """
+    Split a transcript into windows of whole speaker turns, each at most
+    max_chars (a single longer turn gets a window to itself). Consecutive
+    windows share overlap_turns turns so exchanges spanning a boundary are
+    seen in full by at least one window.
+    """
+    turns = []
+    for line in conversation.strip().splitlines():
+        if SPEAKER_TURN.match(line) or not turns:
+            turns.append(line)
+        else:
+            turns[-1] += "\n" + line
+
+    windows = []
+    start = 0
+    while start < len(turns):
+        end = start
+        size = 0
+        while end < len(turns) and (end == start or size + len(turns[end]) + 1 <= max_chars):
+            size += len(turns[end]) + 1
+            end += 1
+        windows.append("\n".join(turns[start:end]))
+        if end == len(turns):
+            break
+        # Step back for overlap, but always make progress
+        start = max(start + 1, end - overlap_turns)
+    return windows
+
+
+def _merge_windows(analyses: List[Dict], weights: List[int]) -> Dict:
+    """
+    Combine per-window analyses into one result of the usual shape.
+
+    Compliance takes the worst window (a violation anywhere counts),
+    call-to-action the last window (where the close happens), and the
+    other dimensions a length-weighted mean. Quotes and feedback are
+    de-duplicated, since overlapping windows repeat some of them.
+    """
+    scores = {}
+    for key, label in DIMENSIONS.items():
+        entries = [(a["scores"][key], w) for a, w in zip(analyses, weights) if key in a.get("scores", {})]
+        if not entries:
+            continue
+        values = [float(entry.get("score", 0.0)) for entry, _ in entries]
+
+        if key == "compliance":
+            score = min(values)
+            source = entries[values.index(score)][0]
+        elif key == "call_to_action":
+            score = values[-1]
+            source = entries[-1][0]
+        else:
+            score = round(sum(v * w for v, (_, w) in zip(values, entries)) / sum(w for _, w in entries), 1)
+            # Justification from the window closest to the merged score
+            source = min(entries, key=lambda e: abs(float(e[0].get("score", 0.0)) - score))[0]
+
+        scores[key] = {
+            "score": score,
+            "color": _score_color(score),
+            "justification": source.get("justification", ""),
+            "examples": _dedupe(quote for entry, _ in entries for quote in entry.get("examples", []))[:3],
+            "dimension": label
+        }
+
+    overall_score = round(sum(s["score"] for s in scores.values()) / len(scores), 1) if scores else 0.0
+    coaching = {}
+    for analysis in analyses:
+        for item in analysis.get("coaching", []):
+            coaching.setdefault(" ".join(str(item.get("issue", "")).lower().split()), item)
+
+    return {
+        "overall_score": overall_score,
+        "overall_color": _score_color(overall_score),
+        "scores": scores,
+        "strengths": _dedupe(s for a in analyses for s in a.get("strengths", []))[:5],
+        "improvements": _dedupe(s for a in analyses for s in a.get("improvements", []))[:5],
+        "coaching": list(coaching.values())[:5],
+        "conversation_summary": " ".join(
+            f"Part {i}: {a['conversation_summary']}"
+            for i, a in enumerate(analyses, start=1) if a.get("conversation_summary")
+        )
+    }
+
+
+def _dedupe(items) -> List[str]:
+    seen = set()
+    unique = []
+    for item in items:
+        key = " ".join(str(item).lower().split())
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+    return unique
+
+
+def _score_color(score: float) -> str:
+    if score >= 4.0:
+        return "green"
+    return "yellow" if score >= 3.0 else "red"
+
+
+def _parse_object(result_text: str) -> Optional[Dict]:
+    """
+    The JSON object in a model response (tolerates code fences and prose); None if malformed.
+    """
+    for path, raw in IncrementalJSONParser().feed(result_text):
+        if not path:
+            value = parse_fragment(raw)
+            return value if isinstance(value, dict) else None
+    return None
+
+# Sync wrapper
+def analyze_conversation_sync(
     conversation: str,
     rep_name: Optional[str] = "Sales Rep",
-    doctor_name: Optional[str] = "Dr. Smith"
+    doctor_name: Optional[str] = "Dr. Smith",
+    use_cache: bool = True,
+    mode: Optional[str] = None,
+    product_id: Optional[str] = None
 ) -> Dict:
-    """Async wrapper."""
-    return analyze_conversation_sync(conversation, rep_name, doctor_name)
+    """
+    Blocking entry point for scripts and tooling.
+    Must not be called from inside a running event loop - use analyze_conversation there.
+    """
+    return asyncio.run(analyze_conversation(conversation, rep_name, doctor_name, use_cache, mode, product_id))
@@ -0,0 +1,120 @@
+"""
+Incremental JSON Parser
+Reports JSON objects and arrays from a token stream as soon as each one closes
+"""
+
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+Path = Tuple[str, ...]
+
+# Trailing commas are the most common defect in model-written JSON
+TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+class IncrementalJSONParser:
+    """
+    Scans model output chunk by chunk and hands back every object or
+    array the moment its closing bracket arrives, with its key path from
+    the root object, e.g. ("scores", "tone") for {"scores": {"tone": {...}}}.
+
+    Only structure is tracked (string/escape state, nesting, object keys),
+    so each character is looked at once and nothing is re-parsed while
+    streaming. Text before the root object (prose, a ```json fence) and
+    after it is ignored. Fragments are returned raw: a malformed one can
+    be repaired or re-requested on its own without losing the rest.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._started = False
+        self.closed = False
+        # One frame per open container: [kind, start offset, key in parent, current key, expecting key]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._pending_key: Optional[str] = None
+
+    def feed(self, chunk: str) -> List[Tuple[Path, str]]:
+        """
+        Add text; returns (path, raw JSON) for each container it closed, innermost first.
+        """
+        self.text += chunk
+        closed = []
+        text = self.text
+        while self._pos < len(text) and not self.closed:
+            char = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == "\n":
+                    # JSON strings cannot hold raw newlines: this one was left
+                    # unterminated. Closing it here keeps the rest in step (the
+                    # enclosing fragment still fails to parse and gets repaired)
+                    self._in_string = False
+                elif char == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame[0] == "object" and frame[4]:
+                        try:
+                            self._pending_key = json.loads(text[self._string_start:self._pos + 1])
+                        except ValueError:
+                            self._pending_key = text[self._string_start + 1:self._pos]
+            elif not self._started:
+                if char == "{":
+                    self._started = True
+                    self._stack.append(["object", self._pos, None, None, True])
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char in "{[":
+                parent = self._stack[-1]
+                key = parent[3] if parent[0] == "object" else str(parent[3])
+                self._stack.append(["object" if char == "{" else "array", self._pos, key, 0 if char == "[" else None, char == "{"])
+            elif char in "}]":
+                frame = self._stack.pop()
+                closed.append((self._path(frame), text[frame[1]:self._pos + 1]))
+                if not self._stack:
+                    self.closed = True
+            elif char == ":":
+                frame = self._stack[-1]
+                if frame[0] == "object":
+                    frame[3] = self._pending_key
+                    frame[4] = False
+            elif char == ",":
+                frame = self._stack[-1]
+                if frame[0] == "object":
+                    frame[4] = True
+                else:
+                    frame[3] += 1
+            self._pos += 1
+        return closed
+
+    def _path(self, frame: list) -> Path:
+        keys = [entry[2] for entry in self._stack[1:]] + ([frame[2]] if frame[2] is not None else [])
+        return tuple(str(k) for k in keys)
+
+    @property
+    def root_text(self) -> str:
+        """
+        Raw text from the root object's opening brace (possibly unfinished).
+        """
+        start = self.text.find("{")
+        return self.text[start:self._pos] if start != -1 else ""
+
+
+def parse_fragment(raw: str) -> Optional[Any]:
+    """
+    Parse one JSON fragment, repairing trailing commas; None if still malformed.
+    """
+    for candidate in (raw, TRAILING_COMMA.sub(r"\1", raw)):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
@@ -3,35 +3,129 @@ OpenAI API Client
 Handles all interactions with OpenAI API
 """
 
+import asyncio
 import os
-from typing import Dict, Optional
-from openai import OpenAI
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional
+
 from dotenv import load_dotenv
 
+from agents.resilience import LLMError, LLMTimeoutError, ResiliencePolicy, time_remaining
+from agents.scheduler import LLMScheduler
+from observability.logs import get_logger
+from observability.metrics import LLM_IN_FLIGHT, LLM_REQUESTS, LLM_SECONDS, LLM_TOKENS
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI
+
 load_dotenv()
 
+DEFAULT_MODEL = "gpt-4o-mini"  # Using mini for cost efficiency in demo
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+logger = get_logger("llm")
+
 
 class OpenAIClient:
     """
-    Wrapper for OpenAI API calls.
+    Async wrapper for OpenAI API calls.
+
+    A single instance owns one keep-alive HTTP connection pool and the
+    LLMScheduler that caps how many calls are in flight at once and
+    orders waiting calls by priority class, user and rate-limit budget
+    (LLM_* variables documented there), so it should be shared
+    process-wide through get_openai_client().
+
+    Every call goes through a ResiliencePolicy (deadline, retries, optional
+    hedging, circuit breaker; configured by the LLM_* variables documented
+    there), which replaces the SDK's own retries. Failures raise LLMError.
+
+    The SDK and its HTTP stack (about 250ms to import) are only imported
+    when the first call, or warmup(), binds the client.
+
+    Configuration (environment variables):
+        OPENAI_API_KEY: Required API key
+        OPENAI_BASE_URL: Alternative OpenAI-compatible endpoint (optional)
+        OPENAI_MAX_CONCURRENCY: Max in-flight calls (default 16)
+        OPENAI_MAX_CONNECTIONS: HTTP connection pool size (default 32)
+        OPENAI_TIMEOUT_SECONDS: Default per-call timeout (default 30)
+        OPENAI_WARMUP_CONNECTIONS: Connections main.py opens at startup, in the background (default 0: none)
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        timeout: Optional[float] = None,
+        base_url: Optional[str] = None
+    ):
         api_key = os.getenv("OPENAI_API_KEY")
 
         if not api_key:
             raise ValueError(
                 "OPENAI_API_KEY not found in environment variables")
 
-        self.client = OpenAI(api_key=api_key)
-        self.model = "gpt-4o-mini"  # Using mini for cost efficiency in demo
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.model = DEFAULT_MODEL
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+        self.max_connections = max_connections or int(
+            os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+        self.timeout = timeout or float(
+            os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
+        self.resilience = ResiliencePolicy.from_env(model=self.model)
+
+        # Built lazily on first use: the pool and scheduler belong to the
+        # event loop that is running when the first call is made.
+        self.client: Optional["AsyncOpenAI"] = None
+        self.scheduler: Optional[LLMScheduler] = None
+        self._http_client: Optional["httpx.AsyncClient"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_to_loop(self) -> "AsyncOpenAI":
+        """
+        Create the connection pool and scheduler for the running event loop.
+
+        Uvicorn runs a single loop, so this happens once per process. Scripts
+        that call asyncio.run() repeatedly get a fresh pool per loop instead
+        of reusing connections owned by a closed loop.
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._loop is not loop:
+            import httpx
+            from openai import AsyncOpenAI
+
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=5.0)
+            )
+            self.client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self._http_client,
+                timeout=self.timeout,
+                max_retries=0  # retried by self.resilience
+            )
+            self.scheduler = LLMScheduler.from_env(self.max_concurrency, model=self.model)
+            self._loop = loop
+
+        return self.client
 
     async def generate_response(
         self,
         system_prompt: str,
         user_message: str,
         temperature: float = 0.7,
-        max_tokens: int = 500
+        max_tokens: int = 500,
+        timeout: Optional[float] = None,
+        response_format: Optional[Dict] = None
     ) -> str:
         """
         Generate response from OpenAI.
@@ -41,40 +135,225 @@ class OpenAIClient:
             user_message: User's question/input
             temperature: Randomness (0.0 = deterministic, 1.0 = creative)
             max_tokens: Maximum response length
+            timeout: Seconds to wait per attempt, including time queued in
+                the scheduler (defaults to OPENAI_TIMEOUT_SECONDS; the
+                request deadline may shorten it)
+            response_format: OpenAI response_format, e.g. a strict json_schema
 
         Returns:
             Generated text response
+
+        Raises:
+            LLMError: After retries; CircuitOpenError when failing fast
         """
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+        client = self._bind_to_loop()
+        estimated_tokens = (len(system_prompt) + len(user_message)) // 4 + max_tokens
 
+        async def _complete(attempt_timeout: float) -> str:
+            async with self.scheduler.slot(estimated_tokens):
+                with LLM_IN_FLIGHT.track(model=self.model), \
+                        LLM_SECONDS.time(model=self.model, kind="complete"):
+                    response = await client.chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_message}
+                        ],
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=attempt_timeout,
+                        **({"response_format": response_format} if response_format else {})
+                    )
+            if response.usage is not None:
+                LLM_TOKENS.inc(response.usage.prompt_tokens, model=self.model, type="prompt")
+                LLM_TOKENS.inc(response.usage.completion_tokens, model=self.model, type="completion")
+                # Prompt-cache hits (only reported by APIs that support prefix caching)
+                details = getattr(response.usage, "prompt_tokens_details", None)
+                cached_tokens = (details.get("cached_tokens") if isinstance(details, dict)
+                                 else getattr(details, "cached_tokens", None))
+                if cached_tokens:
+                    LLM_TOKENS.inc(cached_tokens, model=self.model, type="cached_prompt")
             return response.choices[0].message.content
 
-        except Exception as e:
-            raise Exception(f"OpenAI API error: {str(e)}")
+        try:
+            result = await self.resilience.call(
+                _complete, timeout or self.timeout, kind="complete", hedge=True)
+        except LLMError as e:
+            LLM_REQUESTS.inc(model=self.model, kind="complete", outcome=e.outcome)
+            raise
+        LLM_REQUESTS.inc(model=self.model, kind="complete", outcome="ok")
+        return result
+
+    async def stream_response(
+        self,
+        system_prompt: str,
+        user_message: str,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        timeout: Optional[float] = None,
+        response_format: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from OpenAI as text deltas.
+
+        Closing the iterator early (e.g. when a compliance check blocks)
+        closes the upstream HTTP stream, which stops generation and token
+        spend. The scheduler slot is held until the stream ends.
+
+        Args:
+            Same as generate_response; timeout applies to each network read,
+            and the request deadline (see agents.resilience.deadline) to the
+            whole stream
+
+        Yields:
+            Text chunks in arrival order
+        """
+        client = self._bind_to_loop()
+        timeout = timeout or self.timeout
+
+        async with self.scheduler.slot((len(system_prompt) + len(user_message)) // 4 + max_tokens):
+            with LLM_IN_FLIGHT.track(model=self.model), \
+                    LLM_SECONDS.time(model=self.model, kind="stream"):
+                try:
+                    # Opening the stream is retried; a broken stream is not
+                    stream = await self.resilience.call(
+                        lambda attempt_timeout: client.chat.completions.create(
+                            model=self.model,
+                            messages=[
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": user_message}
+                            ],
+                            temperature=temperature,
+                            max_tokens=max_tokens,
+                            timeout=attempt_timeout,
+                            stream=True,
+                            **({"response_format": response_format} if response_format else {})
+                        ),
+                        timeout,
+                        kind="stream"
+                    )
+                except LLMError as e:
+                    LLM_REQUESTS.inc(model=self.model, kind="stream", outcome=e.outcome)
+                    raise
+
+                # Stream chunks carry no usage: count deltas, estimate the prompt
+                LLM_TOKENS.inc((len(system_prompt) + len(user_message)) // 4,
+                               model=self.model, type="prompt")
+                outcome = "error"
+                chunks = aiter(stream)
+                try:
+                    while True:
+                        try:
+                            # A slow trickle of chunks must not outlive the deadline either
+                            async with asyncio.timeout(time_remaining()):
+                                chunk = await anext(chunks)
+                        except StopAsyncIteration:
+                            break
+                        except TimeoutError:
+                            outcome = "timeout"
+                            raise LLMTimeoutError("Request deadline passed while streaming") from None
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            LLM_TOKENS.inc(model=self.model, type="completion")
+                            yield chunk.choices[0].delta.content
+                    outcome = "ok"
+                except GeneratorExit:
+                    # Closed early by the caller (e.g. compliance block)
+                    outcome = "ok"
+                    raise
+                finally:
+                    LLM_REQUESTS.inc(model=self.model, kind="stream", outcome=outcome)
+                    await stream.close()
+
+    async def embed(
+        self,
+        texts: List[str],
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        timeout: Optional[float] = None
+    ) -> List[List[float]]:
+        """
+        Embed texts with the OpenAI embeddings endpoint (one request, input order kept).
+        """
+        client = self._bind_to_loop()
+        timeout = timeout or self.timeout
+
+        async with self.scheduler.slot(sum(len(text) for text in texts) // 4):
+            try:
+                with LLM_IN_FLIGHT.track(model=model), LLM_SECONDS.time(model=model, kind="embed"):
+                    response = await self.resilience.call(
+                        lambda attempt_timeout: client.embeddings.create(
+                            model=model, input=texts, timeout=attempt_timeout),
+                        timeout,
+                        kind="embed"
+                    )
+            except LLMError as e:
+                LLM_REQUESTS.inc(model=model, kind="embed", outcome=e.outcome)
+                raise
+
+        LLM_REQUESTS.inc(model=model, kind="embed", outcome="ok")
+        if response.usage is not None:
+            LLM_TOKENS.inc(response.usage.prompt_tokens, model=model, type="prompt")
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    async def warmup(self, connections: int = 1) -> None:
+        """
+        Open `connections` pooled connections to the API (DNS, TCP and TLS
+        setup) before the first call needs them, with GET /models requests
+        (free; any response, even an error, leaves a connection open). The
+        SDK import runs in a worker thread so the event loop keeps serving.
+        """
+        import httpx
+
+        start = time.perf_counter()
+        # Off the event loop: the SDK takes a few hundred ms to import
+        await asyncio.to_thread(__import__, "openai")
+        client = self._bind_to_loop()
+        url = client.base_url.join("models")
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+
+        async def touch() -> bool:
+            try:
+                await self._http_client.get(url, headers=headers)
+                return True
+            except httpx.HTTPError as e:
+                logger.warning("Warmup request failed", extra={"error": str(e)})
+                return False
+
+        opened = sum(await asyncio.gather(*(touch() for _ in range(connections))))
+        logger.info("Warmed up LLM connections", extra={
+            "connections": opened, "seconds": round(time.perf_counter() - start, 3)})
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled HTTP connections (call on application shutdown).
+        """
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self.client = None
+        self._http_client = None
+        self.scheduler = None
+        self._loop = None
+
 
 # Singleton instance
 _client_instance = None
 
-def get_openai_client() -> OpenAI:
+
+def get_openai_client() -> OpenAIClient:
     """
-    Get or create OpenAI client instance (singleton pattern).
-    
+    Get or create the shared OpenAIClient instance (singleton pattern).
+
     Returns:
-        OpenAI: Configured OpenAI client
+        OpenAIClient: Configured client shared by all agents
     """
     global _client_instance
     if _client_instance is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-        _client_instance = OpenAI(api_key=api_key)
+        _client_instance = OpenAIClient()
     return _client_instance
+
+
+async def close_openai_client() -> None:
+    """
+    Close the shared client's connections, if it was ever created.
+    """
+    if _client_instance is not None:
+        await _client_instance.aclose()
@@ -3,28 +3,84 @@ Agent Orchestration System
 Coordinates multiple agents to process user queries
 """
 
+import asyncio
+import os
 import time
-from typing import Dict, List
-from agents.openai_client import OpenAIClient
-from prompts.sales_agent import get_sales_agent_prompt
-from compliance.off_label_detector import ComplianceGuardian
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from agents.openai_client import OpenAIClient, get_openai_client
+from agents.resilience import LLMError
+from audit.log import get_audit_log
+from cache.response_cache import ResponseCache, response_key
+from cache.single_flight import SingleFlight
+from prompts.builder import BuiltPrompt, get_prompt_builder
+from retrieval.retriever import get_knowledge_retriever
+from compliance.off_label_detector import ComplianceGuardian, IncrementalOffLabelScanner
+from compliance.registry import get_rule_registry
+from observability.logs import Text, get_logger
+from observability.metrics import (
+    FALLBACK_RESPONSES, PIPELINE_IN_FLIGHT, PROMPT_TOKENS, SPECULATIVE_GENERATIONS, collect_timings,
+    current_timings, record_decision, record_stage, stage)
+
+# Where a degraded answer came from when the LLM was unavailable
+FALLBACK_SOURCES = ("stale_cache", "template")
+
+logger = get_logger("orchestrator")
 
 
 class AgentOrchestrator:
     """
     Orchestrates the multi-agent system.
     Routes queries to appropriate agents and enforces compliance.
+
+    With speculative generation on, process_query starts the sales agent
+    (cache lookup, retrieval, LLM call) at the same time as the query
+    pre-check instead of after it. A blocked query cancels the generation
+    as soon as the pre-check returns, so its response is never used and
+    the upstream request is dropped; approved queries save the pre-check
+    time. Decisions and responses are the same as in sequential mode.
+
+    Concurrent requests for the same answer (same response cache key)
+    share one generation via SingleFlight; each still runs its own
+    compliance checks.
+
+    When the LLM call fails (retries exhausted, deadline passed, circuit
+    open), sales answers degrade instead of erroring: a previously
+    approved answer to the same question from the response cache, even if
+    expired, else a templated answer with the approved messaging. Both
+    still go through the output compliance check and are never cached.
+
+    Configuration (environment variables):
+        SPECULATIVE_GENERATION: on/off (default off)
+        LLM_FALLBACK: template (default: stale cache, then template), cache (stale cache only) or off
     """
 
-    def __init__(self):
-        self.openai_client = OpenAIClient()
+    def __init__(self, speculative: Optional[bool] = None):
         self.compliance_guardian = ComplianceGuardian()
+        self.response_cache = ResponseCache.from_env()
+        self.retriever = get_knowledge_retriever()
+        # Every decision is recorded, off the request path
+        self.audit = get_audit_log()
+        # Identical questions in flight at once share one generation
+        self.flights = SingleFlight.from_env("query")
+        if speculative is None:
+            speculative = os.getenv("SPECULATIVE_GENERATION", "off").lower() in ("1", "on", "true")
+        self.speculative = speculative
+        self.fallback = os.getenv("LLM_FALLBACK", "template").lower()
+        if self.fallback not in ("template", "cache", "off"):
+            raise ValueError(f"Unknown LLM_FALLBACK: {self.fallback}")
+
+    @property
+    def openai_client(self) -> OpenAIClient:
+        # Created on the first LLM call: without OPENAI_API_KEY the app
+        # still starts, checks compliance and blocks off-label queries
+        return get_openai_client()
 
     async def process_query(
         self,
         query: str,
         user_id: str,
-        hcp_context: Dict = None
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None
     ) -> Dict:
         """
         Process a user query through the multi-agent system.
@@ -33,23 +89,55 @@ class AgentOrchestrator:
             query: User's question
             user_id: ID of the user asking
             hcp_context: Context about the HCP (optional)
+            product_id: Product whose compliance rules apply (default product when None)
 
         Returns:
             Complete response with compliance status
         """
+        with PIPELINE_IN_FLIGHT.track(pipeline="query"), stage("query", "total"), collect_timings():
+            return await self._run_query(query, user_id, hcp_context, product_id)
+
+    async def _run_query(
+        self,
+        query: str,
+        user_id: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None
+    ) -> Dict:
         start_time = time.time()
         agents_used = []
 
         # Step 1: Check query for compliance violations
-        initial_compliance = self.compliance_guardian.check_compliance(
-            query, "")
+        # (speculative mode generates the response meanwhile)
+        generation = None
+        if self.speculative:
+            # Without the LLM fallback: that waits for the pre-check verdict
+            generation = asyncio.create_task(
+                self._generate(query, hcp_context, product_id, fallback=False))
+        try:
+            with stage("query", "pre_check"):
+                if generation is None:
+                    initial_compliance = self.compliance_guardian.check_compliance(
+                        query, "", product_id)
+                else:
+                    # In a worker thread so the generation task can run
+                    initial_compliance = await asyncio.to_thread(
+                        self.compliance_guardian.check_compliance, query, "", product_id)
+        except BaseException:
+            if generation is not None:
+                await self._cancel_generation(generation, "cancelled")
+            raise
 
         if initial_compliance["status"] == "BLOCKED":
             # Query itself is non-compliant
+            if generation is not None:
+                await self._cancel_generation(generation, "blocked")
+            self._record_decision("query", initial_compliance, user_id, product_id, query)
             return {
                 "response": self._generate_educational_block_message(
                     initial_compliance["violation_type"],
-                    initial_compliance["explanation"]
+                    initial_compliance["explanation"],
+                    product_id
                 ),
                 "agents_used": ["compliance_guardian"],
                 "compliance_status": {
@@ -65,23 +153,37 @@ class AgentOrchestrator:
         agents_used.append(f"{agent_type}_agent")
 
         # Step 3: Generate response using appropriate agent
-        if agent_type == "sales":
-            response = await self._call_sales_agent(query, hcp_context)
+        # (repeat questions are served from the response cache)
+        if generation is not None:
+            SPECULATIVE_GENERATIONS.inc(pipeline="query", outcome="used")
+            try:
+                cache_key, response, source, prompt_tokens = await generation
+            except LLMError as e:
+                cache_key = (self._answer_key(query, hcp_context, product_id)
+                             if self.response_cache is not None else None)
+                fallback = await self._fallback_response("query", cache_key, product_id, e)
+                if fallback is None:
+                    raise
+                source, response = fallback
+                prompt_tokens = None
         else:
-            # For MVP, all queries go to sales agent
-            response = await self._call_sales_agent(query, hcp_context)
+            cache_key, response, source, prompt_tokens = await self._generate(
+                query, hcp_context, product_id)
 
         # Step 4: Compliance Guardian reviews the response
         agents_used.append("compliance_guardian")
-        final_compliance = self.compliance_guardian.check_compliance(
-            query, response)
+        with stage("query", "post_check"):
+            final_compliance = self.compliance_guardian.check_compliance(
+                query, response, product_id)
+        self._record_decision("query", final_compliance, user_id, product_id, query, response)
 
         if final_compliance["status"] == "BLOCKED":
             # Response generated off-label content
             return {
                 "response": self._generate_educational_block_message(
                     final_compliance["violation_type"],
-                    final_compliance["explanation"]
+                    final_compliance["explanation"],
+                    product_id
                 ),
                 "agents_used": agents_used,
                 "compliance_status": {
@@ -89,10 +191,15 @@ class AgentOrchestrator:
                     "violation_type": final_compliance["violation_type"],
                     "explanation": final_compliance["explanation"]
                 },
-                "response_time_seconds": round(time.time() - start_time, 3)
+                "response_time_seconds": round(time.time() - start_time, 3),
+                "prompt_tokens_estimated": prompt_tokens
             }
 
-        # Step 5: Response approved - return to user
+        # Step 5: Response approved - cache it and return to user
+        if cache_key and source == "llm":
+            with stage("query", "cache_store"):
+                await self.response_cache.set(cache_key, response)
+
         return {
             "response": response,
             "agents_used": agents_used,
@@ -101,9 +208,352 @@ class AgentOrchestrator:
                 "violation_type": None,
                 "explanation": None
             },
-            "response_time_seconds": round(time.time() - start_time, 3)
+            "response_time_seconds": round(time.time() - start_time, 3),
+            "cached": source == "cache",
+            "fallback": source if source in FALLBACK_SOURCES else None,
+            "prompt_tokens_estimated": prompt_tokens
+        }
+
+    async def stream_query(
+        self,
+        query: str,
+        user_id: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of process_query.
+
+        Tokens are forwarded as they arrive, after the Compliance Guardian
+        has scanned them. The moment a violation appears the upstream
+        generation is closed and the educational block message is sent.
+
+        Args:
+            Same as process_query
+
+        Yields:
+            Events as {"event": name, "data": payload}:
+            - token: {"text": chunk}
+            - blocked: {"response": block message, "compliance_status": {...}}
+              (clients must discard any tokens already shown)
+            - done: {"agents_used", "compliance_status",
+              "response_time_seconds", "time_to_first_token_seconds", "cached",
+              "fallback"}
+        """
+        with PIPELINE_IN_FLIGHT.track(pipeline="query_stream"), stage("query_stream", "total"), \
+                collect_timings():
+            events = self._run_stream(query, user_id, hcp_context, product_id)
+            try:
+                async for event in events:
+                    yield event
+            finally:
+                # Propagate an early close so the upstream stream is closed now
+                await events.aclose()
+
+    async def _run_stream(
+        self,
+        query: str,
+        user_id: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        start_time = time.time()
+        first_token_time = None
+
+        # Step 1: Check query for compliance violations
+        with stage("query_stream", "pre_check"):
+            initial_compliance = self.compliance_guardian.check_compliance(
+                query, "", product_id)
+
+        if initial_compliance["status"] == "BLOCKED":
+            self._record_decision("query_stream", initial_compliance, user_id, product_id, query)
+            yield self._blocked_event(initial_compliance, product_id)
+            yield self._done_event(
+                ["compliance_guardian"], initial_compliance, start_time, None)
+            return
+
+        # Step 2: Determine which agent should handle this
+        agent_type = self._determine_agent_type(query)
+        agents_used = [f"{agent_type}_agent", "compliance_guardian"]
+
+        # Repeat questions: check and send the cached answer in one piece
+        with stage("query_stream", "cache_lookup"):
+            cache_key, cached_response = await self._cache_lookup(query, hcp_context, product_id)
+        if cached_response is not None:
+            with stage("query_stream", "post_check"):
+                final_compliance = self.compliance_guardian.check_compliance(
+                    query, cached_response, product_id)
+            self._record_decision(
+                "query_stream", final_compliance, user_id, product_id, query, cached_response)
+            if final_compliance["status"] == "BLOCKED":
+                yield self._blocked_event(final_compliance, product_id)
+            else:
+                first_token_time = time.time()
+                yield {"event": "token", "data": {"text": cached_response}}
+            yield self._done_event(
+                agents_used, final_compliance, start_time, first_token_time, cached=True)
+            return
+
+        # Step 3: Stream the sales agent response through the scanner
+        scanner = IncrementalOffLabelScanner(
+            self.compliance_guardian.detector(product_id))
+        violation = None
+        emitted = 0
+
+        prompt = await self._build_prompt("query_stream", query, hcp_context, product_id)
+
+        stream = self.openai_client.stream_response(
+            system_prompt=prompt.text,
+            user_message=query,
+            temperature=0.7,
+            max_tokens=400
+        )
+        llm_start = time.perf_counter()
+        first_chunk = True
+        fallback = None
+        try:
+            async for chunk in stream:
+                if first_chunk:
+                    record_stage("query_stream", "llm_first_token", time.perf_counter() - llm_start)
+                    first_chunk = False
+                with stage("query_stream", "incremental_check"):
+                    detection = scanner.feed(chunk)
+
+                if detection["is_violation"]:
+                    violation = {
+                        "status": "BLOCKED",
+                        "violation_type": detection["violation_type"],
+                        "explanation": detection["explanation"],
+                        "detected_in": "response",
+                        "violations": detection["violations"]
+                    }
+                    break
+
+                # Hold back a possible partial keyword at the tail
+                safe = scanner.safe_length()
+                if safe > emitted:
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                    yield {"event": "token", "data": {"text": scanner.text[emitted:safe]}}
+                    emitted = safe
+        except LLMError as e:
+            # Only before anything was received: the fallback replaces the whole answer
+            if not scanner.text:
+                fallback = await self._fallback_response("query_stream", cache_key, product_id, e)
+            if fallback is None:
+                raise
+        finally:
+            # Stops generation upstream when we break out early
+            await stream.aclose()
+            record_stage("query_stream", "llm", time.perf_counter() - llm_start)
+
+        # Step 4: Authoritative check on the complete response
+        text = fallback[1] if fallback else scanner.text
+        with stage("query_stream", "post_check"):
+            final_compliance = violation or self.compliance_guardian.check_compliance(
+                query, text, product_id)
+        self._record_decision("query_stream", final_compliance, user_id, product_id, query, text)
+
+        if final_compliance["status"] == "BLOCKED":
+            yield self._blocked_event(final_compliance, product_id)
+        else:
+            if emitted < len(text):
+                if first_token_time is None:
+                    first_token_time = time.time()
+                yield {"event": "token", "data": {"text": text[emitted:]}}
+            if cache_key and fallback is None:
+                with stage("query_stream", "cache_store"):
+                    await self.response_cache.set(cache_key, text)
+
+        yield self._done_event(
+            agents_used, final_compliance, start_time, first_token_time,
+            prompt_tokens=prompt.estimated_tokens,
+            fallback=fallback[0] if fallback else None)
+
+    def _record_decision(
+        self,
+        pipeline: str,
+        compliance: Dict,
+        user_id: str,
+        product_id: Optional[str],
+        query: str,
+        response: Optional[str] = None
+    ) -> None:
+        record_decision(pipeline, compliance)
+        if compliance["status"] == "BLOCKED":
+            logger.warning("Compliance block", extra={
+                "pipeline": pipeline,
+                "user_id": user_id,
+                "product_id": product_id,
+                "violation_type": compliance.get("violation_type"),
+                "detected_in": compliance.get("detected_in"),
+                "query": Text(query)
+            })
+        else:
+            logger.info("Compliance approved", extra={"pipeline": pipeline, "user_id": user_id, "sample": True})
+        if self.audit is not None:
+            self.audit.record(
+                pipeline, compliance,
+                user_id=user_id,
+                product_id=product_id,
+                query=query,
+                response=response,
+                timings=current_timings()
+            )
+
+    def _blocked_event(self, compliance: Dict, product_id: Optional[str] = None) -> Dict:
+        return {
+            "event": "blocked",
+            "data": {
+                "response": self._generate_educational_block_message(
+                    compliance["violation_type"],
+                    compliance["explanation"],
+                    product_id
+                ),
+                "compliance_status": {
+                    "status": "BLOCKED",
+                    "violation_type": compliance["violation_type"],
+                    "explanation": compliance["explanation"]
+                }
+            }
+        }
+
+    def _done_event(
+        self,
+        agents_used: List[str],
+        compliance: Dict,
+        start_time: float,
+        first_token_time: float = None,
+        cached: bool = False,
+        prompt_tokens: Optional[int] = None,
+        fallback: Optional[str] = None
+    ) -> Dict:
+        return {
+            "event": "done",
+            "data": {
+                "agents_used": agents_used,
+                "compliance_status": {
+                    "status": compliance["status"],
+                    "violation_type": compliance["violation_type"],
+                    "explanation": compliance["explanation"]
+                },
+                "response_time_seconds": round(time.time() - start_time, 3),
+                "time_to_first_token_seconds": (
+                    round(first_token_time - start_time, 3)
+                    if first_token_time else None
+                ),
+                "cached": cached,
+                "fallback": fallback,
+                "prompt_tokens_estimated": prompt_tokens
+            }
         }
 
+    async def _cache_lookup(
+        self,
+        query: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Look up a previously approved response.
+
+        Returns:
+            (cache key, cached response) - key is None when caching is off
+        """
+        if self.response_cache is None:
+            return None, None
+
+        cache_key = self._answer_key(query, hcp_context, product_id)
+        return cache_key, await self.response_cache.get(cache_key)
+
+    def _answer_key(
+        self,
+        query: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None
+    ) -> str:
+        knowledge_version = self.retriever.version(product_id) if self.retriever else None
+        return response_key(query, hcp_context, product_id, knowledge_version)
+
+    async def _generate(
+        self,
+        query: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None,
+        fallback: bool = True
+    ) -> Tuple[Optional[str], str, str, Optional[int]]:
+        """
+        Cached or newly generated sales agent response for an unchecked query.
+
+        For MVP all agent types are served by the sales agent. With fallback
+        off, an LLMError is raised instead of serving a degraded answer.
+
+        Returns:
+            (cache key, response, source, estimated prompt tokens) - source
+            is "cache", "llm", or a FALLBACK_SOURCES entry when the LLM failed
+        """
+        with stage("query", "cache_lookup"):
+            cache_key, response = await self._cache_lookup(query, hcp_context, product_id)
+        if response is not None:
+            return cache_key, response, "cache", None
+
+        flight_key = cache_key or self._answer_key(query, hcp_context, product_id)
+        # Another worker's approved answer to the same question lands in the shared cache
+        async def _peek_cache():
+            response = await self.response_cache.peek(cache_key)
+            return None if response is None else (response, None)
+        peek = _peek_cache if cache_key is not None else None
+        try:
+            response, prompt_tokens = await self.flights.do(
+                flight_key, lambda: self._call_sales_agent(query, hcp_context, product_id), peek)
+        except LLMError as e:
+            degraded = await self._fallback_response("query", cache_key, product_id, e) if fallback else None
+            if degraded is None:
+                raise
+            return cache_key, degraded[1], degraded[0], None
+        return cache_key, response, "llm", prompt_tokens
+
+    async def _fallback_response(
+        self,
+        pipeline: str,
+        cache_key: Optional[str],
+        product_id: Optional[str],
+        error: LLMError
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Degraded answer while the LLM is unavailable, per LLM_FALLBACK.
+
+        Returns:
+            (source, response), or None to let the error surface
+        """
+        if self.fallback == "off":
+            return None
+
+        source, response = "stale_cache", None
+        if cache_key and self.response_cache is not None:
+            response = await self.response_cache.get_stale(cache_key)
+        if response is None:
+            if self.fallback != "template":
+                return None
+            source, response = "template", self._generate_fallback_message(product_id)
+
+        logger.warning("LLM unavailable; serving fallback answer", extra={"source": source, "error": str(error)})
+        FALLBACK_RESPONSES.inc(pipeline=pipeline, source=source)
+        return source, response
+
+    async def _cancel_generation(self, generation: asyncio.Task, outcome: str) -> None:
+        """
+        Cancel a speculative generation and wait for it to unwind, which
+        closes its upstream request. Its result or error is discarded.
+
+        Args:
+            outcome: "blocked" when the pre-check blocked the query,
+                "cancelled" when the request itself failed or went away
+        """
+        generation.cancel()
+        await asyncio.gather(generation, return_exceptions=True)
+        SPECULATIVE_GENERATIONS.inc(pipeline="query", outcome=outcome)
+
     def _determine_agent_type(self, query: str) -> str:
         """
         Determine which agent should handle the query.
@@ -123,32 +573,90 @@ class AgentOrchestrator:
 
         return "sales"
 
-    async def _call_sales_agent(self, query: str, hcp_context: Dict = None) -> str:
+    async def _call_sales_agent(
+        self,
+        query: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None
+    ) -> Tuple[str, int]:
         """
         Call the Sales Agent to generate strategic selling advice.
+
+        Returns:
+            (response text, estimated prompt tokens)
         """
-        # Get the full prompt with context
-        full_prompt = get_sales_agent_prompt(query, hcp_context)
+        # Get the full prompt with context (static prefix + HCP/query tail)
+        prompt = await self._build_prompt("query", query, hcp_context, product_id)
 
         # Generate response using OpenAI
-        response = await self.openai_client.generate_response(
-            system_prompt=full_prompt,
-            user_message=query,
-            temperature=0.7,  # Balanced creativity
-            max_tokens=400    # Concise responses
-        )
+        with stage("query", "llm"):
+            response = await self.openai_client.generate_response(
+                system_prompt=prompt.text,
+                user_message=query,
+                temperature=0.7,  # Balanced creativity
+                max_tokens=400    # Concise responses
+            )
+
+        return response, prompt.estimated_tokens
+
+    async def _build_prompt(
+        self,
+        pipeline: str,
+        query: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None
+    ) -> BuiltPrompt:
+        """
+        Sales prompt with the top-k retrieved product chunks when a knowledge
+        index exists for the product, else with the full product data.
+        """
+        knowledge = None
+        if self.retriever is not None:
+            with stage(pipeline, "retrieval"):
+                chunks = await self.retriever.retrieve(query, product_id)
+            if chunks is not None:
+                knowledge = [chunk.text for chunk in chunks]
+
+        with stage(pipeline, "prompt_build"):
+            prompt = get_prompt_builder(product_id).build(query, hcp_context, knowledge)
+        self._record_prompt_size(pipeline, prompt)
+        return prompt
 
-        return response
+    def _record_prompt_size(self, pipeline: str, prompt: BuiltPrompt) -> None:
+        PROMPT_TOKENS.observe(prompt.prefix_tokens, pipeline=pipeline, part="static")
+        PROMPT_TOKENS.observe(
+            prompt.estimated_tokens - prompt.prefix_tokens, pipeline=pipeline, part="dynamic")
+
+    def _generate_fallback_message(self, product_id: Optional[str] = None) -> str:
+        """
+        Templated answer when no tailored one can be generated, built from
+        the product's approved indications only.
+        """
+        rules = get_rule_registry().get(product_id)
+        indications = ", ".join(rules.approved_indications)
+        return f"""⏳ **ASSISTANT TEMPORARILY UNAVAILABLE**
+
+A tailored answer could not be generated right now. Please try again in a minute.
+
+**Approved messaging you can always use:**
+"{rules.name} is FDA-approved for {indications}. I'd be happy to share the full prescribing information and the published clinical data."
+
+**Tip:** For questions outside the approved indication, offer to connect the HCP with our Medical Science Liaison team.
+"""
 
     def _generate_educational_block_message(
         self,
         violation_type: str,
-        explanation: str
+        explanation: str,
+        product_id: Optional[str] = None
     ) -> str:
         """
         Generate educational message when content is blocked.
-        Turns compliance violations into teaching moments.
+        Turns compliance violations into teaching moments; the suggested
+        wording comes from the product's approved indications.
         """
+        rules = get_rule_registry().get(product_id)
+        indications = ", ".join(rules.approved_indications)
         base_message = f"""⚠️ **COMPLIANCE ALERT**
 
 This request was blocked to protect you from regulatory risk.
@@ -157,7 +665,7 @@ This request was blocked to protect you from regulatory risk.
 {explanation}
 
 **What you can say instead:**
-"Our drug is FDA-approved for the treatment of hyperlipidemia in adults. For questions about other potential applications, I'd be happy to connect you with our Medical Science Liaison team who can provide published clinical data."
+"{rules.name} is FDA-approved for {indications}. For questions about other potential applications, I'd be happy to connect you with our Medical Science Liaison team who can provide published clinical data."
 
 **Learn More:**
 - FDA regulations on promotional activities (21 CFR 202.1)
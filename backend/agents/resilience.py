@@ -0,0 +1,382 @@
+"""
+LLM Call Resilience
+Deadlines, jittered retries, hedged requests and a circuit breaker around provider calls
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Awaitable, Callable, Iterator, Optional, Tuple, TypeVar
+
+from observability.logs import get_logger
+from observability.metrics import LLM_CIRCUIT_STATE, LLM_HEDGES, LLM_RETRIES
+
+T = TypeVar("T")
+
+logger = get_logger("llm")
+
+# Monotonic time by which every LLM call of the current request must finish
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> Tuple[type, ...]:
+    """
+    Provider errors worth another attempt (APITimeoutError is an APIConnectionError).
+    """
+    # Imported on first failure: the SDK is loaded with the first client, not at startup
+    import openai
+
+    return (
+        asyncio.TimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+        openai.ConflictError
+    )
+
+
+class LLMError(Exception):
+    """
+    An LLM call failed after retries. `outcome` labels the request metric.
+    """
+
+    outcome = "error"
+
+
+class LLMTimeoutError(LLMError):
+    outcome = "timeout"
+
+
+class CircuitOpenError(LLMError):
+    """
+    Rejected without calling the provider because the circuit is open.
+    """
+
+    outcome = "rejected"
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Bound every LLM call made inside the block (retries and hedges
+    included) to finish within `seconds` from now.
+
+    Propagates to tasks started inside the block; nested deadlines can
+    only tighten an outer one. None or 0 leaves the current deadline.
+    """
+    if not seconds:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(current, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_remaining() -> Optional[float]:
+    """
+    Seconds left before the current deadline (None: no deadline).
+    """
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the provider is down.
+
+    Closed: calls pass; `failure_threshold` consecutive failures open it.
+    Open: calls are rejected for `reset_timeout` seconds. Half-open: one
+    probe call is let through; success closes the circuit, failure opens
+    it again for another `reset_timeout`.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, model: str = ""):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.model = model
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        LLM_CIRCUIT_STATE.set(0, model=model)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("Circuit state change", extra={"model": self.model, "from": self.state, "to": state})
+            self.state = state
+            LLM_CIRCUIT_STATE.set(self.STATES[state], model=self.model)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go to the provider now (claims the probe when half-open).
+        """
+        if self.state == "open":
+            if self.retry_after() > 0:
+                return False
+            self._set_state("half_open")
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release(self) -> None:
+        """
+        Give back a half-open probe that ended without a verdict (cancelled, bad request).
+        """
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._set_state("closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or (
+                self.state == "closed" and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+
+class LatencyTracker:
+    """
+    Quantiles of recent successful attempt latencies (for the hedge delay).
+    """
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, window: int = 1000, refresh_every: int = 50):
+        self.samples = deque(maxlen=window)
+        self.refresh_every = refresh_every
+        self._sorted = []
+        self._pending = 0
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self._pending += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.MIN_SAMPLES:
+            return None
+        # Re-sorting 1000 floats per call would dominate; refresh periodically
+        if self._pending >= self.refresh_every or not self._sorted:
+            self._sorted = sorted(self.samples)
+            self._pending = 0
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+
+class ResiliencePolicy:
+    """
+    Runs provider calls with a deadline, retries, optional hedging and a
+    circuit breaker.
+
+    Every attempt is bounded by the per-call timeout and by the request
+    deadline (see `deadline`), whichever ends first. Retryable errors
+    (timeouts, connection errors, 429, 5xx) are retried with full-jitter
+    exponential backoff, honoring Retry-After, as long as the deadline
+    leaves room. Other errors (bad request, auth) fail at once and do not
+    count against the breaker.
+
+    With hedging on, an idempotent call that has not answered after the
+    recent `hedge_quantile` latency gets a second attempt; the first
+    answer wins and the other is cancelled. Hedges are capped at
+    `hedge_budget` of recent calls so a provider-wide slowdown does not
+    double the load.
+
+    Configuration (environment variables):
+        LLM_RETRY_ATTEMPTS: Attempts per call (default 3)
+        LLM_RETRY_BASE_SECONDS: First backoff bound, doubled per retry (default 0.25)
+        LLM_RETRY_MAX_SECONDS: Backoff bound cap (default 4)
+        LLM_HEDGE: on/off (default off)
+        LLM_HEDGE_QUANTILE: Latency quantile after which to hedge (default 0.95)
+        LLM_HEDGE_MIN_SECONDS: Hedge delay floor, also used until latencies are known (default 0.5)
+        LLM_HEDGE_BUDGET: Max share of recent calls that may hedge (default 0.1)
+        LLM_BREAKER_FAILURES: Consecutive failures that open the circuit (default 5)
+        LLM_BREAKER_RESET_SECONDS: Time open before a probe call (default 30)
+    """
+
+    def __init__(
+        self,
+        model: str = "",
+        max_attempts: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.5,
+        hedge_budget: float = 0.1,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.model = model
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_budget = hedge_budget
+        self.breaker = breaker or CircuitBreaker(model=model)
+        self.latencies = LatencyTracker()
+        self._recent_hedges = deque(maxlen=200)
+
+    @classmethod
+    def from_env(cls, model: str = "") -> "ResiliencePolicy":
+        return cls(
+            model=model,
+            max_attempts=int(os.getenv("LLM_RETRY_ATTEMPTS", "3")),
+            backoff_base=float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.25")),
+            backoff_max=float(os.getenv("LLM_RETRY_MAX_SECONDS", "4")),
+            hedge=os.getenv("LLM_HEDGE", "off").lower() in ("1", "on", "true"),
+            hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_SECONDS", "0.5")),
+            hedge_budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.1")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+                model=model
+            )
+        )
+
+    def hedge_delay(self) -> float:
+        observed = self.latencies.quantile(self.hedge_quantile)
+        return max(self.hedge_min_delay, observed or 0.0)
+
+    async def call(
+        self,
+        attempt: Callable[[float], Awaitable[T]],
+        timeout: float,
+        kind: str,
+        hedge: bool = False
+    ) -> T:
+        """
+        Run `attempt(timeout_seconds)` under the policy.
+
+        Args:
+            attempt: Makes one provider call; must stop within the timeout it is given
+            timeout: Per-attempt limit (the request deadline may shorten it)
+            kind: Call kind for metrics (complete, stream, embed)
+            hedge: Whether the call is idempotent and may be hedged
+
+        Raises:
+            CircuitOpenError: The circuit is open (nothing was sent)
+            LLMTimeoutError: Every attempt timed out, or the deadline passed
+            LLMError: Any other failure
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                "OpenAI API error: provider unavailable (circuit open)", self.breaker.retry_after())
+
+        for attempt_number in range(1, self.max_attempts + 1):
+            remaining = time_remaining()
+            if remaining is not None and remaining <= 0:
+                self.breaker.release()
+                raise LLMTimeoutError("OpenAI API error: request deadline exceeded")
+            attempt_timeout = timeout if remaining is None else min(timeout, remaining)
+
+            try:
+                if hedge and self.hedge:
+                    result = await self._hedged(attempt, attempt_timeout, kind)
+                else:
+                    result = await self._timed(attempt, attempt_timeout, track=hedge)
+                self.breaker.record_success()
+                return result
+
+            except retryable_errors() as e:
+                self.breaker.record_failure()
+                error = self._wrap(e, attempt_timeout)
+                delay = self._backoff(attempt_number, e)
+                remaining = time_remaining()
+                if (attempt_number == self.max_attempts or not self.breaker.allow()
+                        or (remaining is not None and remaining <= delay)):
+                    raise error from e
+                LLM_RETRIES.inc(model=self.model, kind=kind, reason=type(e).__name__)
+                await asyncio.sleep(delay)
+
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+
+            except Exception as e:
+                self.breaker.release()
+                raise LLMError(f"OpenAI API error: {str(e)}") from e
+
+    async def _timed(self, attempt: Callable[[float], Awaitable[T]], timeout: float, track: bool = True) -> T:
+        start = time.perf_counter()
+        result = await asyncio.wait_for(attempt(timeout), timeout=timeout)
+        if track:
+            # Only hedgeable calls: their latency sets the hedge delay
+            self.latencies.observe(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, attempt: Callable[[float], Awaitable[T]], timeout: float, kind: str) -> T:
+        started = time.monotonic()
+        first = asyncio.create_task(self._timed(attempt, timeout))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            hedged = not done and sum(self._recent_hedges) < self.hedge_budget * max(
+                len(self._recent_hedges), 10)
+            self._recent_hedges.append(hedged)
+            if hedged:
+                left = timeout - (time.monotonic() - started)
+                if left > 0:
+                    LLM_HEDGES.inc(model=self.model, kind=kind, outcome="fired")
+                    tasks.add(asyncio.create_task(self._timed(attempt, left)))
+
+            pending = tasks
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            LLM_HEDGES.inc(model=self.model, kind=kind, outcome="won")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _backoff(self, attempt_number: int, error: BaseException) -> float:
+        """
+        Full jitter: uniform in [0, min(max, base * 2^(n-1))], at least Retry-After.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt_number - 1)))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    def _wrap(self, error: BaseException, timeout: float) -> LLMError:
+        import openai
+
+        if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError)):
+            return LLMTimeoutError(f"OpenAI API error: request timed out after {timeout:.1f}s")
+        return LLMError(f"OpenAI API error: {str(error)}")
@@ -90,9 +90,9 @@ async def generate_sales_advice(
 ) -> str:
     """Generate specific sales advice with product data."""
     
-    from .openai_client import OpenAIClient
+    from .openai_client import get_openai_client
     
-    client = OpenAIClient()
+    client = get_openai_client()
     
     # Format HCP context
     hcp_info = ""
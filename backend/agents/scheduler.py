@@ -0,0 +1,400 @@
+"""
+LLM Scheduler
+Fair-share admission of LLM calls by priority class and user, within the provider's rate limits
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+from cache.shared_state import SharedState, get_shared_state
+from observability.logs import get_logger
+from observability.metrics import LLM_QUEUED, LLM_QUEUE_SECONDS, LLM_RATE_LIMIT_WAITS
+
+# Highest priority first
+PRIORITIES = ("interactive", "analysis", "batch")
+DEFAULT_WEIGHTS = {"interactive": 16.0, "analysis": 4.0, "batch": 1.0}
+
+logger = get_logger("llm")
+
+# (priority, user) LLM calls made in the current context are scheduled as
+_caller: ContextVar[Tuple[str, str]] = ContextVar("llm_caller", default=("analysis", ""))
+
+
+@contextmanager
+def llm_priority(priority: str, user_id: Optional[str] = None) -> Iterator[None]:
+    """
+    Schedule every LLM call made inside the block (and in tasks started
+    from it) as `priority`, sharing that class fairly per `user_id`.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority: {priority}")
+    token = _caller.set((priority, user_id or ""))
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def current_priority() -> Tuple[str, str]:
+    return _caller.get()
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """
+    "interactive=16,analysis=4,batch=1" (unlisted classes keep their default).
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        if name not in PRIORITIES or float(value) <= 0:
+            raise ValueError(f"Invalid LLM class weight: {item}")
+        weights[name] = float(value)
+    return weights
+
+
+class TokenBucket:
+    """
+    `rate_per_minute` units, refilled continuously, holding at most a
+    minute's worth. A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.level = rate_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` is available (0: now). Requests larger than
+        the bucket wait for a full one.
+        """
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        if self.capacity:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+
+class RateBudget:
+    """
+    The provider's requests-per-minute and tokens-per-minute limits, as
+    buckets in this process or, with shared state, drawn on by every
+    worker (each worker's scheduler then spends from the same budget).
+
+    While the shared state fails (a locked database, Redis unreachable),
+    the worker spends from its own buckets instead and tries the shared
+    ones again every SHARED_RETRY_SECONDS: the limits then hold per
+    worker rather than for the deployment, but calls keep flowing.
+    """
+
+    SHARED_RETRY_SECONDS = 5.0
+
+    def __init__(self, rpm_limit: float, tpm_limit: float, state: Optional[SharedState] = None, model: str = ""):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.state = state
+        self._local = {"rpm": TokenBucket(rpm_limit), "tpm": TokenBucket(tpm_limit)}
+        self._names = {"rpm": f"llm:{model}:rpm", "tpm": f"llm:{model}:tpm"}
+        # Until when the shared buckets are skipped after a failure
+        self._shared_retry_at = 0.0
+
+    @property
+    def shared(self) -> bool:
+        """
+        Whether reserving now goes through the shared state (and must be awaited).
+        """
+        return (self.state is not None and bool(self.rpm_limit or self.tpm_limit)
+                and time.monotonic() >= self._shared_retry_at)
+
+    async def reserve(self, tokens: float) -> Tuple[float, Optional[str]]:
+        """
+        Charge one request and `tokens` if both buckets hold enough.
+
+        Returns:
+            (0, None) once charged, else (seconds to wait, "rpm" or "tpm")
+        """
+        if self.shared:
+            wanted = self._wanted(tokens)
+            try:
+                wait, short = await self.state.take([(self._names[budget], amount, self._local[budget].capacity)
+                                                     for budget, amount in wanted])
+                return wait, next((budget for budget, name in self._names.items() if name == short), None)
+            except Exception as e:
+                logger.warning("Shared rate limits unavailable; using this worker's own",
+                               extra={"error": str(e), "retry_seconds": self.SHARED_RETRY_SECONDS})
+                self._shared_retry_at = time.monotonic() + self.SHARED_RETRY_SECONDS
+        return self.reserve_local(tokens)
+
+    def reserve_local(self, tokens: float) -> Tuple[float, Optional[str]]:
+        """
+        reserve() from this worker's own buckets, without waiting on anything.
+        """
+        wanted = self._wanted(tokens)
+        if not wanted:
+            return 0.0, None
+        wait, short = max((self._local[budget].wait_time(amount), budget) for budget, amount in wanted)
+        if wait:
+            return wait, short
+        for budget, amount in wanted:
+            self._local[budget].take(amount)
+        return 0.0, None
+
+    def _wanted(self, tokens: float) -> List[Tuple[str, float]]:
+        return [(budget, amount) for budget, amount in (("rpm", 1.0), ("tpm", tokens))
+                if self._local[budget].capacity]
+
+    def available(self, budget: str) -> Optional[float]:
+        """
+        What this process's bucket holds (None: unlimited or shared).
+        """
+        bucket = self._local[budget]
+        return round(bucket.level, 1) if bucket.capacity and self.state is None else None
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "user", "cost", "queued_at")
+
+    def __init__(self, future: asyncio.Future, priority: str, user: str, cost: float):
+        self.future = future
+        self.priority = priority
+        self.user = user
+        self.cost = cost
+        self.queued_at = time.perf_counter()
+
+
+class LLMScheduler:
+    """
+    Decides which waiting LLM call goes next, replacing a plain
+    concurrency semaphore in front of the provider.
+
+    Calls carry a priority class (interactive: reps' live queries;
+    analysis: on-demand conversation scoring; batch: bulk jobs) and a
+    user, set with llm_priority(). Classes share capacity by weighted
+    fair queuing: while all three are backlogged, interactive gets 16
+    parts of the estimated tokens dispatched to analysis's 4 and
+    batch's 1. An idle class's share goes to the others, and no class
+    starves. Within a class, users get equal shares, so one user's
+    thousand queued calls do not delay another user's first. Shares are
+    counted in estimated tokens (prompt plus max_tokens), not calls.
+
+    A call is dispatched only when a concurrency slot is free and the
+    requests-per-minute and tokens-per-minute buckets hold enough. The
+    buckets are charged the estimate at dispatch, as the provider's
+    limiter does, so bursts queue here instead of coming back as 429s.
+    With shared state (SHARED_STATE_BACKEND) every worker draws on the
+    same buckets, so the limits hold for the deployment, not per worker.
+    `interactive_reserved` slots are kept for interactive calls, so
+    even a batch that fills every other slot with slow calls leaves
+    room for a rep's query.
+
+    Configuration (environment variables):
+        OPENAI_MAX_CONCURRENCY: Calls in flight at once (default 16; see OpenAIClient)
+        LLM_RPM_LIMIT: Requests per minute (default 0: unlimited)
+        LLM_TPM_LIMIT: Tokens per minute, prompt + max_tokens (default 0: unlimited)
+        LLM_CLASS_WEIGHTS: Class shares (default interactive=16,analysis=4,batch=1)
+        LLM_INTERACTIVE_RESERVED: Slots only interactive calls may use (default 2)
+        LLM_SCHEDULER: fair (default) or fifo (arrival order, no classes: the old semaphore)
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        rpm_limit: float = 0,
+        tpm_limit: float = 0,
+        weights: Optional[Dict[str, float]] = None,
+        interactive_reserved: int = 2,
+        model: str = "",
+        fifo: bool = False,
+        state: Optional[SharedState] = None
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.fifo = fifo
+        self.interactive_reserved = min(max(0, interactive_reserved), self.max_concurrency - 1)
+        self.weights = weights or dict(DEFAULT_WEIGHTS)
+        self.budget = RateBudget(rpm_limit, tpm_limit, state, model)
+        self.model = model
+        self.in_flight = 0
+
+        # priority -> user -> waiters, and the virtual times that order them
+        self._queues: Dict[str, Dict[str, Deque[_Waiter]]] = {p: {} for p in PRIORITIES}
+        self._class_vtime: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._class_clock = 0.0
+        self._user_vtime: Dict[str, Dict[str, float]] = {p: {} for p in PRIORITIES}
+        self._user_clock: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Reserving shared budget for the next waiter (one round trip at a time)
+        self._reserving: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, max_concurrency: int, model: str = "") -> "LLMScheduler":
+        return cls(
+            max_concurrency=max_concurrency,
+            rpm_limit=float(os.getenv("LLM_RPM_LIMIT", "0")),
+            tpm_limit=float(os.getenv("LLM_TPM_LIMIT", "0")),
+            weights=parse_weights(os.getenv("LLM_CLASS_WEIGHTS", "")),
+            interactive_reserved=int(os.getenv("LLM_INTERACTIVE_RESERVED", "2")),
+            model=model,
+            fifo=os.getenv("LLM_SCHEDULER", "fair").lower() == "fifo",
+            state=get_shared_state()
+        )
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: float) -> AsyncIterator[None]:
+        """
+        Wait for this call's turn, then hold a concurrency slot.
+        """
+        priority, user = _caller.get()
+        await self._acquire(priority, user, max(1.0, estimated_tokens))
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._dispatch()
+
+    async def _acquire(self, priority: str, user: str, cost: float) -> None:
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, user, cost)
+        users = self._queues[priority]
+        if not any(users.values()):
+            # A class returning from idle starts level with the others, without banked credit
+            self._class_vtime[priority] = max(self._class_vtime[priority], self._class_clock)
+        if user not in users:
+            users[user] = deque()
+            self._user_vtime[priority][user] = self._user_clock[priority]
+        users[user].append(waiter)
+        LLM_QUEUED.inc(priority=priority)
+        try:
+            self._dispatch()
+        except BaseException:
+            # Nobody will await this waiter: never leave it queued (or holding a slot) to be admitted later
+            if waiter.future.done():
+                self.in_flight -= 1
+            else:
+                self._discard(waiter)
+            raise
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                # Gave up while queued (timeout, client gone)
+                self._discard(waiter)
+            else:
+                # Admitted just as the caller gave up: hand the slot back
+                self.in_flight -= 1
+            self._dispatch()
+            raise
+
+    def _discard(self, waiter: _Waiter) -> None:
+        queue = self._queues[waiter.priority].get(waiter.user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            LLM_QUEUED.dec(priority=waiter.priority)
+            if not queue:
+                self._drop_user(waiter.priority, waiter.user)
+
+    def _drop_user(self, priority: str, user: str) -> None:
+        del self._queues[priority][user]
+        del self._user_vtime[priority][user]
+
+    def _next(self) -> Optional[_Waiter]:
+        """
+        The waiter fair queuing serves next, among classes allowed a slot.
+        """
+        if self.fifo:
+            heads = [queue[0] for users in self._queues.values() for queue in users.values()]
+            return min(heads, key=lambda waiter: waiter.queued_at, default=None)
+        eligible = PRIORITIES if self.in_flight < self.max_concurrency - self.interactive_reserved \
+            else ("interactive",)
+        backlogged = [p for p in eligible if self._queues[p]]
+        if not backlogged:
+            return None
+        priority = min(backlogged, key=lambda p: (self._class_vtime[p], PRIORITIES.index(p)))
+        vtimes = self._user_vtime[priority]
+        user = min(self._queues[priority], key=vtimes.__getitem__)
+        return self._queues[priority][user][0]
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._reserving is not None:
+            # Dispatches again once the shared state answers
+            return
+        while self.in_flight < self.max_concurrency:
+            waiter = self._next()
+            if waiter is None:
+                return
+            if waiter.future.cancelled():
+                self._discard(waiter)
+                continue
+            if self.budget.shared:
+                self._reserving = asyncio.get_running_loop().create_task(self._reserve_shared(waiter))
+                return
+            wait, budget = self.budget.reserve_local(waiter.cost)
+            if wait:
+                self._retry_in(wait, budget)
+                return
+            self._admit(waiter)
+
+    async def _reserve_shared(self, waiter: _Waiter) -> None:
+        """
+        Reserve the waiter's budget in the shared state, off the loop, then
+        admit it. Slots only free up meanwhile, and the waiter stays at the
+        head of its queue unless it gives up.
+        """
+        try:
+            wait, budget = await self.budget.reserve(waiter.cost)
+        finally:
+            self._reserving = None
+        if wait:
+            self._retry_in(wait, budget)
+            return
+        # A waiter that gave up during the round trip leaves its reservation unspent
+        if not waiter.future.done():
+            self._admit(waiter)
+        self._dispatch()
+
+    def _retry_in(self, wait: float, budget: Optional[str]) -> None:
+        LLM_RATE_LIMIT_WAITS.inc(model=self.model, budget=budget)
+        self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+
+    def _admit(self, waiter: _Waiter) -> None:
+        priority, user = waiter.priority, waiter.user
+        queue = self._queues[priority][user]
+        queue.popleft()
+
+        # Start-time fair queuing: the clock advances to the start tag just served
+        self._class_clock = self._class_vtime[priority]
+        self._class_vtime[priority] += waiter.cost / self.weights[priority]
+        self._user_clock[priority] = self._user_vtime[priority][user]
+        self._user_vtime[priority][user] += waiter.cost
+        if not queue:
+            self._drop_user(priority, user)
+
+        self.in_flight += 1
+        LLM_QUEUED.dec(priority=priority)
+        LLM_QUEUE_SECONDS.observe(time.perf_counter() - waiter.queued_at, model=self.model, priority=priority)
+        waiter.future.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": {p: sum(len(q) for q in users.values()) for p, users in self._queues.items()},
+            "rpm_available": self.budget.available("rpm"),
+            "tpm_available": self.budget.available("tpm")
+        }
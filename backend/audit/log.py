@@ -0,0 +1,340 @@
+"""
+Compliance Audit Log
+Append-only record of every compliance decision, written off the request path
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from observability.logs import get_logger
+from observability.metrics import AUDIT_COMMIT_SECONDS, AUDIT_QUEUE_DEPTH, AUDIT_RECORDS
+
+OVERFLOW_POLICIES = ("drop", "block")
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+
+# Tells the writer to commit what is queued and exit
+_STOP = object()
+
+logger = get_logger("audit")
+
+
+def segment_name(seq: int) -> str:
+    return f"{SEGMENT_PREFIX}{seq:08d}{SEGMENT_SUFFIX}"
+
+
+def segment_seq(name: str) -> Optional[int]:
+    if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+        return None
+    digits = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+    return int(digits) if digits.isdigit() else None
+
+
+def text_hash(text: Optional[str]) -> Optional[str]:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest() if text else None
+
+
+class AuditLog:
+    """
+    Durable audit trail of compliance decisions.
+
+    record() only puts a tuple on a bounded in-memory queue (a few
+    microseconds); hashing, serialization and disk I/O happen on a
+    background writer thread. The writer commits in groups: it takes
+    whatever has queued up (up to batch_size, waiting at most
+    flush_interval for more), appends it to the current segment in one
+    write and fsyncs once. Under load a single fsync covers hundreds of
+    records; when idle a record is durable within about flush_interval.
+
+    Segments are JSON-lines files (segment-00000001.jsonl, ...) that are
+    only ever appended to. The writer starts a new one on every start and
+    once the current one passes segment_bytes, so older segments are
+    immutable and can be archived or indexed as-is. Each worker process
+    writes its own segments: numbers are claimed with an exclusive
+    create, and the current one is flock-ed until it is closed.
+
+    When the queue is full (the disk cannot keep up), the overflow
+    policy decides:
+        drop: the record is discarded and counted
+            (pharma_audit_records_total{outcome="dropped"}); requests
+            never wait on the disk
+        block: the request waits up to block_timeout for space
+            (backpressure), and only then drops. Use it where a missing
+            record is worse than a slower request.
+
+    Configuration (environment variables):
+        AUDIT_LOG: on (default) or off
+        AUDIT_LOG_DIR: Segment directory (default .data/audit)
+        AUDIT_QUEUE_SIZE: Records buffered before the overflow policy applies (default 10000)
+        AUDIT_OVERFLOW: drop (default) or block
+        AUDIT_BLOCK_SECONDS: Longest wait for queue space with block (default 0.1)
+        AUDIT_BATCH_SIZE: Most records per group commit (default 1000)
+        AUDIT_FLUSH_SECONDS: Longest wait to fill a group (default 0.01)
+        AUDIT_SEGMENT_BYTES: Segment size before rotation (default 67108864)
+        AUDIT_FSYNC: on (default) or off (OS-buffered only; for tests)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        queue_size: int = 10000,
+        overflow: str = "drop",
+        block_timeout: float = 0.1,
+        batch_size: int = 1000,
+        flush_interval: float = 0.01,
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync: bool = True
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {overflow}")
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+
+        self.written = 0
+        self.dropped = 0
+        self.commits = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._segment_seq = max(
+            (seq for seq in map(segment_seq, os.listdir(directory)) if seq is not None), default=0)
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @classmethod
+    def from_env(cls) -> Optional["AuditLog"]:
+        if os.getenv("AUDIT_LOG", "on").lower() not in ("1", "on", "true"):
+            return None
+        return cls(
+            os.getenv("AUDIT_LOG_DIR", ".data/audit"),
+            queue_size=int(os.getenv("AUDIT_QUEUE_SIZE", "10000")),
+            overflow=os.getenv("AUDIT_OVERFLOW", "drop").lower(),
+            block_timeout=float(os.getenv("AUDIT_BLOCK_SECONDS", "0.1")),
+            batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "1000")),
+            flush_interval=float(os.getenv("AUDIT_FLUSH_SECONDS", "0.01")),
+            segment_bytes=int(os.getenv("AUDIT_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+            fsync=os.getenv("AUDIT_FSYNC", "on").lower() in ("1", "on", "true")
+        )
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._open_segment()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def record(
+        self,
+        pipeline: str,
+        compliance: Dict,
+        user_id: Optional[str] = None,
+        product_id: Optional[str] = None,
+        query: Optional[str] = None,
+        response: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> bool:
+        """
+        Queue one compliance decision for the log.
+
+        Args:
+            compliance: Decision as returned by ComplianceGuardian
+                (status, violation_type, detected_in, violations)
+            query / response: Checked texts; only their SHA-256 is stored
+            timings: Stage name -> seconds for the request so far
+
+        Returns:
+            False if the record was dropped (queue full)
+        """
+        entry = (time.time(), pipeline, compliance, user_id, product_id, query, response, timings)
+        try:
+            if self.overflow == "block":
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            AUDIT_RECORDS.inc(outcome="dropped")
+            return False
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every record queued so far is committed.
+
+        Returns:
+            False on timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Commit what is queued and stop the writer.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            stop = batch[0] is _STOP
+            # Group commit: everything that queued during the previous fsync, topped up briefly
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        entry = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if entry is _STOP:
+                    stop = True
+                else:
+                    batch.append(entry)
+
+            records = [entry for entry in batch if entry is not _STOP]
+            try:
+                if records:
+                    self._commit(records)
+            except Exception as e:
+                logger.error("Failed to write audit records", extra={"records": len(records), "error": str(e)})
+                self.dropped += len(records)
+                AUDIT_RECORDS.inc(len(records), outcome="dropped")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                AUDIT_QUEUE_DEPTH.set(self._queue.qsize())
+            if stop:
+                return
+
+    def _commit(self, entries: List[tuple]) -> None:
+        start = time.perf_counter()
+        data = "".join(json.dumps(self._to_record(*entry), separators=(",", ":")) + "\n" for entry in entries)
+        self._file.write(data.encode("utf-8"))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        AUDIT_COMMIT_SECONDS.observe(time.perf_counter() - start)
+
+        self.written += len(entries)
+        self.commits += 1
+        AUDIT_RECORDS.inc(len(entries), outcome="written")
+        if self._file.tell() >= self.segment_bytes:
+            self._file.close()
+            self._open_segment()
+
+    @staticmethod
+    def _to_record(
+        ts: float,
+        pipeline: str,
+        compliance: Dict,
+        user_id: Optional[str],
+        product_id: Optional[str],
+        query: Optional[str],
+        response: Optional[str],
+        timings: Optional[Dict[str, float]]
+    ) -> Dict:
+        return {
+            "id": uuid.uuid4().hex,
+            "ts": round(ts, 6),
+            "pipeline": pipeline,
+            "user_id": user_id,
+            "product_id": product_id,
+            "status": compliance["status"],
+            "violation_type": compliance.get("violation_type"),
+            "detected_in": compliance.get("detected_in"),
+            "query_sha256": text_hash(query),
+            "response_sha256": text_hash(response),
+            "spans": compliance.get("violations", []),
+            "timings": {name: round(seconds, 6) for name, seconds in (timings or {}).items()}
+        }
+
+    def _after_fork(self) -> None:
+        # A forked child (the audit compactor) must not hold the current segment, and so its lock,
+        # open after this process moves on; /dev/null takes over the descriptor number instead
+        if self._file is not None:
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, self._file.fileno())
+            os.close(devnull)
+
+    def _open_segment(self) -> None:
+        while True:
+            self._segment_seq += 1
+            path = os.path.join(self.directory, segment_name(self._segment_seq))
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+                break
+            except FileExistsError:
+                # Another worker's segment
+                continue
+        # Held while this is the current segment: the compactor leaves it alone
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        self._file = os.fdopen(fd, "ab")
+        if self.fsync:
+            # Make the new file's directory entry durable too
+            dir_fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def stats(self) -> Dict:
+        return {
+            "directory": self.directory,
+            "segment": segment_name(self._segment_seq),
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "commits": self.commits,
+            "records_per_commit": round(self.written / self.commits, 1) if self.commits else 0.0,
+            "overflow": self.overflow
+        }
+
+
+# Shared instance (created on first use)
+_audit_log: Optional[AuditLog] = None
+_audit_log_loaded = False
+
+
+def get_audit_log() -> Optional[AuditLog]:
+    """
+    Get or create the shared audit log with its writer running (None when disabled).
+    """
+    global _audit_log, _audit_log_loaded
+    if not _audit_log_loaded:
+        _audit_log = AuditLog.from_env()
+        if _audit_log is not None:
+            _audit_log.start()
+        _audit_log_loaded = True
+    return _audit_log
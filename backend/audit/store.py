@@ -0,0 +1,745 @@
+"""
+Audit Store
+Indexed, columnar query layer over the compliance audit log
+"""
+
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from audit.log import segment_name, segment_seq
+from cache.shared_state import is_primary_worker
+from observability.logs import get_logger
+
+logger = get_logger("audit")
+
+PART_PREFIX = "part-"
+
+# Record fields stored as codes into a per-part dictionary (meta.json)
+CODED_FIELDS = {
+    "pipeline": np.uint8,
+    "status": np.uint8,
+    "violation_type": np.uint8,
+    "detected_in": np.uint8,
+    "product_id": np.uint16,
+    "user_id": np.int32
+}
+# Fields with a secondary index (rows grouped by value)
+INDEXED_FIELDS = ("user_id", "product_id", "violation_type")
+
+# A query reads candidate rows a block at a time, so a page stops early
+SCAN_BLOCK_ROWS = 65536
+
+Rows = Union[np.ndarray, slice]
+
+
+class AuditQuery(NamedTuple):
+    """
+    Filters for AuditStore.search; None matches anything. start/end are
+    epoch seconds (end exclusive); text is a case-insensitive substring
+    of a detector span's matched text.
+    """
+    user_id: Optional[str] = None
+    status: Optional[str] = None
+    violation_type: Optional[str] = None
+    product_id: Optional[str] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
+    text: Optional[str] = None
+
+
+def position(seq: int, line: int) -> int:
+    """
+    Log order of a record: its segment and line number in one sortable int.
+    """
+    return (seq << 32) | line
+
+
+def format_cursor(pos: int) -> str:
+    return f"{pos >> 32}:{pos & 0xFFFFFFFF}"
+
+
+def parse_cursor(cursor: Optional[str]) -> int:
+    """
+    Raises:
+        ValueError: Not a cursor from a previous page
+    """
+    if not cursor:
+        return -1
+    seq, _, line = cursor.partition(":")
+    if not (seq.isdigit() and line.isdigit()):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position(int(seq), int(line))
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """
+    Epoch seconds, or an ISO 8601 date/time (UTC unless it has an offset).
+
+    Raises:
+        ValueError: Neither
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def _csr_index(codes: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rows grouped by code (log order within a code) and each group's start.
+    """
+    rows = np.argsort(codes, kind="stable").astype(np.int32)
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(codes, minlength=size))
+    return offsets, rows
+
+
+def write_part(
+    path: str,
+    columns: Dict[str, np.ndarray],
+    dictionaries: Dict[str, list],
+    first_seq: int,
+    last_seq: int
+) -> None:
+    """
+    Write a compiled part: the record columns plus their indexes.
+
+    Args:
+        columns: pos, ts, id (n, 16) and query_sha256/response_sha256
+            (n, 32) as uint8, the CODED_FIELDS codes, spans (span_offsets,
+            span_type, span_text, span_start, span_end) and timings
+            (timing_offsets, timing_stage, timing_seconds)
+        dictionaries: Values behind the codes, per CODED_FIELDS field,
+            plus "texts" (span_text) and "stages" (timing_stage)
+
+    Written to a sibling directory and renamed into place, so readers
+    never see a partial part.
+    """
+    rows = len(columns["pos"])
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = os.path.join(directory, f".building-{os.path.basename(path)}-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    indexes = {}
+    for field in INDEXED_FIELDS:
+        offsets, index_rows = _csr_index(columns[field], len(dictionaries[field]))
+        indexes[f"{field}_index_offsets"] = offsets
+        indexes[f"{field}_index_rows"] = index_rows
+
+    # Inverted index: distinct matched text -> rows with a span of it
+    span_rows = np.repeat(np.arange(rows, dtype=np.int64), np.diff(columns["span_offsets"]))
+    pairs = np.unique(columns["span_text"].astype(np.int64) << 32 | span_rows)
+    text_codes = (pairs >> 32).astype(np.int32)
+    indexes["text_index_offsets"] = np.zeros(len(dictionaries["texts"]) + 1, dtype=np.int64)
+    indexes["text_index_offsets"][1:] = np.cumsum(np.bincount(text_codes, minlength=len(dictionaries["texts"])))
+    indexes["text_index_rows"] = (pairs & 0xFFFFFFFF).astype(np.int32)
+
+    for name, values in {**columns, **indexes}.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), values)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "rows": rows,
+            "first_seq": first_seq,
+            "last_seq": last_seq,
+            "min_ts": float(columns["ts"].min()) if rows else None,
+            "max_ts": float(columns["ts"].max()) if rows else None,
+            "last_pos": int(columns["pos"][-1]) if rows else -1,
+            "dictionaries": dictionaries
+        }, f)
+    os.rename(tmp, path)
+
+
+def part_name(first_seq: int, last_seq: int) -> str:
+    return f"{PART_PREFIX}{first_seq:08d}-{last_seq:08d}"
+
+
+def part_range(name: str) -> Optional[Tuple[int, int]]:
+    if not name.startswith(PART_PREFIX):
+        return None
+    first, _, last = name[len(PART_PREFIX):].partition("-")
+    return (int(first), int(last)) if first.isdigit() and last.isdigit() else None
+
+
+class PartBuilder:
+    """
+    Collects JSON-lines segments into part columns, one segment at a time
+    (parsed values are converted to arrays per segment to bound memory).
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.first_seq: Optional[int] = None
+        self.last_seq: Optional[int] = None
+        self.dictionaries: Dict[str, list] = {field: [] for field in CODED_FIELDS}
+        self.dictionaries.update(texts=[], stages=[])
+        self._codes: Dict[str, Dict] = {name: {} for name in self.dictionaries}
+        self._chunks: Dict[str, List[np.ndarray]] = {}
+        self._span_count = 0
+        self._timing_count = 0
+
+    def _code(self, name: str, value) -> int:
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self.dictionaries[name].append(value)
+        return code
+
+    def add_segment(self, seq: int, path: str) -> None:
+        values: Dict[str, list] = {name: [] for name in (
+            "pos", "ts", "id", "query_sha256", "response_sha256", *CODED_FIELDS,
+            "span_offsets", "span_type", "span_text", "span_start", "span_end",
+            "timing_offsets", "timing_stage", "timing_seconds")}
+        with open(path, "rb") as f:
+            for line_number, line in enumerate(f):
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                values["pos"].append(position(seq, line_number))
+                values["ts"].append(record["ts"])
+                values["id"].append(bytes.fromhex(record["id"]))
+                for field in ("query_sha256", "response_sha256"):
+                    values[field].append(bytes.fromhex(record[field]) if record[field] else bytes(32))
+                for field in CODED_FIELDS:
+                    values[field].append(self._code(field, record[field]))
+                for span in record["spans"]:
+                    values["span_type"].append(self._code("violation_type", span["violation_type"]))
+                    values["span_text"].append(self._code("texts", span["detected_text"]))
+                    values["span_start"].append(span["start"])
+                    values["span_end"].append(span["end"])
+                self._span_count += len(record["spans"])
+                values["span_offsets"].append(self._span_count)
+                for stage_name, seconds in record["timings"].items():
+                    values["timing_stage"].append(self._code("stages", stage_name))
+                    values["timing_seconds"].append(seconds)
+                self._timing_count += len(record["timings"])
+                values["timing_offsets"].append(self._timing_count)
+
+        self.rows += len(values["pos"])
+        self.first_seq = seq if self.first_seq is None else self.first_seq
+        self.last_seq = seq
+        self._append("pos", np.array(values["pos"], dtype=np.int64))
+        self._append("ts", np.array(values["ts"], dtype=np.float64))
+        for field in ("id", "query_sha256", "response_sha256"):
+            width = 16 if field == "id" else 32
+            self._append(field, np.frombuffer(b"".join(values[field]), dtype=np.uint8).reshape(-1, width))
+        for field, dtype in CODED_FIELDS.items():
+            self._append(field, np.array(values[field], dtype=np.int64))
+        self._append("span_offsets", np.array(values["span_offsets"], dtype=np.int64))
+        self._append("span_type", np.array(values["span_type"], dtype=np.uint8))
+        self._append("span_text", np.array(values["span_text"], dtype=np.int32))
+        self._append("span_start", np.array(values["span_start"], dtype=np.int32))
+        self._append("span_end", np.array(values["span_end"], dtype=np.int32))
+        self._append("timing_offsets", np.array(values["timing_offsets"], dtype=np.int64))
+        self._append("timing_stage", np.array(values["timing_stage"], dtype=np.uint8))
+        self._append("timing_seconds", np.array(values["timing_seconds"], dtype=np.float32))
+
+    def _append(self, name: str, values: np.ndarray) -> None:
+        self._chunks.setdefault(name, []).append(values)
+
+    def write(self, directory: str) -> str:
+        columns = {name: np.concatenate(chunks) for name, chunks in self._chunks.items()}
+        for field, dtype in CODED_FIELDS.items():
+            columns[field] = columns[field].astype(dtype)
+        for name in ("span_offsets", "timing_offsets"):
+            columns[name] = np.concatenate([[0], columns[name]]).astype(np.int64)
+        path = os.path.join(directory, part_name(self.first_seq, self.last_seq))
+        write_part(path, columns, self.dictionaries, self.first_seq, self.last_seq)
+        return path
+
+
+def _being_written(path: str) -> bool:
+    """
+    Whether a writer still has the segment open (AuditLog holds a shared
+    flock on its current segment; the lock goes with its process).
+    """
+    with open(path, "rb") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f, fcntl.LOCK_UN)
+    return False
+
+
+def compact_directory(directory: str, part_rows: int = 1000000) -> int:
+    """
+    Compile sealed segments (every segment but the newest, and none a
+    writer still holds) that no part covers yet. Consecutive segments
+    share a part up to part_rows records.
+
+    Returns:
+        Number of segments compiled
+    """
+    names = os.listdir(directory)
+    covered = set()
+    for name in names:
+        seq_range = part_range(name)
+        if seq_range is not None:
+            covered.update(range(seq_range[0], seq_range[1] + 1))
+    segments = sorted(seq for seq in map(segment_seq, names) if seq is not None)
+    sealed = [seq for seq in segments[:-1]
+              if seq not in covered and not _being_written(os.path.join(directory, segment_name(seq)))]
+
+    builder = None
+    for seq in sealed:
+        if builder is not None and (builder.rows >= part_rows or seq != builder.last_seq + 1):
+            builder.write(directory)
+            builder = None
+        builder = builder or PartBuilder()
+        builder.add_segment(seq, os.path.join(directory, segment_name(seq)))
+    if builder is not None:
+        builder.write(directory)
+    return len(sealed)
+
+
+def map_column(path: str) -> Tuple[np.ndarray, mmap.mmap, int]:
+    """
+    Memory-map a .npy column for random access. Read-around is turned
+    off: with a large readahead, touching one row would read megabytes
+    and evict the pages other queries need.
+
+    Returns:
+        (array, mapping, byte offset of the first row)
+    """
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = f.tell()
+    mapped.madvise(mmap.MADV_RANDOM)
+    array = np.frombuffer(mapped, dtype=dtype, count=int(np.prod(shape)), offset=header).reshape(shape)
+    return array, mapped, header
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Concatenated arange(start, end) for each pair.
+    """
+    counts = ends - starts
+    firsts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return np.arange(int(counts.sum())) + np.repeat(starts - firsts, counts)
+
+
+class ColumnMap(dict):
+    """
+    A part's columns by name, mapped on first use (a query that prunes
+    the part never opens its files).
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.mappings: Dict[str, Tuple[mmap.mmap, int]] = {}
+
+    def __missing__(self, name: str) -> np.ndarray:
+        array, mapped, header = map_column(os.path.join(self.path, f"{name}.npy"))
+        self[name] = array
+        self.mappings[name] = (mapped, header)
+        return array
+
+
+class AuditPart:
+    """
+    One compiled part, memory-mapped read-only:
+
+        meta.json                   rows, segment range, ts range, dictionaries
+        pos.npy, ts.npy, ...        one column per record field, in log order
+        <field>_index_*.npy         secondary index per INDEXED_FIELDS field:
+                                    rows grouped by value (CSR offsets + rows)
+        text_index_*.npy            inverted index: matched span text -> rows
+
+    A query starts from its most selective index (or a block range of
+    the part) and filters the remaining conditions on the columns of the
+    candidate rows only. Parts wholly outside the time range are skipped
+    from meta.json alone; the OS page cache keeps hot columns in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        self.dictionaries = self.meta["dictionaries"]
+        self.codes = {field: {value: code for code, value in enumerate(values)}
+                      for field, values in self.dictionaries.items()}
+        self.texts_lower = [text.lower() for text in self.dictionaries["texts"]]
+        self.columns = ColumnMap(path)
+
+    def prefetch(self, names: Tuple[str, ...], rows: np.ndarray) -> None:
+        """
+        Have the kernel read the pages holding `rows` of these columns in
+        parallel (MADV_WILLNEED) before they are gathered, instead of one
+        page fault at a time.
+        """
+        if len(rows) < 2:
+            return
+        for name in names:
+            row_bytes = self.columns[name].strides[0]
+            mapped, header = self.columns.mappings[name]
+            pages = np.unique((header + np.asarray(rows, dtype=np.int64) * row_bytes) // mmap.PAGESIZE)
+            # One call per run of consecutive pages
+            breaks = np.flatnonzero(np.diff(pages) != 1) + 1
+            for run in np.split(pages, breaks):
+                mapped.madvise(mmap.MADV_WILLNEED, int(run[0]) * mmap.PAGESIZE, len(run) * mmap.PAGESIZE)
+
+    def _postings(self, index: str, code: int) -> np.ndarray:
+        offsets = self.columns[f"{index}_index_offsets"]
+        return self.columns[f"{index}_index_rows"][int(offsets[code]):int(offsets[code + 1])]
+
+    def scan(self, query: AuditQuery, after: int = -1) -> Iterator[np.ndarray]:
+        """
+        Rows matching `query` after log position `after`, in log order, a block at a time.
+        """
+        meta = self.meta
+        if not self.rows or meta["last_pos"] <= after:
+            return
+        if (query.start is not None and meta["max_ts"] < query.start) or \
+                (query.end is not None and meta["min_ts"] >= query.end):
+            return
+        check_time = (query.start is not None and meta["min_ts"] < query.start) or \
+            (query.end is not None and meta["max_ts"] >= query.end)
+
+        equal = {}
+        for field in ("user_id", "product_id", "violation_type", "status"):
+            value = getattr(query, field)
+            if value is not None:
+                code = self.codes[field].get(value)
+                if code is None:
+                    # Value never occurs in this part
+                    return
+                equal[field] = code
+
+        candidates = [(field, self._postings(field, equal[field])) for field in INDEXED_FIELDS if field in equal]
+        text_rows = None
+        if query.text:
+            needle = query.text.lower()
+            text_codes = [code for code, text in enumerate(self.texts_lower) if needle in text]
+            if not text_codes:
+                return
+            text_rows = self._postings("text", text_codes[0])
+            if len(text_codes) > 1:
+                text_rows = np.unique(np.concatenate([self._postings("text", code) for code in text_codes]))
+            candidates.append(("text", text_rows))
+
+        start = int(np.searchsorted(self.columns["pos"], after, side="right")) if after >= 0 else 0
+        if candidates:
+            driver, rows = min(candidates, key=lambda candidate: len(candidate[1]))
+            rows = rows[np.searchsorted(rows, start):]
+            blocks = (np.asarray(rows[i:i + SCAN_BLOCK_ROWS]) for i in range(0, len(rows), SCAN_BLOCK_ROWS))
+        else:
+            driver = None
+            blocks = (slice(i, min(i + SCAN_BLOCK_ROWS, self.rows)) for i in range(start, self.rows, SCAN_BLOCK_ROWS))
+
+        filtered = tuple(field for field in equal if field != driver) + (("ts",) if check_time else ())
+        for block in blocks:
+            if driver is not None:
+                self.prefetch(filtered, block)
+            mask = None
+            for field, code in equal.items():
+                if field != driver:
+                    mask = _and(mask, self.columns[field][block] == code)
+            if text_rows is not None and driver != "text":
+                block_rows = np.arange(block.start, block.stop) if isinstance(block, slice) else block
+                mask = _and(mask, np.isin(block_rows, text_rows))
+            if check_time:
+                ts = self.columns["ts"][block]
+                if query.start is not None:
+                    mask = _and(mask, ts >= query.start)
+                if query.end is not None:
+                    mask = _and(mask, ts < query.end)
+
+            rows = np.arange(block.start, block.stop) if isinstance(block, slice) else block
+            if mask is not None:
+                rows = rows[mask]
+            if len(rows):
+                yield rows
+
+    def records(self, rows: np.ndarray) -> List[Dict]:
+        """
+        The records at `rows`, in the audit log's JSON shape. Each column
+        is gathered once for all rows.
+        """
+        columns = self.columns
+        dictionaries = self.dictionaries
+        self.prefetch(("ts", "id", "query_sha256", "response_sha256", "span_offsets", "timing_offsets",
+                       *CODED_FIELDS), rows)
+        values = {field: [dictionaries[field][code] for code in columns[field][rows].tolist()]
+                  for field in CODED_FIELDS}
+        ts = columns["ts"][rows].tolist()
+        ids = columns["id"][rows]
+        query_hashes = columns["query_sha256"][rows]
+        response_hashes = columns["response_sha256"][rows]
+
+        span_bounds = np.stack([columns["span_offsets"][rows], columns["span_offsets"][rows + 1]])
+        spans = _ranges(*span_bounds)
+        self.prefetch(("span_type", "span_text", "span_start", "span_end"), spans)
+        span_type = [dictionaries["violation_type"][code] for code in columns["span_type"][spans].tolist()]
+        span_text = [dictionaries["texts"][code] for code in columns["span_text"][spans].tolist()]
+        span_start = columns["span_start"][spans].tolist()
+        span_end = columns["span_end"][spans].tolist()
+        span_split = np.cumsum(span_bounds[1] - span_bounds[0]).tolist()
+
+        timing_bounds = np.stack([columns["timing_offsets"][rows], columns["timing_offsets"][rows + 1]])
+        timings = _ranges(*timing_bounds)
+        self.prefetch(("timing_stage", "timing_seconds"), timings)
+        timing_stage = [dictionaries["stages"][code] for code in columns["timing_stage"][timings].tolist()]
+        timing_seconds = [round(seconds, 6) for seconds in columns["timing_seconds"][timings].tolist()]
+        timing_split = np.cumsum(timing_bounds[1] - timing_bounds[0]).tolist()
+
+        records = []
+        span_first = timing_first = 0
+        for i in range(len(rows)):
+            span_last, timing_last = span_split[i], timing_split[i]
+            records.append({
+                "id": ids[i].tobytes().hex(),
+                "ts": ts[i],
+                "pipeline": values["pipeline"][i],
+                "user_id": values["user_id"][i],
+                "product_id": values["product_id"][i],
+                "status": values["status"][i],
+                "violation_type": values["violation_type"][i],
+                "detected_in": values["detected_in"][i],
+                "query_sha256": _hash_hex(query_hashes[i]),
+                "response_sha256": _hash_hex(response_hashes[i]),
+                "spans": [
+                    {"violation_type": span_type[j], "detected_text": span_text[j],
+                     "start": span_start[j], "end": span_end[j]}
+                    for j in range(span_first, span_last)
+                ],
+                "timings": dict(zip(timing_stage[timing_first:timing_last], timing_seconds[timing_first:timing_last]))
+            })
+            span_first, timing_first = span_last, timing_last
+        return records
+
+
+def _and(mask: Optional[np.ndarray], condition: np.ndarray) -> np.ndarray:
+    return condition if mask is None else mask & condition
+
+
+def _hash_hex(digest: np.ndarray) -> Optional[str]:
+    raw = digest.tobytes()
+    return raw.hex() if any(raw) else None
+
+
+class TailSegment:
+    """
+    A segment not compiled yet (the one being written, or sealed ones
+    awaiting compaction): parsed incrementally and filtered in Python.
+    """
+
+    def __init__(self, seq: int, path: str):
+        self.seq = seq
+        self.path = path
+        self.records: List[Dict] = []
+        self._offset = 0
+
+    def refresh(self) -> None:
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self.records.append(json.loads(line))
+        self._offset += end
+
+    def scan(self, query: AuditQuery, after: int = -1) -> Iterator[Tuple[int, Dict]]:
+        first = max(0, after - position(self.seq, 0) + 1) if after >= position(self.seq, 0) else 0
+        needle = query.text.lower() if query.text else None
+        for line in range(first, len(self.records)):
+            record = self.records[line]
+            if (query.user_id is not None and record["user_id"] != query.user_id) or \
+                    (query.status is not None and record["status"] != query.status) or \
+                    (query.violation_type is not None and record["violation_type"] != query.violation_type) or \
+                    (query.product_id is not None and record["product_id"] != query.product_id) or \
+                    (query.start is not None and record["ts"] < query.start) or \
+                    (query.end is not None and record["ts"] >= query.end):
+                continue
+            if needle and not any(needle in span["detected_text"].lower() for span in record["spans"]):
+                continue
+            yield position(self.seq, line), record
+
+
+class AuditStore:
+    """
+    Searches the audit log directory: compiled parts first, then the
+    segments not compiled yet, in log order.
+
+    Sealed segments are compiled into columnar parts (see AuditPart) by a
+    background compactor in a separate process, so the work never holds
+    the server's GIL. With several workers only the primary compacts. Parts hold every field, so compiled JSON-lines
+    segments can be archived. Pages are resumed with the cursor of the
+    last record received, which stays valid across compactions.
+
+    Configuration (environment variables):
+        AUDIT_LOG_DIR: Audit log directory (default .data/audit)
+        AUDIT_PART_ROWS: Most records per compiled part (default 1000000)
+        AUDIT_COMPACT_SECONDS: Compaction interval (default 60; 0 disables the background compactor)
+    """
+
+    def __init__(self, directory: str, part_rows: int = 1000000, compact_interval: float = 60.0):
+        self.directory = directory
+        self.part_rows = part_rows
+        self.compact_interval = compact_interval
+        self._parts: Dict[str, AuditPart] = {}
+        self._tails: Dict[int, TailSegment] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls) -> "AuditStore":
+        return cls(
+            os.getenv("AUDIT_LOG_DIR", ".data/audit"),
+            part_rows=int(os.getenv("AUDIT_PART_ROWS", "1000000")),
+            compact_interval=float(os.getenv("AUDIT_COMPACT_SECONDS", "60"))
+        )
+
+    def start(self) -> None:
+        if self.compact_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._compact_loop, name="audit-compactor", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _compact_loop(self) -> None:
+        while not self._stop.wait(self.compact_interval):
+            try:
+                if not is_primary_worker():
+                    continue
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=1)
+                compiled = self._pool.submit(compact_directory, self.directory, self.part_rows).result()
+                if compiled:
+                    logger.info("Compiled sealed segments into columnar parts", extra={"segments": compiled})
+            except Exception as e:
+                logger.error("Compaction failed", extra={"error": str(e)})
+
+    def compact(self) -> int:
+        """
+        Compile sealed segments now, in this process.
+        """
+        return compact_directory(self.directory, self.part_rows)
+
+    def _layout(self) -> Tuple[List[AuditPart], List[TailSegment]]:
+        if not os.path.isdir(self.directory):
+            return [], []
+        names = os.listdir(self.directory)
+        with self._lock:
+            parts = []
+            covered = set()
+            for name in sorted(name for name in names if part_range(name) is not None):
+                part = self._parts.get(name)
+                if part is None:
+                    part = self._parts[name] = AuditPart(os.path.join(self.directory, name))
+                first, last = part_range(name)
+                covered.update(range(first, last + 1))
+                parts.append(part)
+
+            tails = []
+            for seq in sorted(seq for seq in map(segment_seq, names) if seq is not None):
+                if seq in covered:
+                    self._tails.pop(seq, None)
+                    continue
+                tail = self._tails.get(seq)
+                if tail is None:
+                    tail = self._tails[seq] = TailSegment(seq, os.path.join(self.directory, segment_name(seq)))
+                tails.append(tail)
+        return parts, tails
+
+    def search(self, query: AuditQuery, after: Optional[str] = None, limit: int = 100) -> Iterator[Dict]:
+        """
+        Up to `limit` matching records in log order (oldest first), each
+        with the "cursor" to pass as `after` for the next page.
+
+        Raises:
+            ValueError: Invalid cursor
+        """
+        after_pos = parse_cursor(after)
+        parts, tails = self._layout()
+        remaining = limit
+
+        # With several workers a busy worker's segment can be older than compiled ones after it
+        sources = sorted([(part_range(os.path.basename(part.path))[0], part) for part in parts]
+                         + [(tail.seq, tail) for tail in tails], key=lambda source: source[0])
+        for _, source in sources:
+            if isinstance(source, AuditPart):
+                for rows in source.scan(query, after_pos):
+                    rows = rows[:remaining]
+                    for record, pos in zip(source.records(rows), source.columns["pos"][rows].tolist()):
+                        yield {**record, "cursor": format_cursor(pos)}
+                    remaining -= len(rows)
+                    if remaining == 0:
+                        return
+                continue
+
+            with self._lock:
+                source.refresh()
+            for pos, record in source.scan(query, after_pos):
+                yield {**record, "cursor": format_cursor(pos)}
+                remaining -= 1
+                if remaining == 0:
+                    return
+
+    def stats(self) -> Dict:
+        parts, tails = self._layout()
+        return {
+            "parts": len(parts),
+            "compiled_records": sum(part.rows for part in parts),
+            "uncompiled_segments": len(tails)
+        }
+
+
+# Shared instance (created on first use)
+_audit_store: Optional[AuditStore] = None
+_audit_store_loaded = False
+
+
+def get_audit_store() -> Optional[AuditStore]:
+    """
+    Get or create the shared audit store with its compactor running (None when AUDIT_LOG=off).
+    """
+    global _audit_store, _audit_store_loaded
+    if not _audit_store_loaded:
+        if os.getenv("AUDIT_LOG", "on").lower() in ("1", "on", "true"):
+            _audit_store = AuditStore.from_env()
+            _audit_store.start()
+        _audit_store_loaded = True
+    return _audit_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile sealed audit log segments into indexed parts")
+    parser.add_argument("--dir", default=os.getenv("AUDIT_LOG_DIR", ".data/audit"))
+    parser.add_argument("--part-rows", type=int, default=int(os.getenv("AUDIT_PART_ROWS", "1000000")))
+    args = parser.parse_args()
+
+    compiled = compact_directory(args.dir, args.part_rows)
+    print(f"{compiled} segment(s) compiled in {args.dir}")
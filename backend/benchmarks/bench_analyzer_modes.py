@@ -0,0 +1,145 @@
+"""
+Benchmark - Conversation Analyzer: Single vs Parallel Scoring
+End-to-end latency and token usage against a latency-simulating mock LLM
+
+Run from backend/:
+    python -m benchmarks.bench_analyzer_modes --runs 3 --token-latency 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import time
+
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+SAMPLE_CONVERSATION = """Rep: Our latest study published in JAMA Cardiology showed 42% lower side effects and 78% adherence at 12 months.
+Dr: What about cost?
+Rep: When we look at total cost of care, patients had 31% fewer cardiovascular events. One prevented hospitalization averaging $48,000 offsets three years of medication cost.
+Dr: Send me the study.
+Rep: I'll email the JAMA study today. Can we schedule 20 minutes next Thursday at 2pm to discuss?"""
+
+DIMENSION_KEYS = {
+    "Compliance": "compliance",
+    "Tone & Professionalism": "tone",
+    "Product Knowledge": "knowledge",
+    "Objection Handling": "objection_handling",
+    "Relationship Building": "relationship",
+    "Call-to-Action": "call_to_action"
+}
+
+
+def _dimension_json(label: str) -> dict:
+    return {
+        "score": 4.5,
+        "color": "green",
+        "justification": (
+            f"The rep's {label.lower()} was strong: claims were tied to the JAMA Cardiology "
+            "study with specific percentages, and the discussion stayed within the approved "
+            "indication while acknowledging the physician's concerns."
+        ),
+        "examples": [
+            "Our latest study published in JAMA Cardiology showed 42% lower side effects",
+            "Can we schedule 20 minutes next Thursday at 2pm to discuss?"
+        ],
+        "dimension": label
+    }
+
+
+def _feedback_json() -> dict:
+    return {
+        "strengths": [
+            "Cited the JAMA Cardiology study with exact adherence and side-effect figures",
+            "Reframed the cost objection around total cost of care with hard numbers",
+            "Closed with a specific date and time for the follow-up"
+        ],
+        "improvements": [
+            "Ask about the physician's current patient mix before presenting data",
+            "Mention the patient assistance program when cost comes up",
+            "Confirm the preferred channel for sending the study"
+        ],
+        "coaching": [
+            {
+                "issue": f"Opportunity {i}",
+                "recommendation": "Open with a question about the practice's statin-intolerant patients.",
+                "example": "Dr. Smith, how many of your patients stop statins because of muscle pain side effects?"
+            }
+            for i in range(1, 4)
+        ],
+        "conversation_summary": (
+            "The rep presented specific efficacy and adherence data, handled a cost objection with "
+            "total-cost-of-care evidence and secured a concrete follow-up meeting."
+        )
+    }
+
+
+def responder(body: dict) -> str:
+    """
+    Reply shaped like the real model output for each analyzer prompt.
+    """
+    prompt = body["messages"][-1]["content"]
+
+    match = re.search(r'Score ONLY the "([^"]+)" dimension', prompt)
+    if match:
+        return json.dumps(_dimension_json(match.group(1)))
+
+    if "sales coach" in prompt:
+        return json.dumps(_feedback_json())
+
+    full = {
+        "scores": {key: _dimension_json(label) for label, key in DIMENSION_KEYS.items()},
+        **_feedback_json(),
+        "overall_score": 4.5,
+        "overall_color": "green"
+    }
+    if body.get("response_format"):
+        return json.dumps(full, indent=2)
+    return "```json\n" + json.dumps(full, indent=2) + "\n```"
+
+
+async def _measure(mode: str, runs: int, server: MockOpenAIServer) -> dict:
+    from agents.conversation_analyzer import analyze_conversation
+
+    server.reset_stats()
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await analyze_conversation(SAMPLE_CONVERSATION, "Sarah", "Dr. Smith", use_cache=False, mode=mode)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "mode": mode,
+        "median_latency_s": statistics.median(latencies),
+        "requests_per_analysis": server.total_requests / runs,
+        "prompt_tokens_per_analysis": server.prompt_tokens / runs,
+        "completion_tokens_per_analysis": server.completion_tokens / runs
+    }
+
+
+async def main(runs: int, latency: float, token_latency: float) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "off"
+
+    with MockOpenAIServer(latency=latency, token_latency=token_latency, responder=responder) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        results = [await _measure(mode, runs, server) for mode in ("single", "parallel")]
+
+    print(f"\nmock LLM: {latency}s to first token, {token_latency * 1000:.0f}ms per output token\n")
+    print(f"{'mode':<10}{'latency s':>11}{'requests':>10}{'prompt tok':>12}{'output tok':>12}{'total tok':>11}")
+    for r in results:
+        total = r["prompt_tokens_per_analysis"] + r["completion_tokens_per_analysis"]
+        print(f"{r['mode']:<10}{r['median_latency_s']:>11.2f}{r['requests_per_analysis']:>10.0f}"
+              f"{r['prompt_tokens_per_analysis']:>12.0f}{r['completion_tokens_per_analysis']:>12.0f}{total:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.4, help="Seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds per output token")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.runs, args.latency, args.token_latency))
@@ -0,0 +1,121 @@
+"""
+Benchmark - Compliance Audit Log: Request-Path Overhead and Group Commit
+Cost of recording a decision per check, synchronous fsync vs the queued group-committed writer
+
+Run from backend/:
+    python -m benchmarks.bench_audit_log --rate 5000 --seconds 3
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.load_backend import percentile
+
+QUERY = "What's the best way to position CardioStatin against generics for cost-conscious physicians?"
+RESPONSE = ("Lead with total cost of care: patients had 31% fewer cardiovascular events, "
+            "and one prevented hospitalization averages $48,000. ") * 4
+BLOCKED = {
+    "status": "BLOCKED",
+    "violation_type": "implicit_off_label",
+    "explanation": "Implicit off-label suggestion",
+    "detected_in": "query",
+    "violations": [{"violation_type": "implicit_off_label", "detected_text": "can be used for",
+                    "start": 21, "end": 36}]
+}
+APPROVED = {"status": "APPROVED", "violation_type": None, "explanation": None, "detected_in": None,
+            "violations": []}
+TIMINGS = {"pre_check": 0.00004, "cache_lookup": 0.00002, "llm": 0.81, "post_check": 0.00006}
+
+
+def drive(record, rate: int, seconds: float) -> Dict:
+    """
+    Call record() at `rate` per second (open loop) and time each call.
+    """
+    latencies: List[float] = []
+    total = int(rate * seconds)
+    start = time.perf_counter()
+    for i in range(total):
+        # Pace to the target rate; a late caller does not catch up with a burst
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        call_start = time.perf_counter()
+        record(BLOCKED if i % 20 == 0 else APPROVED, f"rep{i % 500}")
+        latencies.append(time.perf_counter() - call_start)
+    return {"latencies": latencies, "elapsed": time.perf_counter() - start}
+
+
+def sync_fsync_recorder(directory: str):
+    """
+    Baseline: what writing each record synchronously would cost.
+    """
+    from audit.log import AuditLog
+
+    handle = open(os.path.join(directory, "sync.jsonl"), "ab")
+
+    def record(compliance: Dict, user_id: str) -> None:
+        entry = AuditLog._to_record(time.time(), "query", compliance, user_id, None, QUERY, RESPONSE, TIMINGS)
+        handle.write((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+        handle.flush()
+        os.fsync(handle.fileno())
+
+    return record, handle
+
+
+def main(rate: int, seconds: float) -> None:
+    from audit.log import AuditLog
+    from compliance.off_label_detector import ComplianceGuardian
+
+    guardian = ComplianceGuardian()
+    check_start = time.perf_counter()
+    for _ in range(2000):
+        guardian.check_compliance(QUERY, RESPONSE)
+    check_cost = (time.perf_counter() - check_start) / 2000
+
+    print(f"\n{rate} checks/s for {seconds}s (compliance check itself: {check_cost * 1e6:.0f} us)\n")
+    print(f"{'recording':<26}{'p50 us':>9}{'p99 us':>9}{'max us':>10}{'achieved/s':>12}"
+          f"{'fsyncs':>8}{'per fsync':>11}{'dropped':>9}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Synchronous write + fsync per record, capped so a slow disk does not stall the run
+        record, handle = sync_fsync_recorder(directory)
+        sync_seconds = min(seconds, 1.0)
+        result = drive(record, rate, sync_seconds)
+        handle.close()
+        lat = result["latencies"]
+        print(f"{'sync write + fsync':<26}{percentile(lat, 50) * 1e6:>9.1f}{percentile(lat, 99) * 1e6:>9.1f}"
+              f"{max(lat) * 1e6:>10.0f}{len(lat) / result['elapsed']:>12.0f}{len(lat):>8}{1:>11}{0:>9}")
+
+        for label, overflow, queue_size in (("queued, group commit", "drop", 10000),
+                                            ("  tiny queue, drop", "drop", 64),
+                                            ("  tiny queue, block", "block", 64)):
+            audit = AuditLog(os.path.join(directory, label.strip().replace(" ", "_").replace(",", "")),
+                             queue_size=queue_size, overflow=overflow, block_timeout=1.0)
+            audit.start()
+
+            def record(compliance: Dict, user_id: str) -> None:
+                audit.record("query", compliance, user_id=user_id, product_id="cardiostatin",
+                             query=QUERY, response=RESPONSE, timings=TIMINGS)
+
+            result = drive(record, rate if queue_size > 64 else rate * 10, seconds)
+            audit.flush()
+            audit.close()
+            lat = result["latencies"]
+            stats = audit.stats()
+            print(f"{label:<26}{percentile(lat, 50) * 1e6:>9.1f}{percentile(lat, 99) * 1e6:>9.1f}"
+                  f"{max(lat) * 1e6:>10.0f}{len(lat) / result['elapsed']:>12.0f}{stats['commits']:>8}"
+                  f"{stats['records_per_commit']:>11.1f}{stats['dropped']:>9}")
+    print("\nTiny-queue rows are driven at 10x the rate to overflow the queue.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=int, default=5000, help="Compliance checks per second")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    main(args.rate, args.seconds)
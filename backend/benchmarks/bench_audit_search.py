@@ -0,0 +1,278 @@
+"""
+Benchmark - Audit Search: Indexed Queries over 100M Compliance Decisions
+Latency of /api/audit/search queries against generated columnar parts, vs scanning without indexes
+
+Run from backend/:
+    python -m benchmarks.bench_audit_search --records 100000000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+PRODUCTS = ["cardiostatin"] + [f"product{i:02d}" for i in range(1, 12)]
+PIPELINES = ["query", "query_stream"]
+STAGES = ["pre_check", "cache_lookup", "llm", "post_check"]
+# Matched text per violation type, as the detector reports it
+SPAN_TEXTS = {
+    "explicit_off_label": ["off-label", "off label", "unapproved use", "investigational use"],
+    "implicit_off_label": ["can be used for", "Can be used for", "some doctors use", "might also help with",
+                           "doctors have found", "some physicians prescribe"],
+    "unapproved_indication": ["migraine", "weight loss", "pediatric use", "pregnancy", "headache prevention"]
+}
+VIOLATIONS = [None, "explicit_off_label", "implicit_off_label", "unapproved_indication"]
+BLOCKED_RATE = 0.05
+SEGMENTS_PER_PART = 8
+YEAR = 365 * 86400
+
+
+def generate_part(rng: np.random.Generator, index: int, rows: int, users: int,
+                  first_ts: float, last_ts: float) -> Tuple[Dict[str, np.ndarray], Dict[str, list], int, int]:
+    """
+    One part's columns, shaped like compiled audit log segments.
+    """
+    first_seq = index * SEGMENTS_PER_PART + 1
+    segment_rows = -(-rows // SEGMENTS_PER_PART)
+    row = np.arange(rows, dtype=np.int64)
+    pos = ((first_seq + row // segment_rows) << 32) | (row % segment_rows)
+    ts = np.sort(rng.uniform(first_ts, last_ts, rows))
+
+    blocked = rng.random(rows) < BLOCKED_RATE
+    violation = np.where(blocked, rng.choice([1, 2, 3], rows, p=[0.3, 0.5, 0.2]), 0).astype(np.uint8)
+    # None, query, response: most violations are caught in the query
+    detected_in = np.where(blocked, np.where(rng.random(rows) < 0.8, 1, 2), 0).astype(np.uint8)
+    in_query = detected_in == 1
+
+    texts = [text for violation_type in VIOLATIONS[1:] for text in SPAN_TEXTS[violation_type]]
+    text_base = np.cumsum([0] + [len(SPAN_TEXTS[v]) for v in VIOLATIONS[1:]])
+    span_counts = np.where(blocked, rng.choice([1, 2], rows, p=[0.8, 0.2]), 0)
+    span_rows = np.repeat(row, span_counts)
+    span_type = violation[span_rows]
+    choices = np.array([len(SPAN_TEXTS[VIOLATIONS[v]]) if v else 1 for v in range(4)])[span_type]
+    span_text = (text_base[span_type - 1] + (rng.random(len(span_rows)) * choices).astype(np.int64)).astype(np.int32)
+    span_start = rng.integers(0, 400, len(span_rows), dtype=np.int32)
+    span_lengths = np.array([len(text) for text in texts], dtype=np.int32)[span_text]
+
+    # A query blocked before generation only has the pre-check timed
+    timing_counts = np.where(in_query, 1, len(STAGES))
+    timing_stage = _ranks(timing_counts).astype(np.uint8)
+    timing_seconds = np.where(timing_stage == 2, rng.lognormal(-0.2, 0.4, len(timing_stage)),
+                              rng.uniform(2e-5, 8e-5, len(timing_stage))).astype(np.float32)
+
+    response_hash = np.frombuffer(rng.bytes(rows * 32), dtype=np.uint8).reshape(rows, 32).copy()
+    response_hash[in_query] = 0
+    columns = {
+        "pos": pos,
+        "ts": ts,
+        "id": np.frombuffer(rng.bytes(rows * 16), dtype=np.uint8).reshape(rows, 16),
+        "pipeline": (rng.random(rows) < 0.3).astype(np.uint8),
+        "status": blocked.astype(np.uint8),
+        "violation_type": violation,
+        "detected_in": detected_in,
+        "product_id": np.minimum(rng.zipf(1.6, rows) - 1, len(PRODUCTS) - 1).astype(np.uint16),
+        "user_id": rng.integers(0, users, rows, dtype=np.int32),
+        "query_sha256": np.frombuffer(rng.bytes(rows * 32), dtype=np.uint8).reshape(rows, 32),
+        "response_sha256": response_hash,
+        "span_offsets": np.concatenate([[0], np.cumsum(span_counts)]).astype(np.int64),
+        "span_type": span_type,
+        "span_text": span_text,
+        "span_start": span_start,
+        "span_end": span_start + span_lengths,
+        "timing_offsets": np.concatenate([[0], np.cumsum(timing_counts)]).astype(np.int64),
+        "timing_stage": timing_stage,
+        "timing_seconds": timing_seconds
+    }
+    dictionaries = {
+        "pipeline": PIPELINES,
+        "status": ["APPROVED", "BLOCKED"],
+        "violation_type": VIOLATIONS,
+        "detected_in": [None, "query", "response"],
+        "product_id": PRODUCTS,
+        "user_id": [f"rep{i:05d}" for i in range(users)],
+        "texts": texts,
+        "stages": STAGES
+    }
+    last_seq = int(pos[-1] >> 32)
+    return columns, dictionaries, first_seq, last_seq
+
+
+def _ranks(counts: np.ndarray) -> np.ndarray:
+    """
+    0..count-1 for each count, concatenated.
+    """
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return np.arange(int(counts.sum())) - np.repeat(starts, counts)
+
+
+def generate(directory: str, records: int, part_rows: int, users: int, seed: int) -> float:
+    """
+    Write parts covering the last year, reusing a previous run's.
+
+    Returns:
+        Seconds spent generating
+    """
+    from audit.store import part_name, write_part
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    parts = -(-records // part_rows)
+    end = time.time()
+    start = time.perf_counter()
+    for index in range(parts):
+        first_seq = index * SEGMENTS_PER_PART + 1
+        if os.path.isdir(os.path.join(directory, part_name(first_seq, first_seq + SEGMENTS_PER_PART - 1))):
+            continue
+        rows = min(part_rows, records - index * part_rows)
+        first_ts = end - YEAR + YEAR * index / parts
+        columns, dictionaries, first_seq, last_seq = generate_part(
+            rng, index, rows, users, first_ts, first_ts + YEAR / parts)
+        write_part(os.path.join(directory, part_name(first_seq, last_seq)), columns, dictionaries, first_seq, last_seq)
+        print(f"  generated part {index + 1}/{parts}", end="\r", flush=True)
+    print()
+    return time.perf_counter() - start
+
+
+def drop_page_cache() -> bool:
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def all_pages(store, query, limit: int) -> Tuple[int, int]:
+    """
+    Follow cursors to the last page.
+
+    Returns:
+        (records, pages)
+    """
+    total = pages = 0
+    cursor = None
+    while True:
+        page = list(store.search(query, after=cursor, limit=limit))
+        pages += 1
+        total += len(page)
+        if len(page) < limit:
+            return total, pages
+        cursor = page[-1]["cursor"]
+
+
+def timed(run: Callable[[], object], repeats: int) -> Tuple[float, float, object]:
+    """
+    First run, then the median of `repeats` more (page cache and part metadata warm).
+    """
+    start = time.perf_counter()
+    result = run()
+    first = time.perf_counter() - start
+    warm = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        warm.append(time.perf_counter() - start)
+    return first, statistics.median(warm), result
+
+
+def json_scan_rate(sample: List[Dict], user_id: str) -> float:
+    """
+    Records per second for filtering JSON lines in Python (grep-the-log baseline).
+    """
+    lines = [json.dumps(record, separators=(",", ":")) for record in sample]
+    start = time.perf_counter()
+    hits = 0
+    for line in lines:
+        record = json.loads(line)
+        if record["user_id"] == user_id and record["status"] == "BLOCKED":
+            hits += 1
+    return len(lines) / (time.perf_counter() - start)
+
+
+def main(directory: str, records: int, part_rows: int, users: int, repeats: int, seed: int) -> None:
+    from audit.store import AuditQuery, AuditStore, format_cursor
+
+    print(f"\nGenerating {records:,} records in {directory} ...")
+    generated = generate(directory, records, part_rows, users, seed)
+    size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+    print(f"  {generated:.0f}s generating (0 = reused), {size / 1e9:.1f} GB on disk, "
+          f"{size / records:.0f} bytes/record")
+
+    cold_cache = drop_page_cache()
+    store = AuditStore(directory, compact_interval=0)
+    start = time.perf_counter()
+    stats = store.stats()
+    opened = time.perf_counter() - start
+    print(f"  {stats['parts']} parts, {stats['compiled_records']:,} records; "
+          f"reading part metadata: {opened * 1000:.0f} ms\n")
+
+    now = time.time()
+    quarter = now - YEAR / 4
+    user = f"rep{min(1234, users - 1):05d}"
+    parts, _ = store._layout()
+    middle = parts[len(parts) // 2]
+    middle_cursor = format_cursor(int(middle.columns["pos"][middle.rows // 2]))
+
+    queries = [
+        ("BLOCKED for one rep, last quarter (all pages)",
+         lambda: all_pages(store, AuditQuery(user_id=user, status="BLOCKED", start=quarter), 100)),
+        ("one rep, whole year (all pages of 1000)",
+         lambda: all_pages(store, AuditQuery(user_id=user), 1000)),
+        ("implicit_off_label ~ 'can be used for', page 1",
+         lambda: len(list(store.search(AuditQuery(violation_type="implicit_off_label", text="can be used for"))))),
+        ("  same, page at mid-history cursor",
+         lambda: len(list(store.search(AuditQuery(violation_type="implicit_off_label", text="can be used for"),
+                                       after=middle_cursor)))),
+        ("'migraine' in the last 7 days (all pages)",
+         lambda: all_pages(store, AuditQuery(text="migraine", start=now - 7 * 86400), 1000)),
+        ("product05, one day a month ago, page 1",
+         lambda: len(list(store.search(AuditQuery(product_id="product05", start=now - 30 * 86400,
+                                                  end=now - 29 * 86400))))),
+        ("BLOCKED, whole log, page at mid-history cursor",
+         lambda: len(list(store.search(AuditQuery(status="BLOCKED"), after=middle_cursor))))
+    ]
+
+    print(f"{'query':<50}{'first ms':>10}{'warm ms':>10}{'records':>10}{'pages':>7}")
+    for label, run in queries:
+        first, warm, result = timed(run, repeats)
+        found, pages = result if isinstance(result, tuple) else (result, 1)
+        print(f"{label:<50}{first * 1000:>10.1f}{warm * 1000:>10.1f}{found:>10,}{pages:>7}")
+
+    # Baselines: the same rep query without secondary indexes
+    def column_scan():
+        hits = 0
+        for part in parts:
+            code = part.codes["user_id"].get(user)
+            blocked = part.codes["status"]["BLOCKED"]
+            mask = (part.columns["user_id"] == code) & (part.columns["status"] == blocked) & \
+                (part.columns["ts"] >= quarter)
+            hits += int(mask.sum())
+        return hits
+
+    first, warm, hits = timed(column_scan, 1)
+    print(f"{'  baseline: columnar scan, no index':<50}{first * 1000:>10.1f}{warm * 1000:>10.1f}{hits:>10,}{'':>7}")
+    sample = parts[0].records(np.arange(min(100000, parts[0].rows)))
+    rate = json_scan_rate(sample, user)
+    print(f"{'  baseline: parse + filter JSON lines':<50}{records / rate * 1000:>10.0f}{'':>10}{'':>10}{'':>7}")
+
+    print(f"\nfirst = first run after {'dropping the page cache' if cold_cache else 'opening the store'}; "
+          f"warm = median of {repeats} repeats.")
+    print(f"JSON-lines baseline extrapolated from {len(sample):,} records at {rate:,.0f} records/s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=100_000_000)
+    parser.add_argument("--part-rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20000, help="Distinct reps")
+    parser.add_argument("--dir", default=".data/bench/audit-search", help="Generated parts (reused across runs)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    main(args.dir, args.records, args.part_rows, args.users, args.repeats, args.seed)
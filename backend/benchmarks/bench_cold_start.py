@@ -0,0 +1,162 @@
+"""
+Benchmark - Cold Start: Import Time and Time to First Response
+Fresh processes: importing main.py, then uvicorn from spawn to the first /health and the first /api/query, checked against a budget
+
+Run from backend/:
+    python -m benchmarks.bench_cold_start --runs 5 --products 1000
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.load_backend import QUERIES, mock_responder
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+BACKEND_PORT = 8027
+
+# Medians the default configuration must stay under (ms), on the 1-CPU
+# machine the README numbers come from; a failed budget exits with status 1
+BUDGETS = {
+    "import_ms": 800,
+    "ready_ms": 1200,
+    "first_query_ms": 1800,
+}
+
+_IMPORT_MAIN = "import time; start = time.perf_counter(); import main; print((time.perf_counter() - start) * 1000)"
+
+
+def configs(products: int, rules_dir: Optional[str]) -> Dict[str, Dict[str, str]]:
+    """
+    Name -> startup environment for the server.
+    """
+    result = {
+        "default": {},
+        "warmup 2": {"OPENAI_WARMUP_CONNECTIONS": "2"},
+    }
+    if rules_dir:
+        result[f"{products} products, compiled"] = {"COMPLIANCE_RULES_DIR": rules_dir, "COMPLIANCE_RULES_CACHE": ""}
+        result[f"{products} products, precompiled"] = {"COMPLIANCE_RULES_DIR": rules_dir}
+    return result
+
+
+def measure_import(env: Dict[str, str]) -> float:
+    output = subprocess.run([sys.executable, "-c", _IMPORT_MAIN], env=env, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_start(env: Dict[str, str]) -> Dict[str, float]:
+    """
+    Spawn the server, poll /health until it answers, then send one query.
+    """
+    url = f"http://127.0.0.1:{BACKEND_PORT}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(BACKEND_PORT),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL)
+    try:
+        # A bare connect is cheap to retry; an HTTP client per attempt would take CPU from the server
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with {server.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", BACKEND_PORT), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.005)
+        httpx.get(f"{url}/health", timeout=5).raise_for_status()
+        ready = time.perf_counter()
+        response = httpx.post(f"{url}/api/query", json={"query": QUERIES[0], "user_id": "cold-start"}, timeout=30)
+        response.raise_for_status()
+        done = time.perf_counter()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {
+        "ready_ms": (ready - start) * 1000,
+        "first_query_ms": (done - start) * 1000,
+        "query_ms": (done - ready) * 1000,
+    }
+
+
+def measure(env: Dict[str, str], runs: int) -> Dict[str, float]:
+    """
+    Medians over `runs` fresh processes, after one unmeasured start that
+    writes the compiled rules cache and warms the OS page cache.
+    """
+    measure_start(env)
+    samples: Dict[str, List[float]] = {"import_ms": []}
+    for _ in range(runs):
+        samples["import_ms"].append(measure_import(env))
+        for name, value in measure_start(env).items():
+            samples.setdefault(name, []).append(value)
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def main(runs: int, products: int, output: Optional[str]) -> None:
+    from benchmarks.bench_rule_registry import write_products
+
+    with tempfile.TemporaryDirectory() as directory:
+        rules_dir = None
+        if products > 1:
+            rules_dir = os.path.join(directory, "rules")
+            os.makedirs(rules_dir)
+            write_products(rules_dir, products)
+
+        mock = MockOpenAIServer(port=8017, latency="fixed:0.05", responder=mock_responder, seed=0)
+        print(f"\nMedian of {runs} fresh processes per row; 50ms mock LLM; {os.cpu_count()} CPU(s)\n")
+        print(f"{'startup':<28}{'import main':>12}{'/health':>10}{'1st query':>11}{'query alone':>13}")
+        results = {}
+        with mock:
+            for name, config in configs(products, rules_dir).items():
+                state = os.path.join(directory, name.replace(" ", "_").replace(",", ""))
+                env = {
+                    **os.environ,
+                    "OPENAI_API_KEY": "sk-mock",
+                    "OPENAI_BASE_URL": mock.base_url,
+                    "LOG_LEVEL": "WARNING",
+                    "COMPLIANCE_RULES_CACHE": os.path.join(state, "compliance_rules.cache"),
+                    "RESPONSE_CACHE_BACKEND": "off",
+                    "ANALYSIS_CACHE_PATH": os.path.join(state, "analysis.sqlite3"),
+                    "AUDIT_LOG_DIR": os.path.join(state, "audit"),
+                    "JOBS_DB_PATH": os.path.join(state, "jobs.sqlite3"),
+                    "SCORECARD_DB_PATH": os.path.join(state, "scorecards.sqlite3"),
+                    "SCORECARD_SNAPSHOT_DIR": os.path.join(state, "scorecards"),
+                    **config,
+                }
+                result = results[name] = measure(env, runs)
+                print(f"{name:<28}{result['import_ms']:>10.0f}ms{result['ready_ms']:>8.0f}ms"
+                      f"{result['first_query_ms']:>9.0f}ms{result['query_ms']:>11.0f}ms")
+
+    print("\n/health and 1st query: from spawning the process; query alone: the first query's own latency.\n")
+    over = [name for name, budget in BUDGETS.items() if results["default"][name] > budget]
+    for name, budget in BUDGETS.items():
+        value = results["default"][name]
+        print(f"budget {name:<16}{value:>7.0f} / {budget} ms  {'OVER' if name in over else 'ok'}")
+    if output:
+        with open(output, "w") as f:
+            json.dump({"budgets": BUDGETS, "results": results}, f, indent=2)
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per configuration")
+    parser.add_argument("--products", type=int, default=0,
+                        help="Also start with this many product rule files, compiled vs precompiled")
+    parser.add_argument("--output", help="Write the medians and budgets as JSON")
+    args = parser.parse_args()
+
+    main(args.runs, args.products, args.output)
@@ -0,0 +1,146 @@
+"""
+Benchmark - Off-Label Detector Throughput vs Rule Count
+Compares the compiled single-pass matcher with the original per-rule scan
+
+Run from backend/:
+    python -m benchmarks.bench_detector --scales 1 10 100 1000
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Dict, List
+
+from compliance.off_label_detector import OffLabelDetector
+from compliance.registry import ProductRules, get_rule_registry
+from prompts.sales_agent import CARDIO_STATIN_DATA
+
+FILLER_WORDS = ["some", "might", "doctors", "patients", "can", "in", "for", "therapy"]
+
+
+def legacy_detect(text: str, rules: Dict[str, List[str]]) -> Dict:
+    """
+    The original OffLabelDetector.detect: one scan per rule, first hit wins.
+    """
+    text_lower = text.lower()
+
+    for keyword in rules["keywords"]:
+        if keyword in text_lower:
+            return {"is_violation": True, "violation_type": "explicit_off_label", "detected_text": keyword}
+
+    for pattern in rules["patterns"]:
+        match = re.search(pattern, text_lower)
+        if match:
+            return {"is_violation": True, "violation_type": "implicit_off_label", "detected_text": match.group(0)}
+
+    for condition in rules["conditions"]:
+        if condition in text_lower:
+            if not any(phrase in text_lower for phrase in rules["phrases"]):
+                return {"is_violation": True, "violation_type": "unapproved_indication", "detected_text": condition}
+
+    return {"is_violation": False, "violation_type": None, "detected_text": None}
+
+
+def scaled_rules(scale: int) -> Dict[str, List[str]]:
+    """
+    The CardioStatin rules plus synthetic ones, `scale` times as many in total.
+    """
+    base = get_rule_registry().get("cardiostatin")
+    rules = {
+        "keywords": list(base.off_label_keywords),
+        "patterns": list(base.implicit_patterns),
+        "conditions": list(base.off_label_conditions),
+        "phrases": list(base.approved_context_phrases)
+    }
+    rng = random.Random(scale)
+    for i in range(len(rules["keywords"]) * (scale - 1)):
+        rules["keywords"].append(f"unapproved claim {i} {rng.choice(FILLER_WORDS)}")
+    for i in range(len(rules["patterns"]) * (scale - 1)):
+        rules["patterns"].append(f"{rng.choice(FILLER_WORDS)} variant{i} (?:works|helps) for")
+    for i in range(len(rules["conditions"]) * (scale - 1)):
+        rules["conditions"].append(f"condition-{i}")
+    return rules
+
+
+def build_detector(rules: Dict[str, List[str]]) -> OffLabelDetector:
+    return OffLabelDetector(ProductRules(
+        "scaled",
+        off_label_keywords=rules["keywords"],
+        implicit_patterns=rules["patterns"],
+        off_label_conditions=rules["conditions"],
+        approved_context_phrases=rules["phrases"]
+    ))
+
+
+def sample_texts(count: int) -> List[str]:
+    """
+    Clean, response-sized texts (the common case: every rule must be checked).
+    """
+    lines = [line.strip() for line in CARDIO_STATIN_DATA.splitlines() if line.strip()]
+    rng = random.Random(0)
+    return [" ".join(rng.choices(lines, k=25)) for _ in range(count)]
+
+
+def throughput(fn, texts: List[str], min_seconds: float) -> float:
+    done = 0
+    start = time.perf_counter()
+    while True:
+        for text in texts:
+            fn(text)
+            done += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds and done >= 3:
+                return done / elapsed
+
+
+def check_parity() -> None:
+    """
+    The headline result must match the original implementation.
+    """
+    rules = scaled_rules(1)
+    detector = build_detector(rules)
+    cases = [
+        "How do I handle cost objections?",
+        "Can I mention off-label uses?",
+        "Some doctors use it for migraine prevention",
+        "It might also help with weight loss in practice",
+        "CardioStatin is not approved for pregnancy",
+        "Is it safe for children?",
+        "Doctors have found it can be used for headache prevention",
+    ] + sample_texts(50)
+    for text in cases:
+        old = legacy_detect(text, rules)
+        new = detector.detect(text)
+        for key in ("is_violation", "violation_type", "detected_text"):
+            assert old[key] == new[key], (text, old, new)
+    print(f"parity: {len(cases)} texts match the original detector")
+
+
+def main(scales: List[int], min_seconds: float) -> None:
+    check_parity()
+    texts = sample_texts(200)
+    print(f"\ntext length ~{sum(map(len, texts)) // len(texts)} chars\n")
+    print(f"{'scale':>6}{'rules':>8}{'compile ms':>12}{'original t/s':>15}{'compiled t/s':>15}{'speedup':>9}")
+
+    for scale in scales:
+        rules = scaled_rules(scale)
+        total_rules = sum(len(v) for v in rules.values())
+
+        start = time.perf_counter()
+        detector = build_detector(rules)
+        detector.matcher
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        original = throughput(lambda t: legacy_detect(t, rules), texts, min_seconds)
+        compiled = throughput(detector.detect, texts, min_seconds)
+        print(f"{scale:>5}x{total_rules:>8}{compile_ms:>12.1f}{original:>15.0f}{compiled:>15.0f}{compiled / original:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--seconds", type=float, default=1.0, help="Minimum run time per measurement")
+    args = parser.parse_args()
+
+    main(args.scales, args.seconds)
@@ -0,0 +1,108 @@
+"""
+Benchmark - Bulk Analysis Job Throughput
+Conversations per minute vs JOB_CONCURRENCY against a mock LLM, plus a resume check
+
+Run from backend/:
+    python -m benchmarks.bench_jobs --conversations 48 --concurrency 1 2 4 8 16 32
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+from benchmarks.bench_analyzer_modes import SAMPLE_CONVERSATION, responder
+from benchmarks.mock_openai_server import MockOpenAIServer
+from jobs.runner import JobRunner
+from jobs.store import JobStore
+
+
+def _items(count: int) -> list:
+    return [
+        (f"call-{i}", {
+            "conversation": f"{SAMPLE_CONVERSATION}\nRep: Reference {i}.",
+            "rep_name": "Sarah",
+            "doctor_name": "Dr. Smith"
+        })
+        for i in range(count)
+    ]
+
+
+async def _wait(store: JobStore, job_id: str, until: float = 1.0) -> dict:
+    while True:
+        job = store.get_job(job_id)
+        if job["status"] == "completed" or job["progress"] >= until:
+            return job
+        await asyncio.sleep(0.05)
+
+
+async def measure(concurrency: int, count: int, directory: str) -> float:
+    store = JobStore(os.path.join(directory, f"jobs-{concurrency}.sqlite3"))
+    runner = JobRunner(store, concurrency=concurrency)
+    await runner.start()
+
+    start = time.perf_counter()
+    job_id = runner.submit(_items(count))
+    await _wait(store, job_id)
+    elapsed = time.perf_counter() - start
+
+    await runner.stop()
+    return count * 60 / elapsed
+
+
+async def check_resume(count: int, directory: str, server: MockOpenAIServer) -> None:
+    """
+    Stop the runner halfway, start a fresh one on the same store, and count LLM calls.
+    """
+    path = os.path.join(directory, "jobs-resume.sqlite3")
+    concurrency = 4
+    server.reset_stats()
+
+    runner = JobRunner(JobStore(path), concurrency=concurrency)
+    await runner.start()
+    job_id = runner.submit(_items(count))
+    before = await _wait(runner.store, job_id, until=0.5)
+    await runner.stop()
+
+    store = JobStore(path)
+    runner = JobRunner(store, concurrency=concurrency)
+    await runner.start()
+    after = await _wait(store, job_id)
+    await runner.stop()
+
+    print(f"\nresume: {before['done']}/{count} done at interruption, {after['done']}/{count} after restart, "
+          f"{server.total_requests} LLM calls (at most {count + concurrency} expected)")
+
+
+async def main(count: int, concurrencies: List[int], latency: float, llm_limit: int) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "off"
+    # The shared client's in-flight cap stands in for the provider's rate limit
+    os.environ["OPENAI_MAX_CONCURRENCY"] = str(llm_limit)
+
+    with MockOpenAIServer(latency=latency, responder=responder) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+        print(f"\n{count} conversations, {latency}s mock LLM latency, LLM concurrency limit {llm_limit}\n")
+        print(f"{'concurrency':>12}{'conv/min':>10}{'speedup':>9}")
+        baseline = None
+        for concurrency in concurrencies:
+            rate = await measure(concurrency, count, directory)
+            baseline = baseline or rate
+            print(f"{concurrency:>12}{rate:>10.0f}{rate / baseline:>8.1f}x")
+
+        await check_resume(count, directory, server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--conversations", type=int, default=48)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--latency", type=float, default=0.25, help="Seconds per mock completion")
+    parser.add_argument("--llm-limit", type=int, default=16, help="OPENAI_MAX_CONCURRENCY")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.conversations, args.concurrency, args.latency, args.llm_limit))
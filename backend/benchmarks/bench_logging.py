@@ -0,0 +1,132 @@
+"""
+Benchmark - Structured Logging: Request Throughput Under Load
+Synchronous full-text log lines vs the queued JSON writer (and sampling), with stdout read by a slow log shipper
+
+Run from backend/:
+    python -m benchmarks.bench_logging --concurrency 64 --duration 10 --sink-kbps 0,16,4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# Name -> logging environment for the server process
+CONFIGS: Dict[str, Dict[str, str]] = {
+    # Every line formatted and written in the request's thread, query text in full:
+    # what print() did, with the unbuffered stdout containers run with
+    "sync, full text": {"LOG_QUEUE_SIZE": "0", "LOG_QUERY_TEXT": "full"},
+    "queued, hashed": {"LOG_QUEUE_SIZE": "10000", "LOG_QUERY_TEXT": "hash"},
+    "queued, hashed, 10% sampled": {"LOG_QUEUE_SIZE": "10000", "LOG_QUERY_TEXT": "hash", "LOG_SAMPLE_RATE": "0.1"},
+}
+
+
+class Sink(threading.Thread):
+    """
+    Reads the server's stdout at up to `kbps` KB/s (0: as fast as it
+    comes), like a log shipper that has fallen behind.
+    """
+
+    def __init__(self, stream, kbps: float):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.kbps = kbps
+        self.bytes = 0
+        self.lines = 0
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        while True:
+            chunk = self.stream.read1(65536)
+            if not chunk:
+                return
+            self.bytes += len(chunk)
+            self.lines += chunk.count(b"\n")
+            if self.kbps:
+                # Stay at the target rate
+                delay = start + self.bytes / (self.kbps * 1024) - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+
+def run_server(config: str, concurrency: int, duration: float, output: str) -> None:
+    """
+    Child process: serve the app against the mock LLM and drive it.
+    """
+    import asyncio
+
+    from benchmarks.load_backend import BackendServer, LoopLagMonitor, mock_responder, run_level
+    from benchmarks.mock_openai_server import MockOpenAIServer
+
+    mock = MockOpenAIServer(port=8012, latency="fixed:0.05", responder=mock_responder, seed=0)
+    with mock:
+        os.environ["OPENAI_BASE_URL"] = mock.base_url
+        monitor = LoopLagMonitor()
+        with BackendServer(8022, monitor) as backend:
+            result = asyncio.run(run_level(backend.url, "query", concurrency, duration, monitor))
+        from observability.logs import configure_logging
+        result["log"] = configure_logging().stats()
+    with open(output, "w") as f:
+        json.dump(result, f)
+
+
+def measure(config: str, concurrency: int, duration: float, kbps: float) -> Tuple[Dict, Sink]:
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "result.json")
+        env = {
+            **os.environ,
+            **CONFIGS[config],
+            "PYTHONUNBUFFERED": "1",
+            "OPENAI_API_KEY": "sk-mock",
+            "RESPONSE_CACHE_BACKEND": "off",
+            "AUDIT_LOG_DIR": os.path.join(directory, "audit"),
+            "JOBS_DB_PATH": os.path.join(directory, "jobs.sqlite3"),
+            "SCORECARD_DB_PATH": os.path.join(directory, "scorecards.sqlite3"),
+            "SCORECARD_SNAPSHOT_DIR": os.path.join(directory, "scorecards"),
+        }
+        child = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_logging", "--child", config,
+             "--concurrency", str(concurrency), "--duration", str(duration), "--output", output],
+            stdout=subprocess.PIPE, env=env)
+        sink = Sink(child.stdout, kbps)
+        sink.start()
+        # A throttled sink may still be draining after the load stops
+        child.wait()
+        sink.join()
+        with open(output) as f:
+            return json.load(f), sink
+
+
+def main(concurrency: int, duration: float, sinks: List[float]) -> None:
+    print(f"\nPOST /api/query, {concurrency} concurrent users, {duration:.0f}s per run, 50ms mock LLM\n")
+    print(f"{'stdout read at':<16}{'logging':<30}{'req/s':>8}{'p50 ms':>8}{'p99 ms':>8}"
+          f"{'lag max ms':>12}{'lines':>9}{'KB/req':>8}{'dropped':>9}{'queued':>8}")
+    for kbps in sinks:
+        for config in CONFIGS:
+            result, sink = measure(config, concurrency, duration, kbps)
+            label = f"{kbps:.0f} KB/s" if kbps else "unthrottled"
+            print(f"{label:<16}{config:<30}{result['throughput_rps']:>8.1f}{result['latency_p50_ms']:>8.0f}"
+                  f"{result['latency_p99_ms']:>8.0f}{result['loop_lag_max_ms']:>12.1f}{sink.lines:>9,}"
+                  f"{sink.bytes / 1024 / max(1, result['requests']):>8.2f}{result['log']['dropped']:>9,}"
+                  f"{result['log']['queued']:>8,}")
+    print("\nlines: log lines the sink read; queued: still waiting for the writer when the load stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    parser.add_argument("--sink-kbps", default="0,16,4", help="Rates stdout is read at (0: unthrottled)")
+    parser.add_argument("--child", choices=list(CONFIGS), help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_server(args.child, args.concurrency, args.duration, args.output)
+    else:
+        main(args.concurrency, args.duration, [float(kbps) for kbps in args.sink_kbps.split(",")])
@@ -0,0 +1,80 @@
+"""
+Benchmark - Long Transcript Analysis
+Single-prompt vs windowed (map-reduce) latency as recorded calls get longer
+
+Run from backend/:
+    python -m benchmarks.bench_long_transcripts --minutes 5 15 30 60
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+from benchmarks.bench_analyzer_modes import responder
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+EXCHANGE = [
+    "Rep: Dr. Smith, our JAMA Cardiology study showed 42% lower side effects and 78% adherence at 12 months in patient group {i}.",
+    "Dr. Smith: How does that compare with what my patients are on now, and what about cost for group {i}?",
+    "Rep: Total cost of care fell because patients had 31% fewer cardiovascular events; the assistance program covers 80% of copays.",
+    "Dr. Smith: I'll think about it. Send me the data for group {i}."
+]
+# Roughly 150 spoken words per minute, ~6 characters per word
+CHARS_PER_MINUTE = 900
+
+
+def build_transcript(minutes: int) -> str:
+    lines = []
+    i = 0
+    while sum(map(len, lines)) < minutes * CHARS_PER_MINUTE:
+        lines.extend(line.format(i=i) for line in EXCHANGE)
+        i += 1
+    lines.append("Rep: Can we schedule 20 minutes next Thursday at 2pm to go through it?")
+    return "\n".join(lines)
+
+
+async def measure(transcript: str, mode: str, server: MockOpenAIServer) -> dict:
+    from agents.conversation_analyzer import analyze_conversation
+
+    server.reset_stats()
+    start = time.perf_counter()
+    await analyze_conversation(transcript, "Sarah", "Dr. Smith", use_cache=False, mode=mode)
+    return {
+        "seconds": time.perf_counter() - start,
+        "requests": server.total_requests,
+        "prompt_tokens": server.prompt_tokens
+    }
+
+
+async def main(minutes_list: List[int], latency: float, prompt_token_latency: float) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "off"
+
+    with MockOpenAIServer(latency=latency, prompt_token_latency=prompt_token_latency,
+                          token_latency=0.002, responder=responder) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        from agents.conversation_analyzer import WINDOW_CHARS
+
+        print(f"\nmock LLM: {latency}s base, {prompt_token_latency * 1000:.2f}ms per prompt token; "
+              f"window {WINDOW_CHARS} chars\n")
+        print(f"{'minutes':>8}{'chars':>9}{'single s':>10}{'windowed s':>12}{'windows':>9}"
+              f"{'single tok':>12}{'windowed tok':>14}")
+        for minutes in minutes_list:
+            transcript = build_transcript(minutes)
+            single = await measure(transcript, "single", server)
+            windowed = await measure(transcript, "windowed", server)
+            print(f"{minutes:>8}{len(transcript):>9}{single['seconds']:>10.2f}{windowed['seconds']:>12.2f}"
+                  f"{windowed['requests']:>9}{single['prompt_tokens']:>12}{windowed['prompt_tokens']:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--minutes", type=int, nargs="+", default=[5, 15, 30, 60])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0005,
+                        help="Seconds per prompt token (context processing)")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.minutes, args.latency, args.prompt_token_latency))
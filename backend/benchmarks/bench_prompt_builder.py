@@ -0,0 +1,103 @@
+"""
+Benchmark - Sales Prompt Builder
+Build cost and cacheable prefix size: original f-string layout vs the prefix-stable builder
+
+Run from backend/:
+    python -m benchmarks.bench_prompt_builder --requests 2000
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Dict, List, Tuple
+
+from prompts.builder import GUIDELINES, ROLE, PromptBuilder, estimate_tokens
+from prompts.sales_agent import CARDIO_STATIN_DATA
+
+HCPS = [
+    {"name": "Martinez", "specialty": "Cardiology"},
+    {"name": "Chen", "specialty": "Internal Medicine"},
+    {"name": "Okafor"},
+    {},
+]
+QUERIES = [
+    "How do I handle cost objections?",
+    "What data should I lead with for elderly patients?",
+    "How do I follow up after a sample drop?",
+    "The doctor says generics work fine. What do I say?",
+]
+
+
+def legacy_prompt(query: str, hcp_context: Dict = None) -> str:
+    """
+    The original layout: HCP name inside the guidelines, rebuilt on every call.
+    """
+    hcp_context = hcp_context or {}
+    hcp_name = hcp_context.get("name", "the doctor")
+    hcp_info = f"Dr. {hcp_name}" if hcp_name != "the doctor" else "the healthcare provider"
+    if hcp_context.get("specialty"):
+        hcp_info += f" ({hcp_context['specialty']})"
+
+    guidelines = GUIDELINES.replace("[the healthcare provider]", hcp_info)
+    return f"""{ROLE}
+
+{CARDIO_STATIN_DATA}
+
+{guidelines}
+
+CONTEXT:
+- Healthcare Provider: {hcp_info}
+- Their Question: {query}
+
+Now provide a SPECIFIC, DATA-DRIVEN response with:
+- Exact statistics from the data above
+- Concrete phrases to say (in quotes)
+- Clear action steps
+
+Your response:"""
+
+
+def workload(count: int) -> List[Tuple[str, Dict]]:
+    rng = random.Random(0)
+    return [(rng.choice(QUERIES), rng.choice(HCPS)) for _ in range(count)]
+
+
+def measure(build, requests: List[Tuple[str, Dict]]) -> Dict:
+    start = time.perf_counter()
+    prompts = [build(query, hcp) for query, hcp in requests]
+    elapsed = time.perf_counter() - start
+
+    # Longest prefix shared by every prompt = what a provider prompt cache can reuse
+    shared = os.path.commonprefix(prompts)
+    total_tokens = sum(estimate_tokens(p) for p in prompts[:200]) / min(len(prompts), 200)
+    return {
+        "us_per_build": elapsed / len(prompts) * 1e6,
+        "prompt_tokens": total_tokens,
+        "shared_prefix_tokens": estimate_tokens(shared),
+    }
+
+
+def main(count: int) -> None:
+    requests = workload(count)
+    builder = PromptBuilder()
+
+    results = [
+        ("original f-string", measure(legacy_prompt, requests)),
+        ("prefix-stable builder", measure(lambda q, h: builder.build(q, h).text, requests)),
+    ]
+
+    print(f"\n{count} requests over {len(HCPS)} HCP contexts and {len(QUERIES)} questions\n")
+    print(f"{'layout':<24}{'us/build':>10}{'prompt tok':>12}{'shared prefix tok':>19}{'uncached tok':>14}")
+    for label, r in results:
+        uncached = r["prompt_tokens"] - r["shared_prefix_tokens"]
+        print(f"{label:<24}{r['us_per_build']:>10.1f}{r['prompt_tokens']:>12.0f}"
+              f"{r['shared_prefix_tokens']:>19}{uncached:>14.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    main(args.requests)
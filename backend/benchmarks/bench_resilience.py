@@ -0,0 +1,103 @@
+"""
+Benchmark - LLM Tail Latency: Retries, Hedging and the Circuit Breaker
+p50/p95/p99 and error rate against a mock LLM with latency spikes and injected errors
+
+Run from backend/:
+    python -m benchmarks.bench_resilience --latency spike:0.3,3,0.05 --error-rate 0.05 --calls 400
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+from benchmarks.load_backend import percentile
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+
+async def run_calls(client, calls: int, concurrency: int) -> Dict:
+    from agents.resilience import LLMError
+
+    latencies: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(calls):
+        queue.put_nowait(i)
+
+    async def worker() -> None:
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                await client.generate_response("You are a test.", f"q{i}", max_tokens=50)
+            except LLMError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latencies": latencies, "errors": errors}
+
+
+async def main(latency: str, error_rate: float, calls: int, concurrency: int, timeout: float) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+
+    with MockOpenAIServer(latency=latency, error_rate=error_rate, seed=7) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+        # Imported after OPENAI_BASE_URL is set so the shared client targets the mock
+        from agents.openai_client import OpenAIClient
+        from agents.resilience import CircuitBreaker, ResiliencePolicy
+
+        never_opens = CircuitBreaker(failure_threshold=10 ** 9)
+        policies = {
+            "no retries": ResiliencePolicy(max_attempts=1, breaker=never_opens),
+            "retries": ResiliencePolicy(max_attempts=3, breaker=CircuitBreaker(failure_threshold=10 ** 9)),
+            "retries + hedge": ResiliencePolicy(
+                max_attempts=3, hedge=True, hedge_min_delay=0.05,
+                breaker=CircuitBreaker(failure_threshold=10 ** 9)),
+        }
+
+        print(f"\nMock latency {server.latency}, error rate {error_rate:.0%}, "
+              f"{calls} calls at concurrency {concurrency}, {timeout}s per-attempt timeout\n")
+        print(f"{'policy':<18}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max s':>8}{'errors':>8}{'requests sent':>15}")
+        for label, policy in policies.items():
+            client = OpenAIClient(max_concurrency=64, timeout=timeout)
+            client.resilience = policy
+            # Warm the latency window so hedging starts from a measured p95
+            if policy.hedge:
+                await run_calls(client, 50, concurrency)
+            server.reset_stats()
+            result = await run_calls(client, calls, concurrency)
+            await client.aclose()
+            lat = result["latencies"]
+            print(f"{label:<18}{percentile(lat, 50):>8.2f}{percentile(lat, 95):>8.2f}{percentile(lat, 99):>8.2f}"
+                  f"{max(lat):>8.2f}{result['errors'] / calls:>8.1%}{server.total_requests:>15}")
+
+        # Outage: every request fails; compare time-to-error with and without the breaker
+        server.error_rate = 1.0
+        print(f"\nProvider outage (100% errors), {calls // 4} calls\n")
+        print(f"{'breaker':<18}{'p50 s':>8}{'p99 s':>8}{'requests sent':>15}")
+        for label, breaker in (("off", CircuitBreaker(failure_threshold=10 ** 9)),
+                               ("on (5 failures)", CircuitBreaker(failure_threshold=5, reset_timeout=30))):
+            client = OpenAIClient(max_concurrency=64, timeout=timeout)
+            client.resilience = ResiliencePolicy(max_attempts=3, breaker=breaker)
+            server.reset_stats()
+            result = await run_calls(client, calls // 4, concurrency)
+            await client.aclose()
+            lat = result["latencies"]
+            print(f"{label:<18}{percentile(lat, 50):>8.3f}{percentile(lat, 99):>8.3f}{server.total_requests:>15}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", default="spike:0.3,3,0.05",
+                        help="Mock latency distribution (see mock_openai_server)")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=5.0, help="Per-attempt timeout in seconds")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.latency, args.error_rate, args.calls, args.concurrency, args.timeout))
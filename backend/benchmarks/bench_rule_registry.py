@@ -0,0 +1,112 @@
+"""
+Benchmark - Compliance Rule Registry vs Product Count
+Load time, hot-reload time and per-check cost as the number of product rule files grows
+
+Run from backend/:
+    python -m benchmarks.bench_rule_registry --products 1 10 100 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import List
+
+from benchmarks.bench_detector import FILLER_WORDS, sample_texts, throughput
+from compliance.off_label_detector import ComplianceGuardian, OffLabelDetector
+from compliance.registry import DEFAULT_RULES_DIR, RuleRegistry
+
+# The keyword list conversation_analyzer.py used before it moved into the rule files
+LEGACY_ANALYZER_KEYWORDS = [
+    "migraine", "headache", "pain", "inflammation",
+    "off-label", "other uses", "also works for",
+    "between you and me", "unofficially"
+]
+
+
+def write_products(rules_dir: str, count: int) -> None:
+    """
+    The shipped rule files plus synthetic products, `count` in total.
+    """
+    for name in os.listdir(DEFAULT_RULES_DIR):
+        shutil.copy(os.path.join(DEFAULT_RULES_DIR, name), rules_dir)
+
+    rng = random.Random(count)
+    for i in range(count - len(os.listdir(rules_dir))):
+        rules = {
+            "product_id": f"product-{i}",
+            "approved_indications": [f"indication {i}"],
+            "off_label_keywords": [f"unapproved claim {i} {rng.choice(FILLER_WORDS)}" for _ in range(5)],
+            "implicit_patterns": [f"{rng.choice(FILLER_WORDS)} variant{i} (?:works|helps) for"],
+            "approved_context_phrases": ["not approved for"],
+            "off_label_conditions": [f"condition-{i}-{j}" for j in range(6)],
+            "conversation_flags": [f"flag-{i}-{j}" for j in range(9)]
+        }
+        with open(os.path.join(rules_dir, f"product-{i}.json"), "w") as f:
+            json.dump(rules, f)
+
+
+def check_analyzer_parity(registry: RuleRegistry) -> None:
+    """
+    The analyzer's off-label flag must match the old hard-coded keyword scan.
+    """
+    detector = OffLabelDetector(registry.get("cardiostatin"))
+    cases = [
+        "Rep: Between you and me, it also works for migraines.",
+        "Dr: Any pain reports? Rep: Muscle pain was 42% lower.",
+        "Rep: Our JAMA Cardiology study showed 78% adherence.",
+    ] + sample_texts(50)
+    for text in cases:
+        old = any(keyword in text.lower() for keyword in LEGACY_ANALYZER_KEYWORDS)
+        assert old == bool(detector.conversation_flags(text)), text
+    print(f"parity: {len(cases)} transcripts flag the same as the old analyzer keyword list")
+
+
+def main(product_counts: List[int], min_seconds: float) -> None:
+    texts = sample_texts(200)
+    print(f"{'products':>9}{'load ms':>10}{'reload ms':>11}{'no-op check us':>16}{'checks/s':>11}")
+
+    for count in product_counts:
+        rules_dir = tempfile.mkdtemp(prefix="rules-")
+        try:
+            write_products(rules_dir, count)
+
+            start = time.perf_counter()
+            registry = RuleRegistry(rules_dir, reload_interval=0)
+            load_ms = (time.perf_counter() - start) * 1000
+            if count == product_counts[0]:
+                check_analyzer_parity(registry)
+
+            # Unchanged directory: the periodic check is a scandir + stat
+            start = time.perf_counter()
+            registry.reload()
+            noop_us = (time.perf_counter() - start) * 1e6
+
+            # One edited product: only that file is parsed and compiled
+            path = os.path.join(rules_dir, "cardiostatin.json")
+            with open(path) as f:
+                rules = json.load(f)
+            rules["off_label_keywords"].append("brand new claim")
+            with open(path, "w") as f:
+                json.dump(rules, f)
+            start = time.perf_counter()
+            assert registry.reload()
+            reload_ms = (time.perf_counter() - start) * 1000
+
+            guardian = ComplianceGuardian(registry)
+            checks = throughput(lambda t: guardian.check_text(t, "cardiostatin"), texts, min_seconds)
+            print(f"{count:>9}{load_ms:>10.1f}{reload_ms:>11.2f}{noop_us:>16.0f}{checks:>11.0f}")
+        finally:
+            shutil.rmtree(rules_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--seconds", type=float, default=1.0, help="Minimum run time per measurement")
+    args = parser.parse_args()
+
+    main(args.products, args.seconds)
@@ -0,0 +1,173 @@
+"""
+Benchmark - LLM Scheduler: Interactive Latency While a Bulk Job Drains
+Rep queries alone, then next to a large analysis job, with FIFO admission vs the fair-share scheduler
+
+Run from backend/:
+    python -m benchmarks.bench_scheduler --users 4 --batch 2000 --duration 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+
+def modes(users: int) -> Dict[str, Dict[str, str]]:
+    """
+    Name -> scheduler environment for the server process.
+    """
+    return {
+        # One queue in arrival order: the semaphore the client used before
+        "fifo": {"LLM_SCHEDULER": "fifo"},
+        "fair, 0 rsv": {"LLM_SCHEDULER": "fair", "LLM_INTERACTIVE_RESERVED": "0"},
+        # Enough reserved slots for every query user
+        f"fair, {users} rsv": {"LLM_SCHEDULER": "fair", "LLM_INTERACTIVE_RESERVED": str(users)},
+    }
+
+
+def _queue_waits() -> Dict[str, Tuple[int, float, List[int]]]:
+    """
+    priority -> (calls, total seconds, per-bucket counts) queued so far.
+    """
+    from observability.metrics import LLM_QUEUE_SECONDS
+
+    with LLM_QUEUE_SECONDS._lock:
+        return {key[1]: (series[2], series[1], list(series[0]))
+                for key, series in LLM_QUEUE_SECONDS._series.items()}
+
+
+def _wait_summary(before: Dict, after: Dict) -> Dict[str, Dict]:
+    """
+    Calls, mean and p95 (bucket upper bound) queue wait per class between two snapshots.
+    """
+    from observability.metrics import LLM_QUEUE_SECONDS
+
+    summary = {}
+    for priority, (count, total, buckets) in after.items():
+        count0, total0, buckets0 = before.get(priority, (0, 0.0, [0] * len(buckets)))
+        calls = count - count0
+        if not calls:
+            continue
+        cumulative, p95 = 0, float("inf")
+        for bound, n, n0 in zip(LLM_QUEUE_SECONDS.buckets, buckets, buckets0):
+            cumulative += n - n0
+            if cumulative >= 0.95 * calls:
+                p95 = bound
+                break
+        summary[priority] = {"calls": calls, "mean_ms": (total - total0) / calls * 1000, "p95_ms": p95 * 1000}
+    return summary
+
+
+def run_server(users: int, batch: int, duration: float, output: str) -> None:
+    """
+    Child process: serve the app against the mock LLM, measure queries
+    alone, then submit the job and measure them again while it drains.
+    """
+    import asyncio
+
+    import httpx
+
+    from benchmarks.load_backend import SAMPLE_CONVERSATION, BackendServer, LoopLagMonitor, mock_responder, run_level
+    from benchmarks.mock_openai_server import MockOpenAIServer
+
+    async def measure(base_url: str) -> Dict:
+        before = _queue_waits()
+        result = await run_level(base_url, "query", users, duration, None)
+        result["queue_wait"] = _wait_summary(before, _queue_waits())
+        return result
+
+    async def drive(base_url: str) -> Dict:
+        alone = await measure(base_url)
+
+        lines = (json.dumps({"id": i, "conversation": f"{SAMPLE_CONVERSATION}\nRep: Reference {i}.",
+                             "rep_name": "Sarah", "doctor_name": "Dr. Smith"}) for i in range(batch))
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            response = await client.post("/api/jobs/analyze-conversations", content="\n".join(lines))
+            job_id = response.json()["job_id"]
+            # Let the job fill the queue before measuring
+            await asyncio.sleep(2.0)
+            done_before = (await client.get(f"/api/jobs/{job_id}")).json()["done"]
+            start = time.perf_counter()
+            busy = await measure(base_url)
+            job = (await client.get(f"/api/jobs/{job_id}")).json()
+        busy["batch_per_s"] = (job["done"] - done_before) / (time.perf_counter() - start)
+        busy["batch_remaining"] = job["pending"]
+        return {"alone": alone, "busy": busy}
+
+    mock = MockOpenAIServer(port=8013, latency="lognormal:0.5,0.4", token_latency=0.002,
+                            responder=mock_responder, seed=0)
+    with mock:
+        os.environ["OPENAI_BASE_URL"] = mock.base_url
+        with BackendServer(8023, LoopLagMonitor()) as backend:
+            result = asyncio.run(drive(backend.url))
+    with open(output, "w") as f:
+        json.dump(result, f)
+    # The job is still draining; it resumes on the next start, so just stop
+    os._exit(0)
+
+
+def measure_mode(users: int, batch: int, duration: float, env: Dict[str, str]) -> Dict:
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "result.json")
+        child_env = {
+            **os.environ,
+            **env,
+            "OPENAI_API_KEY": "sk-mock",
+            "LOG_LEVEL": "ERROR",
+            "RESPONSE_CACHE_BACKEND": "off",
+            "AUDIT_LOG_DIR": os.path.join(directory, "audit"),
+            "JOBS_DB_PATH": os.path.join(directory, "jobs.sqlite3"),
+            "SCORECARD_DB_PATH": os.path.join(directory, "scorecards.sqlite3"),
+            "SCORECARD_SNAPSHOT_DIR": os.path.join(directory, "scorecards"),
+        }
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_scheduler", "--child", "--users", str(users),
+             "--batch", str(batch), "--duration", str(duration), "--output", output],
+            env=child_env, check=True)
+        with open(output) as f:
+            return json.load(f)
+
+
+def main(users: int, batch: int, duration: float, concurrency: int, job_concurrency: int, tpm: int) -> None:
+    env = {
+        "OPENAI_MAX_CONCURRENCY": str(concurrency),
+        "JOB_CONCURRENCY": str(job_concurrency),
+        "LLM_TPM_LIMIT": str(tpm),
+    }
+    print(f"\n{users} users on POST /api/query; job of {batch} conversations ({job_concurrency} at a time); "
+          f"{concurrency} LLM slots, {tpm:,} TPM; lognormal 0.5s mock LLM\n")
+    print(f"{'scheduler':<15}{'load':<14}{'q/s':>7}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}"
+          f"{'wait p95 ms: interactive':>26}{'batch':>8}{'batch/s':>9}")
+    for mode, mode_env in modes(users).items():
+        result = measure_mode(users, batch, duration, {**env, **mode_env})
+        for load, row in (("queries only", result["alone"]), ("+ bulk job", result["busy"])):
+            waits = row["queue_wait"]
+            interactive = waits.get("interactive", {}).get("p95_ms", 0)
+            batch_wait = f"{waits['batch']['p95_ms']:>8.0f}" if "batch" in waits else f"{'-':>8}"
+            batch_rate = f"{row['batch_per_s']:>9.1f}" if "batch_per_s" in row else f"{'-':>9}"
+            print(f"{mode:<15}{load:<14}{row['throughput_rps']:>7.1f}{row['latency_p50_ms']:>8.0f}"
+                  f"{row['latency_p95_ms']:>8.0f}{row['latency_p99_ms']:>8.0f}{interactive:>26.0f}"
+                  f"{batch_wait}{batch_rate}")
+    print("\nwait p95: time queued for an LLM slot (bucket upper bound from pharma_llm_queue_seconds).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=4, help="Concurrent query users")
+    parser.add_argument("--batch", type=int, default=2000, help="Conversations in the bulk job")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per measurement")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="OPENAI_MAX_CONCURRENCY")
+    parser.add_argument("--job-concurrency", type=int, default=32, help="JOB_CONCURRENCY")
+    parser.add_argument("--tpm", type=int, default=400000, help="LLM_TPM_LIMIT (0: unlimited)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_server(args.users, args.batch, args.duration, args.output)
+    else:
+        main(args.users, args.batch, args.duration, args.llm_concurrency, args.job_concurrency, args.tpm)
@@ -0,0 +1,169 @@
+"""
+Benchmark - Scorecards: Query Latency as History Grows
+Incremental array-backed aggregates vs recomputing scorecards from the stored analysis results
+
+Run from backend/:
+    python -m benchmarks.bench_scorecards --sizes 10000,100000,1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.load_backend import percentile
+
+DIMENSION_KEYS = ("compliance", "tone", "knowledge", "objection_handling", "relationship", "call_to_action")
+YEARS = 2
+
+
+def make_analysis(rng: random.Random, skill: float) -> Dict:
+    """
+    An analyzer-shaped result (about 1.5KB as JSON) around a rep's skill level.
+    """
+    scores = {
+        key: {
+            "score": round(min(5.0, max(0.0, rng.gauss(skill, 0.6))), 1),
+            "color": "green",
+            "justification": "Cited the LDL reduction data and checked the physician's concerns.",
+            "examples": ["CardioStatin showed a 38% reduction in LDL cholesterol in clinical trials."],
+            "dimension": key.replace("_", " ").title()
+        }
+        for key in DIMENSION_KEYS
+    }
+    overall = round(sum(score["score"] for score in scores.values()) / len(scores), 1)
+    return {
+        "overall_score": overall,
+        "overall_color": "green" if overall >= 4.0 else "yellow" if overall >= 3.0 else "red",
+        "scores": scores,
+        "strengths": ["Cited trial data", "Asked about patient population"],
+        "improvements": ["Close with a concrete next step"],
+        "coaching": [{"issue": "Vague follow-up", "suggestion": "Propose a date", "example": "Could we meet Tuesday?"}],
+        "conversation_summary": "Rep discussed LDL outcomes and cost with a cardiologist.",
+        "rep_name": "",
+        "doctor_name": ""
+    }
+
+
+def ingest(store, rng: random.Random, start: int, end: int, reps: int, doctors: int,
+           territories: int, now: float) -> List[float]:
+    """
+    Record analyses start..end-1 one at a time, as the analyzer does.
+
+    Returns:
+        Seconds per record call
+    """
+    latencies = []
+    span = YEARS * 365 * 86400
+    for i in range(start, end):
+        rep = rng.randrange(reps)
+        analysis = make_analysis(rng, 2.0 + 3.0 * rep / reps)
+        ts = now - rng.uniform(0, span)
+        call_start = time.perf_counter()
+        store.record(analysis, f"conversation {i}", f"rep{rep:04d}", f"Dr. {rng.randrange(doctors):05d}",
+                     f"territory{rep % territories:02d}", None, ts)
+        latencies.append(time.perf_counter() - call_start)
+    return latencies
+
+
+def recompute(db_path: str, kind: str, since: float) -> int:
+    """
+    Baseline: the same leaderboard computed from stored results.
+
+    Returns:
+        Entities found
+    """
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    column = {"rep": "rep", "doctor": "doctor", "territory": "territory"}[kind]
+    sums: Dict[str, List[float]] = {}
+    for name, scores in conn.execute(f"SELECT {column}, scores FROM analyses WHERE ts >= ?", (since,)):
+        overall = json.loads(scores)[-1]
+        if overall is not None:
+            sums.setdefault(name, []).append(overall)
+    conn.close()
+    ranked = sorted(((statistics.fmean(values), name) for name, values in sums.items()), reverse=True)
+    return len(ranked[:50])
+
+
+def timed(run: Callable[[], object], repeats: int) -> float:
+    """
+    Median seconds per call.
+    """
+    run()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main(sizes: List[int], reps: int, doctors: int, territories: int, repeats: int, seed: int) -> None:
+    from scorecards.store import ScorecardStore
+
+    rng = random.Random(seed)
+    now = time.time()
+    quarter = now - 13 * 7 * 86400
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "scorecards.sqlite3")
+        snapshot_dir = os.path.join(directory, "snapshot")
+        store = ScorecardStore(db_path, snapshot_dir, snapshot_interval=0)
+
+        queries: List[Tuple[str, Callable[[], object]]] = [
+            ("rep leaderboard, 13w", lambda: store.scorecards("rep", window="13w", now=now)),
+            ("doctor leaderboard, 13w", lambda: store.scorecards("doctor", window="13w", now=now)),
+            ("territory leaderboard, all time", lambda: store.scorecards("territory", window="all", now=now)),
+            ("one rep, 52w + weekly trend", lambda: store.scorecards("rep", name="rep0042", window="52w", now=now))
+        ]
+
+        print(f"\n{reps} reps, {doctors} doctors, {territories} territories over {YEARS} years\n")
+        print(f"{'analyses':>10}{'record p50 us':>15}{'p99 us':>9}{'slots':>9}{'agg MB':>8}"
+              + "".join(f"{label[:24]:>26}" for label, _ in queries) + f"{'recompute reps 13w':>20}")
+
+        recorded = 0
+        for size in sizes:
+            latencies = ingest(store, rng, recorded, size, reps, doctors, territories, now)
+            recorded = size
+            stats = store.stats()
+            row = (f"{size:>10,}{percentile(latencies, 50) * 1e6:>15.0f}{percentile(latencies, 99) * 1e6:>9.0f}"
+                   f"{stats['slots']:>9,}{stats['aggregate_bytes'] / 1e6:>8.1f}")
+            row += "".join(f"{timed(run, repeats) * 1000:>23.2f} ms" for _, run in queries)
+            row += f"{timed(lambda: recompute(db_path, 'rep', quarter), 1) * 1000:>17.0f} ms"
+            print(row)
+
+        start = time.perf_counter()
+        store.close()
+        snapshot_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ScorecardStore(db_path, snapshot_dir, snapshot_interval=0)
+        restart_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ScorecardStore(db_path, os.path.join(directory, "none"), snapshot_interval=0)
+        replay_seconds = time.perf_counter() - start
+
+    print(f"\nSnapshot {snapshot_seconds * 1000:.0f} ms; restart from snapshot {restart_seconds * 1000:.0f} ms; "
+          f"rebuilding from all {recorded:,} stored results {replay_seconds:.1f}s.")
+    print(f"Query times are the median of {repeats} calls; recompute reads the stored results with SQL.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Analysis counts to measure at")
+    parser.add_argument("--reps", type=int, default=500)
+    parser.add_argument("--doctors", type=int, default=5000)
+    parser.add_argument("--territories", type=int, default=40)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    main([int(size) for size in args.sizes.split(",")], args.reps, args.doctors, args.territories,
+         args.repeats, args.seed)
@@ -0,0 +1,88 @@
+"""
+Benchmark - Request Coalescing Under a Burst of Identical Requests
+Upstream LLM calls and latency when many reps send the same query or transcript at once
+
+Run from backend/:
+    python -m benchmarks.bench_single_flight --burst 50 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+from benchmarks.bench_analyzer_modes import SAMPLE_CONVERSATION
+from benchmarks.load_backend import QUERIES, mock_responder, percentile
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+
+async def burst(calls) -> List[float]:
+    async def timed(call) -> float:
+        start = time.perf_counter()
+        await call
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(timed(call) for call in calls))
+
+
+async def main(burst_size: int, latency: float) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "off"
+
+    with MockOpenAIServer(latency=latency, responder=mock_responder) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+        # Imported after OPENAI_BASE_URL is set so the shared client targets the mock
+        from agents import conversation_analyzer
+        from agents.orchestrator import AgentOrchestrator
+        from observability.metrics import COALESCED_CALLS
+
+        # The same talking point from the whole region, plus a few other questions
+        queries = [QUERIES[0]] * burst_size + QUERIES[1:3] + [QUERIES[4]]
+
+        print(f"\nBurst of {burst_size} identical requests (+3 distinct queries), "
+              f"{latency}s mock LLM latency\n")
+        print(f"{'scenario':<12}{'coalescing':>12}{'upstream calls':>16}{'collapsed':>11}"
+              f"{'p50 s':>8}{'p99 s':>8}")
+        for enabled in (False, True):
+            # Fresh response cache: the burst arrives before any entry is written
+            orchestrator = AgentOrchestrator()
+            orchestrator.flights.enabled = enabled
+            conversation_analyzer._analysis_flights.enabled = enabled
+
+            for scenario, calls in (
+                ("query", lambda: [orchestrator.process_query(q, f"rep{i}") for i, q in enumerate(queries)]),
+                ("analysis", lambda: [
+                    conversation_analyzer.analyze_conversation(SAMPLE_CONVERSATION, "Sarah", "Dr. Lee")
+                    for _ in range(burst_size)])
+            ):
+                server.reset_stats()
+                collapsed_before = COALESCED_CALLS.value(name=scenario)
+                latencies = await burst(calls())
+                collapsed = COALESCED_CALLS.value(name=scenario) - collapsed_before
+                print(f"{scenario:<12}{'on' if enabled else 'off':>12}{server.total_requests:>16}"
+                      f"{collapsed:>11.0f}{percentile(latencies, 50):>8.2f}{percentile(latencies, 99):>8.2f}")
+
+        # Cancellation safety: half the callers give up; the rest still get the answer
+        orchestrator = AgentOrchestrator()
+        server.reset_stats()
+        tasks = [asyncio.create_task(orchestrator.process_query(QUERIES[1], f"rep{i}"))
+                 for i in range(burst_size)]
+        await asyncio.sleep(latency / 2)
+        for task in tasks[::2]:
+            task.cancel()
+        results: List[Dict] = await asyncio.gather(*tasks[1::2])
+        print(f"\nCancelled {len(tasks[::2])} of {burst_size} waiters mid-call: "
+              f"{sum(r['compliance_status']['status'] == 'APPROVED' for r in results)} of "
+              f"{len(results)} remaining callers answered from {server.total_requests} upstream call(s)")
+        await orchestrator.openai_client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--burst", type=int, default=50, help="Identical requests sent at once")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated LLM latency in seconds")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.burst, args.latency))
@@ -0,0 +1,86 @@
+"""
+Benchmark - Speculative Generation vs Sequential Pre-check
+Query latency with the LLM call overlapped with a slow query pre-check, and decision parity
+
+Run from backend/:
+    python -m benchmarks.bench_speculative --latency 0.5 --pre-check-latency 0.3 --runs 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+from benchmarks.load_backend import QUERIES, SALES_REPLY
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+
+async def run_mode(orchestrator, queries: List[str], runs: int) -> Dict:
+    latencies: Dict[str, List[float]] = {"APPROVED": [], "BLOCKED": []}
+    decisions = []
+    for _ in range(runs):
+        for query in queries:
+            start = time.perf_counter()
+            result = await orchestrator.process_query(query, "bench-user")
+            status = result["compliance_status"]
+            latencies[status["status"]].append(time.perf_counter() - start)
+            decisions.append((query, result["response"], status))
+    return {"latencies": latencies, "decisions": decisions}
+
+
+async def main(latency: float, pre_check_latency: float, runs: int) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    os.environ["RESPONSE_CACHE_BACKEND"] = "off"
+
+    with MockOpenAIServer(latency=latency, response_text=SALES_REPLY) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+        # Imported after OPENAI_BASE_URL is set so the shared client targets the mock
+        from agents.orchestrator import AgentOrchestrator
+        from compliance.off_label_detector import ComplianceGuardian
+        from observability.metrics import SPECULATIVE_GENERATIONS
+
+        class SlowPreCheckGuardian(ComplianceGuardian):
+            # Stands in for a pre-check that includes a model-based context check
+            def check_compliance(self, query, response, product_id=None):
+                if not response:
+                    time.sleep(pre_check_latency)
+                return super().check_compliance(query, response, product_id)
+
+        results = {}
+        for label, speculative in (("sequential", False), ("speculative", True)):
+            orchestrator = AgentOrchestrator(speculative=speculative)
+            orchestrator.compliance_guardian = SlowPreCheckGuardian()
+            server.reset_stats()
+            results[label] = await run_mode(orchestrator, QUERIES, runs)
+            results[label]["llm_requests"] = server.total_requests
+        await orchestrator.openai_client.aclose()
+
+    print(f"\n{latency}s LLM latency, {pre_check_latency}s pre-check, "
+          f"{len(QUERIES)} queries x {runs} runs\n")
+    print(f"{'mode':<14}{'approved p50 s':>16}{'blocked p50 s':>15}{'LLM requests sent':>19}")
+    for label, r in results.items():
+        approved = statistics.median(r["latencies"]["APPROVED"])
+        blocked = statistics.median(r["latencies"]["BLOCKED"]) if r["latencies"]["BLOCKED"] else 0.0
+        print(f"{label:<14}{approved:>16.3f}{blocked:>15.3f}{r['llm_requests']:>19}")
+
+    saved = (statistics.median(results["sequential"]["latencies"]["APPROVED"])
+             - statistics.median(results["speculative"]["latencies"]["APPROVED"]))
+    blocked_generations = SPECULATIVE_GENERATIONS.value(pipeline="query", outcome="blocked")
+    identical = results["sequential"]["decisions"] == results["speculative"]["decisions"]
+    print(f"\nApproved latency saved: {saved:.3f}s (pre-check {pre_check_latency}s)")
+    print(f"Speculative generations cancelled by the pre-check: {blocked_generations:.0f}")
+    print(f"Responses and compliance decisions identical: {'yes' if identical else 'NO'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated LLM latency in seconds")
+    parser.add_argument("--pre-check-latency", type=float, default=0.3,
+                        help="Simulated query pre-check time in seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.latency, args.pre_check_latency, args.runs))
@@ -0,0 +1,109 @@
+"""
+Benchmark - Structured Analysis Output: Streaming Scores and Fragment Repair
+Time to first score when streaming, and the cost of repairing one malformed part instead of re-requesting everything
+
+Run from backend/:
+    python -m benchmarks.bench_structured_analysis --runs 3 --token-latency 0.01
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+from benchmarks.bench_analyzer_modes import SAMPLE_CONVERSATION, responder
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+# Malformed variants of the tone score, as models occasionally write them
+MALFORMED = {
+    "bare word": ('"score": 4.5,', '"score": high,'),
+    "truncated string": ('"color": "green",', '"color": "green,')
+}
+
+
+def malformed_responder(defect: str):
+    old, new = MALFORMED[defect]
+
+    def reply(body: dict) -> str:
+        text = responder(body)
+        if '"tone"' not in text:
+            return text
+        # Corrupt only the tone object; the other five stay well-formed
+        start = text.index('"tone"')
+        return text[:start] + text[start:].replace(old, new, 1)
+
+    return reply
+
+
+async def stream_timings() -> Dict:
+    from agents.conversation_analyzer import analyze_conversation_stream
+
+    start = time.perf_counter()
+    first_score = None
+    all_scores = None
+    scores = 0
+    async for event in analyze_conversation_stream(SAMPLE_CONVERSATION, "Sarah", "Dr. Smith", use_cache=False):
+        if event["event"] == "dimension":
+            scores += 1
+            first_score = first_score or time.perf_counter() - start
+            if scores == 6:
+                all_scores = time.perf_counter() - start
+    return {"first": first_score, "all": all_scores, "done": time.perf_counter() - start}
+
+
+async def timed_analysis() -> float:
+    from agents.conversation_analyzer import analyze_conversation
+
+    start = time.perf_counter()
+    await analyze_conversation(SAMPLE_CONVERSATION, "Sarah", "Dr. Smith", use_cache=False, mode="single")
+    return time.perf_counter() - start
+
+
+async def main(runs: int, latency: float, token_latency: float) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "off"
+
+    with MockOpenAIServer(latency=latency, token_latency=token_latency, responder=responder) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+        # Imported after OPENAI_BASE_URL is set so the shared client targets the mock
+        from observability.metrics import ANALYSIS_REPAIRS
+
+        print(f"\nmock LLM: {latency}s to first token, {token_latency * 1000:.0f}ms per output token, "
+              f"median of {runs} runs\n")
+        blocking = statistics.median([await timed_analysis() for _ in range(runs)])
+        streamed: List[Dict] = [await stream_timings() for _ in range(runs)]
+        print(f"{'endpoint':<28}{'first score s':>15}{'all scores s':>14}{'complete s':>12}")
+        print(f"{'/api/analyze-conversation':<28}{blocking:>15.2f}{blocking:>14.2f}{blocking:>12.2f}")
+        print(f"{'.../stream':<28}{statistics.median(r['first'] for r in streamed):>15.2f}"
+              f"{statistics.median(r['all'] for r in streamed):>14.2f}"
+              f"{statistics.median(r['done'] for r in streamed):>12.2f}")
+
+        print("\nOne malformed dimension in the single-completion output\n")
+        print(f"{'handling':<34}{'latency s':>11}{'requests':>10}{'output tok':>12}{'repaired':>10}")
+        server.reset_stats()
+        # Previously a parse error failed the analysis; a caller retry repeats the whole completion
+        full_retry = statistics.median([await timed_analysis() + await timed_analysis() for _ in range(runs)])
+        print(f"{'re-request whole analysis':<34}{full_retry:>11.2f}{server.total_requests / runs:>10.0f}"
+              f"{server.completion_tokens / runs:>12.0f}{'-':>10}")
+        for defect in MALFORMED:
+            server.responder = malformed_responder(defect)
+            server.reset_stats()
+            repaired_before = ANALYSIS_REPAIRS.value(part="dimension")
+            latencies = [await timed_analysis() for _ in range(runs)]
+            repaired = ANALYSIS_REPAIRS.value(part="dimension") - repaired_before
+            print(f"{'repair fragment (' + defect + ')':<34}{statistics.median(latencies):>11.2f}"
+                  f"{server.total_requests / runs:>10.0f}{server.completion_tokens / runs:>12.0f}"
+                  f"{repaired / runs:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.4, help="Seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds per output token")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.runs, args.latency, args.token_latency))
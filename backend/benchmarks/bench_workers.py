@@ -0,0 +1,137 @@
+"""
+Benchmark - Multi-Worker Serving: Throughput vs Worker Count
+uvicorn with 1, 2, 4 and 8 workers, each with its own caches vs sharing them (and rate limits) through SQLite or Redis
+
+Run from backend/:
+    python -m benchmarks.bench_workers --workers 1,2,4,8 --concurrency 64 --duration 20 --distinct 200
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.load_backend import QUERIES, SCENARIOS, mock_responder, run_level
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+BACKEND_PORT = 8024
+
+
+def modes(redis_url: Optional[str]) -> Dict[str, Dict[str, str]]:
+    """
+    Name -> shared-state environment for the server.
+    """
+    configs = {
+        # What --workers gave before: every worker caches, coalesces and rate-limits on its own
+        "per-worker": {"SHARED_STATE_BACKEND": "off", "RESPONSE_CACHE_BACKEND": "memory"},
+        "shared sqlite": {"SHARED_STATE_BACKEND": "sqlite", "RESPONSE_CACHE_BACKEND": "sqlite"},
+    }
+    if redis_url:
+        configs["shared redis"] = {"SHARED_STATE_BACKEND": "redis", "RESPONSE_CACHE_BACKEND": "redis",
+                                   "REDIS_URL": redis_url}
+    return configs
+
+
+def _distinct_queries(distinct: int) -> None:
+    """
+    Replace the query scenario with `distinct` different questions asked
+    over and over, so caches warm up instead of answering 5 questions.
+    """
+    async def query(client: httpx.AsyncClient, i: int) -> bool:
+        n = i % distinct
+        response = await client.post("/api/query", json={
+            "query": f"{QUERIES[n % 3]} (account {n})", "user_id": f"load-{i % 50}"})
+        return response.status_code == 200
+
+    SCENARIOS["query"] = query
+
+
+def _wait_ready(url: str, server: subprocess.Popen, workers: int, timeout: float = 120.0) -> None:
+    """
+    Wait until the server answers and every worker has started (one pid each).
+    """
+    deadline = time.monotonic() + timeout
+    pids = set()
+    while len(pids) < workers:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Only {len(pids)} of {workers} workers answered within {timeout:.0f}s")
+        try:
+            pids.add(httpx.get(f"{url}/health", timeout=5).json()["worker"]["pid"])
+        except (httpx.HTTPError, KeyError, ValueError):
+            time.sleep(0.2)
+
+
+def measure(workers: int, env: Dict[str, str], concurrency: int, duration: float,
+            mock: MockOpenAIServer) -> Dict:
+    with tempfile.TemporaryDirectory() as directory:
+        server_env = {
+            **os.environ,
+            **env,
+            "OPENAI_API_KEY": "sk-mock",
+            "OPENAI_BASE_URL": mock.base_url,
+            "LOG_LEVEL": "ERROR",
+            "SHARED_STATE_PATH": os.path.join(directory, "shared_state.sqlite3"),
+            "RESPONSE_CACHE_PATH": os.path.join(directory, "response_cache.sqlite3"),
+            "AUDIT_LOG_DIR": os.path.join(directory, "audit"),
+            "JOBS_DB_PATH": os.path.join(directory, "jobs.sqlite3"),
+            "SCORECARD_DB_PATH": os.path.join(directory, "scorecards.sqlite3"),
+            "SCORECARD_SNAPSHOT_DIR": os.path.join(directory, "scorecards"),
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(BACKEND_PORT),
+             "--workers", str(workers), "--log-level", "warning"],
+            env=server_env)
+        url = f"http://127.0.0.1:{BACKEND_PORT}"
+        try:
+            _wait_ready(url, server, workers)
+            mock.reset_stats()
+            result = asyncio.run(run_level(url, "query", concurrency, duration, None))
+            result["llm_calls"] = mock.total_requests
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        return result
+
+
+def main(workers: List[int], concurrency: int, duration: float, distinct: int, rpm: int,
+         redis_url: Optional[str]) -> None:
+    _distinct_queries(distinct)
+    limit = f", LLM_RPM_LIMIT={rpm}" if rpm else ""
+    print(f"\nPOST /api/query, {concurrency} concurrent users, {distinct} distinct questions, "
+          f"{duration:.0f}s per run, 0.2s mock LLM{limit}; {os.cpu_count()} CPU(s)\n")
+    print(f"{'workers':>7}  {'state':<15}{'req/s':>8}{'p50 ms':>8}{'p99 ms':>8}{'err':>6}"
+          f"{'LLM calls':>11}{'LLM/min':>9}")
+    mock = MockOpenAIServer(port=8014, latency="fixed:0.2", responder=mock_responder, seed=0)
+    with mock:
+        for n in workers:
+            for mode, env in modes(redis_url).items():
+                env = {**env, "LLM_RPM_LIMIT": str(rpm)}
+                result = measure(n, env, concurrency, duration, mock)
+                # Requests still in flight at the deadline run past it
+                elapsed = result["requests"] / result["throughput_rps"]
+                print(f"{n:>7}  {mode:<15}{result['throughput_rps']:>8.1f}{result['latency_p50_ms']:>8.0f}"
+                      f"{result['latency_p99_ms']:>8.0f}{result['errors']:>6}{result['llm_calls']:>11,}"
+                      f"{result['llm_calls'] / elapsed * 60:>9.0f}")
+    print("\nLLM calls: requests that reached the mock provider (cache misses that no other worker was already answering).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default="1,2,4,8", help="Worker counts to run")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per run")
+    parser.add_argument("--distinct", type=int, default=200, help="Different questions in the mix")
+    parser.add_argument("--rpm", type=int, default=0, help="LLM_RPM_LIMIT (0: unlimited)")
+    parser.add_argument("--redis-url", help="Also run with state and caches in this Redis server")
+    args = parser.parse_args()
+
+    main([int(n) for n in args.workers.split(",")], args.concurrency, args.duration, args.distinct,
+         args.rpm, args.redis_url)
@@ -0,0 +1,118 @@
+"""
+Cassettes - Record/Replay of Real LLM Responses
+Lets benchmarks run offline against answers captured once from the real API
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+
+class Cassette:
+    """
+    JSONL file of recorded chat completions.
+
+    Each line holds a request fingerprint (model, messages, temperature,
+    max_tokens), the reply text and the upstream latency. In "record" mode
+    requests are forwarded to the real API and appended to the file; in
+    "replay" mode they are answered from it. Repeated identical requests
+    replay their recordings in rotation.
+
+    Cassettes contain prompt and response text (never the API key) -
+    treat them like any other transcript data.
+    """
+
+    MODES = ("record", "replay")
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        upstream_url: str = "https://api.openai.com/v1",
+        api_key: Optional[str] = None
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode == "replay" and not os.path.exists(path):
+            raise FileNotFoundError(f"Cassette not found: {path}")
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.mode = mode
+        self.upstream_url = upstream_url.rstrip("/")
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, List[Dict]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+
+    @staticmethod
+    def key(body: dict) -> str:
+        fingerprint = {
+            "model": body.get("model"),
+            "messages": body.get("messages"),
+            "temperature": body.get("temperature"),
+            "max_tokens": body.get("max_tokens")
+        }
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def lookup(self, body: dict) -> Optional[Dict]:
+        """
+        Next recorded {"text", "latency"} for this request, or None.
+        """
+        key = self.key(body)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            cursor = self._cursor.get(key, 0)
+            self._cursor[key] = cursor + 1
+            self.hits += 1
+            return entries[cursor % len(entries)]
+
+    async def record(self, body: dict) -> Dict:
+        """
+        Forward a request to the real API (non-streaming) and store the reply.
+        """
+        if not self.api_key:
+            raise ValueError("Recording a cassette needs OPENAI_API_KEY")
+
+        upstream_body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=120) as client:
+            response = await client.post(
+                f"{self.upstream_url}/chat/completions",
+                json=upstream_body,
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+        response.raise_for_status()
+        entry = {
+            "key": self.key(body),
+            "model": body.get("model"),
+            "text": response.json()["choices"][0]["message"]["content"] or "",
+            "latency": round(time.perf_counter() - start, 4)
+        }
+
+        with self._lock:
+            self._entries.setdefault(entry["key"], []).append(entry)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry
@@ -0,0 +1,327 @@
+"""
+Load Test - Backend Capacity
+Drives the real FastAPI app against a local LLM stand-in and reports
+throughput, p50/p95/p99 latency and event-loop lag per concurrency level
+
+Run from backend/:
+    python -m benchmarks.load_backend --scenarios query analyze compliance_batch \\
+        --concurrency 1 4 16 64 --duration 10 --output results.json
+    python -m benchmarks.load_backend --compare baseline.json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+from benchmarks.bench_analyzer_modes import SAMPLE_CONVERSATION, responder as analysis_responder
+from benchmarks.cassette import Cassette
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+QUERIES = [
+    "How do I handle cost objections from a cardiologist?",
+    "What efficacy data should I lead with for high-risk patients?",
+    "How does CardioStatin compare on side effects?",
+    "Can I mention off-label uses for migraine prevention?",  # blocked by the pre-check
+    "What should I say about adherence at 12 months?",
+]
+
+SALES_REPLY = (
+    "Lead with the JAMA Cardiology data: 42% fewer muscle-related side effects and 78% adherence "
+    "at 12 months. For cost, frame it as total cost of care - 31% fewer cardiovascular events - "
+    "and mention the patient assistance program. Close by proposing a specific follow-up time."
+)
+
+COMPLIANCE_TEXTS = [
+    "CardioStatin reduced LDL by 52% in the pivotal trial.",
+    "Some doctors use it for migraine prevention.",
+    "Our patient assistance program covers 80% of copays.",
+    "It might also help with weight loss in practice.",
+] * 25
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[rank]
+
+
+def mock_responder(body: dict) -> str:
+    prompt = body["messages"][-1]["content"]
+    if "Rep:" in prompt or "sales coach" in prompt:
+        return analysis_responder(body)
+    return SALES_REPLY
+
+
+class LoopLagMonitor:
+    """
+    Samples how late the server's event loop wakes from a short sleep.
+    Anything blocking the loop (sync I/O, CPU work) shows up as lag.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def reset(self) -> None:
+        self.samples = []
+
+
+class BackendServer:
+    """
+    The backend app served by uvicorn in a background thread.
+    """
+
+    def __init__(self, port: int, monitor: LoopLagMonitor):
+        # Imported here so the environment (mock base URL, caches) is set first
+        from main import app
+
+        app.router.on_startup.append(monitor.start)
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        self.url = f"http://127.0.0.1:{port}"
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self) -> "BackendServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+# Scenario name -> coroutine issuing one request; returns True on success
+async def _query(client: httpx.AsyncClient, i: int) -> bool:
+    response = await client.post("/api/query", json={
+        "query": QUERIES[i % len(QUERIES)], "user_id": f"load-{i % 50}"})
+    return response.status_code == 200
+
+
+async def _query_stream(client: httpx.AsyncClient, i: int) -> bool:
+    async with client.stream("POST", "/api/query/stream", json={
+            "query": QUERIES[i % len(QUERIES)], "user_id": f"load-{i % 50}"}) as response:
+        body = b"".join([chunk async for chunk in response.aiter_bytes()])
+    return response.status_code == 200 and b"event: done" in body
+
+
+async def _analyze(client: httpx.AsyncClient, i: int) -> bool:
+    response = await client.post("/api/analyze-conversation", json={
+        "conversation": f"{SAMPLE_CONVERSATION}\nRep: Reference {i}.",
+        "rep_name": "Sarah", "doctor_name": "Dr. Smith", "bypass_cache": True})
+    return response.status_code == 200
+
+
+async def _compliance_batch(client: httpx.AsyncClient, i: int) -> bool:
+    response = await client.post("/api/compliance/check-batch", json={"texts": COMPLIANCE_TEXTS})
+    return response.status_code == 200
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "query": _query,
+    "query_stream": _query_stream,
+    "analyze": _analyze,
+    "compliance_batch": _compliance_batch,
+}
+
+
+async def run_level(base_url: str, scenario: str, concurrency: int, duration: float,
+                    monitor: Optional[LoopLagMonitor]) -> Dict:
+    """
+    Closed loop: `concurrency` virtual users each send requests back to back for `duration`.
+    """
+    send = SCENARIOS[scenario]
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(10 ** 9))
+    deadline = time.perf_counter() + duration
+
+    async def user(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = await send(client, next(counter))
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        if monitor:
+            monitor.reset()
+        start = time.perf_counter()
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    lag = monitor.samples if monitor else []
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "loop_lag_p50_ms": round(percentile(lag, 50) * 1000, 2) if lag else None,
+        "loop_lag_p99_ms": round(percentile(lag, 99) * 1000, 2) if lag else None,
+        "loop_lag_max_ms": round(max(lag) * 1000, 2) if lag else None,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: List[Dict]) -> None:
+    print(f"\n{'scenario':<18}{'conc':>5}{'req':>7}{'err':>5}{'rps':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'lag p99':>9}{'lag max':>9}")
+    for r in results:
+        lag_p99 = "-" if r["loop_lag_p99_ms"] is None else f"{r['loop_lag_p99_ms']:.1f}"
+        lag_max = "-" if r["loop_lag_max_ms"] is None else f"{r['loop_lag_max_ms']:.1f}"
+        print(f"{r['scenario']:<18}{r['concurrency']:>5}{r['requests']:>7}{r['errors']:>5}"
+              f"{r['throughput_rps']:>9.1f}{r['latency_p50_ms']:>9.0f}{r['latency_p95_ms']:>9.0f}"
+              f"{r['latency_p99_ms']:>9.0f}{lag_p99:>9}{lag_max:>9}")
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    """
+    Print throughput and p95/p99 changes between two result files.
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    with open(candidate_path) as f:
+        candidate = json.load(f)["results"]
+
+    def delta(new: float, old: float) -> str:
+        return f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+
+    print(f"\n{'scenario':<18}{'conc':>5}{'rps':>16}{'p95 ms':>18}{'p99 ms':>18}")
+    for r in candidate:
+        old = baseline.get((r["scenario"], r["concurrency"]))
+        if old is None:
+            continue
+        print(f"{r['scenario']:<18}{r['concurrency']:>5}"
+              f"{r['throughput_rps']:>9.1f}{delta(r['throughput_rps'], old['throughput_rps']):>7}"
+              f"{r['latency_p95_ms']:>11.0f}{delta(r['latency_p95_ms'], old['latency_p95_ms']):>7}"
+              f"{r['latency_p99_ms']:>11.0f}{delta(r['latency_p99_ms'], old['latency_p99_ms']):>7}")
+
+
+async def run(args: argparse.Namespace, base_url: str, monitor: Optional[LoopLagMonitor]) -> List[Dict]:
+    results = []
+    for scenario in args.scenarios:
+        for concurrency in args.concurrency:
+            result = await run_level(base_url, scenario, concurrency, args.duration, monitor)
+            results.append(result)
+            print(f"[LOAD] {scenario} x{concurrency}: {result['throughput_rps']} req/s, "
+                  f"p95 {result['latency_p95_ms']} ms")
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    config = {
+        "scenarios": args.scenarios,
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "target": args.target or "in-process",
+    }
+
+    if args.target:
+        # External server: no access to its event loop
+        results = asyncio.run(run(args, args.target, None))
+    else:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        # Measure the uncached paths unless asked otherwise
+        if not args.cache:
+            os.environ["RESPONSE_CACHE_BACKEND"] = "off"
+            os.environ["ANALYSIS_CACHE_BACKEND"] = "off"
+        os.environ.setdefault("JOBS_DB_PATH", os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+
+        cassette = Cassette(args.cassette, mode=args.cassette_mode) if args.cassette else None
+        mock = MockOpenAIServer(
+            port=args.mock_port, latency=args.latency, token_latency=args.token_latency,
+            error_rate=args.error_rate, responder=mock_responder, cassette=cassette, seed=0)
+        config["mock"] = {
+            "latency": str(mock.latency),
+            "token_latency": args.token_latency,
+            "error_rate": args.error_rate,
+            "cassette": args.cassette,
+        }
+
+        with mock:
+            os.environ["OPENAI_BASE_URL"] = mock.base_url
+            monitor = LoopLagMonitor()
+            with BackendServer(args.port, monitor) as backend:
+                results = asyncio.run(run(args, backend.url, monitor))
+
+    print_results(results)
+
+    if args.output:
+        report = {
+            "timestamp": time.time(),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "config": config,
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS),
+                        default=["query", "analyze", "compliance_batch"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--latency", default="lognormal:0.4,0.5",
+                        help="Mock LLM latency: seconds or a distribution spec")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Mock seconds per output token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock LLM calls that fail")
+    parser.add_argument("--cassette", help="Replay (or record) real responses from this JSONL file")
+    parser.add_argument("--cassette-mode", choices=Cassette.MODES, default="replay")
+    parser.add_argument("--cache", action="store_true", help="Keep response/analysis caches on")
+    parser.add_argument("--target", help="Load an already running server instead (e.g. http://localhost:8000)")
+    parser.add_argument("--port", type=int, default=8021)
+    parser.add_argument("--mock-port", type=int, default=8011)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="Compare two result files and exit")
+
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+"""
+Load Test - OpenAI Client Concurrency
+Shows that concurrent generate_response calls overlap instead of serializing
+
+Run from backend/:
+    python -m benchmarks.load_openai_client --requests 32 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from openai import OpenAI
+
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+
+async def _blocking_generate(client: OpenAI, prompt: str) -> str:
+    """
+    The previous implementation: an async def around the synchronous SDK.
+    """
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=50
+    )
+    return response.choices[0].message.content
+
+
+async def _run(label: str, server: MockOpenAIServer, calls) -> dict:
+    server.reset_stats()
+    start = time.perf_counter()
+    await asyncio.gather(*calls)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": label,
+        "requests": server.total_requests,
+        "wall_seconds": round(elapsed, 3),
+        "max_server_concurrency": server.max_in_flight
+    }
+
+
+async def main(num_requests: int, latency: float, concurrency: int) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+
+    with MockOpenAIServer(latency=latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+        # Imported after OPENAI_BASE_URL is set so the shared client targets the mock
+        from agents.openai_client import OpenAIClient
+
+        sync_client = OpenAI(api_key="sk-mock", base_url=server.base_url)
+        async_client = OpenAIClient(max_concurrency=concurrency)
+
+        results = [
+            await _run(
+                "blocking (sync SDK)",
+                server,
+                [_blocking_generate(sync_client, f"q{i}") for i in range(num_requests)]
+            ),
+            await _run(
+                f"async pooled (cap={concurrency})",
+                server,
+                [
+                    async_client.generate_response("You are a test.", f"q{i}", max_tokens=50)
+                    for i in range(num_requests)
+                ]
+            )
+        ]
+        await async_client.aclose()
+
+    serial_seconds = num_requests * latency
+    print(f"\n{num_requests} requests, {latency}s simulated latency "
+          f"(fully serial = {serial_seconds:.1f}s)\n")
+    print(f"{'mode':<28}{'wall s':>10}{'overlap x':>12}{'max concurrent':>17}")
+    for r in results:
+        overlap = serial_seconds / r["wall_seconds"] if r["wall_seconds"] else 0.0
+        print(f"{r['mode']:<28}{r['wall_seconds']:>10.2f}{overlap:>12.1f}{r['max_server_concurrency']:>17}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.latency, args.concurrency))
@@ -0,0 +1,305 @@
+"""
+Mock OpenAI Server
+Local OpenAI-compatible stand-in for load tests and benchmarks
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from typing import Callable, Optional, Sequence, Union
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+from benchmarks.cassette import Cassette
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, (len(text) + 3) // 4)
+
+
+class LatencyDistribution:
+    """
+    Random delay in seconds, parsed from a spec string:
+
+        "0.5"                 fixed
+        "uniform:0.2,0.8"     uniform between bounds
+        "normal:0.5,0.1"      mean, stddev (clipped at 0)
+        "lognormal:0.5,0.6"   median, sigma (long right tail, like real APIs)
+        "exponential:0.5"     mean
+        "spike:0.3,3,0.05"    base, spike delay, spike probability (provider stalls)
+    """
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal", "exponential", "spike")
+
+    def __init__(self, kind: str, params: Sequence[float], rng: Optional[random.Random] = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.params = tuple(params)
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def parse(cls, spec: Union[str, float, "LatencyDistribution"], rng: Optional[random.Random] = None) -> "LatencyDistribution":
+        if isinstance(spec, LatencyDistribution):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("fixed", (float(spec),), rng)
+        kind, _, args = spec.partition(":")
+        if not args:
+            return cls("fixed", (float(kind),), rng)
+        return cls(kind, [float(a) for a in args.split(",")], rng)
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            return p[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(p[0], p[1])
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(p[0], p[1]))
+        if self.kind == "lognormal":
+            return self.rng.lognormvariate(math.log(p[0]), p[1])
+        if self.kind == "spike":
+            return p[1] if self.rng.random() < p[2] else p[0]
+        return self.rng.expovariate(1 / p[0])
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(f'{v:g}' for v in self.params)}"
+
+
+class MockOpenAIServer:
+    """
+    Minimal /v1/chat/completions endpoint with simulated latency.
+
+    Each completion sleeps `latency` seconds plus `prompt_token_latency` per
+    prompt token before its first token, and `token_latency` seconds per
+    completion token after that (asyncio sleeps, so the mock itself never
+    serializes requests). Tokens are estimated as
+    4 characters and output is truncated at the request's max_tokens.
+
+    The reply is `response_text`, or whatever `responder(request_body)`
+    returns. Supports "stream": true and records concurrency, token usage
+    and how many streams the client closed early.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8011,
+        latency: Union[float, str, LatencyDistribution] = 0.5,
+        token_latency: float = 0.0,
+        prompt_token_latency: float = 0.0,
+        response_text: str = "Mock completion.",
+        responder: Optional[Callable[[dict], str]] = None,
+        error_rate: float = 0.0,
+        error_statuses: Sequence[int] = (429, 500, 503),
+        cassette: Optional[Cassette] = None,
+        seed: Optional[int] = None
+    ):
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.latency = LatencyDistribution.parse(latency, self.rng)
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.response_text = response_text
+        self.responder = responder
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.cassette = cassette
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_requests = 0
+        self.cancelled_streams = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.errors = 0
+
+        self.app = self._build_app()
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Mock OpenAI")
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            try:
+                body = await request.json()
+            except ClientDisconnect:
+                # Cancelled before the body arrived (e.g. a losing hedged request)
+                return Response(status_code=499)
+            self.total_requests += 1
+
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return await self._error_response()
+
+            prompt_tokens = self._prompt_tokens(body)
+            first_token_delay = self.latency.sample() + self.prompt_token_latency * prompt_tokens
+
+            if self.cassette is not None and self.cassette.mode == "record":
+                # Real call: its own latency replaces the simulated one
+                text = (await self.cassette.record(body))["text"]
+                first_token_delay = 0.0
+            else:
+                recorded = self.cassette.lookup(body) if self.cassette is not None else None
+                if recorded is not None:
+                    text = recorded["text"]
+                    first_token_delay = recorded["latency"]
+                else:
+                    text = self._reply_text(body)
+
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += _estimate_tokens(text)
+
+            if body.get("stream"):
+                return StreamingResponse(
+                    self._stream_chunks(body, text, first_token_delay), media_type="text/event-stream")
+
+            try:
+                await asyncio.sleep(
+                    first_token_delay + self.token_latency * _estimate_tokens(text))
+            finally:
+                self.in_flight -= 1
+
+            return self._completion_payload(body, text)
+
+        return app
+
+    async def _error_response(self) -> JSONResponse:
+        self.errors += 1
+        status = self.rng.choice(self.error_statuses)
+        await asyncio.sleep(self.latency.sample() / 10)
+        error_type = "rate_limit_error" if status == 429 else "server_error"
+        return JSONResponse(
+            status_code=status,
+            content={"error": {"message": f"Mock {status} error", "type": error_type, "code": None}}
+        )
+
+    def _reply_text(self, body: dict) -> str:
+        text = self.responder(body) if self.responder else self.response_text
+        max_tokens = body.get("max_tokens")
+        return text[:max_tokens * 4] if max_tokens else text
+
+    def _prompt_tokens(self, body: dict) -> int:
+        return _estimate_tokens("".join(m.get("content") or "" for m in body.get("messages", [])))
+
+    async def _stream_chunks(self, body: dict, text: str, first_token_delay: float):
+        finished = False
+        words = text.split(" ")
+        sent = ""
+        try:
+            await asyncio.sleep(first_token_delay)
+            for i, word in enumerate(words):
+                token = word if i == 0 else " " + word
+                chunk = {
+                    "id": f"chatcmpl-mock-{self.total_requests}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "gpt-4o-mini"),
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                # Pace by tokens in the text so far, so a stream takes as long as the whole reply
+                await asyncio.sleep(self.token_latency * (_estimate_tokens(sent + token) - _estimate_tokens(sent)))
+                sent += token
+            yield "data: [DONE]\n\n"
+            finished = True
+        finally:
+            self.in_flight -= 1
+            if not finished:
+                self.cancelled_streams += 1
+
+    def _completion_payload(self, body: dict, text: str) -> dict:
+        prompt_tokens = self._prompt_tokens(body)
+        completion_tokens = _estimate_tokens(text)
+
+        return {
+            "id": f"chatcmpl-mock-{self.total_requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def reset_stats(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_requests = 0
+        self.cancelled_streams = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.errors = 0
+
+    def start(self) -> "MockOpenAIServer":
+        """
+        Serve in a background thread and wait until it accepts connections.
+        """
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", default="0.5",
+                        help="Seconds before the first token, or a distribution such as lognormal:0.5,0.6")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per generated token")
+    parser.add_argument("--tokens-per-second", type=float, help="Generation rate (overrides --token-latency)")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0, help="Seconds per prompt token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--cassette", help="JSONL cassette file")
+    parser.add_argument("--cassette-mode", choices=Cassette.MODES, default="replay")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        host=args.host, port=args.port, latency=args.latency,
+        token_latency=1 / args.tokens_per_second if args.tokens_per_second else args.token_latency,
+        prompt_token_latency=args.prompt_token_latency,
+        error_rate=args.error_rate,
+        cassette=Cassette(args.cassette, mode=args.cassette_mode) if args.cassette else None,
+        seed=args.seed)
+    print(f"Mock OpenAI listening on {server.base_url} (latency {server.latency})")
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,133 @@
+"""
+Conversation Analysis Cache
+Content-addressed store of finished analyses so re-opened call reviews skip the LLM
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+from cache.backends import CacheBackend, create_backend
+
+
+def normalize_transcript(conversation: str) -> str:
+    """
+    Transcript with per-line whitespace collapsed and blank lines dropped.
+    """
+    lines = (" ".join(line.split()) for line in conversation.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def analysis_key(
+    conversation: str,
+    rep_name: Optional[str],
+    doctor_name: Optional[str],
+    prompt_version: str,
+    model: str,
+    rules_version: Optional[str] = None
+) -> str:
+    """
+    Identity of an analysis (used for the cache and for coalescing concurrent requests).
+    """
+    payload = json.dumps({
+        "conversation": normalize_transcript(conversation),
+        "rep_name": rep_name,
+        "doctor_name": doctor_name,
+        "prompt_version": prompt_version,
+        "model": model,
+        "rules_version": rules_version
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Cache of conversation analysis results.
+
+    Keys hash the normalized transcript, rep and doctor names, the
+    analyzer prompt version (few-shot examples, scoring prompt, system
+    prompt), the model name and the product rule set version, so any
+    change to the prompts, model or compliance rules produces fresh analyses.
+
+    Configuration (environment variables):
+        ANALYSIS_CACHE_BACKEND: sqlite (default), memory, redis (REDIS_URL) or off
+        ANALYSIS_CACHE_PATH: SQLite file (default .cache/analysis.sqlite3)
+        ANALYSIS_CACHE_MAX_ENTRIES: Size bound before LRU eviction (default 5000)
+        ANALYSIS_CACHE_TTL_SECONDS: Entry lifetime, 0 = no expiry (default 604800)
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: Optional[float] = None):
+        self.backend = backend
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["AnalysisCache"]:
+        backend = create_backend(
+            kind=os.getenv("ANALYSIS_CACHE_BACKEND", "sqlite"),
+            path=os.getenv("ANALYSIS_CACHE_PATH", ".cache/analysis.sqlite3"),
+            max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000")),
+            table="conversation_analyses"
+        )
+        if backend is None:
+            return None
+        return cls(backend, ttl=float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "604800")))
+
+    def make_key(
+        self,
+        conversation: str,
+        rep_name: Optional[str],
+        doctor_name: Optional[str],
+        prompt_version: str,
+        model: str,
+        rules_version: Optional[str] = None
+    ) -> str:
+        return analysis_key(conversation, rep_name, doctor_name, prompt_version, model, rules_version)
+
+    async def get(self, key: str) -> Optional[Dict]:
+        analysis = await self.backend.get(key)
+        if analysis is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return analysis
+
+    async def peek(self, key: str) -> Optional[Dict]:
+        """
+        Like get(), without counting a lookup (polling for another worker's analysis).
+        """
+        return await self.backend.get(key)
+
+    async def set(self, key: str, analysis: Dict) -> None:
+        await self.backend.set(key, analysis, ttl=self.ttl)
+
+    async def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": await self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "ttl_seconds": self.ttl
+        }
+
+
+# Shared instance (created on first use)
+_analysis_cache: Optional[AnalysisCache] = None
+_analysis_cache_loaded = False
+
+
+def get_analysis_cache() -> Optional[AnalysisCache]:
+    """
+    Get or create the shared analysis cache (None when disabled).
+    """
+    global _analysis_cache, _analysis_cache_loaded
+    if not _analysis_cache_loaded:
+        _analysis_cache = AnalysisCache.from_env()
+        _analysis_cache_loaded = True
+    return _analysis_cache
@@ -0,0 +1,290 @@
+"""
+Cache Backends
+Pluggable key/value storage with TTLs and size-bounded LRU eviction
+"""
+
+import asyncio
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+
+class CacheBackend:
+    """
+    Interface for cache storage.
+
+    Values must be JSON-serializable. Expired entries are never returned.
+    Operations are awaited, so disk and network backends keep their I/O
+    off the event loop.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+    async def size(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process LRU cache. Fastest option; contents are lost on restart and
+    not shared between worker processes.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    On-disk cache in a SQLite table. Survives restarts; the least recently
+    used entries are evicted once the table exceeds max_entries (checked
+    every EVICT_EVERY writes, so the table may briefly overshoot). Queries
+    run in a thread: another worker holding the write lock makes the
+    caller wait, not the event loop.
+    """
+
+    EVICT_EVERY = 32
+
+    def __init__(self, path: str, max_entries: int = 10000, table: str = "cache"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table}")
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.RLock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table}(last_access)")
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self._clear)
+
+    async def size(self) -> int:
+        return await asyncio.to_thread(self._size)
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+
+            self._conn.execute(
+                f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            return json.loads(value)
+
+    def _set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),)
+        )
+        overflow = self._size() - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def _size(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache in Redis (or anything speaking its protocol), shared by every
+    worker on every host. Expiry is Redis's own; a sorted set of keys by
+    last access gives the same LRU bound as the SQLite backend (checked
+    every EVICT_EVERY writes). Each entry is one round trip, made with
+    the redis package's asyncio client.
+    """
+
+    EVICT_EVERY = 32
+    KEY_PREFIX = "pharma:cache:"
+
+    def __init__(self, url: str, max_entries: int = 10000, table: str = "cache"):
+        try:
+            # Optional, and imported only where it is used: it adds ~80ms to startup
+            from redis import asyncio as redis
+        except ImportError:
+            raise ValueError("Cache backend redis needs the redis package (5.0.1 or later) installed") from None
+
+        self.url = url
+        self.max_entries = max_entries
+        self.prefix = f"{self.KEY_PREFIX}{table}:"
+        self._lru = f"{self.KEY_PREFIX}{table}"
+        self._writes = 0
+        self._client = redis.Redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._client.get(self.prefix + key)
+        if value is None:
+            return None
+        await self._client.zadd(self._lru, {key: time.time()})
+        return json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+        pipe.zadd(self._lru, {key: time.time()})
+        await pipe.execute()
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            await self._evict()
+
+    async def _evict(self) -> None:
+        overflow = await self._client.zcard(self._lru) - self.max_entries
+        if overflow > 0:
+            keys = [key.decode() for key in await self._client.zrange(self._lru, 0, overflow - 1)]
+            pipe = self._client.pipeline(transaction=False)
+            pipe.delete(*(self.prefix + key for key in keys))
+            pipe.zrem(self._lru, *keys)
+            await pipe.execute()
+
+    async def delete(self, key: str) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.delete(self.prefix + key)
+        pipe.zrem(self._lru, key)
+        await pipe.execute()
+
+    async def clear(self) -> None:
+        keys = [key.decode() for key in await self._client.zrange(self._lru, 0, -1)]
+        for start in range(0, len(keys), 1000):
+            await self._client.delete(*(self.prefix + key for key in keys[start:start + 1000]))
+        await self._client.delete(self._lru)
+
+    async def size(self) -> int:
+        # Expired entries count until evicted
+        return await self._client.zcard(self._lru)
+
+
+def create_backend(
+    kind: str,
+    path: str,
+    max_entries: int,
+    table: str,
+    redis_url: Optional[str] = None
+) -> Optional[CacheBackend]:
+    """
+    Build a backend from configuration.
+
+    Args:
+        kind: "memory", "sqlite" (alias "disk"), "redis" or "off"
+        path: SQLite file path (sqlite only)
+        max_entries: Size bound before LRU eviction
+        table: SQLite table name, or Redis key namespace
+        redis_url: Server URL (redis only; default REDIS_URL)
+
+    Returns:
+        Backend instance, or None when caching is off
+    """
+    kind = kind.lower()
+    if kind == "off":
+        return None
+    if kind == "memory":
+        return MemoryCacheBackend(max_entries=max_entries)
+    if kind in ("sqlite", "disk"):
+        return SQLiteCacheBackend(path, max_entries=max_entries, table=table)
+    if kind == "redis":
+        url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        return RedisCacheBackend(url, max_entries=max_entries, table=table)
+    raise ValueError(f"Unknown cache backend: {kind}")
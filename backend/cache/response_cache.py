@@ -0,0 +1,161 @@
+"""
+Sales Agent Response Cache
+Serves repeat questions without another LLM round trip
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from cache.backends import CacheBackend, create_backend
+from prompts.builder import get_prompt_builder
+
+
+def normalize_query(query: str) -> str:
+    """
+    Case-, whitespace- and trailing-punctuation-insensitive form of a query.
+    """
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def prompt_fingerprint(product_id: Optional[str] = None) -> str:
+    """
+    Hash of the product, its product data and the sales prompt template.
+
+    Computed once by the product's prompt builder over its static prefix
+    and context template, so any edit to either (or to PRODUCT_DATA)
+    changes it.
+    """
+    return get_prompt_builder(product_id).fingerprint
+
+
+def response_key(
+    query: str,
+    hcp_context: Dict = None,
+    product_id: Optional[str] = None,
+    knowledge_version: Optional[str] = None
+) -> str:
+    """
+    Identity of a sales answer: questions with the same key get the same
+    answer (used for the cache and for coalescing concurrent requests).
+    """
+    payload = json.dumps(
+        {
+            "query": normalize_query(query),
+            "hcp_context": hcp_context or {},
+            "prompt": prompt_fingerprint(product_id),
+            "product_id": product_id,
+            "knowledge": knowledge_version
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache of approved sales agent responses.
+
+    Keys combine the normalized query, the HCP context, the product, the
+    prompt fingerprint and the knowledge index version (when retrieval is
+    on), so entries written against old product data, an old template or
+    an old index are simply never hit again (and age out via TTL/LRU).
+
+    Configuration (environment variables):
+        RESPONSE_CACHE_BACKEND: memory (default), sqlite, redis (REDIS_URL) or off; use sqlite or redis
+            with several workers, so they share one cache
+        RESPONSE_CACHE_TTL_SECONDS: Entry lifetime (default 3600)
+        RESPONSE_CACHE_STALE_SECONDS: How long expired entries remain as outage fallback (default 86400)
+        RESPONSE_CACHE_MAX_ENTRIES: Size bound before LRU eviction (default 1000)
+        RESPONSE_CACHE_PATH: SQLite file (default .cache/responses.sqlite3)
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: Optional[float] = 3600, stale_ttl: float = 86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        backend = create_backend(
+            kind=os.getenv("RESPONSE_CACHE_BACKEND", "memory"),
+            path=os.getenv("RESPONSE_CACHE_PATH", ".cache/responses.sqlite3"),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+            table="sales_responses"
+        )
+        if backend is None:
+            return None
+        return cls(
+            backend,
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+            stale_ttl=float(os.getenv("RESPONSE_CACHE_STALE_SECONDS", "86400"))
+        )
+
+    def make_key(
+        self,
+        query: str,
+        hcp_context: Dict = None,
+        product_id: Optional[str] = None,
+        knowledge_version: Optional[str] = None
+    ) -> str:
+        return response_key(query, hcp_context, product_id, knowledge_version)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = await self.backend.get(key)
+        if entry is None or self._expired(entry):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._response(entry)
+
+    async def peek(self, key: str) -> Optional[str]:
+        """
+        Like get(), without counting a lookup (polling for another worker's answer).
+        """
+        entry = await self.backend.get(key)
+        return None if entry is None or self._expired(entry) else self._response(entry)
+
+    async def get_stale(self, key: str) -> Optional[str]:
+        """
+        The entry's response even if past its TTL (within the stale window).
+        """
+        entry = await self.backend.get(key)
+        if entry is None:
+            return None
+        self.stale_hits += 1
+        return self._response(entry)
+
+    async def set(self, key: str, response: str) -> None:
+        if self.ttl:
+            entry = {"response": response, "fresh_until": time.time() + self.ttl}
+            await self.backend.set(key, entry, ttl=self.ttl + self.stale_ttl)
+        else:
+            await self.backend.set(key, {"response": response, "fresh_until": None})
+
+    @staticmethod
+    def _expired(entry) -> bool:
+        # Plain strings were written before the stale window existed
+        return isinstance(entry, dict) and entry["fresh_until"] is not None and entry["fresh_until"] <= time.time()
+
+    @staticmethod
+    def _response(entry) -> str:
+        return entry["response"] if isinstance(entry, dict) else entry
+
+    async def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": await self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stale_hits": self.stale_hits,
+            "ttl_seconds": self.ttl,
+            "stale_seconds": self.stale_ttl
+        }
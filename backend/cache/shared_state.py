@@ -0,0 +1,368 @@
+"""
+Shared Worker State
+Leases and rate-limit buckets shared by every worker process, in SQLite (one host) or Redis
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional, Sequence, Tuple
+
+from observability.logs import get_logger
+
+logger = get_logger("workers")
+
+# (bucket name, amount to take, refill per minute)
+Bucket = Tuple[str, float, float]
+
+# Redis: take every bucket or none, atomically, on the server's clock
+_TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels = {}
+local wait, short = 0, ''
+for i, key in ipairs(KEYS) do
+    local amount, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'level', 'updated')
+    local level = tonumber(state[1]) or rate
+    local updated = tonumber(state[2]) or now
+    level = math.min(rate, level + (now - updated) * rate / 60)
+    levels[i] = level
+    local missing = math.min(amount, rate) - level
+    if missing > 0 and missing * 60 / rate > wait then
+        wait, short = missing * 60 / rate, key
+    end
+end
+if wait > 0 then
+    return {tostring(wait), short}
+end
+for i, key in ipairs(KEYS) do
+    local amount, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'level', tostring(levels[i] - math.min(amount, rate)), 'updated', tostring(now))
+    redis.call('EXPIRE', key, 120)
+end
+return {'0', ''}
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class SharedState:
+    """
+    Coordination between the worker processes serving the app.
+
+    Leases are named locks with an expiry: held by one worker at a time,
+    released by their holder, and free again by themselves if it dies.
+    Buckets are token buckets (rate units per minute, holding at most a
+    minute's worth) drawn on by every worker.
+
+    Every operation is awaited: its I/O (a SQLite transaction that may
+    wait on another worker's lock, a Redis round trip) never blocks the
+    event loop serving requests.
+
+    Configuration (environment variables):
+        SHARED_STATE_BACKEND: off (default: one worker), sqlite (workers on one host) or redis
+        SHARED_STATE_PATH: SQLite file (default .data/shared_state.sqlite3)
+        REDIS_URL: Redis server (default redis://localhost:6379/0)
+    """
+
+    def __init__(self):
+        # This process's claim on the leases it takes
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        """
+        Take the lease for `ttl` seconds unless another worker holds it.
+        """
+        raise NotImplementedError
+
+    async def renew(self, key: str, ttl: float) -> bool:
+        """
+        Extend a lease this worker holds (False: it had expired and was lost).
+        """
+        raise NotImplementedError
+
+    async def release(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def take(self, buckets: Sequence[Bucket]) -> Tuple[float, Optional[str]]:
+        """
+        Take from every bucket, or from none.
+
+        Returns:
+            (0, None) once taken, else (seconds until all would hold
+            enough, the bucket that is shortest)
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteSharedState(SharedState):
+    """
+    State in a SQLite file in WAL mode, for workers on one host. Every
+    operation is one short write transaction, run in a thread.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL);"
+        )
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        return await asyncio.to_thread(self._acquire, key, ttl)
+
+    async def renew(self, key: str, ttl: float) -> bool:
+        return await asyncio.to_thread(self._renew, key, ttl)
+
+    async def release(self, key: str) -> None:
+        await asyncio.to_thread(self._release, key)
+
+    async def take(self, buckets: Sequence[Bucket]) -> Tuple[float, Optional[str]]:
+        return await asyncio.to_thread(self._take, buckets)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._close)
+
+    def _acquire(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at <= ?",
+                (key, self.owner, now + ttl, now)
+            )
+            return cursor.rowcount == 1
+
+    def _renew(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ? AND expires_at > ?",
+                (now + ttl, key, self.owner, now)
+            )
+            return cursor.rowcount == 1
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def _take(self, buckets: Sequence[Bucket]) -> Tuple[float, Optional[str]]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                levels, wait, short = [], 0.0, None
+                for name, amount, rate in buckets:
+                    row = self._conn.execute(
+                        "SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                    level, updated = row if row is not None else (rate, now)
+                    level = min(rate, level + (now - updated) * rate / 60.0)
+                    levels.append(level)
+                    missing = min(amount, rate) - level
+                    if missing > 0 and missing * 60.0 / rate > wait:
+                        wait, short = missing * 60.0 / rate, name
+                if wait == 0:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                        [(name, level - min(amount, rate), now)
+                         for (name, amount, rate), level in zip(buckets, levels)]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait, short
+
+    def _close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSharedState(SharedState):
+    """
+    State in Redis (or anything speaking its protocol), for workers on
+    any number of hosts. Buckets run as one server-side script, so
+    concurrent workers never both take the last tokens. Uses the
+    redis package's asyncio client.
+    """
+
+    KEY_PREFIX = "pharma:state:"
+
+    def __init__(self, url: str):
+        try:
+            # Optional; imported here so single-host deployments never load it
+            from redis import asyncio as redis
+        except ImportError:
+            raise ValueError("SHARED_STATE_BACKEND=redis needs the redis package (5.0.1 or later) installed") from None
+        super().__init__()
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+        self._release = self._client.register_script(_RELEASE_SCRIPT)
+        self._renew = self._client.register_script(_RENEW_SCRIPT)
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        return bool(await self._client.set(self.KEY_PREFIX + key, self.owner, nx=True, px=max(1, int(ttl * 1000))))
+
+    async def renew(self, key: str, ttl: float) -> bool:
+        return bool(await self._renew(keys=[self.KEY_PREFIX + key], args=[self.owner, max(1, int(ttl * 1000))]))
+
+    async def release(self, key: str) -> None:
+        await self._release(keys=[self.KEY_PREFIX + key], args=[self.owner])
+
+    async def take(self, buckets: Sequence[Bucket]) -> Tuple[float, Optional[str]]:
+        args = []
+        for _, amount, rate in buckets:
+            args += [amount, rate]
+        wait, short = await self._take(keys=[self.KEY_PREFIX + name for name, _, _ in buckets], args=args)
+        wait = float(wait)
+        return (wait, short.decode()[len(self.KEY_PREFIX):]) if wait > 0 else (0.0, None)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_shared_state(kind: str, path: str, url: str) -> Optional[SharedState]:
+    """
+    Build the shared state from configuration.
+
+    Args:
+        kind: "off", "sqlite" or "redis"
+        path: SQLite file path (sqlite only)
+        url: Server URL (redis only)
+
+    Returns:
+        State instance, or None when workers share nothing
+    """
+    kind = kind.lower()
+    if kind == "off":
+        return None
+    if kind == "sqlite":
+        return SQLiteSharedState(path)
+    if kind == "redis":
+        return RedisSharedState(url)
+    raise ValueError(f"Unknown shared state backend: {kind}")
+
+
+class PrimaryElection:
+    """
+    Keeps exactly one worker primary: the one holding the "primary"
+    lease. It renews the lease every ttl/3 seconds; if it dies or stalls
+    past ttl, another worker takes over within about ttl/3 more. A
+    primary that cannot reach the state steps down before its lease
+    runs out, so two workers never both act as primary.
+
+    Background duties that must not run twice (bulk jobs, audit
+    compaction, scorecard snapshots) run in the primary only; every
+    worker serves requests.
+
+    Configuration (environment variables):
+        PRIMARY_LEASE_SECONDS: How long a silent primary keeps the role (default 15)
+    """
+
+    LEASE = "primary"
+
+    def __init__(
+        self,
+        state: SharedState,
+        ttl: float = 15.0,
+        on_promote: Optional[Callable[[], Awaitable[None]]] = None,
+        on_demote: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        self.state = state
+        self.ttl = ttl
+        self.on_promote = on_promote
+        self.on_demote = on_demote
+        self.primary = False
+
+    async def run(self) -> None:
+        global _primary
+        # When the lease was last taken or renewed (it runs out ttl later)
+        held_since = 0.0
+        try:
+            while True:
+                checked = time.monotonic()
+                try:
+                    if self.primary:
+                        held = await self.state.renew(self.LEASE, self.ttl)
+                    else:
+                        held = await self.state.acquire(self.LEASE, self.ttl)
+                    if held:
+                        held_since = checked
+                except Exception as e:
+                    # Unreachable state: keep the role only while the lease is sure to last until the
+                    # next check; once it runs out another worker may take it, so step down before then
+                    logger.error("Primary lease check failed", extra={"error": str(e)})
+                    held = self.primary and time.monotonic() + self.ttl / 3 < held_since + self.ttl
+                if held != self.primary:
+                    self.primary = _primary = held
+                    logger.info("Primary worker" if held else "No longer primary worker",
+                                extra={"owner": self.state.owner})
+                    callback = self.on_promote if held else self.on_demote
+                    if callback is not None:
+                        await callback()
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            if self.primary:
+                self.primary = _primary = False
+                await self.state.release(self.LEASE)
+
+
+# Whether this process holds the primary lease (see PrimaryElection)
+_primary = False
+
+
+def is_primary_worker() -> bool:
+    """
+    True when this process should run background duties: it is the only
+    worker (no shared state), or it was elected.
+    """
+    return _primary or get_shared_state() is None
+
+
+# Shared instance (created on first use)
+_shared_state: Optional[SharedState] = None
+_shared_state_loaded = False
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """
+    Get or create this process's handle on the shared state (None when off).
+    """
+    global _shared_state, _shared_state_loaded
+    if not _shared_state_loaded:
+        _shared_state = create_shared_state(
+            os.getenv("SHARED_STATE_BACKEND", "off"),
+            os.getenv("SHARED_STATE_PATH", ".data/shared_state.sqlite3"),
+            os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        )
+        _shared_state_loaded = True
+    return _shared_state
@@ -0,0 +1,155 @@
+"""
+Request Coalescing
+Concurrent identical requests share one in-flight upstream call
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from cache.shared_state import SharedState, get_shared_state
+from observability.logs import get_logger
+from observability.metrics import COALESCED_CALLS, SHARED_FLIGHT_WAITS
+
+logger = get_logger("workers")
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers arriving while it is
+    in flight await the same result (or exception) instead of starting
+    their own.
+
+    This covers the gap before a cache entry exists: when dozens of reps
+    ask the same question within seconds, the first request calls the LLM
+    and the rest join it.
+
+    The call runs as its own task, shielded from the callers: a caller
+    that is cancelled (e.g. its client disconnected) just stops waiting.
+    The call itself is cancelled only once every caller has gone. The key
+    is released as soon as the call finishes, so later requests start
+    fresh (and normally hit the cache).
+
+    With shared state (several workers), the call also takes a lease on
+    the key, so only one worker at a time makes it. A worker that finds
+    the lease taken polls `peek` (the shared cache the holder writes its
+    result to) and returns what appears there; if the lease is released
+    with nothing stored (a blocked answer, an error), it makes the call
+    itself. This is best effort: without `peek`, between the holder's
+    call ending and its result being stored, or while the shared state
+    is unreachable, workers call independently.
+
+    Configuration (environment variables):
+        REQUEST_COALESCING: on (default) or off
+        SINGLE_FLIGHT_LEASE_SECONDS: Longest a worker waits on another's call (default 60)
+    """
+
+    POLL_SECONDS = 0.05
+
+    def __init__(
+        self,
+        name: str,
+        enabled: bool = True,
+        state: Optional[SharedState] = None,
+        lease_ttl: float = 60.0
+    ):
+        self.name = name
+        self.enabled = enabled
+        self.state = state
+        self.lease_ttl = lease_ttl
+        self._flights: Dict[str, _Flight] = {}
+
+    @classmethod
+    def from_env(cls, name: str) -> "SingleFlight":
+        return cls(
+            name,
+            enabled=os.getenv("REQUEST_COALESCING", "on").lower() in ("1", "on", "true"),
+            state=get_shared_state(),
+            lease_ttl=float(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", "60"))
+        )
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[T]],
+        peek: Optional[Callable[[], Awaitable[Optional[T]]]] = None
+    ) -> T:
+        """
+        Result of `call()`, shared with concurrent callers of the same key
+        (and, through `peek`, with other workers).
+        """
+        if not self.enabled:
+            return await call()
+
+        flight = self._flights.get(key)
+        if flight is None:
+            if self.state is not None and peek is not None:
+                upstream = self._leased(key, call, peek)
+            else:
+                upstream = call()
+            flight = _Flight(asyncio.create_task(upstream))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._release(key, flight))
+        else:
+            COALESCED_CALLS.inc(name=self.name)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Last caller gone: stop the upstream call (new callers start afresh)
+                self._release(key, flight)
+                flight.task.cancel()
+
+    async def _leased(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[T]],
+        peek: Callable[[], Awaitable[Optional[T]]]
+    ) -> T:
+        lease = f"flight:{self.name}:{key}"
+        waited = False
+        try:
+            while not await self.state.acquire(lease, self.lease_ttl):
+                # Another worker is making this call: wait for its result to be stored
+                waited = True
+                await asyncio.sleep(self.POLL_SECONDS)
+                result = await peek()
+                if result is not None:
+                    SHARED_FLIGHT_WAITS.inc(name=self.name, outcome="joined")
+                    return result
+        except Exception as e:
+            logger.warning("Shared lease unavailable; calling without it", extra={"error": str(e)})
+            return await call()
+        if waited:
+            SHARED_FLIGHT_WAITS.inc(name=self.name, outcome="took_over")
+        try:
+            return await call()
+        finally:
+            try:
+                await self.state.release(lease)
+            except Exception as e:
+                # The lease runs out by itself; the call's own outcome stands
+                logger.warning("Failed to release shared lease", extra={"error": str(e)})
+
+    def _release(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.task.done() and not flight.task.cancelled():
+            # Mark the exception retrieved when every caller had already left
+            flight.task.exception()
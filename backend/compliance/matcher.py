@@ -0,0 +1,333 @@
+"""
+Multi-Pattern Rule Matcher
+Finds every keyword and pattern hit in a single pass over the text
+"""
+
+from collections import deque
+from functools import lru_cache
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# Characters that end a pattern's literal prefix
+_REGEX_META = set(".^$*+?{}[]\\|()")
+_QUANTIFIERS = set("*+?{")
+
+# Shorter prefixes fire too often to be a useful prefilter
+MIN_TRIGGER_LENGTH = 3
+
+# Up to this many literals, one str.find loop per literal (run in C) beats
+# stepping the automaton through the text in Python
+SCAN_MAX_LITERALS = 128
+
+# Match length assumed for open-ended patterns (".*", "\s+"), and the most
+# any pattern is assumed to match
+MAX_MATCH_LENGTH = 256
+
+
+class RuleMatch(NamedTuple):
+    """
+    One rule hit. Spans index into the (lowercased) scanned text.
+    """
+    category: str
+    rule: str
+    rule_index: int
+    start: int
+    end: int
+    text: str
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a fixed set of literal strings.
+
+    Matching cost is linear in the text length plus the number of hits,
+    independent of how many literals were compiled in.
+    """
+
+    def __init__(self, literals: List[str]):
+        self.literals = list(literals)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for index, literal in enumerate(self.literals):
+            self._add(literal, index)
+        self._build_links()
+
+    def _add(self, literal: str, index: int) -> None:
+        state = 0
+        for char in literal:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (index,)
+
+    def _build_links(self) -> None:
+        # Breadth-first so every fail target is finished before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """
+        Yield (start, end, literal_index) for every occurrence, overlaps included.
+        """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        literals = self.literals
+        state = 0
+
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                end = position + 1
+                for index in out[state]:
+                    yield end - len(literals[index]), end, index
+
+
+class LiteralScanner:
+    """
+    Finds the same matches as AhoCorasick, in the same order, with a
+    str.find loop per literal. Its cost grows with the number of
+    literals, so it is only used for small rule sets (SCAN_MAX_LITERALS).
+    """
+
+    def __init__(self, literals: List[str]):
+        self.literals = list(literals)
+
+    def iter_matches(self, text: str):
+        """
+        Yield (start, end, literal_index) for every occurrence, overlaps included.
+        """
+        find = text.find
+        hits = []
+        for index, literal in enumerate(self.literals):
+            length = len(literal)
+            start = find(literal)
+            while start != -1:
+                hits.append((start + length, start, index))
+                start = find(literal, start + 1)
+        # The automaton's order: by end, longer (earlier-starting) literals first
+        hits.sort()
+        for end, start, index in hits:
+            yield start, end, index
+
+
+def scanner_for(literals: List[str]):
+    """
+    The faster literal scanner for this many literals.
+    """
+    if len(literals) <= SCAN_MAX_LITERALS:
+        return LiteralScanner(literals)
+    return AhoCorasick(literals)
+
+
+def max_match_length(pattern: str) -> int:
+    """
+    Longest text `pattern` can match, capped at MAX_MATCH_LENGTH.
+    """
+    return min(sre_parse.parse(pattern).getwidth()[1], MAX_MATCH_LENGTH)
+
+
+def literal_prefix(pattern: str) -> str:
+    """
+    Leading literal text that every match of `pattern` must start with.
+
+    Returns an empty string when the pattern has a top-level alternation or
+    starts with a regex construct.
+    """
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return ""
+        i += 1
+
+    prefix = []
+    for char in pattern:
+        if char in _REGEX_META:
+            if char in _QUANTIFIERS and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+    return "".join(prefix)
+
+
+class RuleMatcher:
+    """
+    Compiled matcher for one rule set.
+
+    Literal rules and the literal prefixes of regex rules share a single
+    Aho-Corasick automaton, so one pass over the text finds every literal
+    hit and every position where a pattern could start; only those
+    positions are verified with the pattern's own regex. Patterns without a
+    usable literal prefix are searched for one by one with their own regex.
+    Small rule sets (up to SCAN_MAX_LITERALS literals and prefixes) are
+    scanned with a LiteralScanner instead: same hits, but faster until the
+    rule count grows.
+
+    Compiling the regexes is most of the cost of building a matcher. With
+    validate=False (patterns already known to compile, see the registry's
+    compiled rules cache) each regex is compiled the first time it is needed.
+
+    Each pattern's longest possible match (capped at MAX_MATCH_LENGTH) is
+    measured on first use, so a growing text can be checked for pattern
+    matches that later text may still complete (see open_start).
+    """
+
+    def __init__(
+        self,
+        literals: Dict[str, List[str]],
+        patterns: Dict[str, List[str]],
+        validate: bool = True
+    ):
+        self._literal_rules: List[Tuple[str, int, str]] = []
+        trigger_literals: List[str] = []
+        # literal index -> ("literal", rule id) or ("pattern", pattern id)
+        self._trigger_targets: List[Tuple[str, int]] = []
+
+        for category, rules in literals.items():
+            for rule_index, rule in enumerate(rules):
+                trigger_literals.append(rule)
+                self._trigger_targets.append(("literal", len(self._literal_rules)))
+                self._literal_rules.append((category, rule_index, rule))
+
+        self._patterns: List[Tuple[str, int, str]] = []
+        # Compiled here when validating, so invalid patterns raise; otherwise on first use
+        self._regexes: List[Optional["re.Pattern"]] = []
+        self._max_lengths: List[Optional[int]] = []
+        # Patterns without a usable literal prefix, searched for on their own
+        self._fallback_ids: List[int] = []
+        for category, rules in patterns.items():
+            for rule_index, rule in enumerate(rules):
+                pattern_id = len(self._patterns)
+                self._patterns.append((category, rule_index, rule))
+                self._regexes.append(re.compile(rule) if validate else None)
+                self._max_lengths.append(None)
+                prefix = literal_prefix(rule)
+                if len(prefix) >= MIN_TRIGGER_LENGTH:
+                    trigger_literals.append(prefix)
+                    self._trigger_targets.append(("pattern", pattern_id))
+                else:
+                    self._fallback_ids.append(pattern_id)
+
+        self._automaton = scanner_for(trigger_literals)
+        self._fallback_reach: Optional[int] = None
+        self.longest_literal = max(
+            (len(rule) for _, _, rule in self._literal_rules), default=0)
+        # Longest literal rule or pattern prefix
+        self.longest_trigger = max(map(len, trigger_literals), default=0)
+
+    def find_all(self, text: str) -> List[RuleMatch]:
+        """
+        Find every rule hit in `text`, ordered by start position.
+        """
+        matches = []
+        literal_rules = self._literal_rules
+        targets = self._trigger_targets
+        regexes = self._regexes
+        verified = set()
+
+        for start, end, literal_id in self._automaton.iter_matches(text):
+            kind, target = targets[literal_id]
+            if kind == "literal":
+                category, rule_index, rule = literal_rules[target]
+                matches.append(RuleMatch(category, rule, rule_index, start, end, rule))
+            elif (target, start) not in verified:
+                verified.add((target, start))
+                category, rule_index, rule = self._patterns[target]
+                compiled = regexes[target] or self._compile(target)
+                match = compiled.match(text, start)
+                if match:
+                    matches.append(RuleMatch(
+                        category, rule, rule_index, start, match.end(), match.group(0)))
+
+        for pattern_id in self._fallback_ids:
+            category, rule_index, rule = self._patterns[pattern_id]
+            compiled = regexes[pattern_id] or self._compile(pattern_id)
+            for match in compiled.finditer(text):
+                matches.append(RuleMatch(
+                    category, rule, rule_index, match.start(), match.end(), match.group(0)))
+
+        matches.sort(key=lambda m: (m.start, m.end))
+        return matches
+
+    def _compile(self, pattern_id: int) -> "re.Pattern":
+        compiled = self._regexes[pattern_id] = re.compile(self._patterns[pattern_id][2])
+        return compiled
+
+    def _max_length(self, pattern_id: int) -> int:
+        length = self._max_lengths[pattern_id]
+        if length is None:
+            length = self._max_lengths[pattern_id] = max_match_length(self._patterns[pattern_id][2])
+        return length
+
+    def open_start(self, text: str) -> int:
+        """
+        Earliest position from which a pattern could still match once more
+        text is appended (len(text) when there is none).
+
+        A pattern is open from each of its literal prefix hits until its
+        longest possible match would end inside `text`. Patterns without a
+        prefix can start anywhere, so they keep their whole length open.
+        A prefix cut off at the end of `text` is not seen here; it lies
+        within the last longest_trigger - 1 characters.
+        """
+        if self._fallback_reach is None:
+            self._fallback_reach = max(map(self._max_length, self._fallback_ids), default=0)
+        end = len(text)
+        earliest = max(0, end - self._fallback_reach + 1) if self._fallback_reach else end
+        tail = max(0, end - MAX_MATCH_LENGTH)
+        for start, _, literal_id in self._automaton.iter_matches(text[tail:]):
+            kind, target = self._trigger_targets[literal_id]
+            if kind == "pattern" and tail + start + self._max_length(target) > end:
+                earliest = min(earliest, tail + start)
+        return earliest
+
+
+# Bounded: hot-reloaded rule files would otherwise pin every old version
+@lru_cache(maxsize=256)
+def compile_rules(
+    literals: Tuple[Tuple[str, Tuple[str, ...]], ...],
+    patterns: Tuple[Tuple[str, Tuple[str, ...]], ...],
+    validate: bool = True
+) -> RuleMatcher:
+    """
+    Build (once) and return the matcher for a rule set.
+
+    Args are hashable (category, rules) pairs so identical rule sets share
+    one compiled matcher.
+    """
+    return RuleMatcher(
+        {category: list(rules) for category, rules in literals},
+        {category: list(rules) for category, rules in patterns},
+        validate=validate
+    )
@@ -3,50 +3,52 @@ Off-Label Promotion Detection System
 Multi-layer detection to prevent FDA violations
 """
 
-import re
-from typing import Dict, List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+import multiprocessing
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from compliance.matcher import MAX_MATCH_LENGTH, RuleMatch, RuleMatcher
+from compliance.registry import ProductRules, RuleRegistry, get_rule_registry
+
+# Batches smaller than this are scanned in-process (pool overhead dominates)
+BATCH_PARALLEL_THRESHOLD = 512
+# Texts per task sent to a worker process
+BATCH_CHUNK_SIZE = 256
 
 
 class OffLabelDetector:
     """
     Detects off-label promotion attempts using keyword and pattern matching.
+
+    The rules come from one product's rule file (see compliance.registry),
+    all compiled into one RuleMatcher, so a text is scanned once no matter
+    how many keywords, patterns and conditions there are.
     """
 
-    # FDA-approved indications (example for demo)
-    APPROVED_INDICATIONS = [
-        "hyperlipidemia",
-        "high cholesterol",
-        "elevated ldl",
-        "cardiovascular risk reduction"
-    ]
-
-    # Prohibited terms
-    OFF_LABEL_KEYWORDS = [
-        "off-label",
-        "off label",
-        "unapproved use",
-        "non-approved indication",
-        "investigational use"
-    ]
-
-    # Implicit off-label patterns
-    IMPLICIT_PATTERNS = [
-        r"some (?:doctors|physicians|clinicians) (?:use|prescribe|find success)",
-        r"might(?:\s+also)? (?:work|help|benefit) (?:for|with)",
-        r"can be used for",
-        r"doctors have found",
-        r"in practice.*works for"
-    ]
-
-    # Common off-label conditions (example - would be customized per drug)
-    COMMON_OFF_LABEL_CONDITIONS = [
-        "migraine",
-        "headache prevention",
-        "weight loss",
-        "pediatric use",
-        "children",
-        "pregnancy"
-    ]
+    # Violation categories in reporting precedence
+    VIOLATION_PRIORITY = {
+        "explicit_off_label": 0,
+        "implicit_off_label": 1,
+        "unapproved_indication": 2
+    }
+
+    def __init__(self, rules: Optional[ProductRules] = None):
+        """
+        Args:
+            rules: Product rule set (default: the registry's default product)
+        """
+        self.rules = rules or get_rule_registry().get()
+
+    @property
+    def matcher(self) -> RuleMatcher:
+        """
+        Compiled single-pass matcher for this detector's rule set
+        (built once per rule file version and shared by every detector).
+        """
+        return self.rules.matcher
 
     def detect(self, text: str) -> Dict:
         """
@@ -56,64 +58,166 @@ class OffLabelDetector:
             text: Text to analyze (query or response)
 
         Returns:
-            Dictionary with detection results
-        """
-        text_lower = text.lower()
-
-        # Check 1: Explicit off-label language
-        for keyword in self.OFF_LABEL_KEYWORDS:
-            if keyword in text_lower:
-                return {
-                    "is_violation": True,
-                    "violation_type": "explicit_off_label",
-                    "detected_text": keyword,
-                    "explanation": f"Text contains explicit off-label language: '{keyword}'"
-                }
+            Dictionary with detection results. The headline fields describe
+            the highest-priority violation; "violations" lists every hit
+            with its character span.
+        """
+        return self._detect_lower(text.lower())
 
-        # Check 2: Implicit patterns
-        for pattern in self.IMPLICIT_PATTERNS:
-            match = re.search(pattern, text_lower)
-            if match:
-                return {
-                    "is_violation": True,
-                    "violation_type": "implicit_off_label",
-                    "detected_text": match.group(0),
-                    "explanation": f"Text contains implicit off-label suggestion: '{match.group(0)}'"
-                }
+    def _detect_lower(self, text_lower: str, approved_context: Optional[bool] = None) -> Dict:
+        """
+        Run the detection layers over already-lowercased text in one pass.
+
+        Args:
+            text_lower: Lowercased text to analyze
+            approved_context: Precomputed approved-context flag (computed
+                from text_lower when not given)
+        """
+        matches = self.matcher.find_all(text_lower)
+
+        if approved_context is None:
+            approved_context = any(
+                m.category == "approved_context" for m in matches)
+
+        violations = [
+            m for m in matches
+            if m.category in self.VIOLATION_PRIORITY
+            # Conditions are okay when discussed in an approved context
+            and not (m.category == "unapproved_indication" and approved_context)
+        ]
+
+        if not violations:
+            return {
+                "is_violation": False,
+                "violation_type": None,
+                "detected_text": None,
+                "explanation": "No off-label promotion detected",
+                "violations": []
+            }
+
+        # Same precedence as the original layer order: explicit language,
+        # then implicit patterns, then unapproved conditions; rule order
+        # breaks ties within a layer.
+        primary = min(
+            violations,
+            key=lambda m: (self.VIOLATION_PRIORITY[m.category], m.rule_index, m.start)
+        )
 
-        # Check 3: Mention of unapproved conditions
-        for condition in self.COMMON_OFF_LABEL_CONDITIONS:
-            if condition in text_lower:
-                # Check if it's being discussed in an approved context
-                if not self._is_approved_context(text_lower):
-                    return {
-                        "is_violation": True,
-                        "violation_type": "unapproved_indication",
-                        "detected_text": condition,
-                        "explanation": f"Discussion of unapproved indication: '{condition}'. Approved uses: {', '.join(self.APPROVED_INDICATIONS)}"
-                    }
-
-        # No violations detected
         return {
-            "is_violation": False,
-            "violation_type": None,
-            "detected_text": None,
-            "explanation": "No off-label promotion detected"
+            "is_violation": True,
+            "violation_type": primary.category,
+            "detected_text": primary.text,
+            "explanation": self._explain(primary),
+            "violations": [
+                {
+                    "violation_type": m.category,
+                    "detected_text": m.text,
+                    "start": m.start,
+                    "end": m.end
+                }
+                for m in violations
+            ]
         }
 
+    def _explain(self, match: RuleMatch) -> str:
+        if match.category == "explicit_off_label":
+            return f"Text contains explicit off-label language: '{match.text}'"
+        if match.category == "implicit_off_label":
+            return f"Text contains implicit off-label suggestion: '{match.text}'"
+        return f"Discussion of unapproved indication: '{match.text}'. Approved uses: {', '.join(self.rules.approved_indications)}"
+
     def _is_approved_context(self, text: str) -> bool:
         """
         Check if off-label condition is mentioned in an approved context
         (e.g., "not approved for X" is okay)
         """
-        approved_phrases = [
-            "not approved for",
-            "is not indicated for",
-            "not fda-approved for",
-            "outside approved indications"
-        ]
+        return any(phrase in text for phrase in self.rules.approved_context_phrases)
+
+    def conversation_flags(self, text: str) -> List[str]:
+        """
+        Red-flag terms present in a call transcript (the analyzer's
+        compliance override), found by the same single-pass matcher.
+        """
+        return list(dict.fromkeys(
+            m.rule for m in self.matcher.find_all(text.lower())
+            if m.category == "conversation_flag"))
+
+
+class IncrementalOffLabelScanner:
+    """
+    Scans a growing text (e.g. a streamed LLM response) for off-label content.
+
+    Each feed() re-runs detection only over the tail that the new chunk can
+    affect: the new text plus the last LOOKBACK characters already scanned,
+    so the work per chunk stays bounded however long the text grows. A
+    match that straddles chunk boundaries is still found as long as it is
+    no longer than LOOKBACK; open-ended patterns (".*", "\\s+") are only
+    followed that far here and left to the check on the finished text.
+
+    The approved-context flag is tracked over the whole text, but a condition
+    that streams in before any approved-context phrase blocks immediately -
+    stricter than detect() on the finished text, never looser.
+    """
+
+    LOOKBACK = MAX_MATCH_LENGTH
+
+    def __init__(self, detector: Optional[OffLabelDetector] = None):
+        self.detector = detector or OffLabelDetector()
+        self.text = ""
+        self._text_lower = ""
+        # Index in `text` of each character of the lowercased text, once lowercasing
+        # has changed the length (e.g. "İ" -> "i̇"); None while the two line up
+        self._offsets: Optional[List[int]] = None
+        self._approved_context = False
+        # Trailing characters that could still be the start of a literal rule or pattern prefix
+        self.holdback = max(0, self.detector.matcher.longest_trigger - 1)
+
+    def feed(self, chunk: str) -> Dict:
+        """
+        Append a chunk and scan the affected tail.
+
+        Returns:
+            Detection result for the text seen so far (same shape as
+            detect(), spans relative to the full text)
+        """
+        scanned = len(self._text_lower)
+        lower = chunk.lower()
+        if self._offsets is None and len(lower) != len(chunk):
+            self._offsets = list(range(scanned))
+        if self._offsets is not None:
+            for index, char in enumerate(chunk, len(self.text)):
+                self._offsets.extend([index] * len(char.lower()))
+        self.text += chunk
+        self._text_lower += lower
 
-        return any(phrase in text for phrase in approved_phrases)
+        window_start = max(0, scanned - self.LOOKBACK)
+        window = self._text_lower[window_start:]
+
+        if not self._approved_context:
+            self._approved_context = self.detector._is_approved_context(window)
+
+        result = self.detector._detect_lower(window, self._approved_context)
+        for violation in result["violations"]:
+            violation["start"] = self._original(violation["start"] + window_start)
+            violation["end"] = self._original(violation["end"] - 1 + window_start) + 1
+        return result
+
+    def safe_length(self) -> int:
+        """
+        Number of leading characters that can be released to the client
+        without exposing a partially received rule match: a literal still
+        arriving, or a pattern that later text could complete.
+        """
+        open_start = self.detector.matcher.open_start(self._text_lower)
+        return self._original(max(0, min(len(self._text_lower) - self.holdback, open_start)))
+
+    def _original(self, position: int) -> int:
+        """
+        Position in `text` of the character at `position` in the lowercased text.
+        """
+        if self._offsets is None:
+            return position
+        return self._offsets[position] if position < len(self._offsets) else len(self.text)
 
 
 class ComplianceGuardian:
@@ -122,40 +226,62 @@ class ComplianceGuardian:
     Coordinates multiple detection layers.
     """
 
-    def __init__(self):
-        self.off_label_detector = OffLabelDetector()
+    def __init__(self, registry: Optional[RuleRegistry] = None):
+        self.registry = registry or get_rule_registry()
+
+    def detector(self, product_id: Optional[str] = None) -> OffLabelDetector:
+        """
+        Detector for one product's current rule set.
+
+        Raises:
+            ValueError: Unknown product_id
+        """
+        return OffLabelDetector(self.registry.get(product_id))
+
+    @property
+    def off_label_detector(self) -> OffLabelDetector:
+        """
+        Detector for the default product.
+        """
+        return self.detector()
 
-    def check_compliance(self, query: str, response: str) -> Dict:
+    def check_compliance(self, query: str, response: str, product_id: Optional[str] = None) -> Dict:
         """
         Comprehensive compliance check on query and response.
 
         Args:
             query: User's original question
             response: AI-generated response
+            product_id: Product whose rules apply (default product when None)
 
         Returns:
-            Dictionary with compliance status
+            Dictionary with compliance status; "violations" lists every
+            hit in the text that was blocked, with its span
         """
+        detector = self.detector(product_id)
+
         # Check query for off-label requests
-        query_check = self.off_label_detector.detect(query)
+        query_check = detector.detect(query)
 
         if query_check["is_violation"]:
             return {
                 "status": "BLOCKED",
                 "violation_type": query_check["violation_type"],
                 "explanation": query_check["explanation"],
-                "detected_in": "query"
+                "detected_in": "query",
+                "violations": query_check["violations"]
             }
 
         # Check response for off-label content
-        response_check = self.off_label_detector.detect(response)
+        response_check = detector.detect(response)
 
         if response_check["is_violation"]:
             return {
                 "status": "BLOCKED",
                 "violation_type": response_check["violation_type"],
                 "explanation": response_check["explanation"],
-                "detected_in": "response"
+                "detected_in": "response",
+                "violations": response_check["violations"]
             }
 
         # All checks passed
@@ -163,5 +289,117 @@ class ComplianceGuardian:
             "status": "APPROVED",
             "violation_type": None,
             "explanation": None,
-            "detected_in": None
+            "detected_in": None,
+            "violations": []
+        }
+
+    def check_text(self, text: str, product_id: Optional[str] = None) -> Dict:
+        """
+        Detector-only check of a standalone text (no LLM involved).
+
+        Returns:
+            Dictionary with compliance status and every violation span
+        """
+        return self._text_result(self.detector(product_id).detect(text))
+
+    @staticmethod
+    def _text_result(detection: Dict) -> Dict:
+        return {
+            "status": "BLOCKED" if detection["is_violation"] else "APPROVED",
+            "violation_type": detection["violation_type"],
+            "explanation": detection["explanation"] if detection["is_violation"] else None,
+            "violations": detection["violations"]
         }
+
+    def check_batch(
+        self,
+        texts: Iterable[str],
+        workers: Optional[int] = None,
+        product_id: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        Run the detector layers over many texts, yielding results in input order.
+
+        Small batches are scanned in-process. Larger ones are split into
+        chunks and spread across a shared process pool with a bounded number
+        of chunks in flight, so arbitrarily long inputs stream through with
+        flat memory. The rule set is resolved once, here, and its rule data
+        sent with every chunk; a worker compiles each rule set version once.
+
+        Args:
+            texts: Texts to check (any iterable, consumed lazily)
+            workers: Worker processes (default COMPLIANCE_BATCH_WORKERS or CPU count)
+            product_id: Product whose rules apply (default product when None)
+
+        Yields:
+            check_text() results with an added "index" field
+        """
+        # One rule set version for the whole batch, in-process or in the pool
+        rules = self.registry.get(product_id)
+        detector = OffLabelDetector(rules)
+        texts = iter(texts)
+        head = list(islice(texts, BATCH_PARALLEL_THRESHOLD))
+        workers = workers or int(
+            os.getenv("COMPLIANCE_BATCH_WORKERS", str(os.cpu_count() or 1)))
+
+        if len(head) < BATCH_PARALLEL_THRESHOLD or workers < 2:
+            for index, text in enumerate(chain(head, texts)):
+                yield {"index": index, **self._text_result(detector.detect(text))}
+            return
+
+        pool = _get_batch_pool(workers)
+        in_flight = deque()
+        index = 0
+        chunks = _chunked(chain(head, texts), BATCH_CHUNK_SIZE)
+        rule_data = rules.to_dict()
+
+        for chunk in chunks:
+            in_flight.append(pool.submit(_check_chunk, chunk, rules.version, rule_data))
+            if len(in_flight) >= workers * 2:
+                for result in in_flight.popleft().result():
+                    yield {"index": index, **result}
+                    index += 1
+
+        while in_flight:
+            for result in in_flight.popleft().result():
+                yield {"index": index, **result}
+                index += 1
+
+
+def _chunked(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Batch worker pool (created on first large batch, shared afterwards)
+_batch_pool: Optional[ProcessPoolExecutor] = None
+_batch_pool_workers = 0
+
+# Per-worker-process detectors: product id -> (rule set version, detector)
+_worker_detectors: Dict[str, Tuple[str, OffLabelDetector]] = {}
+
+
+def _get_batch_pool(workers: int) -> ProcessPoolExecutor:
+    global _batch_pool, _batch_pool_workers
+    if _batch_pool is None or _batch_pool_workers != workers:
+        if _batch_pool is not None:
+            _batch_pool.shutdown(wait=False)
+        # Spawned, not forked: the server has threads (e.g. the rule reloader) running
+        _batch_pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _batch_pool_workers = workers
+    return _batch_pool
+
+
+def _check_chunk(texts: List[str], version: str, rule_data: Dict) -> List[Dict]:
+    product_id = rule_data["product_id"]
+    cached = _worker_detectors.get(product_id)
+    if cached is None or cached[0] != version:
+        cached = _worker_detectors[product_id] = (
+            version, OffLabelDetector(ProductRules.from_dict(rule_data)))
+    detector = cached[1]
+    return [ComplianceGuardian._text_result(detector.detect(text)) for text in texts]
@@ -0,0 +1,188 @@
+"""
+Job Runner
+Bounded-concurrency worker pool that works through bulk analysis jobs
+"""
+
+import asyncio
+import os
+import random
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from agents.scheduler import llm_priority
+from jobs.store import JobStore
+from observability.logs import get_logger, set_request_id
+
+logger = get_logger("jobs")
+
+
+class JobRunner:
+    """
+    Runs queued jobs one at a time (FIFO), with up to `concurrency`
+    conversations of the current job in flight.
+
+    Failed analyses are retried with exponential backoff and jitter; an
+    item is marked failed once it has used up max_attempts. Every outcome
+    is checkpointed to the store, so jobs interrupted by a restart resume
+    on the next start() with only their unfinished items.
+
+    With several workers only the primary runs jobs. The others just
+    store the jobs they receive, and the running one picks them up from
+    the store within poll_interval.
+
+    Configuration (environment variables):
+        JOBS_DB_PATH: SQLite file (default .data/jobs.sqlite3)
+        JOB_CONCURRENCY: Conversations analyzed at once (default 8)
+        JOB_MAX_ATTEMPTS: Tries per conversation (default 3)
+        JOB_RETRY_BACKOFF_SECONDS: First retry delay, doubled per attempt (default 1.0)
+    """
+
+    MAX_BACKOFF_SECONDS = 30.0
+
+    def __init__(
+        self,
+        store: JobStore,
+        analyze: Optional[Callable[..., Awaitable[Dict]]] = None,
+        concurrency: int = 8,
+        max_attempts: int = 3,
+        backoff: float = 1.0,
+        poll_interval: float = 2.0
+    ):
+        if analyze is None:
+            from agents.conversation_analyzer import analyze_conversation
+            analyze = analyze_conversation
+
+        self.store = store
+        self.analyze = analyze
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self._jobs: Optional[asyncio.Queue] = None
+        # Jobs queued or running here, so polling the store does not queue them twice
+        self._queued: Set[str] = set()
+        self._items: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def from_env(cls) -> "JobRunner":
+        return cls(
+            JobStore(os.getenv("JOBS_DB_PATH", ".data/jobs.sqlite3")),
+            concurrency=int(os.getenv("JOB_CONCURRENCY", "8")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+            backoff=float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "1.0"))
+        )
+
+    async def start(self) -> None:
+        """
+        Start the workers and re-queue any jobs left unfinished by a previous run.
+        """
+        self._jobs = asyncio.Queue()
+        # Small buffer: pending items stay in SQLite, not in memory
+        self._items = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        self._queued = set()
+        resumed = self._queue_stored()
+        if resumed:
+            logger.info("Resuming unfinished jobs", extra={"jobs": len(resumed)})
+
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """
+        Cancel the workers. In-flight items stay pending and are redone on the next start.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, items: List[Tuple[Optional[str], Dict]]) -> str:
+        """
+        Persist a job and queue it behind any running ones.
+
+        Args:
+            items: (ref, analyzer kwargs) per conversation
+
+        Returns:
+            Job id
+        """
+        job_id = self.store.create_job(items)
+        if self._jobs is not None:
+            self._queued.add(job_id)
+            self._jobs.put_nowait(job_id)
+        logger.info("Queued job", extra={"job_id": job_id, "conversations": len(items)})
+        return job_id
+
+    def _queue_stored(self) -> int:
+        """
+        Queue unfinished jobs from the store (interrupted ones, or ones
+        another worker received) that are not queued yet.
+        """
+        found = [job_id for job_id in self.store.unfinished_jobs() if job_id not in self._queued]
+        for job_id in found:
+            self._queued.add(job_id)
+            self._jobs.put_nowait(job_id)
+        return len(found)
+
+    async def _dispatch(self) -> None:
+        while True:
+            try:
+                job_id = await asyncio.wait_for(self._jobs.get(), self.poll_interval)
+            except asyncio.TimeoutError:
+                self._queue_stored()
+                continue
+            self.store.mark_job(job_id, "running")
+
+            after = -1
+            while True:
+                page = self.store.pending_items(job_id, after=after)
+                if not page:
+                    break
+                for idx, attempts, payload in page:
+                    await self._items.put((job_id, idx, attempts, payload))
+                after = page[-1][0]
+
+            await self._items.join()
+            self.store.mark_job(job_id, "completed")
+            self._queued.discard(job_id)
+            logger.info("Job completed", extra={"job_id": job_id})
+
+    async def _work(self) -> None:
+        while True:
+            job_id, idx, attempts, payload = await self._items.get()
+            # Log lines for this conversation carry "<job id>:<item>"
+            set_request_id(f"{job_id}:{idx}")
+            try:
+                # Bulk scoring yields the LLM to live queries and on-demand analyses
+                with llm_priority("batch", job_id):
+                    await self._run_item(job_id, idx, attempts, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Store errors must not kill the worker; the item stays pending
+                logger.error("Job item error", extra={"job_id": job_id, "item": idx, "error": str(e)})
+            finally:
+                self._items.task_done()
+
+    async def _run_item(self, job_id: str, idx: int, attempts: int, payload: Dict) -> None:
+        while True:
+            attempts += 1
+            try:
+                result = await self.analyze(**payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempts >= self.max_attempts:
+                    self.store.finish_item(job_id, idx, attempts, error=str(e))
+                    return
+                self.store.record_attempt(job_id, idx, attempts, str(e))
+                await asyncio.sleep(self._retry_delay(attempts))
+            else:
+                self.store.finish_item(job_id, idx, attempts, result=result)
+                return
+
+    def _retry_delay(self, attempts: int) -> float:
+        # Exponential backoff with jitter so retries after a rate limit spread out
+        delay = min(self.MAX_BACKOFF_SECONDS, self.backoff * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
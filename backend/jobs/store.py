@@ -0,0 +1,203 @@
+"""
+Job Store
+SQLite persistence for bulk analysis jobs and their per-conversation items
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Job lifecycle: queued -> running -> completed (items may individually fail)
+JOB_STATUSES = ("queued", "running", "completed")
+
+# Item lifecycle: pending -> done | failed
+ITEM_STATUSES = ("pending", "done", "failed")
+
+
+class JobStore:
+    """
+    Durable record of every job and item.
+
+    Each item's outcome is written as soon as it finishes, which is the
+    checkpoint: after a crash or restart, a job resumes with exactly the
+    items still marked pending.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL);"
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            "job_id TEXT NOT NULL, idx INTEGER NOT NULL, ref TEXT, "
+            "payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "result TEXT, error TEXT, finished_at REAL, "
+            "PRIMARY KEY (job_id, idx));"
+            "CREATE INDEX IF NOT EXISTS job_items_status ON job_items(job_id, status, idx);"
+        )
+
+    def create_job(self, items: List[Tuple[Optional[str], Dict]]) -> str:
+        """
+        Persist a new job.
+
+        Args:
+            items: (ref, payload) pairs; ref is the caller's own id for the
+                conversation (may be None), payload the analyzer arguments
+
+        Returns:
+            Job id
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, total, created_at) VALUES (?, 'queued', ?, ?)",
+                    (job_id, len(items), time.time())
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, idx, ref, payload, status) "
+                    "VALUES (?, ?, ?, ?, 'pending')",
+                    ((job_id, idx, ref, json.dumps(payload)) for idx, (ref, payload) in enumerate(items))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """
+        Job status with per-status item counts, or None if unknown.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, total, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall())
+
+        status, total, created_at, started_at, finished_at = row
+        finished = total - counts.get("pending", 0)
+        elapsed = (finished_at or time.time()) - started_at if started_at else 0.0
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            **{item_status: counts.get(item_status, 0) for item_status in ITEM_STATUSES},
+            "progress": round(finished / total, 4) if total else 1.0,
+            "conversations_per_minute": round(finished * 60 / elapsed, 1) if elapsed > 0 else 0.0,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at
+        }
+
+    def unfinished_jobs(self) -> List[str]:
+        """
+        Ids of queued or interrupted jobs, oldest first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status != 'completed' ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def mark_job(self, job_id: str, status: str) -> None:
+        now = time.time()
+        with self._lock:
+            if status == "running":
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (status, now, job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+                    (status, now if status == "completed" else None, job_id)
+                )
+
+    def pending_items(self, job_id: str, after: int = -1, limit: int = 256) -> List[Tuple[int, int, Dict]]:
+        """
+        Next page of pending items as (idx, attempts, payload), in input order.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, attempts, payload FROM job_items "
+                "WHERE job_id = ? AND status = 'pending' AND idx > ? ORDER BY idx LIMIT ?",
+                (job_id, after, limit)
+            ).fetchall()
+        return [(idx, attempts, json.loads(payload)) for idx, attempts, payload in rows]
+
+    def record_attempt(self, job_id: str, idx: int, attempts: int, error: str) -> None:
+        """
+        Checkpoint a failed attempt that will be retried.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET attempts = ?, error = ? WHERE job_id = ? AND idx = ?",
+                (attempts, error, job_id, idx)
+            )
+
+    def finish_item(
+        self,
+        job_id: str,
+        idx: int,
+        attempts: int,
+        result: Optional[Dict] = None,
+        error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, attempts = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE job_id = ? AND idx = ?",
+                (
+                    "failed" if error is not None else "done",
+                    attempts,
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id,
+                    idx
+                )
+            )
+
+    def iter_results(self, job_id: str, after: int = -1, page_size: int = 500) -> Iterator[Dict]:
+        """
+        Finished items in input order, read a page at a time.
+        """
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT idx, ref, status, attempts, result, error FROM job_items "
+                    "WHERE job_id = ? AND status != 'pending' AND idx > ? ORDER BY idx LIMIT ?",
+                    (job_id, after, page_size)
+                ).fetchall()
+
+            for idx, ref, status, attempts, result, error in rows:
+                item = {"index": idx, "id": ref, "status": status, "attempts": attempts}
+                if status == "done":
+                    item["result"] = json.loads(result)
+                else:
+                    item["error"] = error
+                yield item
+
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
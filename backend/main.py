@@ -1,11 +1,28 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from starlette.requests import ClientDisconnect
+from itertools import islice
+from typing import AsyncIterator, Iterator, Optional, List, Literal
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
 import time
 
+from agents.openai_client import close_openai_client, get_openai_client
 from agents.orchestrator import AgentOrchestrator
+from agents.resilience import CircuitOpenError, deadline
+from agents.scheduler import llm_priority
+from audit.store import AuditQuery, AuditStore, get_audit_store, parse_cursor, parse_timestamp
+from cache.analysis_cache import get_analysis_cache
+from cache.shared_state import PrimaryElection, get_shared_state, is_primary_worker
+from compliance.registry import get_rule_registry
+from jobs.runner import JobRunner
+from scorecards.aggregates import KINDS, METRICS
+from scorecards.store import ScorecardStore, get_scorecard_store
+from observability.logs import Text, get_logger, new_request_id, set_request_id
+from observability.metrics import HTTP_IN_FLIGHT, HTTP_SECONDS, REGISTRY, stage
 
 load_dotenv()
 
@@ -14,13 +31,29 @@ app = FastAPI(
     version="1.0.0"
 )
 
-orchestrator = AgentOrchestrator()
+# Built by startup_event, so importing this module opens no files and needs no API key
+orchestrator: Optional[AgentOrchestrator] = None
+job_runner: Optional[JobRunner] = None
+audit_store: Optional[AuditStore] = None
+scorecard_store: Optional[ScorecardStore] = None
+logger = get_logger("api")
+# Multi-worker mode: the task keeping this worker's claim on (or bid for) the primary role
+primary_election: Optional[asyncio.Task] = None
+# Opening upstream connections in the background (OPENAI_WARMUP_CONNECTIONS)
+llm_warmup: Optional[asyncio.Task] = None
+
+# Upper bound on LLM time (retries and hedges included) per API request
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+
+# Most audit records per search page
+AUDIT_SEARCH_MAX_LIMIT = 1000
 
 
 class QueryRequest(BaseModel):
     query: str
     user_id: str
     hcp_context: Optional[dict] = None
+    product_id: Optional[str] = None
 
 
 class ComplianceCheck(BaseModel):
@@ -29,12 +62,48 @@ class ComplianceCheck(BaseModel):
     explanation: Optional[str] = None
 
 
+class BatchComplianceRequest(BaseModel):
+    texts: List[str]
+
+
 class QueryResponse(BaseModel):
     query: str
     response: str
     agents_used: List[str]
     compliance_status: ComplianceCheck
     response_time_seconds: float
+    cached: bool = False
+    fallback: Optional[str] = None
+    prompt_tokens_estimated: Optional[int] = None
+
+
+def _unavailable(e: CircuitOpenError) -> HTTPException:
+    return HTTPException(
+        status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    # Correlation id for every log line of this request, echoed back to the caller
+    request_id = new_request_id(request.headers.get("x-request-id"))
+    set_request_id(request_id)
+    start = time.perf_counter()
+    status = 500
+    with HTTP_IN_FLIGHT.track():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Request-ID"] = request_id
+            return response
+        finally:
+            # Route template, not the raw path, keeps label cardinality bounded
+            route = request.scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start,
+                method=request.method,
+                route=getattr(route, "path", "unmatched"),
+                status=status
+            )
 
 
 @app.get("/")
@@ -43,7 +112,7 @@ def read_root():
         "message": "Pharma AI Backend - Multi-Agent System",
         "status": "operational",
         "version": "1.0.0",
-        "endpoints": ["/health", "/api/query", "/api/agents/status", "/docs"]
+        "endpoints": ["/health", "/api/query", "/api/query/stream", "/api/analyze-conversation", "/api/analyze-conversation/stream", "/api/compliance/check-batch", "/api/compliance/products", "/api/cache/stats", "/api/audit/stats", "/api/audit/search", "/api/agents/status", "/api/jobs/analyze-conversations", "/api/scorecards", "/metrics", "/docs"]
     }
 
 
@@ -54,34 +123,295 @@ def health_check():
         "status": "healthy",
         "version": "1.0.0",
         "openai_configured": openai_configured,
+        # Which worker answered, and whether it runs the background duties
+        "worker": {"pid": os.getpid(), "primary": is_primary_worker()},
         "timestamp": time.time()
     }
 
 
 @app.post("/api/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
+    _require_product(request.product_id)
     try:
-        print(f"[API] Received query: {request.query}")
+        logger.info("Received query", extra={
+            "user_id": request.user_id, "product_id": request.product_id, "query": Text(request.query), "sample": True})
+
+        with deadline(REQUEST_DEADLINE_SECONDS), llm_priority("interactive", request.user_id):
+            result = await orchestrator.process_query(
+                query=request.query,
+                user_id=request.user_id,
+                hcp_context=request.hcp_context,
+                product_id=request.product_id
+            )
+
+        logger.info("Query processed", extra={"cached": result.get("cached", False), "sample": True})
+
+        with stage("query", "serialization"):
+            body = QueryResponse(
+                query=request.query,
+                response=result["response"],
+                agents_used=result["agents_used"],
+                compliance_status=ComplianceCheck(**result["compliance_status"]),
+                response_time_seconds=result["response_time_seconds"],
+                cached=result.get("cached", False),
+                fallback=result.get("fallback"),
+                prompt_tokens_estimated=result.get("prompt_tokens_estimated")
+            ).model_dump_json()
+
+        return Response(content=body, media_type="application/json")
+
+    except CircuitOpenError as e:
+        logger.warning("Query rejected", extra={"error": str(e)})
+        raise _unavailable(e)
+    except Exception as e:
+        logger.error("Error processing query", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=str(e))
 
-        result = await orchestrator.process_query(
-            query=request.query,
-            user_id=request.user_id,
-            hcp_context=request.hcp_context
-        )
 
-        print(f"[API] Query processed successfully")
+@app.post("/api/query/stream")
+async def stream_query(request: QueryRequest):
+    """
+    Stream the sales agent response as server-sent events.
 
-        return QueryResponse(
-            query=request.query,
-            response=result["response"],
-            agents_used=result["agents_used"],
-            compliance_status=ComplianceCheck(**result["compliance_status"]),
-            response_time_seconds=result["response_time_seconds"]
-        )
+    Events: token (incremental text), blocked (compliance block message,
+    replaces any text shown so far), error, and a final done event with
+    compliance status and timings.
+    """
+    logger.info("Received streaming query", extra={
+        "user_id": request.user_id, "product_id": request.product_id, "query": Text(request.query), "sample": True})
+    _require_product(request.product_id)
+
+    async def event_stream():
+        try:
+            with deadline(REQUEST_DEADLINE_SECONDS), llm_priority("interactive", request.user_id):
+                async for event in orchestrator.stream_query(
+                    query=request.query,
+                    user_id=request.user_id,
+                    hcp_context=request.hcp_context,
+                    product_id=request.product_id
+                ):
+                    yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            logger.error("Error streaming query", extra={"error": str(e)})
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/compliance/check-batch")
+async def check_compliance_batch(request: Request):
+    """
+    Detector-only compliance check over many texts (no LLM calls).
 
-    except Exception as e:
-        print(f"[API] Error processing query: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    Accepts JSON {"texts": [...]} or an NDJSON body (Content-Type:
+    application/x-ndjson) with one text per line, either as a JSON string
+    or a {"text": "..."} object. Streams one NDJSON result per text, in
+    input order, with violation types and spans. Pass ?product_id=... to
+    check against a product other than the default.
+
+    NDJSON bodies are read line by line while results stream back, so
+    memory stays flat however long the input; a malformed line ends the
+    stream with an {"error": ...} line.
+    """
+    product_id = request.query_params.get("product_id")
+    _require_product(product_id)
+
+    if "ndjson" in request.headers.get("content-type", ""):
+        texts = _ndjson_texts(request.stream())
+    else:
+        try:
+            texts = _async_iter(BatchComplianceRequest.model_validate_json(await request.body()).texts)
+        except (ValueError, ValidationError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid batch: {str(e)}")
+
+    logger.info("Batch compliance check", extra={"product_id": product_id, "sample": True})
+
+    return BodyStreamingResponse(
+        _check_batch_lines(texts, product_id),
+        media_type="application/x-ndjson"
+    )
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for handlers that are still reading the request body.
+
+    Below ASGI spec 2.4 (uvicorn reports 2.3) the stock response reads
+    receive() to watch for the client going away, which would swallow the
+    body chunks; a gone client shows up as a failed send instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+
+# Texts handed to the batch check, and result lines sent back, per thread hop
+BATCH_STREAM_ITEMS = 256
+
+
+async def _check_batch_lines(texts: AsyncIterator[str], product_id: Optional[str]) -> AsyncIterator[str]:
+    """
+    Run the (blocking) batch check in worker threads, feeding it texts from
+    the request as it asks for them and yielding its result lines.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def next_texts() -> List[str]:
+        batch = []
+        async for text in texts:
+            batch.append(text)
+            if len(batch) >= BATCH_STREAM_ITEMS:
+                break
+        return batch
+
+    def pull_texts() -> Iterator[str]:
+        # Runs in the worker thread; the event loop reads the next lines meanwhile
+        while True:
+            batch = asyncio.run_coroutine_threadsafe(next_texts(), loop).result()
+            if not batch:
+                return
+            yield from batch
+
+    results = orchestrator.compliance_guardian.check_batch(pull_texts(), product_id=product_id)
+
+    def next_lines() -> str:
+        return "".join(json.dumps(result) + "\n" for result in islice(results, BATCH_STREAM_ITEMS))
+
+    try:
+        while True:
+            lines = await asyncio.to_thread(next_lines)
+            if not lines:
+                return
+            yield lines
+    except ValueError as e:
+        yield json.dumps({"error": f"Invalid batch: {str(e)}"}) + "\n"
+
+
+async def _ndjson_texts(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Texts from an NDJSON body, parsed line by line as it arrives.
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            text = _ndjson_text(line, line_number)
+            if text is not None:
+                yield text
+    text = _ndjson_text(buffer, line_number + 1)
+    if text is not None:
+        yield text
+
+
+def _ndjson_text(line: bytes, line_number: int) -> Optional[str]:
+    if not line.strip():
+        return None
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"line {line_number}: {e}") from None
+    if isinstance(item, dict):
+        item = item.get("text")
+    if not isinstance(item, str):
+        raise ValueError(f"line {line_number}: expected a string or {{\"text\": ...}}")
+    return item
+
+
+async def _async_iter(items: List[str]) -> AsyncIterator[str]:
+    for item in items:
+        yield item
+
+
+def _require_product(product_id: Optional[str]) -> None:
+    try:
+        get_rule_registry().get(product_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/compliance/products")
+def get_compliance_products():
+    """
+    Loaded product rule sets with their versions (changes on hot reload).
+    """
+    registry = get_rule_registry()
+    return {
+        "default_product": registry.default_product,
+        "products": registry.products()
+    }
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    response_cache = orchestrator.response_cache
+    analysis_cache = get_analysis_cache()
+    return {
+        "response_cache": await response_cache.stats() if response_cache else {"backend": "off"},
+        "analysis_cache": await analysis_cache.stats() if analysis_cache else {"backend": "off"}
+    }
+
+
+@app.get("/api/audit/stats")
+def get_audit_stats():
+    audit_log = orchestrator.audit
+    if audit_log is None:
+        return {"audit_log": "off"}
+    return {**audit_log.stats(), "store": audit_store.stats()}
+
+
+@app.get("/api/audit/search")
+def search_audit(
+    user_id: Optional[str] = None,
+    status: Optional[Literal["APPROVED", "BLOCKED"]] = None,
+    violation_type: Optional[str] = None,
+    product_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    text: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = 100
+):
+    """
+    Stream matching audit records as NDJSON, oldest first. start/end are
+    epoch seconds or ISO 8601 (end exclusive); text matches detected
+    violation text (case-insensitive substring). Pass after=<cursor of
+    the last record received> for the next page.
+    """
+    if audit_store is None:
+        raise HTTPException(status_code=404, detail="Audit log is off")
+    if not 1 <= limit <= AUDIT_SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {AUDIT_SEARCH_MAX_LIMIT}")
+    try:
+        query = AuditQuery(
+            user_id=user_id, status=status, violation_type=violation_type, product_id=product_id,
+            start=parse_timestamp(start), end=parse_timestamp(end), text=text)
+        parse_cursor(after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        (json.dumps(record) + "\n" for record in audit_store.search(query, after=after, limit=limit)),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus scrape endpoint: pipeline stage histograms, compliance
+    decisions, LLM tokens/errors/latency and in-flight gauges.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/api/agents/status")
@@ -100,48 +430,85 @@ def get_agent_status():
         "system_status": "operational" if openai_configured else "configuration_required",
         "openai_configured": openai_configured
     }
-# backend/main.py
-
-
-class ConversationAnalysisRequest(BaseModel):
-    conversation: str
-    rep_name: Optional[str] = None
-    doctor_name: Optional[str] = None
-
-
-@app.post("/api/analyze-conversation")
-async def analyze_sales_conversation(request: ConversationAnalysisRequest):
-    try:
-        result = await analyze_conversation(request.conversation)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.on_event("startup")
 async def startup_event():
-    print("="*50)
-    print("🚀 Pharma AI Backend Starting")
-    print("="*50)
-    if os.getenv("OPENAI_API_KEY"):
-        print("✅ OpenAI API key configured")
+    global orchestrator, job_runner, audit_store, scorecard_store, primary_election, llm_warmup
+    start = time.perf_counter()
+    if not os.getenv("OPENAI_API_KEY"):
+        logger.warning("OPENAI_API_KEY not set")
+    # The LLM client itself is created by the first call (or the warmup below)
+    orchestrator = AgentOrchestrator()
+    job_runner = JobRunner.from_env()
+    audit_store = get_audit_store()
+    scorecard_store = get_scorecard_store()
+
+    state = get_shared_state()
+    if state is None:
+        if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            logger.warning("Several workers without SHARED_STATE_BACKEND: each runs jobs and keeps its own limits")
+        await job_runner.start()
     else:
-        print("⚠️  WARNING: OPENAI_API_KEY not set!")
-    print("📊 Agents initialized")
-    print("✅ Server ready!")
-    print("="*50)
+        # Bulk jobs run in one worker at a time; any worker takes over if it goes away
+        election = PrimaryElection(
+            state,
+            ttl=float(os.getenv("PRIMARY_LEASE_SECONDS", "15")),
+            on_promote=job_runner.start,
+            on_demote=job_runner.stop
+        )
+        primary_election = asyncio.create_task(election.run())
+
+    warmup_connections = int(os.getenv("OPENAI_WARMUP_CONNECTIONS", "0"))
+    if warmup_connections > 0 and os.getenv("OPENAI_API_KEY"):
+        # Not awaited: requests are served meanwhile, and the first LLM call
+        # finds the SDK loaded and connections open if it comes after
+        llm_warmup = asyncio.create_task(get_openai_client().warmup(warmup_connections))
+    logger.info("Server ready", extra={
+        "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
+        "shared_state": type(state).__name__ if state is not None else None,
+        "startup_seconds": round(time.perf_counter() - start, 3)
+    })
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Unfinished job items stay pending and resume on the next start
+    await job_runner.stop()
+    # Hand the primary role to another worker straight away
+    if primary_election is not None:
+        primary_election.cancel()
+        await asyncio.gather(primary_election, return_exceptions=True)
+    if llm_warmup is not None:
+        llm_warmup.cancel()
+        await asyncio.gather(llm_warmup, return_exceptions=True)
+    # Release pooled upstream connections
+    await close_openai_client()
+    # Stop watching the rule files
+    get_rule_registry().close()
+    # Commit queued audit records
+    if orchestrator.audit is not None:
+        await asyncio.to_thread(orchestrator.audit.close)
+    if audit_store is not None:
+        await asyncio.to_thread(audit_store.close)
+    # Snapshot the scorecard aggregates so the next start replays nothing
+    if scorecard_store is not None:
+        await asyncio.to_thread(scorecard_store.close)
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
 
 # Conversation Analysis Endpoint
-from agents.conversation_analyzer import analyze_conversation
+from agents.conversation_analyzer import analyze_conversation, analyze_conversation_stream
 
 class ConversationAnalysisRequest(BaseModel):
     conversation: str
     rep_name: Optional[str] = "Sales Rep"
     doctor_name: Optional[str] = "Dr. Smith"
+    bypass_cache: bool = False
+    mode: Optional[Literal["single", "parallel", "windowed"]] = None
+    product_id: Optional[str] = None
+    territory: Optional[str] = None
+    # Who asked (e.g. a manager re-analyzing); shares LLM capacity fairly per user, default rep_name
+    user_id: Optional[str] = None
 
 class ConversationAnalysisResponse(BaseModel):
     overall_score: float
@@ -158,20 +525,180 @@ class ConversationAnalysisResponse(BaseModel):
 async def analyze_sales_conversation(request: ConversationAnalysisRequest):
     """
     Analyze a sales conversation and provide detailed scoring and coaching.
+    Identical transcripts are served from the analysis cache unless bypass_cache is set.
     """
+    _require_product(request.product_id)
     try:
-        print(f"[API] Analyzing conversation for {request.rep_name} with {request.doctor_name}")
+        logger.info("Analyzing conversation", extra={
+            "rep": request.rep_name, "doctor": request.doctor_name, "sample": True})
         
-        result = await analyze_conversation(
-            conversation=request.conversation,
-            rep_name=request.rep_name,
-            doctor_name=request.doctor_name
-        )
+        with deadline(REQUEST_DEADLINE_SECONDS), \
+                llm_priority("analysis", request.user_id or request.rep_name):
+            result = await analyze_conversation(
+                conversation=request.conversation,
+                rep_name=request.rep_name,
+                doctor_name=request.doctor_name,
+                use_cache=not request.bypass_cache,
+                mode=request.mode,
+                product_id=request.product_id,
+                territory=request.territory
+            )
         
-        print(f"[API] Analysis complete. Overall score: {result.get('overall_score')}")
+        logger.info("Analysis complete", extra={"overall_score": result.get("overall_score"), "sample": True})
         
-        return result
+        with stage("analysis", "serialization"):
+            body = ConversationAnalysisResponse.model_validate(result).model_dump_json()
+
+        return Response(content=body, media_type="application/json")
         
+    except CircuitOpenError as e:
+        logger.warning("Analysis rejected", extra={"error": str(e)})
+        raise _unavailable(e)
     except Exception as e:
-        print(f"[API] Error analyzing conversation: {str(e)}")
+        logger.error("Error analyzing conversation", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/analyze-conversation/stream")
+async def stream_sales_conversation_analysis(request: ConversationAnalysisRequest):
+    """
+    Stream a conversation analysis as server-sent events.
+
+    Events: dimension (one score, as soon as the model has finished it),
+    feedback (strengths, improvements, coaching or the summary), error,
+    and a final done event with the complete analysis and "cached".
+    """
+    logger.info("Streaming analysis", extra={"rep": request.rep_name, "doctor": request.doctor_name, "sample": True})
+    _require_product(request.product_id)
+
+    async def event_stream():
+        try:
+            with deadline(REQUEST_DEADLINE_SECONDS), \
+                    llm_priority("analysis", request.user_id or request.rep_name):
+                async for event in analyze_conversation_stream(
+                    conversation=request.conversation,
+                    rep_name=request.rep_name,
+                    doctor_name=request.doctor_name,
+                    use_cache=not request.bypass_cache,
+                    mode=request.mode,
+                    product_id=request.product_id,
+                    territory=request.territory
+                ):
+                    yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            logger.error("Error streaming analysis", extra={"error": str(e)})
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Bulk Analysis Jobs
+@app.post("/api/jobs/analyze-conversations", status_code=202)
+async def submit_analysis_job(request: Request):
+    """
+    Queue many conversations for background analysis.
+
+    Body is NDJSON: one ConversationAnalysisRequest object per line, plus an
+    optional "id" echoed back with its result. Returns the job id; poll
+    /api/jobs/{job_id} for progress and download /api/jobs/{job_id}/results.
+    """
+    body = await request.body()
+
+    try:
+        items = _parse_ndjson_conversations(body)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid job: {str(e)}")
+    if not items:
+        raise HTTPException(status_code=400, detail="Invalid job: no conversations")
+
+    job_id = job_runner.submit(items)
+    return {
+        "job_id": job_id,
+        "total": len(items),
+        "status_url": f"/api/jobs/{job_id}",
+        "results_url": f"/api/jobs/{job_id}/results"
+    }
+
+
+def _parse_ndjson_conversations(body: bytes) -> List[tuple]:
+    items = []
+    for line_number, line in enumerate(body.decode("utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if not isinstance(item, dict):
+            raise ValueError(f"line {line_number}: expected a JSON object")
+        ref = item.pop("id", None)
+        request = ConversationAnalysisRequest.model_validate(item)
+        try:
+            get_rule_registry().get(request.product_id)
+        except ValueError as e:
+            raise ValueError(f"line {line_number}: {e}")
+        items.append((None if ref is None else str(ref), {
+            "conversation": request.conversation,
+            "rep_name": request.rep_name,
+            "doctor_name": request.doctor_name,
+            "use_cache": not request.bypass_cache,
+            "mode": request.mode,
+            "product_id": request.product_id,
+            "territory": request.territory
+        }))
+    return items
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job_status(job_id: str):
+    job = job_runner.store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/results")
+def get_job_results(job_id: str, after: int = -1):
+    """
+    Stream finished results as NDJSON in input order (available while the job runs).
+    Pass after=<last index received> to fetch only newer results.
+    """
+    if job_runner.store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return StreamingResponse(
+        (json.dumps(item) + "\n" for item in job_runner.store.iter_results(job_id, after=after)),
+        media_type="application/x-ndjson"
+    )
+
+
+
+# Scorecards
+@app.get("/api/scorecards")
+def get_scorecards(
+    kind: Literal[KINDS] = "rep",
+    name: Optional[str] = None,
+    window: str = "13w",
+    sort: Literal[METRICS] = "overall",
+    limit: int = 50
+):
+    """
+    Per-dimension count, mean, std and p10/p50/p90 of analysis scores
+    per rep, doctor or territory over the last N weeks ("13w") or "all".
+    Without a name: every entity of that kind, best `sort` mean first.
+    With a name: that entity's scorecard and its week-by-week means.
+    """
+    if scorecard_store is None:
+        raise HTTPException(status_code=404, detail="Scorecards are off")
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    try:
+        return scorecard_store.scorecards(kind, window=window, name=name, sort=sort, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
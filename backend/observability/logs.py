@@ -0,0 +1,285 @@
+"""
+Structured Logging
+JSON log lines tagged with the request's correlation id, written off the request path
+"""
+
+from contextvars import ContextVar
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, TextIO
+
+from observability.metrics import LOG_RECORDS
+
+# How query text in log fields is written
+QUERY_TEXT_MODES = ("hash", "redact", "full")
+
+# Incoming X-Request-ID values used as-is; anything else gets a fresh id
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+# LogRecord attributes that are not caller-supplied fields
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "sample"}
+
+# Tells the writer to write what is queued and exit
+_STOP = object()
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def new_request_id(supplied: Optional[str] = None) -> str:
+    """
+    The caller's id if it is a sane one (e.g. from X-Request-ID), else a new one.
+    """
+    if supplied and REQUEST_ID_PATTERN.match(supplied):
+        return supplied
+    return uuid.uuid4().hex
+
+
+def set_request_id(request_id: Optional[str]) -> None:
+    """
+    Tag log lines from this context (and tasks and worker threads started
+    from it) with `request_id`.
+    """
+    _request_id.set(request_id)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+class Text:
+    """
+    Free text (user queries) in a log field. Written per LOG_QUERY_TEXT
+    by the writer thread, so hashing costs the request nothing.
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: Optional[str]):
+        self.text = text
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: ts, level, logger, msg, request_id, then the
+    record's extra fields. Text fields are hashed (SHA-256, the same
+    digest the audit log stores), reduced to their length, or kept.
+    """
+
+    def __init__(self, query_text: str = "hash"):
+        super().__init__()
+        if query_text not in QUERY_TEXT_MODES:
+            raise ValueError(f"Unknown LOG_QUERY_TEXT: {query_text}")
+        self.query_text = query_text
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = self._text(value) if isinstance(value, Text) else value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+    def _text(self, value: Text):
+        if value.text is None or self.query_text == "full":
+            return value.text
+        if self.query_text == "redact":
+            return {"chars": len(value.text)}
+        return {"sha256": hashlib.sha256(value.text.encode("utf-8")).hexdigest(), "chars": len(value.text)}
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Puts records on a bounded queue; a background thread formats them
+    and writes each batch to the stream with one write and flush. A
+    request only pays for building the LogRecord: formatting, hashing
+    and a slow stdout (a stalled log shipper, a full pipe) stay on the
+    writer thread. When the queue is full, records are dropped and
+    counted (pharma_log_records_total{outcome="dropped"}) rather than
+    making requests wait.
+
+    Records logged with extra={"sample": True} (high-volume success
+    lines) are kept with probability sample_rate, decided before they
+    are queued. Warnings and errors are never sampled.
+
+    queue_size 0 writes synchronously in the caller instead (scripts,
+    debugging).
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        queue_size: int = 10000,
+        batch_size: int = 512,
+        sample_rate: float = 1.0
+    ):
+        super().__init__()
+        self.stream = stream
+        self.batch_size = max(1, batch_size)
+        self.sample_rate = sample_rate
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._queue: Optional[queue.Queue] = queue.Queue(maxsize=queue_size) if queue_size > 0 else None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        # Not self.lock: logging holds that around emit(), which must not wait on the stream
+        self._write_lock = threading.Lock()
+        if self._queue is not None:
+            # A forked child (the audit compactor) has the queue but not the thread
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if (getattr(record, "sample", False) and record.levelno <= logging.INFO
+                and self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            self.sampled_out += 1
+            LOG_RECORDS.inc(outcome="sampled_out")
+            return
+        record.request_id = _request_id.get()
+        if self._queue is None:
+            self._write([record])
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS.inc(outcome="dropped")
+
+    def _start(self) -> None:
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _after_fork(self) -> None:
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not _STOP]
+            try:
+                if records:
+                    self._write(records)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(records) < len(batch):
+                return
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record) + "\n")
+            except Exception:
+                self.handleError(record)
+        stream = self.stream or sys.stdout
+        try:
+            with self._write_lock:
+                stream.write("".join(lines))
+                stream.flush()
+        except Exception:
+            self.dropped += len(lines)
+            LOG_RECORDS.inc(len(lines), outcome="dropped")
+            return
+        self.written += len(lines)
+        LOG_RECORDS.inc(len(lines), outcome="written")
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """
+        Wait (up to `timeout`) until every record queued so far is written.
+        """
+        if self._queue is None or self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._queue.all_tasks_done.wait(remaining)
+
+    def close(self) -> None:
+        """
+        Write what is queued and stop the writer.
+        """
+        if self._queue is not None and self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(5.0)
+            self._thread = None
+        super().close()
+
+    def stats(self) -> Dict:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
+
+
+# Shared handler (created on first use)
+_handler: Optional[QueueLogHandler] = None
+
+
+def configure_logging(stream: Optional[TextIO] = None) -> QueueLogHandler:
+    """
+    Install the JSON handler on the "pharma" logger (once).
+
+    Configuration (environment variables):
+        LOG_LEVEL: Lowest level written (default INFO)
+        LOG_QUEUE_SIZE: Records buffered for the writer before dropping (default 10000; 0 writes synchronously)
+        LOG_SAMPLE_RATE: Fraction of high-volume success lines kept (default 1.0)
+        LOG_QUERY_TEXT: hash (default; SHA-256 and length), redact (length only) or full
+    """
+    global _handler
+    if _handler is None:
+        handler = QueueLogHandler(
+            stream,
+            queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+        )
+        handler.setFormatter(JSONFormatter(os.getenv("LOG_QUERY_TEXT", "hash").lower()))
+        root = logging.getLogger("pharma")
+        root.addHandler(handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+        _handler = handler
+    return _handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger "pharma.<name>" (the component, e.g. "api", "analyzer").
+    """
+    configure_logging()
+    return logging.getLogger(f"pharma.{name}")
+
@@ -0,0 +1,418 @@
+"""
+Pipeline Metrics
+Counters, gauges and histograms rendered in the Prometheus text format
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans detector checks (sub-ms) to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names. Label values are
+    passed as keyword arguments; missing labels default to "".
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        unknown = set(labels) - set(self.labelnames)
+        if unknown:
+            raise ValueError(f"Unknown labels for {self.name}: {sorted(unknown)}")
+        return tuple("" if labels.get(name) is None else str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """
+        Count the enclosed block as in progress.
+        """
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [per-bucket counts, sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        Observe the wall time of the enclosed block (also when it raises).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of metrics, rendered for GET /metrics.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Pipeline stages: pipeline = query | query_stream | analysis
+STAGE_SECONDS = REGISTRY.histogram(
+    "pharma_pipeline_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["pipeline", "stage"]
+)
+PIPELINE_IN_FLIGHT = REGISTRY.gauge(
+    "pharma_pipeline_in_flight",
+    "Requests currently inside a pipeline",
+    ["pipeline"]
+)
+COMPLIANCE_DECISIONS = REGISTRY.counter(
+    "pharma_compliance_decisions_total",
+    "Compliance Guardian outcomes",
+    ["pipeline", "status", "violation_type", "detected_in"]
+)
+SPECULATIVE_GENERATIONS = REGISTRY.counter(
+    "pharma_speculative_generations_total",
+    "Generations started alongside the query pre-check (used, blocked, cancelled)",
+    ["pipeline", "outcome"]
+)
+RULE_LOADS = REGISTRY.counter(
+    "pharma_compliance_rule_loads_total",
+    "Product rule files (re)loaded by outcome (ok, error)",
+    ["outcome"]
+)
+ANALYSES = REGISTRY.counter(
+    "pharma_analyses_total",
+    "Conversation analyses by mode, cache use and off-label override",
+    ["mode", "cached", "off_label"]
+)
+ANALYSIS_REPAIRS = REGISTRY.counter(
+    "pharma_analysis_repairs_total",
+    "Malformed or missing analysis parts re-requested on their own (dimension, feedback)",
+    ["part"]
+)
+
+# LLM calls
+LLM_REQUESTS = REGISTRY.counter(
+    "pharma_llm_requests_total",
+    "LLM calls by outcome (ok, error, timeout)",
+    ["model", "kind", "outcome"]
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "pharma_llm_request_seconds",
+    "LLM call duration, excluding time queued for a concurrency slot",
+    ["model", "kind"]
+)
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "pharma_llm_queue_seconds",
+    "Time waiting in the LLM scheduler for a slot and rate-limit budget, by priority class",
+    ["model", "priority"]
+)
+LLM_QUEUED = REGISTRY.gauge(
+    "pharma_llm_queued",
+    "LLM calls waiting in the scheduler, by priority class",
+    ["priority"]
+)
+LLM_RATE_LIMIT_WAITS = REGISTRY.counter(
+    "pharma_llm_rate_limit_waits_total",
+    "Times the next LLM call had to wait for the requests/min or tokens/min budget",
+    ["model", "budget"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "pharma_llm_tokens_total",
+    "Tokens used (streams: completion counted per delta, prompt estimated at 4 chars/token)",
+    ["model", "type"]
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "pharma_prompt_tokens_estimated",
+    "Estimated sales prompt size per request (static = cacheable prefix)",
+    ["pipeline", "part"],
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "pharma_llm_requests_in_flight",
+    "LLM calls currently holding a concurrency slot",
+    ["model"]
+)
+LLM_RETRIES = REGISTRY.counter(
+    "pharma_llm_retries_total",
+    "LLM attempts retried after a retryable error",
+    ["model", "kind", "reason"]
+)
+LLM_HEDGES = REGISTRY.counter(
+    "pharma_llm_hedges_total",
+    "Hedged LLM attempts fired, and how many answered first",
+    ["model", "kind", "outcome"]
+)
+LLM_CIRCUIT_STATE = REGISTRY.gauge(
+    "pharma_llm_circuit_state",
+    "LLM circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["model"]
+)
+COALESCED_CALLS = REGISTRY.counter(
+    "pharma_coalesced_calls_total",
+    "Requests that joined an identical in-flight call instead of starting one (query, analysis)",
+    ["name"]
+)
+SHARED_FLIGHT_WAITS = REGISTRY.counter(
+    "pharma_shared_flight_waits_total",
+    "Calls that found another worker making them: joined (its result was used) or took_over",
+    ["name", "outcome"]
+)
+FALLBACK_RESPONSES = REGISTRY.counter(
+    "pharma_fallback_responses_total",
+    "Answers served without the LLM while it was unavailable (stale_cache, template)",
+    ["pipeline", "source"]
+)
+
+# Audit log
+AUDIT_RECORDS = REGISTRY.counter(
+    "pharma_audit_records_total",
+    "Audit records by outcome (written, dropped on a full queue)",
+    ["outcome"]
+)
+AUDIT_QUEUE_DEPTH = REGISTRY.gauge(
+    "pharma_audit_queue_depth",
+    "Audit records waiting for the writer"
+)
+AUDIT_COMMIT_SECONDS = REGISTRY.histogram(
+    "pharma_audit_commit_seconds",
+    "Write + fsync time per audit batch (group commit)"
+)
+
+# Logging
+LOG_RECORDS = REGISTRY.counter(
+    "pharma_log_records_total",
+    "Structured log records by outcome (written, dropped on a full queue, sampled_out)",
+    ["outcome"]
+)
+
+# HTTP layer
+HTTP_SECONDS = REGISTRY.histogram(
+    "pharma_http_request_seconds",
+    "Time to response headers by route (streams continue after this)",
+    ["method", "route", "status"]
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "pharma_http_requests_in_flight",
+    "HTTP requests currently being handled"
+)
+
+
+# Stage timings of the request being handled, when collected (for its audit record)
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """
+    Also sum the enclosed stages' times per stage name into the yielded
+    dict. Tasks and worker threads started inside inherit it.
+    """
+    previous = _request_timings.get()
+    timings: Dict[str, float] = {}
+    # set() rather than reset(): async generators may resume in another context
+    _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.set(previous)
+
+
+def current_timings() -> Dict[str, float]:
+    """
+    Copy of the stage timings collected so far for this request.
+    """
+    timings = _request_timings.get()
+    return dict(timings) if timings else {}
+
+
+def record_stage(pipeline: str, name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, pipeline=pipeline, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(pipeline: str, name: str) -> Iterator[None]:
+    """
+    Context manager timing one pipeline stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(pipeline, name, time.perf_counter() - start)
+
+
+def record_decision(pipeline: str, compliance: Dict) -> None:
+    COMPLIANCE_DECISIONS.inc(
+        pipeline=pipeline,
+        status=compliance["status"],
+        violation_type=compliance.get("violation_type"),
+        detected_in=compliance.get("detected_in")
+    )
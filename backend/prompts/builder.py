@@ -0,0 +1,191 @@
+"""
+Sales Agent Prompt Builder
+Static product data and guidelines compiled once into a byte-identical prefix,
+with the per-request HCP context and question appended at the end
+"""
+
+from functools import lru_cache
+import hashlib
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+from compliance.registry import ProductRules, get_rule_registry
+from prompts.sales_agent import PRODUCT_DATA
+
+try:
+    import tiktoken
+except ImportError:  # optional: exact token counts when installed
+    tiktoken = None
+
+ROLE = "You are an expert pharmaceutical sales strategist with 15+ years of experience in cardiovascular medications."
+
+GUIDELINES = """════════════════════════════════════════════════════════════
+
+GUIDELINES FOR YOUR RESPONSE:
+
+✅ BE SPECIFIC - NOT GENERIC:
+❌ Bad: "Discuss the benefits and clinical advantages"
+✅ Good: "In our JAMA Cardiology 2024 study, CardioStatin showed 42% lower muscle-related side effects"
+
+✅ CITE ACTUAL DATA:
+- Use specific percentages: "42% reduction", "78% adherence", "$8,400 lower cost"
+- Reference real studies: "JAMA Cardiology March 2024 study"
+- Include dollar amounts: "$48,000 average hospitalization cost"
+
+✅ PROVIDE EXACT PHRASES TO SAY:
+❌ Bad: "Address their cost concerns empathetically"
+✅ Good: "Say: 'I understand cost is important. When we look at total cost of care, patients on CardioStatin had $8,400 lower healthcare costs over 2 years due to 31% fewer cardiac events.'"
+
+✅ STRUCTURE YOUR RESPONSE:
+
+**1. Acknowledge/Empathize** (if addressing concern)
+"I understand [the healthcare provider]'s concern about [cost/efficacy/safety]..."
+
+**2. Provide Specific Data**
+"Our [specific study] showed [exact numbers]..."
+
+**3. Translate to Value**
+"What this means for your practice: [concrete benefit]..."
+
+**4. Give Exact Talking Points**
+"When speaking with [the healthcare provider], say: '[exact phrase to use]'"
+
+**5. Clear Next Steps**
+"Specific actions: 1) [action with timeline], 2) [action]..."
+
+════════════════════════════════════════════════════════════"""
+
+# Products without written product data: their approved indications only
+PRODUCT_DATA_TEMPLATE = """
+═══════════════════════════════════════════════════════════
+PRODUCT: {name}
+FDA APPROVED FOR: {indications}
+═══════════════════════════════════════════════════════════
+"""
+
+# Retrieved product knowledge: per-request, so it goes in the tail
+KNOWLEDGE_TEMPLATE = """
+RELEVANT PRODUCT DATA (retrieved for this question):
+
+{chunks}
+"""
+
+# Per-request part: always last, so everything before it is a stable prefix
+CONTEXT_TEMPLATE = """
+CONTEXT:
+- Healthcare Provider: {hcp_info} (use this name wherever the guidelines say [the healthcare provider])
+- Their Question: {query}
+
+Now provide a SPECIFIC, DATA-DRIVEN response with:
+- Exact statistics from the data above
+- Concrete phrases to say (in quotes)
+- Clear action steps
+
+Your response:"""
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("cl100k_base") if tiktoken is not None else None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Prompt token count: exact with tiktoken installed, else ~4 characters per token.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+class BuiltPrompt(NamedTuple):
+    text: str
+    prefix_tokens: int
+    estimated_tokens: int
+
+
+class PromptBuilder:
+    """
+    Builds sales agent system prompts as static prefix + per-request tail.
+
+    The prefix (role, product data, guidelines) is rendered and measured
+    once. Providers that cache prompt prefixes can then reuse it across
+    every request, which cuts time-to-first-token and input-token cost;
+    only the short tail with the HCP and the question is new each time.
+
+    When retrieved knowledge chunks are passed, the full product data is
+    left out of the prefix and only those chunks are added to the tail.
+
+    One builder serves one product (see get_prompt_builder).
+    """
+
+    def __init__(self, product_data: str = PRODUCT_DATA["cardiostatin"], product_id: str = "cardiostatin"):
+        self.product_id = product_id
+        self.prefix = f"{ROLE}\n\n{product_data}\n\n{GUIDELINES}\n"
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self.knowledge_prefix = f"{ROLE}\n\n{GUIDELINES}\n"
+        self.knowledge_prefix_tokens = estimate_tokens(self.knowledge_prefix)
+        self.fingerprint = hashlib.sha256(
+            (product_id + "\n" + self.prefix + KNOWLEDGE_TEMPLATE + CONTEXT_TEMPLATE).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @classmethod
+    def for_product(cls, rules: ProductRules) -> "PromptBuilder":
+        """
+        Builder with the product's written data, else its approved indications.
+        """
+        product_data = PRODUCT_DATA.get(rules.product_id) or PRODUCT_DATA_TEMPLATE.format(
+            name=rules.name, indications=", ".join(rules.approved_indications))
+        return cls(product_data, rules.product_id)
+
+    def build(
+        self,
+        query: str,
+        hcp_context: Optional[Dict] = None,
+        knowledge: Optional[Sequence[str]] = None
+    ) -> BuiltPrompt:
+        """
+        Args:
+            knowledge: Retrieved product data chunks, used instead of the full product data
+        """
+        hcp_context = hcp_context or {}
+        hcp_info = self.render_hcp(hcp_context.get("name"), hcp_context.get("specialty"))
+        tail = CONTEXT_TEMPLATE.format(hcp_info=hcp_info, query=query)
+        if knowledge is None:
+            prefix, prefix_tokens = self.prefix, self.prefix_tokens
+        else:
+            prefix, prefix_tokens = self.knowledge_prefix, self.knowledge_prefix_tokens
+            tail = KNOWLEDGE_TEMPLATE.format(chunks="\n\n".join(knowledge)) + tail
+        return BuiltPrompt(
+            text=prefix + tail,
+            prefix_tokens=prefix_tokens,
+            estimated_tokens=prefix_tokens + estimate_tokens(tail)
+        )
+
+    @staticmethod
+    def render_hcp(name: Optional[str], specialty: Optional[str]) -> str:
+        """
+        HCP description (the context is free-form request JSON).
+        """
+        hcp_info = f"Dr. {name}" if name and name != "the doctor" else "the healthcare provider"
+        if specialty:
+            hcp_info += f" ({specialty})"
+        return hcp_info
+
+
+# Shared instances: product id -> (rule set version, builder), compiled on first use
+_builders: Dict[str, Tuple[str, PromptBuilder]] = {}
+
+
+def get_prompt_builder(product_id: Optional[str] = None) -> PromptBuilder:
+    """
+    Builder for one product (default product when None), rebuilt when its rule set changes.
+
+    Raises:
+        ValueError: Unknown product_id
+    """
+    rules = get_rule_registry().get(product_id)
+    cached = _builders.get(rules.product_id)
+    if cached is None or cached[0] != rules.version:
+        cached = _builders[rules.product_id] = (rules.version, PromptBuilder.for_product(rules))
+    return cached[1]
@@ -43,72 +43,19 @@ KEY CLINICAL DATA:
 - Total 2-Year Cost: $8,400 LOWER (including all healthcare costs)
 """
 
-def get_sales_agent_prompt(query: str, hcp_context: dict = None) -> str:
-    """
-    Generate sales agent prompt with product knowledge and HCP context.
-    """
-    
-    # Extract HCP information
-    hcp_name = "the doctor"
-    hcp_specialty = ""
-    
-    if hcp_context:
-        hcp_name = hcp_context.get("name", "the doctor")
-        hcp_specialty = hcp_context.get("specialty", "")
-    
-    hcp_info = f"Dr. {hcp_name}" if hcp_name != "the doctor" else "the healthcare provider"
-    if hcp_specialty:
-        hcp_info += f" ({hcp_specialty})"
-    
-    prompt = f"""You are an expert pharmaceutical sales strategist with 15+ years of experience in cardiovascular medications.
-
-{CARDIO_STATIN_DATA}
-
-════════════════════════════════════════════════════════════
-
-GUIDELINES FOR YOUR RESPONSE:
-
-✅ BE SPECIFIC - NOT GENERIC:
-❌ Bad: "Discuss the benefits and clinical advantages"
-✅ Good: "In our JAMA Cardiology 2024 study, CardioStatin showed 42% lower muscle-related side effects"
-
-✅ CITE ACTUAL DATA:
-- Use specific percentages: "42% reduction", "78% adherence", "$8,400 lower cost"
-- Reference real studies: "JAMA Cardiology March 2024 study"
-- Include dollar amounts: "$48,000 average hospitalization cost"
-
-✅ PROVIDE EXACT PHRASES TO SAY:
-❌ Bad: "Address their cost concerns empathetically"
-✅ Good: "Say: 'I understand cost is important. When we look at total cost of care, patients on CardioStatin had $8,400 lower healthcare costs over 2 years due to 31% fewer cardiac events.'"
-
-✅ STRUCTURE YOUR RESPONSE:
+# Written product data by product id; other products get their approved indications only
+PRODUCT_DATA = {
+    "cardiostatin": CARDIO_STATIN_DATA,
+}
 
-**1. Acknowledge/Empathize** (if addressing concern)
-"I understand {hcp_info}'s concern about [cost/efficacy/safety]..."
 
-**2. Provide Specific Data**
-"Our [specific study] showed [exact numbers]..."
-
-**3. Translate to Value**
-"What this means for your practice: [concrete benefit]..."
-
-**4. Give Exact Talking Points**
-"When speaking with {hcp_info}, say: '[exact phrase to use]'"
-
-**5. Clear Next Steps**
-"Specific actions: 1) [action with timeline], 2) [action]..."
-
-════════════════════════════════════════════════════════════
-
-CONTEXT:
-- Healthcare Provider: {hcp_info}
-- Their Question: {query}
-
-Now provide a SPECIFIC, DATA-DRIVEN response with:
-- Exact statistics from the data above
-- Concrete phrases to say (in quotes)
-- Clear action steps
+def get_sales_agent_prompt(query: str, hcp_context: dict = None, product_id: str = None) -> str:
+    """
+    Generate sales agent prompt with product knowledge and HCP context.
 
-Your response:"""
+    Built by prompts.builder: the product data and guidelines form a fixed
+    prefix, with the HCP and the question at the end.
+    """
+    from prompts.builder import get_prompt_builder
 
-    return prompt
+    return get_prompt_builder(product_id).build(query, hcp_context).text
@@ -0,0 +1,83 @@
+"""
+Knowledge Index Builder
+Chunks a product's monographs and study summaries, embeds them and writes the index
+
+Run from backend/:
+    python -m retrieval.build_index --product cardiostatin
+    python -m retrieval.build_index --product cardiostatin --docs docs/cardiostatin/
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List, Optional
+
+from prompts.sales_agent import PRODUCT_DATA
+from retrieval.chunker import DEFAULT_MAX_CHARS, Chunk, chunk_document
+from retrieval.embeddings import create_embedder
+from retrieval.index import LocalVectorIndex
+from retrieval.retriever import KnowledgeRetriever
+
+DOCUMENT_EXTENSIONS = (".md", ".txt")
+
+# Built-in product data, indexed when no documents are given
+BUILTIN_DOCUMENTS = PRODUCT_DATA
+
+
+def load_chunks(product_id: str, paths: List[str], max_chars: int) -> List[Chunk]:
+    """
+    Chunks of every .md/.txt file under `paths` (files or directories).
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(DOCUMENT_EXTENSIONS))
+        else:
+            files.append(path)
+
+    if not files:
+        if product_id not in BUILTIN_DOCUMENTS:
+            raise ValueError(f"No documents given for {product_id}")
+        return chunk_document(BUILTIN_DOCUMENTS[product_id], product_id, "monograph", max_chars)
+
+    chunks = []
+    for file in files:
+        with open(file, "r", encoding="utf-8") as f:
+            chunks.extend(chunk_document(f.read(), product_id, os.path.basename(file), max_chars))
+    return chunks
+
+
+async def build(product_id: str, paths: List[str], max_chars: int, nlist: Optional[int]) -> None:
+    retriever = KnowledgeRetriever.from_env()
+    embedder = retriever.embedder if retriever else create_embedder()
+
+    start = time.perf_counter()
+    chunks = load_chunks(product_id, paths, max_chars)
+    vectors = await embedder.embed([chunk.text for chunk in chunks])
+    print(f"[RETRIEVAL] Embedded {len(chunks)} chunks with {embedder.name} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    if retriever is not None and retriever.pinecone is not None:
+        await asyncio.to_thread(retriever.pinecone.upsert, product_id, chunks, vectors)
+        print(f"[RETRIEVAL] Upserted into Pinecone index {retriever.pinecone.index_name} ({product_id})")
+        return
+
+    index_dir = retriever.index_dir if retriever else os.getenv("RETRIEVAL_INDEX_DIR", ".data/knowledge")
+    os.makedirs(index_dir, exist_ok=True)
+    index = LocalVectorIndex.build(
+        os.path.join(index_dir, product_id), chunks, vectors, embedder.name, nlist=nlist)
+    print(f"[RETRIEVAL] Wrote {index.path}: {len(index)} chunks, "
+          f"{index.meta['nlist'] or 'no'} IVF lists (version {index.version})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--product", required=True, help="Product id (matches the compliance rule file)")
+    parser.add_argument("--docs", nargs="*", default=[], help="Files or directories of .md/.txt documents")
+    parser.add_argument("--max-chars", type=int, default=DEFAULT_MAX_CHARS, help="Chunk size limit")
+    parser.add_argument("--nlist", type=int, help="IVF lists (default: automatic by index size)")
+    args = parser.parse_args()
+
+    asyncio.run(build(args.product, args.docs, args.max_chars, args.nlist))
@@ -0,0 +1,83 @@
+"""
+Product Document Chunker
+Splits monographs and study summaries into retrieval-sized, self-describing chunks
+"""
+
+import hashlib
+import re
+from typing import Iterator, List, NamedTuple
+
+# Rule lines such as ═══ or --- carry no content
+DECORATION = re.compile(r"^[\s═─=\-_*#]+$")
+
+DEFAULT_MAX_CHARS = 800
+
+
+class Chunk(NamedTuple):
+    chunk_id: str
+    product_id: str
+    source: str
+    text: str
+
+
+def _sections(text: str) -> Iterator[List[str]]:
+    """
+    Blank-line separated blocks of non-decoration lines.
+    """
+    block: List[str] = []
+    for line in text.splitlines():
+        if not line.strip() or DECORATION.match(line):
+            if block:
+                yield block
+                block = []
+            continue
+        block.append(line.rstrip())
+    if block:
+        yield block
+
+
+def chunk_document(
+    text: str,
+    product_id: str,
+    source: str,
+    max_chars: int = DEFAULT_MAX_CHARS
+) -> List[Chunk]:
+    """
+    Split a document into chunks of at most ~max_chars.
+
+    Consecutive short sections are packed together. A section that is too
+    long on its own is split between lines, and every piece repeats the
+    section's first line (usually its heading, e.g. "SAFETY & TOLERABILITY:")
+    so a chunk still says what it is about when retrieved alone.
+
+    Chunk ids are content hashes, so re-indexing unchanged text keeps its ids.
+    """
+    pieces: List[str] = []
+    for block in _sections(text):
+        heading, body = block[0], block[1:]
+        if len("\n".join(block)) <= max_chars:
+            pieces.append("\n".join(block))
+            continue
+        current = [heading]
+        for line in body:
+            if len("\n".join(current + [line])) > max_chars and len(current) > 1:
+                pieces.append("\n".join(current))
+                current = [heading]
+            current.append(line)
+        pieces.append("\n".join(current))
+
+    chunks: List[Chunk] = []
+    packed = ""
+    for piece in pieces:
+        if packed and len(packed) + 2 + len(piece) > max_chars:
+            chunks.append(_make_chunk(product_id, source, packed))
+            packed = ""
+        packed = f"{packed}\n\n{piece}" if packed else piece
+    if packed:
+        chunks.append(_make_chunk(product_id, source, packed))
+    return chunks
+
+
+def _make_chunk(product_id: str, source: str, text: str) -> Chunk:
+    digest = hashlib.sha256(f"{product_id}\n{source}\n{text}".encode("utf-8")).hexdigest()[:16]
+    return Chunk(chunk_id=f"{product_id}:{digest}", product_id=product_id, source=source, text=text)
@@ -0,0 +1,77 @@
+"""
+Text Embedders
+In-process feature-hashing embeddings, or the OpenAI embeddings API
+"""
+
+import os
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+from agents.openai_client import DEFAULT_EMBEDDING_MODEL, get_openai_client
+
+TOKEN = re.compile(r"[a-z0-9$%.]+")
+
+
+class HashingEmbedder:
+    """
+    Bag of words and word bigrams hashed into `dim` signed buckets,
+    L2-normalized.
+
+    No model, no network and deterministic across processes, so indexes
+    can be built and queried anywhere; matching is lexical (shared terms
+    such as "adherence" or "renal"), which suits monograph lookups.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [w.strip(".") for w in TOKEN.findall(text.lower())]
+            words = [w for w in words if w]
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class OpenAIEmbedder:
+    """
+    OpenAI embeddings through the shared client (one request per batch).
+    """
+
+    BATCH_SIZE = 256
+
+    def __init__(self, model: str = DEFAULT_EMBEDDING_MODEL):
+        self.model = model
+        self.name = f"openai-{model}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        client = get_openai_client()
+        rows: List[List[float]] = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            rows.extend(await client.embed(texts[start:start + self.BATCH_SIZE], model=self.model))
+        vectors = np.asarray(rows, dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def create_embedder(kind: Optional[str] = None):
+    """
+    Embedder named by RETRIEVAL_EMBEDDER: hashing (default) or openai.
+    """
+    kind = (kind or os.getenv("RETRIEVAL_EMBEDDER", "hashing")).lower()
+    if kind == "hashing":
+        return HashingEmbedder(int(os.getenv("RETRIEVAL_EMBEDDING_DIM", "256")))
+    if kind == "openai":
+        return OpenAIEmbedder(os.getenv("RETRIEVAL_EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL))
+    raise ValueError(f"Unknown RETRIEVAL_EMBEDDER: {kind}")
@@ -0,0 +1,263 @@
+"""
+Vector Indexes
+Memory-mapped NumPy index on disk (brute force or IVF), and an optional Pinecone backend
+"""
+
+import hashlib
+import json
+import math
+import os
+import shutil
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from retrieval.chunker import Chunk
+
+# Brute force below this many vectors; IVF with ~sqrt(n) lists above it
+IVF_MIN_VECTORS = 50_000
+# Rows scored per matrix product while training and assigning lists
+ASSIGN_BATCH = 65_536
+
+
+def train_ivf(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = 8,
+    sample_size: int = 50_000,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Spherical k-means on a sample of unit vectors; returns unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = max(nlist, min(sample_size, len(vectors)))
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_lists(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        # Re-seed empty lists from random sample points
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Nearest centroid (by inner product) for every vector.
+    """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH):
+        batch = np.asarray(vectors[start:start + ASSIGN_BATCH])
+        assignments[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class LocalVectorIndex:
+    """
+    One product's chunks and unit-length embeddings in a directory:
+
+        meta.json       embedder, dimension, count, list count, version
+        vectors.npy     float32 (count, dim), memory-mapped read-only
+        chunks.jsonl    one chunk per line, in vector order
+        offsets.npy     byte offset of every line (count + 1)
+        centroids.npy   IVF only: list centroids
+        lists.npy       IVF only: first row of every list (nlist + 1)
+
+    Small indexes are searched exhaustively with one matrix-vector
+    product. Large ones are built as an inverted file (IVF): vectors are
+    clustered around ~sqrt(n) centroids and stored grouped by list, so a
+    query scores the centroids, then only the `nprobe` nearest lists as
+    contiguous slices of the mapped file. The OS page cache keeps hot
+    lists in memory; nothing is loaded up front.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.embedder = self.meta["embedder"]
+        self.version = self.meta["version"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: Optional[np.ndarray] = None
+        if self.meta["nlist"]:
+            self.centroids = np.load(os.path.join(path, "centroids.npy"))
+            self.lists = np.load(os.path.join(path, "lists.npy"))
+        # pread on one descriptor is safe from concurrent search threads
+        self._fd = os.open(os.path.join(path, "chunks.jsonl"), os.O_RDONLY)
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    @classmethod
+    def build(
+        cls,
+        path: str,
+        chunks: Iterable[Chunk],
+        vectors: np.ndarray,
+        embedder: str,
+        nlist: Optional[int] = None
+    ) -> "LocalVectorIndex":
+        """
+        Write an index for `chunks` (same order as `vectors`) and open it.
+
+        The index is written to a sibling directory and renamed into place,
+        so readers of the previous version are never handed a partial index.
+
+        Args:
+            nlist: IVF list count (default: 0 below IVF_MIN_VECTORS, else sqrt(n))
+        """
+        count, dim = vectors.shape
+        tmp = f"{path}.building-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        # Chunks in input order, with line offsets for random access
+        raw_path = os.path.join(tmp, "chunks.raw.jsonl")
+        raw_offsets = np.zeros(count + 1, dtype=np.int64)
+        digest = hashlib.sha256(embedder.encode("utf-8"))
+        written = 0
+        with open(raw_path, "wb") as f:
+            for chunk in chunks:
+                if written == count:
+                    raise ValueError("More chunks than vectors")
+                line = (json.dumps(chunk._asdict()) + "\n").encode("utf-8")
+                f.write(line)
+                digest.update(chunk.chunk_id.encode("utf-8"))
+                written += 1
+                raw_offsets[written] = raw_offsets[written - 1] + len(line)
+        if written != count:
+            raise ValueError(f"{written} chunks for {count} vectors")
+
+        if nlist is None:
+            nlist = int(math.sqrt(count)) if count >= IVF_MIN_VECTORS else 0
+        order = np.arange(count)
+        if nlist:
+            centroids = train_ivf(vectors, nlist)
+            assignments = assign_lists(vectors, centroids)
+            order = np.argsort(assignments, kind="stable")
+            lists = np.zeros(nlist + 1, dtype=np.int64)
+            lists[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+            np.save(os.path.join(tmp, "centroids.npy"), centroids)
+            np.save(os.path.join(tmp, "lists.npy"), lists)
+
+        # Vectors and chunk lines in stored (list-grouped) order
+        stored = np.lib.format.open_memmap(
+            os.path.join(tmp, "vectors.npy"), mode="w+", dtype=np.float32, shape=(count, dim))
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        with open(raw_path, "rb") as raw, open(os.path.join(tmp, "chunks.jsonl"), "wb") as out:
+            for start in range(0, count, ASSIGN_BATCH):
+                rows = order[start:start + ASSIGN_BATCH]
+                stored[start:start + len(rows)] = vectors[rows]
+                for i, row in enumerate(rows, start=start):
+                    raw.seek(raw_offsets[row])
+                    line = raw.read(raw_offsets[row + 1] - raw_offsets[row])
+                    out.write(line)
+                    offsets[i + 1] = offsets[i] + len(line)
+        stored.flush()
+        del stored
+        os.remove(raw_path)
+        np.save(os.path.join(tmp, "offsets.npy"), offsets)
+
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "embedder": embedder,
+                "dim": dim,
+                "count": count,
+                "nlist": nlist,
+                "version": digest.hexdigest()[:16]
+            }, f)
+
+        old = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.rename(path, old)
+        os.rename(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+        return cls(path)
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = 16) -> List[Tuple[Chunk, float]]:
+        """
+        The k chunks with the highest inner product with `query`.
+        """
+        if self.centroids is None:
+            scores = self.vectors @ query
+            rows = _top_k(scores, k)
+            return [(self.chunk(int(row)), float(scores[row])) for row in rows]
+
+        probe = _top_k(self.centroids @ query, nprobe)
+        candidates = []
+        candidate_scores = []
+        for list_id in probe:
+            start, end = int(self.lists[list_id]), int(self.lists[list_id + 1])
+            if end > start:
+                candidates.append(np.arange(start, end))
+                candidate_scores.append(self.vectors[start:end] @ query)
+        if not candidates:
+            return []
+        rows = np.concatenate(candidates)
+        scores = np.concatenate(candidate_scores)
+        top = _top_k(scores, k)
+        return [(self.chunk(int(rows[i])), float(scores[i])) for i in top]
+
+    def chunk(self, row: int) -> Chunk:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return Chunk(**json.loads(os.pread(self._fd, end - start, start)))
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PineconeIndex:
+    """
+    Chunks in a Pinecone index, one namespace per product.
+
+    The client is synchronous; callers run it in a worker thread.
+    """
+
+    UPSERT_BATCH = 100
+
+    def __init__(self, api_key: str, index_name: str):
+        try:
+            # Optional, and slow to import: only loaded for this backend
+            from pinecone import Pinecone
+        except ImportError:
+            raise ValueError("RETRIEVAL_BACKEND=pinecone needs pinecone-client installed") from None
+        self.index_name = index_name
+        self.index = Pinecone(api_key=api_key).Index(index_name)
+
+    def upsert(self, product_id: str, chunks: Sequence[Chunk], vectors: np.ndarray) -> None:
+        for start in range(0, len(chunks), self.UPSERT_BATCH):
+            batch = chunks[start:start + self.UPSERT_BATCH]
+            self.index.upsert(
+                vectors=[
+                    {
+                        "id": chunk.chunk_id,
+                        "values": vector.tolist(),
+                        "metadata": {"source": chunk.source, "text": chunk.text}
+                    }
+                    for chunk, vector in zip(batch, vectors[start:start + self.UPSERT_BATCH])
+                ],
+                namespace=product_id
+            )
+
+    def search(self, query: np.ndarray, k: int, product_id: str) -> List[Tuple[Chunk, float]]:
+        result = self.index.query(
+            vector=query.tolist(), top_k=k, include_metadata=True, namespace=product_id)
+        return [
+            (Chunk(match.id, product_id, match.metadata["source"], match.metadata["text"]), match.score)
+            for match in result.matches
+        ]
@@ -0,0 +1,154 @@
+"""
+Product Knowledge Retriever
+Top-k product knowledge chunks for a sales question, from a local or Pinecone index
+"""
+
+import asyncio
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from compliance.registry import get_rule_registry
+from observability.logs import get_logger
+from retrieval.chunker import Chunk
+from retrieval.embeddings import create_embedder
+from retrieval.index import LocalVectorIndex, PineconeIndex
+
+RETRIEVAL_BACKENDS = ("off", "local", "pinecone")
+
+logger = get_logger("retrieval")
+
+
+class KnowledgeRetriever:
+    """
+    Finds the product knowledge relevant to a question.
+
+    Instead of inlining a product's whole catalog in every sales prompt,
+    the question is embedded and the `top_k` nearest chunks of that
+    product's index are injected, so prompt size stays bounded however
+    large the catalog grows. Products without an index return None and
+    the caller falls back to the full built-in product data.
+
+    Local indexes live in one directory per product and are re-opened when
+    rebuilt (detected from meta.json), so `python -m retrieval.build_index`
+    takes effect without a restart.
+
+    Configuration (environment variables):
+        RETRIEVAL_BACKEND: off (default), local or pinecone
+        RETRIEVAL_INDEX_DIR: Local indexes, one subdirectory per product (default .data/knowledge)
+        RETRIEVAL_TOP_K: Chunks added to each prompt (default 4)
+        RETRIEVAL_NPROBE: IVF lists searched per query (default 16)
+        RETRIEVAL_EMBEDDER: hashing (default, in-process) or openai
+        PINECONE_API_KEY, PINECONE_INDEX: Remote index for the pinecone backend
+    """
+
+    def __init__(
+        self,
+        embedder,
+        index_dir: Optional[str] = None,
+        pinecone: Optional[PineconeIndex] = None,
+        top_k: int = 4,
+        nprobe: int = 16
+    ):
+        self.embedder = embedder
+        self.index_dir = index_dir
+        self.pinecone = pinecone
+        self.top_k = top_k
+        self.nprobe = nprobe
+        # product id -> (meta.json mtime, open index)
+        self._local: Dict[str, Tuple[int, LocalVectorIndex]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["KnowledgeRetriever"]:
+        backend = os.getenv("RETRIEVAL_BACKEND", "off").lower()
+        if backend not in RETRIEVAL_BACKENDS:
+            raise ValueError(f"Unknown RETRIEVAL_BACKEND: {backend}")
+        if backend == "off":
+            return None
+
+        pinecone = None
+        if backend == "pinecone":
+            pinecone = PineconeIndex(
+                api_key=os.getenv("PINECONE_API_KEY", ""),
+                index_name=os.getenv("PINECONE_INDEX", "pharma-knowledge"))
+        return cls(
+            embedder=create_embedder(),
+            index_dir=os.getenv("RETRIEVAL_INDEX_DIR", ".data/knowledge"),
+            pinecone=pinecone,
+            top_k=int(os.getenv("RETRIEVAL_TOP_K", "4")),
+            nprobe=int(os.getenv("RETRIEVAL_NPROBE", "16"))
+        )
+
+    def _resolve(self, product_id: Optional[str]) -> str:
+        return product_id or get_rule_registry().default_product
+
+    def local_index(self, product_id: Optional[str]) -> Optional[LocalVectorIndex]:
+        """
+        The product's local index, re-opened if it was rebuilt (None if absent).
+        """
+        product_id = self._resolve(product_id)
+        path = os.path.join(self.index_dir, product_id)
+        try:
+            mtime = os.stat(os.path.join(path, "meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        cached = self._local.get(product_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with self._lock:
+            cached = self._local.get(product_id)
+            if cached is None or cached[0] != mtime:
+                index = LocalVectorIndex(path)
+                if index.embedder != self.embedder.name:
+                    raise ValueError(
+                        f"Index for {product_id} was built with {index.embedder}, "
+                        f"but RETRIEVAL_EMBEDDER is {self.embedder.name}")
+                # Searches still holding the old index keep their mappings
+                self._local[product_id] = (mtime, index)
+                logger.info("Opened index", extra={
+                    "product_id": product_id, "chunks": len(index), "version": index.version})
+            return self._local[product_id][1]
+
+    def version(self, product_id: Optional[str]) -> Optional[str]:
+        """
+        Identifies the knowledge a prompt would be built from (for cache keys).
+        """
+        if self.pinecone is not None:
+            return f"pinecone:{self.pinecone.index_name}:{self.embedder.name}:{self._resolve(product_id)}"
+        index = self.local_index(product_id)
+        return None if index is None else index.version
+
+    async def retrieve(self, query: str, product_id: Optional[str] = None) -> Optional[List[Chunk]]:
+        """
+        The top_k chunks for a question, best first (None: no index for the product).
+        """
+        product_id = self._resolve(product_id)
+        if self.pinecone is not None:
+            vector = (await self.embedder.embed([query]))[0]
+            hits = await asyncio.to_thread(self.pinecone.search, vector, self.top_k, product_id)
+        else:
+            index = self.local_index(product_id)
+            if index is None:
+                return None
+            vector = (await self.embedder.embed([query]))[0]
+            # NumPy releases the GIL: large scans don't stall the event loop
+            hits = await asyncio.to_thread(index.search, vector, self.top_k, self.nprobe)
+        return [chunk for chunk, _ in hits]
+
+
+# Shared instance (created on first use)
+_retriever: Optional[KnowledgeRetriever] = None
+_retriever_loaded = False
+
+
+def get_knowledge_retriever() -> Optional[KnowledgeRetriever]:
+    """
+    Get or create the shared retriever (None when RETRIEVAL_BACKEND=off).
+    """
+    global _retriever, _retriever_loaded
+    if not _retriever_loaded:
+        _retriever = KnowledgeRetriever.from_env()
+        _retriever_loaded = True
+    return _retriever
@@ -0,0 +1,318 @@
+"""
+Scorecard Aggregates
+Incrementally maintained score statistics per rep, doctor and territory, held in numpy arrays
+"""
+
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# The analyzer's six dimensions (agents.conversation_analyzer.DIMENSIONS) plus the overall score
+METRICS = ("compliance", "tone", "knowledge", "objection_handling", "relationship", "call_to_action", "overall")
+# Entities an analysis is aggregated under
+KINDS = ("rep", "doctor", "territory")
+
+# Scores are 0.0-5.0 with one decimal, so a 0.1-wide histogram is an exact,
+# mergeable percentile sketch
+BIN_WIDTH = 0.1
+BINS = 51
+PERCENTILES = (10, 50, 90)
+
+WEEK_SECONDS = 7 * 86400
+
+# Per-slot statistics, and which entity and week each slot belongs to
+ARRAYS = ("count", "mean", "m2", "hist")
+INDEX_ARRAYS = ("slot_kind", "slot_entity", "slot_week")
+
+
+def week_of(ts: float) -> int:
+    """
+    Monday-aligned (UTC) week number of a timestamp.
+    """
+    # 1970-01-01 was a Thursday
+    return int((ts + 3 * 86400) // WEEK_SECONDS)
+
+
+def week_start(week: int) -> float:
+    return week * WEEK_SECONDS - 3 * 86400
+
+
+class ScorecardAggregates:
+    """
+    Per entity and week, for each metric: the count, Welford mean and sum
+    of squared deviations (M2), and a score histogram. One row ("slot")
+    per (kind, name, week) in each array, about 1.6 KB:
+
+        count  (slots, metrics)         uint32
+        mean   (slots, metrics)         float64
+        m2     (slots, metrics)         float64
+        hist   (slots, metrics, BINS)   uint32
+        slot_kind, slot_entity, slot_week   (slots,)
+
+    Adding an analysis updates 3 slots (its rep, doctor and territory
+    that week) in place. A leaderboard selects the window's slots with an
+    array mask, merges each entity's moments (Chan's parallel combination),
+    ranks them, and sums histograms only for the entities it returns, so
+    its cost follows the entity-weeks in the window, not the analyses
+    behind them.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.slots: Dict[Tuple[str, str, int], int] = {}
+        # (kind, name) -> {week: slot}
+        self.entities: Dict[Tuple[str, str], Dict[int, int]] = {}
+        # (kind, name) <-> slot_entity values
+        self.entity_ids: Dict[Tuple[str, str], int] = {}
+        self.entity_names: List[Tuple[str, str]] = []
+        self.last_id = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self.count = np.zeros((capacity, len(METRICS)), dtype=np.uint32)
+        self.mean = np.zeros((capacity, len(METRICS)), dtype=np.float64)
+        self.m2 = np.zeros((capacity, len(METRICS)), dtype=np.float64)
+        self.hist = np.zeros((capacity, len(METRICS), BINS), dtype=np.uint32)
+        self.slot_kind = np.zeros(capacity, dtype=np.int8)
+        self.slot_entity = np.zeros(capacity, dtype=np.int32)
+        self.slot_week = np.zeros(capacity, dtype=np.int32)
+
+    def _grow(self) -> None:
+        used = len(self.slots)
+        old = {name: getattr(self, name) for name in ARRAYS + INDEX_ARRAYS}
+        self._allocate(max(1024, used * 3 // 2))
+        for name, values in old.items():
+            getattr(self, name)[:used] = values[:used]
+
+    def _slot(self, kind: str, name: str, week: int) -> int:
+        key = (kind, name, week)
+        slot = self.slots.get(key)
+        if slot is None:
+            if len(self.slots) == len(self.count):
+                self._grow()
+            slot = len(self.slots)
+            self._register(key, slot)
+        return slot
+
+    def _register(self, key: Tuple[str, str, int], slot: int) -> None:
+        kind, name, week = key
+        entity = self.entity_ids.get((kind, name))
+        if entity is None:
+            entity = self.entity_ids[(kind, name)] = len(self.entity_names)
+            self.entity_names.append((kind, name))
+        self.slots[key] = slot
+        self.entities.setdefault((kind, name), {})[week] = slot
+        self.slot_kind[slot] = KINDS.index(kind)
+        self.slot_entity[slot] = entity
+        self.slot_week[slot] = week
+
+    def add(self, ts: float, entities: Dict[str, Optional[str]], scores: Sequence[float]) -> None:
+        """
+        Fold one analysis in.
+
+        Args:
+            entities: kind -> name (None: not aggregated for that kind)
+            scores: One value per METRICS entry (NaN when missing)
+        """
+        week = week_of(ts)
+        slots = np.array([
+            self._slot(kind, name, week) for kind, name in entities.items() if name is not None
+        ], dtype=np.int64)
+        values = np.asarray(scores, dtype=np.float64)
+        present = np.flatnonzero(~np.isnan(values))
+        if not len(slots) or not len(present):
+            return
+        values = values[present]
+
+        rows, cols = np.ix_(slots, present)
+        count = self.count[rows, cols] + 1
+        delta = values - self.mean[rows, cols]
+        mean = self.mean[rows, cols] + delta / count
+        self.m2[rows, cols] += delta * (values - mean)
+        self.mean[rows, cols] = mean
+        self.count[rows, cols] = count
+        bins = np.clip(np.rint(values / BIN_WIDTH), 0, BINS - 1).astype(np.int64)
+        self.hist[rows, cols, bins] += 1
+
+    def _window_slots(
+        self,
+        kind: str,
+        weeks: Optional[Tuple[int, int]],
+        names: Optional[List[str]]
+    ) -> np.ndarray:
+        if names is not None:
+            return np.array([
+                slot
+                for name in names
+                for week, slot in self.entities.get((kind, name), {}).items()
+                if weeks is None or weeks[0] <= week <= weeks[1]
+            ], dtype=np.int64)
+        used = len(self.slots)
+        mask = self.slot_kind[:used] == KINDS.index(kind)
+        if weeks is not None:
+            mask &= (self.slot_week[:used] >= weeks[0]) & (self.slot_week[:used] <= weeks[1])
+        return np.flatnonzero(mask)
+
+    def summarize(
+        self,
+        kind: str,
+        weeks: Optional[Tuple[int, int]],
+        names: Optional[List[str]] = None,
+        sort: str = "overall",
+        limit: Optional[int] = None
+    ) -> Tuple[int, List[Dict]]:
+        """
+        Merged statistics per entity of `kind`.
+
+        Args:
+            weeks: Inclusive (first, last) week range, or None for all time
+            names: Entities to include (default: all of that kind)
+            sort: Metric whose mean ranks the entities (highest first)
+            limit: Most entities returned
+
+        Returns:
+            (entities with data in the window, {"name", "analyses", "metrics"}
+            dicts for the top `limit` of them)
+        """
+        slots = self._window_slots(kind, weeks, names)
+        if not len(slots):
+            return 0, []
+
+        # Group the slots by entity
+        entity = self.slot_entity[slots]
+        order = np.argsort(entity, kind="stable")
+        slots, entity = slots[order], entity[order]
+        starts = np.flatnonzero(np.concatenate([[True], entity[1:] != entity[:-1]]))
+        sizes = np.diff(np.append(starts, len(slots)))
+
+        count, mean, m2 = merge(self.count[slots], self.mean[slots], self.m2[slots], starts)
+        column = METRICS.index(sort)
+        ranking = np.where(count[:, column] > 0, mean[:, column], -np.inf)
+        top = np.argsort(-ranking, kind="stable")[:limit]
+        count, mean, m2 = count[top], mean[top], m2[top]
+        std = np.sqrt(np.divide(m2, count - 1, out=np.zeros_like(m2), where=count > 1))
+
+        # Histograms are the bulk of the data; sum them for the returned entities only
+        top_slots = np.concatenate([slots[starts[g]:starts[g] + sizes[g]] for g in top])
+        top_starts = np.concatenate([[0], np.cumsum(sizes[top])[:-1]])
+        hist = np.add.reduceat(self.hist[top_slots], top_starts, axis=0, dtype=np.int64)
+        percentiles = {p: percentile(hist, count, p) for p in PERCENTILES}
+
+        results = []
+        for i, group in enumerate(top):
+            metrics = {}
+            for j, metric in enumerate(METRICS):
+                if count[i, j]:
+                    metrics[metric] = {
+                        "count": int(count[i, j]),
+                        "mean": round(float(mean[i, j]), 3),
+                        "std": round(float(std[i, j]), 3),
+                        **{f"p{p}": round(float(values[i, j]), 1) for p, values in percentiles.items()}
+                    }
+            results.append({
+                "name": self.entity_names[entity[starts[group]]][1],
+                "analyses": int(count[i].max()),
+                "metrics": metrics
+            })
+        return len(starts), results
+
+    def series(self, kind: str, name: str, weeks: Tuple[int, int]) -> List[Dict]:
+        """
+        Week-by-week analyses and mean scores for one entity.
+        """
+        buckets = self.entities.get((kind, name), {})
+        points = []
+        for week in sorted(week for week in buckets if weeks[0] <= week <= weeks[1]):
+            slot = buckets[week]
+            points.append({
+                "week_start": week_start(week),
+                "analyses": int(self.count[slot].max()),
+                "mean": {metric: round(float(self.mean[slot, j]), 3)
+                         for j, metric in enumerate(METRICS) if self.count[slot, j]}
+            })
+        return points
+
+    def copy(self) -> "ScorecardAggregates":
+        used = len(self.slots)
+        copied = ScorecardAggregates(capacity=0)
+        for name in ARRAYS + INDEX_ARRAYS:
+            setattr(copied, name, getattr(self, name)[:used].copy())
+        copied.slots = dict(self.slots)
+        copied.entities = {entity: dict(buckets) for entity, buckets in self.entities.items()}
+        copied.entity_ids = dict(self.entity_ids)
+        copied.entity_names = list(self.entity_names)
+        copied.last_id = self.last_id
+        return copied
+
+    def save(self, directory: str) -> None:
+        """
+        Snapshot to `directory` (written beside it and renamed into place).
+        """
+        used = len(self.slots)
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp = f"{os.path.abspath(directory)}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name)[:used])
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"last_id": self.last_id, "slots": [list(key) for key in self.slots]}, f)
+
+        old = f"{os.path.abspath(directory)}.old-{os.getpid()}"
+        if os.path.exists(directory):
+            os.rename(directory, old)
+        os.rename(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["ScorecardAggregates"]:
+        """
+        The snapshot in `directory`, or None if there is none.
+        """
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            return None
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        aggregates = cls(capacity=max(1024, len(meta["slots"]) * 3 // 2))
+        for name in ARRAYS:
+            values = np.load(os.path.join(directory, f"{name}.npy"))
+            getattr(aggregates, name)[:len(values)] = values
+        for slot, (kind, name, week) in enumerate(meta["slots"]):
+            aggregates._register((kind, name, week), slot)
+        aggregates.last_id = meta["last_id"]
+        return aggregates
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ARRAYS + INDEX_ARRAYS)
+
+
+def merge(
+    count: np.ndarray,
+    mean: np.ndarray,
+    m2: np.ndarray,
+    starts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Combine the moments of consecutive groups of slots (group i starts at starts[i]).
+    """
+    # Widened first: per-week counts are stored narrow
+    count = count.astype(np.int64)
+    total = np.add.reduceat(count, starts, axis=0)
+    weighted = np.add.reduceat(count * mean, starts, axis=0)
+    merged_mean = np.divide(weighted, total, out=np.zeros_like(weighted), where=total > 0)
+    group = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(count))))
+    spread = count * (mean - merged_mean[group]) ** 2
+    merged_m2 = np.add.reduceat(m2 + spread, starts, axis=0)
+    return total, merged_mean, merged_m2
+
+
+def percentile(hist: np.ndarray, count: np.ndarray, p: float) -> np.ndarray:
+    """
+    p-th percentile score from histograms (..., BINS) and their counts.
+    """
+    cumulative = np.cumsum(hist, axis=-1)
+    target = np.maximum(1, np.ceil(count * p / 100))[..., None]
+    return np.argmax(cumulative >= target, axis=-1) * BIN_WIDTH
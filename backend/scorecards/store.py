@@ -0,0 +1,341 @@
+"""
+Scorecard Store
+Every conversation analysis result, with incrementally updated per-rep/doctor/territory scorecards
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cache.shared_state import is_primary_worker
+from observability.logs import get_logger
+from scorecards.aggregates import KINDS, METRICS, ScorecardAggregates, week_of
+
+logger = get_logger("scorecards")
+
+# Windows are N weeks ending with the current one, or "all"
+WINDOW_PATTERN = re.compile(r"^(\d{1,3})w$")
+MAX_WINDOW_WEEKS = 520
+
+
+def analysis_id(conversation: str, rep_name: Optional[str], doctor_name: Optional[str],
+                territory: Optional[str], product_id: Optional[str]) -> str:
+    """
+    Identity of an analyzed call: the same transcript for the same rep,
+    doctor, territory and product counts once, however often it is analyzed.
+    """
+    key = json.dumps([conversation, rep_name, doctor_name, territory, product_id])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def parse_window(window: str) -> Optional[int]:
+    """
+    Weeks in a window ("13w"), or None for "all".
+
+    Raises:
+        ValueError: Not a window
+    """
+    if window == "all":
+        return None
+    match = WINDOW_PATTERN.match(window)
+    if match is None or not 1 <= int(match.group(1)) <= MAX_WINDOW_WEEKS:
+        raise ValueError(f"Invalid window: {window} (use 1w-{MAX_WINDOW_WEEKS}w or all)")
+    return int(match.group(1))
+
+
+def _scores(analysis: Dict) -> List[float]:
+    scores = analysis.get("scores") or {}
+    values = [
+        float(scores[key]["score"]) if isinstance((scores.get(key) or {}).get("score"), (int, float)) else math.nan
+        for key in METRICS[:-1]
+    ]
+    overall = analysis.get("overall_score")
+    return values + [float(overall) if isinstance(overall, (int, float)) else math.nan]
+
+
+class ScorecardStore:
+    """
+    Persists every analysis result in SQLite (the record of truth) and
+    keeps ScorecardAggregates current as results arrive, so scorecards
+    never re-read or re-analyze history.
+
+    The aggregates live in memory and are snapshotted to .npy files in
+    the background and on close. On start the snapshot is loaded and only
+    results stored after it are replayed; without a snapshot every stored
+    result is folded in once.
+
+    Several workers can share the database: each folds in every stored
+    result (its own and the others') in seq order before answering, and
+    only the primary worker snapshots.
+
+    Configuration (environment variables):
+        SCORECARDS: on (default) or off
+        SCORECARD_DB_PATH: SQLite file (default .data/scorecards.sqlite3)
+        SCORECARD_SNAPSHOT_DIR: Aggregate snapshot directory (default .data/scorecards)
+        SCORECARD_SNAPSHOT_SECONDS: Snapshot interval while results arrive (default 60)
+    """
+
+    def __init__(self, path: str, snapshot_dir: str, snapshot_interval: float = 60.0):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, ts REAL NOT NULL, "
+            "rep TEXT, doctor TEXT, territory TEXT, product_id TEXT, "
+            "scores TEXT NOT NULL, result TEXT NOT NULL);"
+        )
+
+        self.aggregates = ScorecardAggregates.load(snapshot_dir) or ScorecardAggregates()
+        self._saved_id = self.aggregates.last_id
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        replayed = self._catch_up()
+        if replayed:
+            logger.info("Replayed analysis results into the aggregates", extra={"results": replayed})
+
+    @classmethod
+    def from_env(cls) -> Optional["ScorecardStore"]:
+        if os.getenv("SCORECARDS", "on").lower() not in ("1", "on", "true"):
+            return None
+        return cls(
+            os.getenv("SCORECARD_DB_PATH", ".data/scorecards.sqlite3"),
+            os.getenv("SCORECARD_SNAPSHOT_DIR", ".data/scorecards"),
+            snapshot_interval=float(os.getenv("SCORECARD_SNAPSHOT_SECONDS", "60"))
+        )
+
+    def _catch_up(self) -> int:
+        """
+        Fold in results stored after the snapshot, or since the last call
+        (by this process or another worker sharing the database).
+
+        Returns:
+            Number of results folded in
+        """
+        replayed = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, ts, rep, doctor, territory, scores FROM analyses WHERE seq > ? ORDER BY seq LIMIT 10000",
+                    (self.aggregates.last_id,)
+                ).fetchall()
+                for seq, ts, rep, doctor, territory, scores in rows:
+                    self.aggregates.add(ts, {"rep": rep, "doctor": doctor, "territory": territory},
+                                        [math.nan if score is None else score for score in json.loads(scores)])
+                    self.aggregates.last_id = seq
+            replayed += len(rows)
+            if len(rows) < 10000:
+                break
+        return replayed
+
+    def start(self) -> None:
+        if self.snapshot_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._snapshot_loop, name="scorecard-snapshots", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if is_primary_worker():
+            self.snapshot()
+
+    def _snapshot_loop(self) -> None:
+        while not self._stop.wait(self.snapshot_interval):
+            if not is_primary_worker():
+                continue
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error("Snapshot failed", extra={"error": str(e)})
+
+    def snapshot(self) -> None:
+        """
+        Save the aggregates if results arrived since the last snapshot.
+        """
+        with self._lock:
+            self._catch_up()
+            if self.aggregates.last_id == self._saved_id:
+                return
+            # Written from a copy so results keep arriving meanwhile
+            aggregates = self.aggregates.copy()
+        aggregates.save(self.snapshot_dir)
+        self._saved_id = aggregates.last_id
+
+    def record(
+        self,
+        analysis: Dict,
+        conversation: str,
+        rep_name: Optional[str] = None,
+        doctor_name: Optional[str] = None,
+        territory: Optional[str] = None,
+        product_id: Optional[str] = None,
+        ts: Optional[float] = None
+    ) -> bool:
+        """
+        Store one analysis result and fold it into the scorecards.
+
+        Returns:
+            False if this call was already recorded (see analysis_id)
+        """
+        return self.record_many([(analysis, conversation, rep_name, doctor_name, territory, product_id, ts)]) == 1
+
+    def record_many(self, items: Iterable[Tuple]) -> int:
+        """
+        Store (analysis, conversation, rep_name, doctor_name, territory,
+        product_id, ts) tuples in one transaction.
+
+        Returns:
+            Number of new results
+        """
+        now = time.time()
+        added = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for analysis, conversation, rep_name, doctor_name, territory, product_id, ts in items:
+                    scores = _scores(analysis)
+                    ts = now if ts is None else ts
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO analyses (id, ts, rep, doctor, territory, product_id, scores, result) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            analysis_id(conversation, rep_name, doctor_name, territory, product_id),
+                            ts, rep_name, doctor_name, territory, product_id,
+                            json.dumps([None if math.isnan(score) else score for score in scores]),
+                            json.dumps(analysis)
+                        )
+                    )
+                    added += cursor.rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            # Folds in this batch and whatever other workers stored meanwhile, in seq order
+            self._catch_up()
+        return added
+
+    def scorecards(
+        self,
+        kind: str,
+        window: str = "13w",
+        name: Optional[str] = None,
+        sort: str = "overall",
+        limit: int = 50,
+        now: Optional[float] = None
+    ) -> Dict:
+        """
+        Scorecards for every entity of `kind` (best `sort` mean first), or
+        for one entity with its week-by-week trend.
+
+        Raises:
+            ValueError: Unknown kind, sort metric or window
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown scorecard kind: {kind}")
+        if sort not in METRICS:
+            raise ValueError(f"Unknown metric: {sort}")
+        weeks = parse_window(window)
+        current = week_of(time.time() if now is None else now)
+        week_range = (current - weeks + 1, current) if weeks is not None else None
+
+        with self._lock:
+            self._catch_up()
+            if name is not None:
+                _, entities = self.aggregates.summarize(kind, week_range, names=[name])
+                return {
+                    "kind": kind,
+                    "window": window,
+                    "scorecard": entities[0] if entities else None,
+                    "weekly": self.aggregates.series(
+                        kind, name, week_range or (current - MAX_WINDOW_WEEKS + 1, current))
+                }
+            total, entities = self.aggregates.summarize(kind, week_range, sort=sort, limit=limit)
+        return {"kind": kind, "window": window, "sort": sort, "entities": total, "scorecards": entities}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+            return {
+                "analyses": stored,
+                "slots": len(self.aggregates.slots),
+                "aggregate_bytes": self.aggregates.nbytes(),
+                "snapshot_id": self._saved_id
+            }
+
+
+def backfill_from_jobs(store: ScorecardStore, jobs_db_path: str, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    Record every finished bulk-job analysis at its finish time.
+
+    Returns:
+        (results read, new results)
+    """
+    conn = sqlite3.connect(jobs_db_path)
+    read = added = 0
+    try:
+        cursor = conn.execute(
+            "SELECT payload, result, finished_at FROM job_items WHERE status = 'done' ORDER BY finished_at")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            items = []
+            for payload, result, finished_at in rows:
+                payload = json.loads(payload)
+                items.append((
+                    json.loads(result), payload["conversation"], payload.get("rep_name"),
+                    payload.get("doctor_name"), payload.get("territory"), payload.get("product_id"), finished_at
+                ))
+            read += len(items)
+            added += store.record_many(items)
+    finally:
+        conn.close()
+    return read, added
+
+
+# Shared instance (created on first use)
+_scorecard_store: Optional[ScorecardStore] = None
+_scorecard_store_loaded = False
+
+
+def get_scorecard_store() -> Optional[ScorecardStore]:
+    """
+    Get or create the shared scorecard store (None when disabled).
+    """
+    global _scorecard_store, _scorecard_store_loaded
+    if not _scorecard_store_loaded:
+        _scorecard_store = ScorecardStore.from_env()
+        if _scorecard_store is not None:
+            _scorecard_store.start()
+        _scorecard_store_loaded = True
+    return _scorecard_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill scorecards from historical bulk-job analyses")
+    parser.add_argument("--jobs-db", default=os.getenv("JOBS_DB_PATH", ".data/jobs.sqlite3"))
+    args = parser.parse_args()
+
+    store = ScorecardStore(os.getenv("SCORECARD_DB_PATH", ".data/scorecards.sqlite3"),
+                           os.getenv("SCORECARD_SNAPSHOT_DIR", ".data/scorecards"))
+    start = time.perf_counter()
+    read, added = backfill_from_jobs(store, args.jobs_db)
+    store.close()
+    print(f"{read} finished job result(s) read, {added} new, in {time.perf_counter() - start:.1f}s "
+          f"({store.stats()['analyses']} analyses stored)")
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The backend's packages (agents, compliance, ...) import each other as top-level modules
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from compliance.registry import DEFAULT_RULES_DIR, ProductRules  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def cardiostatin_rules() -> ProductRules:
+    return ProductRules.load(os.path.join(DEFAULT_RULES_DIR, "cardiostatin.json"))
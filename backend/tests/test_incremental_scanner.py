@@ -0,0 +1,95 @@
+"""
+IncrementalOffLabelScanner: what may be released to the client while a response streams in.
+"""
+
+import random
+
+from compliance.off_label_detector import IncrementalOffLabelScanner, OffLabelDetector
+
+FILLER = [
+    "the study", "patients", "in practice", "might", "also", "some doctors", "dose",
+    "cardiostatin", "lowers ldl", "is approved", "for", "with", "works", "help",
+    "can be used", "weight", "\n", "and", "may"
+]
+VIOLATIONS = [
+    "in practice, many say it works for", "might also   help with", "some physicians prescribe",
+    "can be used for", "doctors have found", "weight loss", "off-label"
+]
+
+
+def stream(scanner: IncrementalOffLabelScanner, text: str, rnd: random.Random):
+    """
+    Feed `text` in random-sized chunks until a violation is reported.
+
+    Returns:
+        (first violating result or None, most characters released before it)
+    """
+    released = 0
+    position = 0
+    while position < len(text):
+        size = rnd.randint(1, 12)
+        result = scanner.feed(text[position:position + size])
+        position += size
+        if result["is_violation"]:
+            return result, released
+        released = max(released, scanner.safe_length())
+    return None, released
+
+
+def test_no_violation_leaks_before_it_is_blocked(cardiostatin_rules):
+    detector = OffLabelDetector(cardiostatin_rules)
+    rnd = random.Random(7)
+    checked = 0
+    for _ in range(2000):
+        words = [rnd.choice(FILLER) for _ in range(rnd.randint(5, 80))]
+        if rnd.random() < 0.6:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(VIOLATIONS))
+        text = " ".join(words)
+        full = detector.detect(text)
+        scanner = IncrementalOffLabelScanner(detector)
+        found, released = stream(scanner, text, rnd)
+
+        # Matches longer than the lookback are left to the check on the finished text
+        bounded = [v for v in full["violations"] if v["end"] - v["start"] <= scanner.LOOKBACK]
+        if bounded:
+            checked += 1
+            assert found is not None, text
+            assert released <= min(v["start"] for v in bounded), (text, released)
+        elif not full["is_violation"]:
+            assert found is None, text
+    assert checked > 500
+
+
+def test_holdback_covers_a_literal_still_arriving(cardiostatin_rules):
+    scanner = IncrementalOffLabelScanner(OffLabelDetector(cardiostatin_rules))
+    scanner.feed("The dose is fine. Off-lab")
+    assert scanner.safe_length() <= len("The dose is fine. ")
+    assert scanner.feed("el use")["is_violation"]
+
+
+def test_open_pattern_holds_back_its_prefix(cardiostatin_rules):
+    scanner = IncrementalOffLabelScanner(OffLabelDetector(cardiostatin_rules))
+    scanner.feed("Patients do well. In practice it")
+    # "in practice.*works for" may still complete
+    assert scanner.safe_length() <= len("Patients do well. ")
+    result = scanner.feed(" works for migraines")
+    assert result["violation_type"] == "implicit_off_label"
+
+
+def test_spans_map_back_to_the_original_text(cardiostatin_rules):
+    # "İ" lowercases to two characters, shifting every later lowercased offset
+    scanner = IncrementalOffLabelScanner(OffLabelDetector(cardiostatin_rules))
+    scanner.feed("İİİ dose. ")
+    result = scanner.feed("It is used off-label.")
+    violation = result["violations"][0]
+    assert scanner.text[violation["start"]:violation["end"]] == "off-label"
+    assert scanner.safe_length() <= violation["start"]
+
+
+def test_work_per_chunk_stays_bounded(cardiostatin_rules):
+    scanner = IncrementalOffLabelScanner(OffLabelDetector(cardiostatin_rules))
+    text = "the study shows patients with high ldl respond well and " * 400
+    for position in range(0, len(text), 4):
+        scanner.feed(text[position:position + 4])
+    # Only the last lookback's worth of text is held back, not the whole response
+    assert len(scanner.text) - scanner.safe_length() <= scanner.LOOKBACK
@@ -0,0 +1,134 @@
+"""
+RuleMatcher against the per-pattern detector it replaced.
+"""
+
+import random
+import re
+
+import pytest
+
+from compliance.matcher import SCAN_MAX_LITERALS, RuleMatcher
+from compliance.off_label_detector import OffLabelDetector
+from compliance.registry import ProductRules
+
+FILLER = [
+    "the study", "patients", "in practice", "might", "also", "some doctors", "dose",
+    "cardiostatin", "lowers ldl", "is approved", "for", "with", "works", "help",
+    "can be used", "weight", "and", "may", "children's", "not approved", "\n"
+]
+PHRASES = [
+    "off-label", "off label", "in practice, many say it works for", "might also   help with",
+    "some physicians prescribe", "can be used for", "doctors have found", "weight loss",
+    "migraine", "pregnancy", "not approved for", "is not indicated for"
+]
+
+
+def per_pattern_detect(rules: ProductRules, text: str) -> dict:
+    """
+    The original detector: each layer in turn, each rule in turn, first hit wins.
+    """
+    text_lower = text.lower()
+    for keyword in rules.off_label_keywords:
+        if keyword in text_lower:
+            return {"violation_type": "explicit_off_label", "detected_text": keyword}
+    for pattern in rules.implicit_patterns:
+        match = re.search(pattern, text_lower)
+        if match:
+            return {"violation_type": "implicit_off_label", "detected_text": match.group(0)}
+    for condition in rules.off_label_conditions:
+        if condition in text_lower and not any(
+                phrase in text_lower for phrase in rules.approved_context_phrases):
+            return {"violation_type": "unapproved_indication", "detected_text": condition}
+    return {"violation_type": None, "detected_text": None}
+
+
+def random_texts(rnd: random.Random, phrases, count: int):
+    for _ in range(count):
+        words = [rnd.choice(FILLER) for _ in range(rnd.randint(1, 40))]
+        for _ in range(rnd.randint(0, 3)):
+            words.insert(rnd.randint(0, len(words)), rnd.choice(phrases))
+        yield " ".join(words)
+
+
+def many_rules() -> ProductRules:
+    """
+    More literals than SCAN_MAX_LITERALS (so the Aho-Corasick automaton is
+    used), with patterns both with and without a literal prefix.
+    """
+    return ProductRules(
+        "many",
+        off_label_keywords=[f"unapproved use {i}" for i in range(SCAN_MAX_LITERALS)] + ["off-label"],
+        implicit_patterns=[
+            r"some (?:doctors|physicians) (?:use|prescribe)",
+            r"in practice.*works for",
+            r"(?:might|may)(?:\s+also)? help",
+            r"\bcan\b.{0,10}\bused\b",
+            r"(?P<who>doctors) have (?i:found)",
+        ],
+        off_label_conditions=[f"condition {i}" for i in range(SCAN_MAX_LITERALS)] + ["weight loss", "migraine"],
+        approved_context_phrases=["not approved for"],
+    )
+
+
+@pytest.mark.parametrize("rule_set", ["cardiostatin", "many"])
+def test_detect_matches_per_pattern_detector(rule_set, cardiostatin_rules):
+    rules = cardiostatin_rules if rule_set == "cardiostatin" else many_rules()
+    phrases = PHRASES + ["unapproved use 17", "condition 99", "may help", "can be   used"]
+    detector = OffLabelDetector(rules)
+    for text in random_texts(random.Random(7), phrases, 2000):
+        result = detector.detect(text)
+        expected = per_pattern_detect(rules, text)
+        assert result["violation_type"] == expected["violation_type"], text
+        assert result["detected_text"] == expected["detected_text"], text
+        assert result["is_violation"] == (expected["violation_type"] is not None)
+
+
+def test_literal_hits_match_substring_search():
+    rules = many_rules()
+    literals = {
+        "explicit_off_label": list(rules.off_label_keywords),
+        "unapproved_indication": list(rules.off_label_conditions),
+    }
+    matcher = RuleMatcher(literals, {})
+    rnd = random.Random(11)
+    for text in random_texts(rnd, PHRASES + ["unapproved use 12", "condition 1", "condition 100"], 500):
+        found = {(m.rule, m.start) for m in matcher.find_all(text.lower())}
+        expected = {
+            (rule, match.start())
+            for rules_ in literals.values()
+            for rule in rules_
+            for match in re.finditer(f"(?={re.escape(rule)})", text.lower())
+        }
+        assert found == expected, text
+
+
+def test_each_pattern_reports_its_leftmost_match():
+    rules = many_rules()
+    matcher = RuleMatcher({}, {"implicit_off_label": list(rules.implicit_patterns)})
+    rnd = random.Random(3)
+    for text in random_texts(rnd, PHRASES + ["may help", "can be   used", "Doctors have FOUND"], 1000):
+        text = text.lower()
+        matches = matcher.find_all(text)
+        for rule_index, pattern in enumerate(rules.implicit_patterns):
+            first = min((m for m in matches if m.rule_index == rule_index),
+                        key=lambda m: m.start, default=None)
+            expected = re.search(pattern, text)
+            if expected is None:
+                assert first is None, (pattern, text)
+            else:
+                assert (first.start, first.end, first.text) == (
+                    expected.start(), expected.end(), expected.group(0)), (pattern, text)
+
+
+def test_fallback_patterns_report_overlapping_matches():
+    # Neither pattern has a literal prefix; both match at the same start
+    matcher = RuleMatcher({}, {"implicit_off_label": [r"\w+ help", r"(?:may|might) help"]})
+    spans = {(m.rule_index, m.start, m.end) for m in matcher.find_all("it may help")}
+    assert spans == {(0, 3, 11), (1, 3, 11)}
+
+
+def test_invalid_pattern_raises_unless_validated():
+    with pytest.raises(re.error):
+        RuleMatcher({}, {"implicit_off_label": ["(unclosed"]})
+    # Known to compile: compiled on first use only
+    RuleMatcher({}, {"implicit_off_label": ["(unclosed"]}, validate=False)
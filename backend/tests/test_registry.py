@@ -0,0 +1,127 @@
+"""
+RuleRegistry hot reload, in-process and through the batch worker pool.
+"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from compliance import off_label_detector
+from compliance.off_label_detector import BATCH_PARALLEL_THRESHOLD, ComplianceGuardian
+from compliance.registry import DEFAULT_RULES_DIR, RuleRegistry
+
+TEXT = "It helps with gout flares"
+
+
+@pytest.fixture
+def rules_dir(tmp_path):
+    shutil.copy(os.path.join(DEFAULT_RULES_DIR, "cardiostatin.json"), tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def batch_pool():
+    yield
+    if off_label_detector._batch_pool is not None:
+        off_label_detector._batch_pool.shutdown()
+        off_label_detector._batch_pool = None
+
+
+def edit_rules(rules_dir, product_id="cardiostatin", **changes):
+    """
+    Rewrite a copy of the cardiostatin rules as `product_id` with list fields extended.
+    """
+    with open(os.path.join(DEFAULT_RULES_DIR, "cardiostatin.json"), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["product_id"] = product_id
+    for field, extra in changes.items():
+        data[field] = data[field] + extra
+    with open(os.path.join(rules_dir, f"{product_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def statuses(guardian, count, product_id=None, workers=2):
+    return {result["status"] for result in guardian.check_batch([TEXT] * count, workers, product_id)}
+
+
+def test_changed_file_is_picked_up(rules_dir):
+    registry = RuleRegistry(str(rules_dir), reload_interval=0)
+    before = registry.get()
+    assert ComplianceGuardian(registry).check_text(TEXT)["status"] == "APPROVED"
+
+    edit_rules(rules_dir, off_label_conditions=["gout"])
+    assert registry.reload()
+    assert registry.get().version != before.version
+    assert ComplianceGuardian(registry).check_text(TEXT)["status"] == "BLOCKED"
+    # Nothing changed since
+    assert not registry.reload()
+
+
+def test_added_and_removed_products(rules_dir):
+    registry = RuleRegistry(str(rules_dir), reload_interval=0)
+    with pytest.raises(ValueError):
+        registry.get("newdrug")
+
+    edit_rules(rules_dir, "newdrug", off_label_conditions=["gout"])
+    assert registry.reload()
+    assert registry.get("newdrug").product_id == "newdrug"
+
+    os.remove(os.path.join(rules_dir, "newdrug.json"))
+    assert registry.reload()
+    with pytest.raises(ValueError):
+        registry.get("newdrug")
+
+
+def test_broken_file_keeps_the_previous_rules(rules_dir):
+    registry = RuleRegistry(str(rules_dir), reload_interval=0)
+    before = registry.get()
+
+    with open(os.path.join(rules_dir, "cardiostatin.json"), "w", encoding="utf-8") as f:
+        json.dump({"implicit_patterns": ["(unclosed"]}, f)
+    assert not registry.reload()
+    assert registry.get() is before
+
+
+def test_invalid_rules_fail_startup(rules_dir):
+    with open(os.path.join(rules_dir, "broken.json"), "w", encoding="utf-8") as f:
+        f.write("{not json")
+    with pytest.raises(ValueError):
+        RuleRegistry(str(rules_dir), reload_interval=0)
+
+
+def test_compiled_cache_only_skips_files_that_compiled(rules_dir, tmp_path_factory):
+    cache = str(tmp_path_factory.mktemp("cache") / "compiled_rules.json")
+    RuleRegistry(str(rules_dir), reload_interval=0, compiled_cache=cache)
+    assert os.path.exists(cache)
+
+    # Same file: loaded without validating, same rules
+    registry = RuleRegistry(str(rules_dir), reload_interval=0, compiled_cache=cache)
+    assert ComplianceGuardian(registry).check_text("It is used off-label")["status"] == "BLOCKED"
+
+    # A changed file is compiled (and validated) again
+    with open(os.path.join(rules_dir, "cardiostatin.json"), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["implicit_patterns"].append("(unclosed")
+    with open(os.path.join(rules_dir, "cardiostatin.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    with pytest.raises(ValueError):
+        RuleRegistry(str(rules_dir), reload_interval=0, compiled_cache=cache)
+
+
+@pytest.mark.parametrize("count", [10, BATCH_PARALLEL_THRESHOLD + 88])
+def test_batches_use_the_reloaded_rules(rules_dir, batch_pool, count):
+    registry = RuleRegistry(str(rules_dir), reload_interval=0)
+    guardian = ComplianceGuardian(registry)
+    # Warms the worker pool up on the old rules
+    assert statuses(guardian, count) == {"APPROVED"}
+
+    edit_rules(rules_dir, off_label_conditions=["gout"])
+    assert registry.reload()
+    assert statuses(guardian, count) == {"BLOCKED"}
+
+    edit_rules(rules_dir, "newdrug")
+    assert registry.reload()
+    assert statuses(guardian, count, "newdrug") == {"APPROVED"}
+    assert statuses(guardian, count) == {"BLOCKED"}
@@ -0,0 +1,88 @@
+"""
+CircuitBreaker state transitions.
+"""
+
+from typing import Tuple
+
+from agents import resilience
+from agents.resilience import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def breaker(monkeypatch, **kwargs) -> Tuple[CircuitBreaker, FakeClock]:
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return CircuitBreaker(model="test", **kwargs), clock
+
+
+def test_opens_after_consecutive_failures(monkeypatch):
+    circuit, _ = breaker(monkeypatch, failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        assert circuit.allow()
+        circuit.record_failure()
+    assert circuit.state == "closed"
+    circuit.record_failure()
+    assert circuit.state == "open"
+    assert not circuit.allow()
+    assert circuit.retry_after() == 30
+
+
+def test_success_resets_the_failure_count(monkeypatch):
+    circuit, _ = breaker(monkeypatch, failure_threshold=2)
+    circuit.record_failure()
+    circuit.record_success()
+    circuit.record_failure()
+    assert circuit.state == "closed"
+
+
+def test_half_open_lets_one_probe_through(monkeypatch):
+    circuit, clock = breaker(monkeypatch, failure_threshold=1, reset_timeout=30)
+    circuit.record_failure()
+    clock.now += 29
+    assert not circuit.allow()
+    clock.now += 1
+    assert circuit.allow()
+    assert circuit.state == "half_open"
+    # Only the one probe while it is out
+    assert not circuit.allow()
+
+
+def test_probe_success_closes(monkeypatch):
+    circuit, clock = breaker(monkeypatch, failure_threshold=1, reset_timeout=30)
+    circuit.record_failure()
+    clock.now += 30
+    assert circuit.allow()
+    circuit.record_success()
+    assert circuit.state == "closed"
+    assert circuit.allow() and circuit.allow()
+
+
+def test_probe_failure_reopens_for_another_timeout(monkeypatch):
+    circuit, clock = breaker(monkeypatch, failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        circuit.record_failure()
+    clock.now += 30
+    assert circuit.allow()
+    # One failure is enough in half-open
+    circuit.record_failure()
+    assert circuit.state == "open"
+    assert circuit.retry_after() == 30
+    assert not circuit.allow()
+
+
+def test_released_probe_can_be_retried(monkeypatch):
+    circuit, clock = breaker(monkeypatch, failure_threshold=1, reset_timeout=30)
+    circuit.record_failure()
+    clock.now += 30
+    assert circuit.allow()
+    # Cancelled or a bad request: no verdict either way
+    circuit.release()
+    assert circuit.state == "half_open"
+    assert circuit.allow()
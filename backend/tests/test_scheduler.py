@@ -0,0 +1,141 @@
+"""
+LLMScheduler: fair-share dispatch order and giving up while queued.
+"""
+
+import asyncio
+from typing import List
+
+import pytest
+
+from agents.scheduler import LLMScheduler, llm_priority
+
+
+async def queue_calls(scheduler: LLMScheduler, callers, cost: float = 100) -> List[str]:
+    """
+    Start one call per (priority, user) behind a held slot, then free the
+    slot and return the order the calls were dispatched in.
+    """
+    release = asyncio.Event()
+    order = []
+
+    async def call(priority: str, user: str):
+        with llm_priority(priority, user):
+            async with scheduler.slot(cost):
+                order.append(f"{priority}:{user}")
+                await asyncio.sleep(0)
+
+    async def hold():
+        async with scheduler.slot(cost):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = []
+    for priority, user in callers:
+        tasks.append(asyncio.create_task(call(priority, user)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_users_share_a_class_equally():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserved=0)
+    order = asyncio.run(queue_calls(
+        scheduler, [("batch", "a")] * 6 + [("batch", "b")] * 2))
+    # b's calls are not stuck behind all of a's
+    assert order[:4] == ["batch:a", "batch:b", "batch:a", "batch:b"]
+
+
+def test_classes_share_by_weight():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserved=0,
+                             weights={"interactive": 4.0, "analysis": 1.0, "batch": 1.0})
+    order = asyncio.run(queue_calls(
+        scheduler, [("batch", "b")] * 10 + [("interactive", "i")] * 10))
+    first = order[:10]
+    assert first.count("interactive:i") == 8
+    # Batch is slowed down, never starved
+    assert first.count("batch:b") == 2
+
+
+def test_fifo_serves_in_arrival_order():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserved=0, fifo=True)
+    callers = [("batch", "b"), ("interactive", "i"), ("analysis", "a"), ("batch", "b")]
+    order = asyncio.run(queue_calls(scheduler, callers))
+    assert order == [f"{priority}:{user}" for priority, user in callers]
+
+
+def test_reserved_slots_are_kept_for_interactive_calls():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=2, interactive_reserved=1)
+        release = asyncio.Event()
+
+        async def call(priority: str):
+            with llm_priority(priority, "u"):
+                async with scheduler.slot(10):
+                    await release.wait()
+
+        batch = [asyncio.create_task(call("batch")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assert scheduler.in_flight == 1
+        interactive = asyncio.create_task(call("interactive"))
+        await asyncio.sleep(0.01)
+        assert scheduler.in_flight == 2
+        release.set()
+        await asyncio.gather(*batch, interactive)
+        assert scheduler.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1, interactive_reserved=0)
+        release = asyncio.Event()
+        served = []
+
+        async def call(name: str):
+            with llm_priority("analysis", name):
+                async with scheduler.slot(10):
+                    served.append(name)
+                    await release.wait()
+
+        holder = asyncio.create_task(call("holder"))
+        await asyncio.sleep(0)
+        gone = asyncio.create_task(call("gone"))
+        waiting = asyncio.create_task(call("waiting"))
+        await asyncio.sleep(0)
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        release.set()
+        await asyncio.gather(holder, waiting)
+        assert served == ["holder", "waiting"]
+        assert scheduler.in_flight == 0
+        assert not any(scheduler._queues.values())
+
+    asyncio.run(run())
+
+
+def test_cancel_after_admission_returns_the_slot():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1, interactive_reserved=0)
+        entered = []
+
+        async def call():
+            async with scheduler.slot(10):
+                entered.append(True)
+
+        async with scheduler.slot(10):
+            waiter = asyncio.create_task(call())
+            await asyncio.sleep(0)
+        # Leaving the slot handed it to the waiter, which is cancelled before it runs
+        assert scheduler.in_flight == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert not entered
+        assert scheduler.in_flight == 0
+        async with scheduler.slot(10):
+            assert scheduler.in_flight == 1
+
+    asyncio.run(run())
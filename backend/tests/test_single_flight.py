@@ -0,0 +1,103 @@
+"""
+SingleFlight: shared calls, and callers that give up while waiting.
+"""
+
+import asyncio
+
+import pytest
+
+from cache.single_flight import SingleFlight
+
+
+class SlowCall:
+    """
+    A call that runs until released, counting starts and cancellations.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "answer"
+
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flights = SingleFlight("test")
+        call = SlowCall()
+        callers = [asyncio.create_task(flights.do("key", call)) for _ in range(5)]
+        await asyncio.sleep(0)
+        call.release.set()
+        assert await asyncio.gather(*callers) == ["answer"] * 5
+        assert call.started == 1
+        assert len(flights) == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_call_to_the_others():
+    async def run():
+        flights = SingleFlight("test")
+        call = SlowCall()
+        first = asyncio.create_task(flights.do("key", call))
+        second = asyncio.create_task(flights.do("key", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert call.cancelled == 0
+        call.release.set()
+        assert await second == "answer"
+        assert call.started == 1
+
+    asyncio.run(run())
+
+
+def test_last_waiter_gone_cancels_the_call():
+    async def run():
+        flights = SingleFlight("test")
+        call = SlowCall()
+        callers = [asyncio.create_task(flights.do("key", call)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert call.cancelled == 1
+        assert len(flights) == 0
+
+        # A new caller starts afresh instead of joining the cancelled call
+        again = asyncio.create_task(flights.do("key", call))
+        await asyncio.sleep(0)
+        call.release.set()
+        assert await again == "answer"
+        assert call.started == 2
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_waiter():
+    async def run():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise ValueError("upstream failed")
+
+        callers = [asyncio.create_task(flights.do("key", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(flights) == 0
+
+    asyncio.run(run())